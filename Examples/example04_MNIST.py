@@ -2,7 +2,6 @@
 # Go to github.com/Algebraic-AI for full license details.
 
 import random
-import math
 import sys
 
 import aml
@@ -95,22 +94,6 @@ def selectFromSet(fromSet, navigatorIndex, pSize, nSize):
     return navigatorIndex, pbatch, nbatch
 
 
-def selectClass(wH, las, classToClassConstant):
-    minsize = math.inf
-    selectDigit = None
-    for d in range(0, mnist_numclasses):
-        dc = classToClassConstant[d]
-        if dc in las:
-            dlas = las[dc]
-            disc = dlas - wH.las
-            discsize = len(disc)
-            if discsize < minsize:
-                selectDigit = d
-                minsize = discsize
-
-    return selectDigit
-
-
 def batchTraining(embedder, model, DATA_SOURCE, params):
     # Add embedding constants to model
     for i in params.constants:
@@ -175,34 +158,37 @@ def batchTraining(embedder, model, DATA_SOURCE, params):
             testSetDuples = ptest.copy()
             testSetDuples.extend(ntest)
 
-            # Precompute the lower atomic segment for all terms (instead of duple by duple)
-            print("Calculate test space")
-            las = aml.calculateLowerAtomicSegment(
+            # Compile the union model once and score all test terms in a batch
+            print("Compiling union model")
+            predictor = aml.UnionModelPredictor(
                 embedder.lastUnionModel,
                 model.cmanager.embeddingConstants,
-                True,
             )
-            testSpace = aml.termSpace()
-            for rel in testSetDuples:
-                rel.wL = testSpace.add(rel.L)
-                rel.wH = testSpace.add(rel.R)
-            testSpace.calculateLowerAtomicSegments(embedder.lastUnionModel, las)
+            ptestDuples = [r for r in testSetDuples if r.positive]
+            selectedDigits = predictor.predict(
+                [r.R for r in ptestDuples],
+                classToClassConstant,
+            )
 
             # Compute and report statistics
             correct = 0
             incorrect = 0
+            noPrediction = 0
             cm = [[0] * mnist_numclasses for d in range(0, mnist_numclasses)]
-            for r in testSetDuples:
-                if r.positive:
-                    digit = r.region - 1
-                    selectedDigit = selectClass(r.wH, las, classToClassConstant)
-                    if digit == selectedDigit:
-                        correct += 1
-                    else:
-                        incorrect += 1
-                    cm[digit][selectedDigit] += 1
+            for r, selectedDigit in zip(ptestDuples, selectedDigits.tolist()):
+                digit = r.region - 1
+                if selectedDigit == -1:
+                    # No class has atoms, counted as incorrect out of the matrix
+                    noPrediction += 1
+                    incorrect += 1
+                    continue
+                if digit == selectedDigit:
+                    correct += 1
+                else:
+                    incorrect += 1
+                cm[digit][selectedDigit] += 1
             classificationError = incorrect / (correct + incorrect)
-            print(f"correct: {correct}, incorrect: {incorrect}")
+            print(f"correct: {correct}, incorrect: {incorrect}, no prediction: {noPrediction}")  # fmt:skip
             for d in range(0, mnist_numclasses):
                 print(cm[d])
 
@@ -3,14 +3,35 @@
 
 USE_BITARRAYS = True
 
+# Constant universes up to this size are better served by dense bitsets
+DENSE_BITARRAYS_MAX_UNIVERSE = 4096
+
 if USE_BITARRAYS:
     from .aml_fast.amlFastBitarrays import bitarray
+    from .aml_fast.amlFastDenseBitarrays import densebitarray
     amlset = bitarray
 else:
     amlset = set
 
+
+def amlsetForUniverse(universeSize):
+    """
+    Return the set implementation for a universe of 'universeSize' constants:
+    dense fixed-width bitsets for small universes, compressed bitarrays
+    otherwise. Compiled routines only accept the compressed representation.
+    """
+
+    if not USE_BITARRAYS:
+        return set
+    if universeSize <= DENSE_BITARRAYS_MAX_UNIVERSE:
+        return densebitarray
+    return bitarray
+
+
 from .core import *
 from .embedders import *
 from .io import *
+from .inference import *
+from .parallel import *
 from .tools import *
 from . import amldl
@@ -3,6 +3,7 @@
 
 import ctypes
 import functools
+import random
 import numpy as np
 
 from .amlCompiledLibrary import ffi
@@ -12,6 +13,15 @@ from .amlCompiledLibrary import lib as caml
 class bitarray:
     __bitarray_out = 0
     gsm = None
+    # Read-only buffer that holds the segment when it is not owned by the gsm
+    # (e.g. a memory mapped model). The segment is copied before any change.
+    _mapping = None
+    _hash = None
+    # BitarrayVector that holds the segment of a view, see BitarrayVector
+    _vector = None
+    _borrowed = False
+    # Items decoded per call when iterating large bitarrays
+    chunkSize = 4096
 
     @classmethod
     def init(cls):
@@ -34,19 +44,72 @@ class bitarray:
 
     # Destructor
     def __del__(self):
-        caml.bitarray_delete(self._segment_handle, self.gsm)
+        if self._mapping is None and not self._borrowed:
+            caml.bitarray_delete(self._segment_handle, self.gsm)
         bitarray.__bitarray_out -= 1
 
+    @classmethod
+    def fromMapping(cls, handle, mapping):
+        """
+        Return a bitarray over the segment pointed by 'handle', which lives in
+        the read-only buffer 'mapping'. The buffer is kept alive by the
+        bitarray and never written to.
+        """
+
+        ret = cls()
+        ret._segment_handle = handle
+        ret._mapping = mapping
+        return ret
+
+    @classmethod
+    def _views(cls, handles, vector, borrowed):
+        # Bitarrays over the slots of 'vector', without allocating handles
+        ret = []
+        new = cls.__new__
+        for handle in handles:
+            b = new(cls)
+            b._segment_handle = handle
+            b._vector = vector
+            ret.append(b)
+        if vector.gsm != bitarray.gsm:
+            for b in ret:
+                b.gsm = vector.gsm
+        if borrowed:
+            for b in ret:
+                b._borrowed = True
+        bitarray.__bitarray_out += len(ret)
+        return ret
+
+    @classmethod
+    def bulk_new(cls, n, gsm=None):
+        """Return a BitarrayVector with 'n' empty bitarrays"""
+
+        return BitarrayVector(n, gsm)
+
+    def _detach(self):
+        handle = ffi.new("void **")
+        caml.bitarray_clone(handle, self._segment_handle[0], self.gsm)
+        self._segment_handle = handle
+        self._mapping = None
+
     def __eq__(self, other):
         return bool(
             caml.bitarray_compare(self._segment_handle[0], other._segment_handle[0])
         )
 
+    # The hash is computed in C from the segment and cached until the next
+    # modification. Compiled routines that modify a bitarray in place through
+    # its handle must reset '_hash'. Borrowed views share their slot with
+    # other views of the same vector, so their hash is never cached.
     def __hash__(self):
-        return hash(frozenset(self))
+        if self._borrowed:
+            return caml.bitarray_hash(self._segment_handle[0])
+        if self._hash is None:
+            self._hash = caml.bitarray_hash(self._segment_handle[0])
+        return self._hash
 
     def __repr__(self):
-        return "bitarray(" + list(self.__unpack()).__repr__() + ")"
+        return "bitarray(" + self.to_numpy().tolist().__repr__() + ")"
 
     def __str__(self):
         return self.__repr__()
@@ -60,8 +123,63 @@ class bitarray:
     def __bool__(self):
         return bool(self._segment_handle[0] != ffi.NULL)
 
+    # Bitarrays up to 'chunkSize' items are decoded at once, larger ones
+    # lazily, 'chunkSize' items at a time
     def __iter__(self):
-        return iter(self.__unpack())
+        len_ba = len(self)
+        if len_ba <= bitarray.chunkSize:
+            ret = ffi.new("int []", len_ba)
+            caml.bitarray_unpack(ret, self._segment_handle[0])
+            return iter(ffi.unpack(ret, len_ba))
+        return self.__iterChunks()
+
+    def __iterChunks(self):
+        size = bitarray.chunkSize
+        buffer = ffi.new("int []", size)
+        start = 0
+        while True:
+            len_chunk = caml.bitarray_unpackFrom(
+                buffer, self._segment_handle[0], start, size
+            )
+            yield from ffi.unpack(buffer, len_chunk)
+            if len_chunk < size:
+                return
+            start = buffer[len_chunk - 1] + 1
+
+    # Items in ascending order as int32 arrays of at most 'size' items. Every
+    # chunk is decoded from the segment when requested.
+    def chunks(self, size=None):
+        if size is None:
+            size = bitarray.chunkSize
+        start = 0
+        while True:
+            chunk = np.empty([size], dtype=np.int32)
+            len_chunk = caml.bitarray_unpackFrom(
+                ffi.cast("int *", chunk.ctypes.data),
+                self._segment_handle[0],
+                start,
+                size,
+            )
+            if len_chunk == 0:
+                return
+            yield chunk[:len_chunk]
+            if len_chunk < size:
+                return
+            start = int(chunk[-1]) + 1
+
+    # Items in ascending order as an int32 array
+    def to_numpy(self):
+        ret = np.empty([len(self)], dtype=np.int32)
+        caml.bitarray_unpack(ffi.cast("int *", ret.ctypes.data), self._segment_handle[0])
+        return ret
+
+    @classmethod
+    def from_numpy(cls, items, gsm=None):
+        """Bitarray with the items of the integer array 'items'"""
+
+        ret = cls(gsm=gsm)
+        ret.add(np.asarray(items))
+        return ret
 
     def __getstate__(self):
         handles = [self._segment_handle[0]]
@@ -73,6 +191,7 @@ class bitarray:
 
     def __setstate__(self, state):
         self.gms = bitarray.gsm
+        self._hash = None
         self._segment_handle = ffi.new("void **")
         handles = [self._segment_handle]
         buffer_ptr = ffi.cast("char *", state.ctypes.data)
@@ -80,23 +199,55 @@ class bitarray:
 
     # Add an item
     def add(self, values):
+        self._hash = None
+        if self._mapping is not None:
+            self._detach()
         if isinstance(values, int):
             caml.bitarray_addItem(self._segment_handle, values, self.gsm)
-        elif isinstance(values, (list, set, frozenset, tuple, bitarray)):
+        elif isinstance(values, bitarray):
+            caml.bitarray_add(self._segment_handle, values._segment_handle[0], self.gsm)
+        elif isinstance(values, (list, set, frozenset, tuple)):
             caml.bitarray_addItems(
                 self._segment_handle, list(values), len(values), self.gsm
             )
-        elif isinstance(values, bitarray):
-            caml.bitarray_clone(
-                self._segment_handle, values._segment_handle[0], self.gsm
+        elif isinstance(values, np.ndarray):
+            # Sorted items are appended at the end of the segment
+            items = np.unique(values).astype(np.int32)
+            caml.bitarray_addItems(
+                self._segment_handle,
+                ffi.cast("int *", items.ctypes.data),
+                len(items),
+                self.gsm,
             )
         else:
             raise TypeError("Wrong value initialisation for bitarray")
 
     # Remove an item
     def remove(self, value):
+        self._hash = None
+        if self._mapping is not None:
+            self._detach()
         caml.bitarray_removeItem(self._segment_handle, value, self.gsm)
 
+    # Remove an item if present: a.discard(v)
+    def discard(self, value):
+        if value in self:
+            self.remove(value)
+
+    # Item of index 'n' in ascending order
+    def nth(self, n):
+        ret = caml.bitarray_nth(self._segment_handle[0], n)
+        if ret < 0:
+            raise IndexError("bitarray index out of range")
+        return ret
+
+    # Same draw as random.choice(tuple(a)), without unpacking the bitarray
+    def choose_random(self):
+        len_ba = len(self)
+        if len_ba == 0:
+            raise IndexError("Cannot choose from an empty bitarray")
+        return self.nth(random.randrange(len_ba))
+
     # Union: a | b
     def __or__(self, other):
         new_bitarray = self.copy()
@@ -123,11 +274,17 @@ class bitarray:
 
     # In-place union: a |= b (same as a += b)
     def __ior__(self, other):
+        self._hash = None
+        if self._mapping is not None:
+            self._detach()
         caml.bitarray_add(self._segment_handle, other._segment_handle[0], self.gsm)
         return self
 
     # In-place intersection: a &= b
     def __iand__(self, other):
+        self._hash = None
+        if self._mapping is not None:
+            self._detach()
         caml.bitarray_intersect(
             self._segment_handle, other._segment_handle[0], self.gsm
         )
@@ -135,6 +292,9 @@ class bitarray:
 
     # In-place subtraction: a -= b
     def __isub__(self, other):
+        self._hash = None
+        if self._mapping is not None:
+            self._detach()
         caml.bitarray_subtract(self._segment_handle, other._segment_handle[0], self.gsm)
         return self
 
@@ -152,6 +312,29 @@ class bitarray:
             caml.bitarray_isdisjoint(self._segment_handle[0], other._segment_handle[0])
         )
 
+    # Size of a - b, without building it
+    def difference_len(self, other):
+        return caml.bitarray_differenceLen(
+            self._segment_handle[0], other._segment_handle[0]
+        )
+
+    # Size of a & b, without building it
+    def intersection_len(self, other):
+        return caml.bitarray_intersectionLen(
+            self._segment_handle[0], other._segment_handle[0]
+        )
+
+    # True if a intersects any of the bitarrays in 'others'
+    def intersects_any_of(self, others):
+        ### ATTENTION: This block cannot be extracted.
+        ### If in a function, Python garbage collects pointers before they're used
+        others_ptr = [o._segment_handle[0] for o in others]
+        ###
+
+        return caml.bitarray_intersectsAnyOf(
+            self._segment_handle[0], others_ptr, len(others_ptr)
+        ) != -1
+
     # Checks if semgemnt is in segment: a < b
     def __lt__(self, other):
         return self.issubset(other) and self != other
@@ -167,21 +350,109 @@ class bitarray:
         )
         return new_bitarray
 
-    # Return a set representation of the bitarray (Slow to compute)
-    def __unpack(self):
-        len_ba = len(self)
-        ret = ffi.new("int []", [0] * len_ba)
-        caml.bitarray_unpack(ret, self._segment_handle[0])
-        return ret
-
     @classmethod
     def howManyAreOut(cls):
         import gc
         gc.collect()
         return caml.bitarray_howManyAreOut(cls.gsm)
 
+    # Bytes held by the cbars currently out
+    @classmethod
+    def memoryUsed(cls):
+        return caml.bitarray_memoryUsed(cls.gsm)
+
+    # Cbars allocated since the manager was created
+    @classmethod
+    def countAllocated(cls):
+        return caml.bitarray_countAllocated(cls.gsm)
+
+    # Cbars allocated since the manager was created that reused a free cbar
+    @classmethod
+    def countReused(cls):
+        return caml.bitarray_countReused(cls.gsm)
+
+    # Bytes held from the system: slabs, free cbars included, and long cbars
+    @classmethod
+    def residentBytes(cls):
+        return caml.bitarray_residentBytes(cls.gsm)
+
+    # Give back to the system the slabs with no cbar in use. Also done on its
+    # own when the free bytes in slabs grow
+    @classmethod
+    def trim(cls):
+        caml.bitarray_trim(cls.gsm)
+
     @classmethod
     def checkLeaks(cls):
         assert (
             caml.bitarray_howManyAreOut(cls.gsm) <= cls.__bitarray_out
         ), f"{caml.bitarray_howManyAreOut(cls.gsm)} not <= {cls.__bitarray_out}"
+
+
+class BitarrayVector:
+    """
+    Vector of 'n' segments held in a single 'void *[n]' buffer, 'segments',
+    together with 'handles', the array of pointers to its slots. Both are
+    passed as they are to compiled functions that take a list of segments or
+    of handles, so no bitarray is built per element.
+
+    Indexing returns a view over a slot, which keeps the vector alive and
+    never frees the segment. 'release' hands the segments out as bitarrays
+    that own them. The segments that were not released are freed in a single
+    call when the vector is collected.
+    """
+
+    def __init__(self, n, gsm=None):
+        if gsm == None:
+            self.gsm = bitarray.gsm
+        else:
+            self.gsm = gsm
+
+        self.segments = ffi.new("void *[]", n)
+        self.handles = ffi.new("void **[]", n)
+        caml.bitarray_handlesOf(self.handles, self.segments, n)
+        self._released = False
+
+    @classmethod
+    def copyOf(cls, values, gsm=None):
+        """Vector with a copy of every bitarray or set in 'values'"""
+
+        ret = cls(len(values), gsm)
+        if values and isinstance(values[0], bitarray):
+            ### ATTENTION: This block cannot be extracted.
+            ### If in a function, Python garbage collects pointers before they're used
+            values_ptr = [v._segment_handle[0] for v in values]
+            ###
+
+            caml.bitarray_cloneMany(ret.segments, values_ptr, len(values), ret.gsm)
+        else:
+            for handle, v in zip(ret.handles, values):
+                caml.bitarray_addItems(handle, list(v), len(v), ret.gsm)
+        return ret
+
+    def __del__(self):
+        if not self._released:
+            caml.bitarray_deleteMany(self.segments, len(self.segments), self.gsm)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __getitem__(self, k):
+        if not -len(self) <= k < len(self):
+            raise IndexError("BitarrayVector index out of range")
+        return bitarray._views([self.handles[k % len(self)]], self, True)[0]
+
+    def __iter__(self):
+        return iter(bitarray._views(self.handles, self, True))
+
+    def release(self, cls=bitarray):
+        """
+        Return the elements as a list of instances of 'cls', bitarray or a
+        subclass, that own their segment and free it when collected. The
+        vector owns no segment afterwards.
+        """
+
+        if self._released:
+            raise ValueError("BitarrayVector already released")
+        self._released = True
+        return cls._views(self.handles, self, False)
@@ -0,0 +1,326 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import random
+import numpy as np
+
+from .amlCompiledLibrary import ffi
+from .amlCompiledLibrary import lib as caml
+from .amlFastBitarrays import bitarray
+
+
+class densebitarray:
+    """
+    Dense fixed-width bitset with the same interface as 'bitarray'.
+    Items are stored as uint64 words, so set operations are plain word loops
+    with no decoding. Suited to small constant universes, where the
+    compressed representation of 'bitarray' saves little memory.
+    """
+
+    __densebitarray_out = 0
+    _hash = None
+
+    def __init__(self, values=None, gsm=None):
+        # gsm is accepted for interface compatibility with bitarray
+        self._segment_handle = ffi.new("void **")
+        if values is not None:
+            self.add(values)
+
+        densebitarray.__densebitarray_out += 1
+
+    # Destructor
+    def __del__(self):
+        caml.densebitarray_delete(self._segment_handle)
+        densebitarray.__densebitarray_out -= 1
+
+    def __eq__(self, other):
+        if isinstance(other, bitarray):
+            other = densebitarray(other)
+        elif not isinstance(other, densebitarray):
+            return NotImplemented
+        return bool(
+            caml.densebitarray_compare(
+                self._segment_handle[0], other._segment_handle[0]
+            )
+        )
+
+    # The hash is computed in C and cached until the next modification
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = caml.densebitarray_hash(self._segment_handle[0])
+        return self._hash
+
+    def __repr__(self):
+        return "densebitarray(" + self.to_numpy().tolist().__repr__() + ")"
+
+    def __str__(self):
+        return self.__repr__()
+
+    def __len__(self):
+        return caml.densebitarray_length(self._segment_handle[0])
+
+    def len_upto2(self):
+        return caml.densebitarray_length_upto2(self._segment_handle[0])
+
+    def __bool__(self):
+        return bool(self._segment_handle[0] != ffi.NULL)
+
+    def __iter__(self):
+        return iter(self.to_numpy().tolist())
+
+    def __getstate__(self):
+        return self.to_numpy()
+
+    def __setstate__(self, state):
+        self._segment_handle = ffi.new("void **")
+        self._hash = None
+        items = ffi.cast("int *", state.ctypes.data)
+        caml.densebitarray_addItems(self._segment_handle, items, len(state))
+        densebitarray.__densebitarray_out += 1
+
+    # Add an item
+    def add(self, values):
+        self._hash = None
+        if isinstance(values, int):
+            caml.densebitarray_addItem(self._segment_handle, values)
+        elif isinstance(values, densebitarray):
+            caml.densebitarray_add(self._segment_handle, values._segment_handle[0])
+        elif isinstance(values, bitarray):
+            other = densebitarray()
+            caml.densebitarray_fromSegment(
+                other._segment_handle, values._segment_handle[0]
+            )
+            caml.densebitarray_add(self._segment_handle, other._segment_handle[0])
+        elif isinstance(values, (list, set, frozenset, tuple)):
+            caml.densebitarray_addItems(self._segment_handle, list(values), len(values))
+        elif isinstance(values, np.ndarray):
+            items = np.ascontiguousarray(values, dtype=np.int32)
+            caml.densebitarray_addItems(
+                self._segment_handle, ffi.cast("int *", items.ctypes.data), len(items)
+            )
+        else:
+            raise TypeError("Wrong value initialisation for densebitarray")
+
+    # Remove an item
+    def remove(self, value):
+        self._hash = None
+        caml.densebitarray_removeItem(self._segment_handle, value)
+
+    # Remove an item if present: a.discard(v)
+    def discard(self, value):
+        self.remove(value)
+
+    # Item of index 'n' in ascending order
+    def nth(self, n):
+        ret = caml.densebitarray_nth(self._segment_handle[0], n)
+        if ret < 0:
+            raise IndexError("densebitarray index out of range")
+        return ret
+
+    # Same draw as random.choice(tuple(a)), without unpacking the bitarray
+    def choose_random(self):
+        len_ba = len(self)
+        if len_ba == 0:
+            raise IndexError("Cannot choose from an empty densebitarray")
+        return self.nth(random.randrange(len_ba))
+
+    # The C routines read the other operand as a dense struct, so anything
+    # else is converted first. The result must be bound to a name by the
+    # caller: a temporary is collected before its pointer is used.
+    @staticmethod
+    def _coerce(other):
+        if isinstance(other, densebitarray):
+            return other
+        if isinstance(other, (bitarray, list, set, frozenset, tuple, np.ndarray)):
+            return densebitarray(other)
+        raise TypeError(
+            f"unsupported operand type for densebitarray: '{type(other).__name__}'"
+        )
+
+    # Union: a | b
+    def __or__(self, other):
+        other = densebitarray._coerce(other)
+        new_bitarray = self.copy()
+        caml.densebitarray_add(new_bitarray._segment_handle, other._segment_handle[0])
+        return new_bitarray
+
+    # Intersection: a & b
+    def __and__(self, other):
+        other = densebitarray._coerce(other)
+        new_bitarray = self.copy()
+        caml.densebitarray_intersect(
+            new_bitarray._segment_handle, other._segment_handle[0]
+        )
+        return new_bitarray
+
+    # Subtraction: a - b
+    def __sub__(self, other):
+        other = densebitarray._coerce(other)
+        new_bitarray = self.copy()
+        caml.densebitarray_subtract(
+            new_bitarray._segment_handle, other._segment_handle[0]
+        )
+        return new_bitarray
+
+    # In-place union: a |= b (same as a += b)
+    def __ior__(self, other):
+        other = densebitarray._coerce(other)
+        self._hash = None
+        caml.densebitarray_add(self._segment_handle, other._segment_handle[0])
+        return self
+
+    # In-place intersection: a &= b
+    def __iand__(self, other):
+        other = densebitarray._coerce(other)
+        self._hash = None
+        caml.densebitarray_intersect(self._segment_handle, other._segment_handle[0])
+        return self
+
+    # In-place subtraction: a -= b
+    def __isub__(self, other):
+        other = densebitarray._coerce(other)
+        self._hash = None
+        caml.densebitarray_subtract(self._segment_handle, other._segment_handle[0])
+        return self
+
+    # Return True if the item is in the bitarray: v in a
+    def __contains__(self, item):
+        return bool(caml.densebitarray_contains(self._segment_handle[0], item))
+
+    def issubset(self, other):
+        other = densebitarray._coerce(other)
+        return bool(
+            caml.densebitarray_issubset(
+                self._segment_handle[0], other._segment_handle[0]
+            )
+        )
+
+    def isdisjoint(self, other):
+        other = densebitarray._coerce(other)
+        return bool(
+            caml.densebitarray_isdisjoint(
+                self._segment_handle[0], other._segment_handle[0]
+            )
+        )
+
+    # Size of a - b, without building it
+    def difference_len(self, other):
+        other = densebitarray._coerce(other)
+        return caml.densebitarray_differenceLen(
+            self._segment_handle[0], other._segment_handle[0]
+        )
+
+    # Size of a & b, without building it
+    def intersection_len(self, other):
+        other = densebitarray._coerce(other)
+        return caml.densebitarray_intersectionLen(
+            self._segment_handle[0], other._segment_handle[0]
+        )
+
+    # True if a intersects any of the bitarrays in 'others'
+    def intersects_any_of(self, others):
+        ### ATTENTION: This block cannot be extracted.
+        ### If in a function, Python garbage collects pointers before they're used
+        others = [densebitarray._coerce(o) for o in others]
+        others_ptr = [o._segment_handle[0] for o in others]
+        ###
+
+        return caml.densebitarray_intersectsAnyOf(
+            self._segment_handle[0], others_ptr, len(others_ptr)
+        ) != -1
+
+    # Checks if semgemnt is in segment: a < b
+    def __lt__(self, other):
+        return self.issubset(other) and self != other
+
+    # Checks if semgemnt is in segment: a <= b
+    def __le__(self, other):
+        return self.issubset(other)
+
+    def copy(self):
+        new_bitarray = densebitarray()
+        caml.densebitarray_clone(new_bitarray._segment_handle, self._segment_handle[0])
+        return new_bitarray
+
+    # Return the same set in the compressed representation
+    def toBitarray(self):
+        ret = bitarray()
+        caml.densebitarray_toSegment(
+            ret._segment_handle, self._segment_handle[0], ret.gsm
+        )
+        return ret
+
+    # Items in ascending order as an int32 array
+    def to_numpy(self):
+        ret = np.empty([len(self)], dtype=np.int32)
+        caml.densebitarray_unpack(
+            ffi.cast("int *", ret.ctypes.data), self._segment_handle[0]
+        )
+        return ret
+
+    @classmethod
+    def from_numpy(cls, items, gsm=None):
+        """Densebitarray with the items of the integer array 'items'"""
+
+        ret = cls(gsm=gsm)
+        ret.add(np.asarray(items))
+        return ret
+
+    @classmethod
+    def howManyAreOut(cls):
+        import gc
+        gc.collect()
+        return caml.densebitarray_howManyAreOut()
+
+    @classmethod
+    def checkLeaks(cls):
+        assert (
+            caml.densebitarray_howManyAreOut() <= cls.__densebitarray_out
+        ), f"{caml.densebitarray_howManyAreOut()} not <= {cls.__densebitarray_out}"
+
+
+class DenseBitarrayVector:
+    """
+    Vector of 'n' dense sets held in a single 'void *[n]' buffer, 'segments',
+    scanned against one set in a single compiled call. Used for the
+    indicators of a small constant universe, which are matched against every
+    term and atom the tracer sees.
+    """
+
+    def __init__(self, n):
+        self.segments = ffi.new("void *[]", n)
+        self._ret = ffi.new("int []", n)
+
+    @classmethod
+    def copyOf(cls, values):
+        """Vector with a dense copy of every bitarray or set in 'values'"""
+
+        ret = cls(len(values))
+        for k, v in enumerate(values):
+            if isinstance(v, bitarray):
+                caml.densebitarray_fromSegment(ret.segments + k, v._segment_handle[0])
+            else:
+                caml.densebitarray_addItems(ret.segments + k, list(v), len(v))
+        return ret
+
+    def __del__(self):
+        caml.densebitarray_deleteMany(self.segments, len(self.segments))
+
+    def __len__(self):
+        return len(self.segments)
+
+    # Indices of the elements that contain 'values'
+    def supersetsOf(self, values):
+        values = densebitarray._coerce(values)
+        count = caml.densebitarray_supersetsOf(
+            self._ret, values._segment_handle[0], self.segments, len(self.segments)
+        )
+        return ffi.unpack(self._ret, count)
+
+    # Indices of the elements that intersect 'values'
+    def intersecting(self, values):
+        values = densebitarray._coerce(values)
+        count = caml.densebitarray_intersecting(
+            self._ret, values._segment_handle[0], self.segments, len(self.segments)
+        )
+        return ffi.unpack(self._ret, count)
@@ -0,0 +1,126 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import numpy as np
+
+from .amlCompiledLibrary import ffi
+from .amlCompiledLibrary import lib as caml
+from .amlFastBitarrays import bitarray
+
+
+class TraceMatrix:
+    """
+    Traces of a list of atoms packed as a bit matrix: one row of uint64 words
+    per atom, bit k set if indicator k is in the trace of the atom. The
+    transpose, one row per indicator with the positions of the atoms whose
+    trace holds it, is built on first use. Both are single contiguous
+    buffers, and reductions over groups of atoms run as word loops in C.
+
+    A matrix is only valid for the tracer period it was built in, see
+    isValid. Positions refer to the list of atoms used to build it.
+    """
+
+    def __init__(self, traces, width, period=-1):
+        self.width = width
+        self.period = period
+        self.rows = np.empty([len(traces), width // 64 + 1], dtype=np.uint64)
+        self._columns = None
+
+        ### ATTENTION: This block cannot be extracted.
+        ### If in a function, Python garbage collects pointers before they're used
+        if traces and not isinstance(traces[0], bitarray):
+            traces = [bitarray(t) for t in traces]
+        traces_ptr = [t._segment_handle[0] for t in traces]
+        ###
+
+        caml.traceMatrix_pack(self.__data(self.rows), traces_ptr, len(traces), width)
+
+    @classmethod
+    def fromAtoms(cls, tracer, atoms):
+        """Matrix with the traces of 'atoms' in the current period of 'tracer'"""
+
+        traces = [tracer.getTraceOfAtom(at) for at in atoms]
+        return cls(traces, tracer.numIndicators(), tracer.period)
+
+    def __len__(self):
+        return self.rows.shape[0]
+
+    def isValid(self, tracer):
+        return self.period == tracer.period
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            self._columns = np.empty([self.width, len(self) // 64 + 1], dtype=np.uint64)
+            caml.traceMatrix_transpose(
+                self.__data(self._columns), self.__data(self.rows), len(self), self.width
+            )
+        return self._columns
+
+    @staticmethod
+    def __data(buffer):
+        return ffi.cast("uint64_t *", buffer.ctypes.data)
+
+    def __unpack(self, buffer, width, idx, complement):
+        ret = bitarray.bulk_new(len(idx))
+        caml.traceMatrix_unpackRows(
+            ret.handles,
+            self.__data(buffer),
+            width,
+            idx,
+            len(idx),
+            complement,
+            bitarray.gsm,
+        )
+        return ret.release()
+
+    def __reduce(self, groups, union):
+        ### ATTENTION: This block cannot be extracted.
+        ### If in a function, Python garbage collects pointers before they're used
+        if groups and not isinstance(groups[0], bitarray):
+            groups = [bitarray(g) for g in groups]
+        groups_ptr = [g._segment_handle[0] for g in groups]
+        ###
+
+        ret = bitarray.bulk_new(len(groups))
+        caml.traceMatrix_reduceRows(
+            ret.handles,
+            self.__data(self.rows),
+            self.width,
+            groups_ptr,
+            len(groups),
+            union,
+            bitarray.gsm,
+        )
+        return ret.release()
+
+    def row(self, x):
+        """Trace of the atom at position 'x'"""
+
+        return self.__unpack(self.rows, self.width, [x], False)[0]
+
+    def column(self, k):
+        """Positions of the atoms whose trace holds indicator 'k'"""
+
+        return self.__unpack(self.columns, len(self), [k], False)[0]
+
+    def tD(self):
+        """
+        For every indicator, the positions of the atoms whose trace does not
+        hold it.
+        """
+
+        return self.__unpack(self.columns, len(self), list(range(self.width)), True)
+
+    def andRows(self, groups):
+        """
+        For every group of atom positions in 'groups', the intersection of the
+        traces of its atoms. The intersection of no traces has every indicator.
+        """
+
+        return self.__reduce(groups, False)
+
+    def orRows(self, groups):
+        """For every group of atom positions, the union of their traces"""
+
+        return self.__reduce(groups, True)
@@ -1,6 +1,7 @@
 // Algebraic AI - 2025
 // Go to github.com/Algebraic-AI for full license details.
 
+#include <inttypes.h>
 #include <stdio.h>
 
 #include "cbar.h"
@@ -13,11 +14,53 @@ void bitarray_delete(
     generalSegmentManager_returnSegment(theGeneralSegmentManager, segment);
 }
 
+void bitarray_deleteMany(
+    segmentHead* segments[], int segments_len,
+    generalSegmentManager* theGeneralSegmentManager)
+{
+    for (int idx = 0; idx < segments_len; ++idx) {
+        generalSegmentManager_returnSegment(theGeneralSegmentManager, &segments[idx]);
+    }
+}
+
+void bitarray_handlesOf(
+    segmentHead** handles[], segmentHead* segments[], int segments_len)
+{
+    for (int idx = 0; idx < segments_len; ++idx) {
+        handles[idx] = &segments[idx];
+    }
+}
+
 int bitarray_howManyAreOut(generalSegmentManager* theGeneralSegmentManager)
 {
     return generalSegmentManager_countSegmentsOut(theGeneralSegmentManager);
 }
 
+int64_t bitarray_memoryUsed(generalSegmentManager* theGeneralSegmentManager)
+{
+    return generalSegmentManager_memoryUsed(theGeneralSegmentManager);
+}
+
+int64_t bitarray_countAllocated(generalSegmentManager* theGeneralSegmentManager)
+{
+    return generalSegmentManager_countAllocated(theGeneralSegmentManager);
+}
+
+int64_t bitarray_countReused(generalSegmentManager* theGeneralSegmentManager)
+{
+    return generalSegmentManager_countReused(theGeneralSegmentManager);
+}
+
+int64_t bitarray_residentBytes(generalSegmentManager* theGeneralSegmentManager)
+{
+    return generalSegmentManager_residentBytes(theGeneralSegmentManager);
+}
+
+void bitarray_trim(generalSegmentManager* theGeneralSegmentManager)
+{
+    generalSegmentManager_trim(theGeneralSegmentManager);
+}
+
 void bitarray_clone(
     segmentHead** new_segment, segmentHead* segment, generalSegmentManager* theGeneralSegmentManager)
 {
@@ -28,6 +71,18 @@ void bitarray_clone(
     segmentWriter_cloneFrom(&writer, segment);
 }
 
+void bitarray_cloneMany(
+    segmentHead* new_segments[], segmentHead* segments[], int segments_len,
+    generalSegmentManager* theGeneralSegmentManager)
+{
+    segmentWriter writer;
+    for (int idx = 0; idx < segments_len; ++idx) {
+        generalSegmentManager_returnSegment(theGeneralSegmentManager, &new_segments[idx]);
+        segmentWriter_set(&writer, &new_segments[idx], theGeneralSegmentManager);
+        segmentWriter_cloneFrom(&writer, segments[idx]);
+    }
+}
+
 int bitarray_length(segmentHead* segment)
 {
     return segment_countItems(segment);
@@ -43,6 +98,11 @@ int bitarray_compare(segmentHead* segmentA, segmentHead* segmentB)
     return segment_compareSegments(segmentA, segmentB) ? false : true;
 }
 
+int64_t bitarray_hash(segmentHead* segment)
+{
+    return (int64_t)segment_hash(segment);
+}
+
 int bitarray_contains(segmentHead* segment, int item)
 {
     return segment_containsItem(segment, item);
@@ -58,6 +118,32 @@ int bitarray_issubset(segmentHead* segment, segmentHead* container)
     return segment_inSegment(segment, container);
 }
 
+int bitarray_differenceLen(segmentHead* segmentA, segmentHead* segmentB)
+{
+    return segment_countDifference(segmentA, segmentB);
+}
+
+int bitarray_intersectionLen(segmentHead* segmentA, segmentHead* segmentB)
+{
+    return segment_countIntersection(segmentA, segmentB);
+}
+
+int bitarray_intersectsAnyOf(
+    segmentHead* segment, segmentHead* others[], int others_len)
+{
+    for (int idx = 0; idx < others_len; ++idx) {
+        if (!segment_isDisjoint(segment, others[idx])) {
+            return idx;
+        }
+    }
+    return -1;
+}
+
+int bitarray_nth(segmentHead* segment, int n)
+{
+    return segment_nthItem(segment, n);
+}
+
 void bitarray_unpack(int ret[], segmentHead* segment)
 {
     segmentReader reader;
@@ -68,6 +154,11 @@ void bitarray_unpack(int ret[], segmentHead* segment)
     }
 }
 
+int bitarray_unpackFrom(int ret[], segmentHead* segment, int fromItem, int maxItems)
+{
+    return segment_unpackFrom(ret, segment, fromItem, maxItems);
+}
+
 void bitarray_addItem(
     segmentHead** segment, int item,
     generalSegmentManager* theGeneralSegmentManager)
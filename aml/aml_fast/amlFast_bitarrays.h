@@ -5,25 +5,54 @@ void* bitarray_new();
 
 void bitarray_delete(void** segment, void* theGeneralSegmentManager);
 
+void bitarray_deleteMany(void* segments[], int segments_len, void* theGeneralSegmentManager);
+
+void bitarray_handlesOf(void** handles[], void* segments[], int segments_len);
+
 int bitarray_howManyAreOut(void* theGeneralSegmentManager);
 
+int64_t bitarray_memoryUsed(void* theGeneralSegmentManager);
+
+int64_t bitarray_countAllocated(void* theGeneralSegmentManager);
+
+int64_t bitarray_countReused(void* theGeneralSegmentManager);
+
+int64_t bitarray_residentBytes(void* theGeneralSegmentManager);
+void bitarray_trim(void* theGeneralSegmentManager);
+
 void bitarray_clone(
     void** new_segment, void* segment, void* theGeneralSegmentManager);
 
+void bitarray_cloneMany(
+    void* new_segments[], void* segments[], int segments_len,
+    void* theGeneralSegmentManager);
+
 int bitarray_length(void* segment);
 
 int bitarray_length_upto2(void* segment);
 
 int bitarray_compare(void* segmentA, void* segmentB);
 
+int64_t bitarray_hash(void* segment);
+
 int bitarray_contains(void* segment, int item);
 
 int bitarray_isdisjoint(void* segmentA, void* segmentB);
 
 int bitarray_issubset(void* segment, void* container);
 
+int bitarray_differenceLen(void* segmentA, void* segmentB);
+
+int bitarray_intersectionLen(void* segmentA, void* segmentB);
+
+int bitarray_intersectsAnyOf(void* segment, void* others[], int others_len);
+
+int bitarray_nth(void* segment, int n);
+
 void bitarray_unpack(int ret[], void* segment);
 
+int bitarray_unpackFrom(int ret[], void* segment, int fromItem, int maxItems);
+
 void bitarray_addItem(void** segment, int item, void* theGeneralSegmentManager);
 
 void bitarray_addItems(
@@ -0,0 +1,354 @@
+// Algebraic AI - 2025
+// Go to github.com/Algebraic-AI for full license details.
+
+#include <inttypes.h>
+#include <stdlib.h>
+#include <string.h>
+
+#include "cbar.h"
+
+// Dense fixed-width bitset. Item i is bit (i % 64) of word (i / 64).
+// The empty set is represented by NULL, as with cbars, and the last word in use is never zero so
+// that equal sets have equal representations.
+
+#define DENSE_ALIGNMENT 32
+
+typedef struct denseHead {
+    uint64_t words;    // words in use
+    uint64_t capacity; // words allocated
+    uint64_t reserved[2];
+    uint64_t data[];
+} denseHead;
+
+static int denseOut = 0;
+
+static denseHead* dense_alloc(uint64_t capacity)
+{
+    void* ptr;
+    if (posix_memalign(&ptr, DENSE_ALIGNMENT, sizeof(denseHead) + capacity * sizeof(uint64_t))) {
+        d("out of memory allocating dense bitarray");
+        abort();
+    }
+    denseHead* ret = (denseHead*)ptr;
+    ret->words = 0;
+    ret->capacity = capacity;
+    #pragma omp atomic update
+    ++denseOut;
+    return ret;
+}
+
+void densebitarray_delete(denseHead** dense)
+{
+    if (*dense != NULL) {
+        free(*dense);
+        *dense = NULL;
+        #pragma omp atomic update
+        --denseOut;
+    }
+}
+
+int densebitarray_howManyAreOut() { return denseOut; }
+
+// Make room for 'words' words. New words are zeroed and counted as in use.
+static void dense_reserve(denseHead** dense, uint64_t words)
+{
+    denseHead* self = *dense;
+    if (self == NULL) {
+        self = dense_alloc(words);
+        *dense = self;
+    } else if (self->capacity < words) {
+        uint64_t capacity = max(words, 2 * self->capacity);
+        denseHead* grown = dense_alloc(capacity);
+        memcpy(grown->data, self->data, self->words * sizeof(uint64_t));
+        grown->words = self->words;
+        densebitarray_delete(dense);
+        self = grown;
+        *dense = self;
+    }
+    if (self->words < words) {
+        memset(self->data + self->words, 0, (words - self->words) * sizeof(uint64_t));
+        self->words = words;
+    }
+}
+
+// Drop trailing zero words. An empty set is released.
+static void dense_normalize(denseHead** dense)
+{
+    denseHead* self = *dense;
+    if (self == NULL) return;
+    while (self->words > 0 && self->data[self->words - 1] == 0) {
+        --self->words;
+    }
+    if (self->words == 0) densebitarray_delete(dense);
+}
+
+void densebitarray_clone(denseHead** new_dense, denseHead* dense)
+{
+    densebitarray_delete(new_dense);
+    if (dense == NULL) return;
+    *new_dense = dense_alloc(dense->words);
+    memcpy((*new_dense)->data, dense->data, dense->words * sizeof(uint64_t));
+    (*new_dense)->words = dense->words;
+}
+
+int densebitarray_length(denseHead* dense)
+{
+    if (dense == NULL) return 0;
+    int count = 0;
+    for (uint64_t w = 0; w < dense->words; ++w) {
+        count += __builtin_popcountll(dense->data[w]);
+    }
+    return count;
+}
+
+int densebitarray_length_upto2(denseHead* dense)
+{
+    if (dense == NULL) return 0;
+    int count = 0;
+    for (uint64_t w = 0; w < dense->words && count < 2; ++w) {
+        count += __builtin_popcountll(dense->data[w]);
+    }
+    return min(count, 2);
+}
+
+int densebitarray_compare(denseHead* denseA, denseHead* denseB)
+{
+    if (denseA == NULL || denseB == NULL) return denseA == denseB;
+    if (denseA->words != denseB->words) return false;
+    return memcmp(denseA->data, denseB->data, denseA->words * sizeof(uint64_t)) == 0;
+}
+
+int64_t densebitarray_hash(denseHead* dense)
+{
+    uint64_t h = 0xcbf29ce484222325ULL;
+    if (dense == NULL) return (int64_t)h;
+    for (uint64_t w = 0; w < dense->words; ++w) {
+        h ^= dense->data[w];
+        h *= 0x100000001b3ULL;
+    }
+    h ^= h >> 33;
+    h *= 0xff51afd7ed558ccdULL;
+    h ^= h >> 33;
+    return (int64_t)h;
+}
+
+int densebitarray_contains(denseHead* dense, int item)
+{
+    uint64_t w = (uint64_t)item >> 6;
+    if (dense == NULL || w >= dense->words) return false;
+    return (dense->data[w] >> (item & 63)) & 1;
+}
+
+int densebitarray_isdisjoint(denseHead* denseA, denseHead* denseB)
+{
+    if (denseA == NULL || denseB == NULL) return true;
+    uint64_t words = min(denseA->words, denseB->words);
+    uint64_t any = 0;
+    for (uint64_t w = 0; w < words; ++w) {
+        any |= denseA->data[w] & denseB->data[w];
+    }
+    return any == 0;
+}
+
+int densebitarray_issubset(denseHead* dense, denseHead* container)
+{
+    if (dense == NULL) return true;
+    if (container == NULL || dense->words > container->words) return false;
+    uint64_t any = 0;
+    for (uint64_t w = 0; w < dense->words; ++w) {
+        any |= dense->data[w] & ~container->data[w];
+    }
+    return any == 0;
+}
+
+int densebitarray_differenceLen(denseHead* denseA, denseHead* denseB)
+{
+    if (denseA == NULL) return 0;
+    uint64_t words = (denseB == NULL) ? 0 : min(denseA->words, denseB->words);
+    int count = 0;
+    for (uint64_t w = 0; w < words; ++w) {
+        count += __builtin_popcountll(denseA->data[w] & ~denseB->data[w]);
+    }
+    for (uint64_t w = words; w < denseA->words; ++w) {
+        count += __builtin_popcountll(denseA->data[w]);
+    }
+    return count;
+}
+
+int densebitarray_intersectionLen(denseHead* denseA, denseHead* denseB)
+{
+    if (denseA == NULL || denseB == NULL) return 0;
+    uint64_t words = min(denseA->words, denseB->words);
+    int count = 0;
+    for (uint64_t w = 0; w < words; ++w) {
+        count += __builtin_popcountll(denseA->data[w] & denseB->data[w]);
+    }
+    return count;
+}
+
+int densebitarray_intersectsAnyOf(denseHead* dense, denseHead* others[], int others_len)
+{
+    for (int idx = 0; idx < others_len; ++idx) {
+        if (!densebitarray_isdisjoint(dense, others[idx])) {
+            return idx;
+        }
+    }
+    return -1;
+}
+
+// Indices of the sets in 'others' that contain 'dense', written to 'ret'. Returns how many there are.
+int densebitarray_supersetsOf(int ret[], denseHead* dense, denseHead* others[], int others_len)
+{
+    int count = 0;
+    for (int idx = 0; idx < others_len; ++idx) {
+        if (densebitarray_issubset(dense, others[idx])) {
+            ret[count++] = idx;
+        }
+    }
+    return count;
+}
+
+// Indices of the sets in 'others' that intersect 'dense', written to 'ret'. Returns how many there are.
+int densebitarray_intersecting(int ret[], denseHead* dense, denseHead* others[], int others_len)
+{
+    int count = 0;
+    for (int idx = 0; idx < others_len; ++idx) {
+        if (!densebitarray_isdisjoint(dense, others[idx])) {
+            ret[count++] = idx;
+        }
+    }
+    return count;
+}
+
+void densebitarray_deleteMany(denseHead* denses[], int denses_len)
+{
+    for (int idx = 0; idx < denses_len; ++idx) {
+        densebitarray_delete(&denses[idx]);
+    }
+}
+
+int densebitarray_nth(denseHead* dense, int n)
+{
+    if (dense == NULL || n < 0) return -1;
+    for (uint64_t w = 0; w < dense->words; ++w) {
+        uint64_t word = dense->data[w];
+        int inWord = __builtin_popcountll(word);
+        if (n < inWord) {
+            for (; n > 0; --n) {
+                word &= word - 1;
+            }
+            return (int)(w * 64 + __builtin_ctzll(word));
+        }
+        n -= inWord;
+    }
+    return -1;
+}
+
+void densebitarray_unpack(int ret[], denseHead* dense)
+{
+    if (dense == NULL) return;
+    int idx = 0;
+    for (uint64_t w = 0; w < dense->words; ++w) {
+        uint64_t word = dense->data[w];
+        while (word) {
+            ret[idx++] = (int)(w * 64 + __builtin_ctzll(word));
+            word &= word - 1;
+        }
+    }
+}
+
+void densebitarray_addItem(denseHead** dense, int item)
+{
+    uint64_t w = (uint64_t)item >> 6;
+    dense_reserve(dense, w + 1);
+    (*dense)->data[w] |= (uint64_t)1 << (item & 63);
+}
+
+void densebitarray_addItems(denseHead** dense, int items[], int items_len)
+{
+    if (items_len == 0) return;
+    int maxItem = items[0];
+    for (int idx = 1; idx < items_len; ++idx) {
+        maxItem = max(maxItem, items[idx]);
+    }
+    dense_reserve(dense, ((uint64_t)maxItem >> 6) + 1);
+    uint64_t* data = (*dense)->data;
+    for (int idx = 0; idx < items_len; ++idx) {
+        data[(uint64_t)items[idx] >> 6] |= (uint64_t)1 << (items[idx] & 63);
+    }
+}
+
+void densebitarray_removeItem(denseHead** dense, int item)
+{
+    uint64_t w = (uint64_t)item >> 6;
+    if (*dense == NULL || w >= (*dense)->words) return;
+    (*dense)->data[w] &= ~((uint64_t)1 << (item & 63));
+    dense_normalize(dense);
+}
+
+void densebitarray_add(denseHead** denseA, denseHead* denseB)
+{
+    if (denseB == NULL) return;
+    dense_reserve(denseA, denseB->words);
+    uint64_t* restrict dst = (*denseA)->data;
+    const uint64_t* restrict src = denseB->data;
+    for (uint64_t w = 0; w < denseB->words; ++w) {
+        dst[w] |= src[w];
+    }
+}
+
+void densebitarray_intersect(denseHead** denseA, denseHead* denseB)
+{
+    if (*denseA == NULL) return;
+    if (denseB == NULL) {
+        densebitarray_delete(denseA);
+        return;
+    }
+    uint64_t words = min((*denseA)->words, denseB->words);
+    uint64_t* restrict dst = (*denseA)->data;
+    const uint64_t* restrict src = denseB->data;
+    for (uint64_t w = 0; w < words; ++w) {
+        dst[w] &= src[w];
+    }
+    (*denseA)->words = words;
+    dense_normalize(denseA);
+}
+
+void densebitarray_subtract(denseHead** denseA, denseHead* denseB)
+{
+    if (*denseA == NULL || denseB == NULL) return;
+    uint64_t words = min((*denseA)->words, denseB->words);
+    uint64_t* restrict dst = (*denseA)->data;
+    const uint64_t* restrict src = denseB->data;
+    for (uint64_t w = 0; w < words; ++w) {
+        dst[w] &= ~src[w];
+    }
+    dense_normalize(denseA);
+}
+
+// Conversion from and to the compressed representation
+
+void densebitarray_fromSegment(denseHead** dense, segmentHead* segment)
+{
+    densebitarray_delete(dense);
+    segmentReader reader;
+    segmentReader_set(&reader, segment);
+    while (segmentReader_nextItem(&reader)) {
+        densebitarray_addItem(dense, segmentReader_currentItem(&reader));
+    }
+}
+
+void densebitarray_toSegment(segmentHead** segment, denseHead* dense, generalSegmentManager* gsm)
+{
+    generalSegmentManager_returnSegment(gsm, segment);
+    if (dense == NULL) return;
+    segmentWriter writer;
+    segmentWriter_set(&writer, segment, gsm);
+    for (uint64_t w = 0; w < dense->words; ++w) {
+        uint64_t word = dense->data[w];
+        while (word) {
+            segmentWriter_addItem(&writer, (int)(w * 64 + __builtin_ctzll(word)));
+            word &= word - 1;
+        }
+    }
+}
@@ -0,0 +1,55 @@
+// Algebraic AI - 2025
+// Go to github.com/Algebraic-AI for full license details.
+
+void densebitarray_delete(void** dense);
+
+int densebitarray_howManyAreOut();
+
+void densebitarray_clone(void** new_dense, void* dense);
+
+int densebitarray_length(void* dense);
+
+int densebitarray_length_upto2(void* dense);
+
+int densebitarray_compare(void* denseA, void* denseB);
+
+int64_t densebitarray_hash(void* dense);
+
+int densebitarray_contains(void* dense, int item);
+
+int densebitarray_isdisjoint(void* denseA, void* denseB);
+
+int densebitarray_issubset(void* dense, void* container);
+
+int densebitarray_differenceLen(void* denseA, void* denseB);
+
+int densebitarray_intersectionLen(void* denseA, void* denseB);
+
+int densebitarray_intersectsAnyOf(void* dense, void* others[], int others_len);
+
+int densebitarray_supersetsOf(int ret[], void* dense, void* others[], int others_len);
+
+int densebitarray_intersecting(int ret[], void* dense, void* others[], int others_len);
+
+void densebitarray_deleteMany(void* denses[], int denses_len);
+
+int densebitarray_nth(void* dense, int n);
+
+void densebitarray_unpack(int ret[], void* dense);
+
+void densebitarray_addItem(void** dense, int item);
+
+void densebitarray_addItems(void** dense, int items[], int items_len);
+
+void densebitarray_removeItem(void** dense, int item);
+
+void densebitarray_add(void** denseA, void* denseB);
+
+void densebitarray_intersect(void** denseA, void* denseB);
+
+void densebitarray_subtract(void** denseA, void* denseB);
+
+void densebitarray_fromSegment(void** dense, void* segment);
+
+void densebitarray_toSegment(
+    void** segment, void* dense, void* theGeneralSegmentManager);
@@ -120,6 +120,66 @@ static __maybe_unused void shuffle_array(uint32_t array[], uint32_t length)
     }
 }
 
+// Python's random module
+//
+// The Mersenne Twister of CPython, so that compiled routines draw the same numbers as their Python versions from the
+// state of random.getstate(): 624 words and the position in them. PyRandom_below(n) is random._randbelow(n).
+
+#define PY_RANDOM_N 624
+#define PY_RANDOM_M 397
+
+typedef struct PyRandom {
+    uint32_t* state;  // PY_RANDOM_N words followed by the position
+} PyRandom;
+
+static uint32_t PyRandom_next(PyRandom* self)
+{
+    static const uint32_t mag01[2] = {0x0U, 0x9908b0dfU};
+    uint32_t* mt = self->state;
+    uint32_t y;
+
+    if (mt[PY_RANDOM_N] >= PY_RANDOM_N) {
+        int kk;
+        for (kk = 0; kk < PY_RANDOM_N - PY_RANDOM_M; kk++) {
+            y = (mt[kk] & 0x80000000U) | (mt[kk + 1] & 0x7fffffffU);
+            mt[kk] = mt[kk + PY_RANDOM_M] ^ (y >> 1) ^ mag01[y & 0x1U];
+        }
+        for (; kk < PY_RANDOM_N - 1; kk++) {
+            y = (mt[kk] & 0x80000000U) | (mt[kk + 1] & 0x7fffffffU);
+            mt[kk] = mt[kk + (PY_RANDOM_M - PY_RANDOM_N)] ^ (y >> 1) ^ mag01[y & 0x1U];
+        }
+        y = (mt[PY_RANDOM_N - 1] & 0x80000000U) | (mt[0] & 0x7fffffffU);
+        mt[PY_RANDOM_N - 1] = mt[PY_RANDOM_M - 1] ^ (y >> 1) ^ mag01[y & 0x1U];
+        mt[PY_RANDOM_N] = 0;
+    }
+
+    y = mt[mt[PY_RANDOM_N]++];
+    y ^= (y >> 11);
+    y ^= (y << 7) & 0x9d2c5680U;
+    y ^= (y << 15) & 0xefc60000U;
+    y ^= (y >> 18);
+    return y;
+}
+
+static uint32_t PyRandom_below(PyRandom* self, uint32_t n)
+{
+    uint32_t k = 32 - __builtin_clz(n);
+    uint32_t r = PyRandom_next(self) >> (32 - k);
+    while (r >= n) r = PyRandom_next(self) >> (32 - k);
+    return r;
+}
+
+// random.shuffle
+static void PyRandom_shuffle(PyRandom* self, uint32_t array[], uint32_t length)
+{
+    for (uint32_t i = length > 1 ? length - 1 : 0; i > 0; --i) {
+        uint32_t j = PyRandom_below(self, i + 1);
+        uint32_t temp = array[j];
+        array[j] = array[i];
+        array[i] = temp;
+    }
+}
+
 // ----------------------------
 
 Space* linkSpace(uint32_t sp_len, segmentHead* sp_cset_constants[], segmentHead** sp_ftrace[], segmentHead** sp_trace[])
@@ -203,53 +263,82 @@ void unlinkAtomization(Atomization* atomization)
     free(atomization);
 }
 
+// The ucs and traces of the linked atoms are borrowed from the caller, which must keep them alive and unmodified
+// until the atomization is unlinked. They are never modified nor freed on the C side, see Atom_s_release.
 Atomization_s* linkAtomization_s(
     uint32_t atomization_len, segmentHead* atomization_at_ucs_constants[], segmentHead* atomization_at_trace[],
     uint32_t atomization_epoch[], uint32_t atomization_G[], uint32_t atomization_gen[], generalSegmentManager* gsm)
 {
+    (void)gsm;
     Atomization_s* atomization = malloc(sizeof(Atomization_s));
 
     atomization->len = atomization_len;
     atomization->atoms = calloc(atomization_len, sizeof(Atom_s));
 
     for (uint32_t k = 0; k < atomization_len; ++k) {
-        segment_clone_to(&atomization->atoms[k].trace, atomization_at_trace[k], gsm);
-        segment_clone_to(&atomization->atoms[k].ucs.constants, atomization_at_ucs_constants[k], gsm);
+        atomization->atoms[k].trace = atomization_at_trace[k];
+        atomization->atoms[k].ucs.constants = atomization_at_ucs_constants[k];
         atomization->atoms[k].epoch = atomization_epoch[k];
         atomization->atoms[k].G = atomization_G[k];
         atomization->atoms[k].gen = atomization_gen[k];
+        atomization->atoms[k].origin = k;
     }
 
     return atomization;
 }
 
+// Free the segments of an atom created in C. Linked atoms only borrow theirs.
+static void Atom_s_release(Atom_s* at, generalSegmentManager* gsm)
+{
+    if (at->origin != NEW_ATOM) return;
+    generalSegmentManager_returnSegment(gsm, &at->ucs.constants);
+    generalSegmentManager_returnSegment(gsm, &at->trace);
+}
+
 void unlinkAtomization_s(Atomization_s* atomization, generalSegmentManager* gsm)
 {
     for (uint32_t k = 0; k < atomization->len; ++k) {
-        generalSegmentManager_returnSegment(gsm, &atomization->atoms[k].ucs.constants);
-        generalSegmentManager_returnSegment(gsm, &atomization->atoms[k].trace);
+        Atom_s_release(&atomization->atoms[k], gsm);
     }
     free(atomization->atoms);
     free(atomization);
 }
 
+// Write in ret_origin[] the index in the linked atomization of every atom, or NEW_ATOM for the
+// atoms created in C. Return the number of new atoms.
+uint32_t originsAtomization_s(Atomization_s* atomization, uint32_t ret_origin[])
+{
+    uint32_t count = 0;
+    for (uint32_t idx = 0; idx < atomization->len; ++idx) {
+        ret_origin[idx] = atomization->atoms[idx].origin;
+        if (ret_origin[idx] == NEW_ATOM) ++count;
+    }
+    return count;
+}
+
+// Move the new atoms out of the atomization, in order. Atoms that come from the linked atomization
+// are left in place: their ucs and trace are the caller's, unchanged.
 void extractAtomization_s(
     Atomization_s* atomization, segmentHead** at_ucs_constants[], segmentHead** at_trace[], uint32_t at_epoch[],
     uint32_t at_G[], uint32_t at_gen[])
 {
+    uint32_t out = 0;
     for (uint32_t idx = 0; idx < atomization->len; ++idx) {
-        assert(!*at_ucs_constants[idx]);
-        assert(!*at_trace[idx]);
+        if (atomization->atoms[idx].origin != NEW_ATOM) continue;
 
-        *at_ucs_constants[idx] = atomization->atoms[idx].ucs.constants;
+        assert(!*at_ucs_constants[out]);
+        assert(!*at_trace[out]);
+
+        *at_ucs_constants[out] = atomization->atoms[idx].ucs.constants;
         atomization->atoms[idx].ucs.constants = NULL;
 
-        *at_trace[idx] = atomization->atoms[idx].trace;
+        *at_trace[out] = atomization->atoms[idx].trace;
         atomization->atoms[idx].trace = NULL;
 
-        at_epoch[idx] = atomization->atoms[idx].epoch;
-        at_G[idx] = atomization->atoms[idx].G;
-        at_gen[idx] = atomization->atoms[idx].gen;
+        at_epoch[out] = atomization->atoms[idx].epoch;
+        at_G[out] = atomization->atoms[idx].G;
+        at_gen[out] = atomization->atoms[idx].gen;
+        ++out;
     }
 }
 
@@ -338,7 +427,374 @@ static segmentHead* getFreeTraceOfTerm(const LCS* cset, const Tracer* tracer, ge
     return ret;
 }
 
-void freeTraceAll(Space* space, Tracer* tracer, generalSegmentManager* gsm)
+static segmentHead* getFreeTraceOfIsolatedConstant(
+    const Tracer* tracer, const uint32_t constant_idx, generalSegmentManager* gsm)
+{
+    LCS* constant = calloc(1, sizeof(LCS));
+    segment_addItem(&constant->constants, constant_idx, gsm);
+
+    segmentHead* trace = getFreeTraceOfTerm(constant, tracer, gsm);
+    generalSegmentManager_returnSegment(gsm, &constant->constants);
+    free(constant);
+    return trace;
+}
+
+void calculateTraceOfAtom(const Tracer* tracer, Atom* at, generalSegmentManager* gsm)
+{
+    if (*at->trace != NULL) {
+        const char* COLOR_RED = "\033[1;31m";
+        const char* COLOR_RESET = "\033[0m";
+        printf("%s", COLOR_RED);
+        printf("Caller must ensure atom trace is empty");
+        printf("%s", COLOR_RESET);
+        printf("\n");
+        abort();
+    }
+
+    segmentWriter writer;
+    segmentWriter_set(&writer, at->trace, gsm);
+
+    segmentReader reader;
+    segmentReader_set(&reader, at->ucs.constants);
+    while (segmentReader_nextItem(&reader)) {
+        uint32_t constant_idx = segmentReader_currentItem(&reader);
+        segmentHead* constant_trace = getFreeTraceOfIsolatedConstant(tracer, constant_idx, gsm);
+        segmentWriter_addSegmentNoReturn(&writer, constant_trace);
+        generalSegmentManager_returnSegment(gsm, &constant_trace);
+    }
+}
+
+// Trace matrices
+//
+// Traces of many atoms are packed as the rows of a bit matrix, 'row_words' uint64 words per row and bit k of a row set
+// if indicator k is in the trace. Reductions over groups of rows are then plain word loops.
+
+static inline uint32_t traceMatrix_words(uint32_t width) { return width / 64 + 1; }
+
+// Copy the items of 'segment' below 'width' into 'row'
+static void traceMatrix_packRow(uint64_t row[], segmentHead* segment, uint32_t row_words, uint32_t width)
+{
+    memset(row, 0, row_words * sizeof(uint64_t));
+    segmentReader reader;
+    segmentReader_set(&reader, segment);
+    while (segmentReader_nextItem(&reader)) {
+        uint32_t k = segmentReader_currentItem(&reader);
+        if (k >= width) break;
+        row[k / 64] |= (uint64_t)1 << (k % 64);
+    }
+}
+
+static void traceMatrix_fullRow(uint64_t row[], uint32_t row_words, uint32_t width)
+{
+    memset(row, 0, row_words * sizeof(uint64_t));
+    for (uint32_t w = 0; w < width / 64; ++w) row[w] = ~(uint64_t)0;
+    if (width % 64) row[width / 64] = ((uint64_t)1 << (width % 64)) - 1;
+}
+
+static void traceMatrix_writeRow(
+    segmentHead** ret, const uint64_t row[], uint32_t row_words, bool complement, uint32_t width,
+    generalSegmentManager* gsm)
+{
+    segmentWriter writer;
+    segmentWriter_set(&writer, ret, gsm);
+    for (uint32_t w = 0; w < row_words; ++w) {
+        uint64_t word = complement ? ~row[w] : row[w];
+        while (word) {
+            uint32_t k = w * 64 + __builtin_ctzll(word);
+            if (k >= width) return;
+            segmentWriter_addItem(&writer, k);
+            word &= word - 1;
+        }
+    }
+}
+
+void traceMatrix_pack(uint64_t rows[], segmentHead* segments[], uint32_t rows_len, uint32_t width)
+{
+    uint32_t row_words = traceMatrix_words(width);
+    #pragma omp parallel for
+    for (uint32_t i = 0; i < rows_len; ++i) {
+        traceMatrix_packRow(rows + (size_t)i * row_words, segments[i], row_words, width);
+    }
+}
+
+// Write on cols[] the transpose of rows[]: one row of traceMatrix_words(rows_len) words per indicator
+void traceMatrix_transpose(uint64_t cols[], const uint64_t rows[], uint32_t rows_len, uint32_t width)
+{
+    uint32_t row_words = traceMatrix_words(width);
+    uint32_t col_words = traceMatrix_words(rows_len);
+    memset(cols, 0, (size_t)width * col_words * sizeof(uint64_t));
+
+    // Every block of 64 rows fills one word of each column
+    #pragma omp parallel for
+    for (uint32_t b = 0; b < col_words; ++b) {
+        for (uint32_t i = b * 64; i < rows_len && i < (b + 1) * 64; ++i) {
+            const uint64_t* row = rows + (size_t)i * row_words;
+            for (uint32_t w = 0; w < row_words; ++w) {
+                uint64_t word = row[w];
+                while (word) {
+                    uint32_t k = w * 64 + __builtin_ctzll(word);
+                    cols[(size_t)k * col_words + b] |= (uint64_t)1 << (i % 64);
+                    word &= word - 1;
+                }
+            }
+        }
+    }
+}
+
+// Write on ret[g] the AND (or the OR, if 'union_') of the rows listed in groups[g].
+// The AND of no rows is the full row, as the trace of a term with no atoms.
+void traceMatrix_reduceRows(
+    segmentHead** ret[], const uint64_t rows[], uint32_t width, segmentHead* groups[], uint32_t groups_len,
+    bool union_, generalSegmentManager* gsm)
+{
+    uint32_t row_words = traceMatrix_words(width);
+    #pragma omp parallel
+    {
+        uint64_t* acc = (uint64_t*)malloc(row_words * sizeof(uint64_t));
+        #pragma omp for schedule(dynamic, 16)
+        for (uint32_t g = 0; g < groups_len; ++g) {
+            if (*ret[g]) abort();
+            if (union_) {
+                memset(acc, 0, row_words * sizeof(uint64_t));
+            } else {
+                traceMatrix_fullRow(acc, row_words, width);
+            }
+            segmentReader reader;
+            segmentReader_set(&reader, groups[g]);
+            while (segmentReader_nextItem(&reader)) {
+                const uint64_t* row = rows + (size_t)segmentReader_currentItem(&reader) * row_words;
+                if (union_) {
+                    for (uint32_t w = 0; w < row_words; ++w) acc[w] |= row[w];
+                } else {
+                    for (uint32_t w = 0; w < row_words; ++w) acc[w] &= row[w];
+                }
+            }
+            traceMatrix_writeRow(ret[g], acc, row_words, false, width, gsm);
+        }
+        free(acc);
+    }
+}
+
+// Write on ret[j] the row idx[j] of a matrix of the given width, or its complement
+void traceMatrix_unpackRows(
+    segmentHead** ret[], const uint64_t rows[], uint32_t width, uint32_t idx[], uint32_t idx_len, bool complement,
+    generalSegmentManager* gsm)
+{
+    uint32_t row_words = traceMatrix_words(width);
+    #pragma omp parallel for
+    for (uint32_t j = 0; j < idx_len; ++j) {
+        if (*ret[j]) abort();
+        traceMatrix_writeRow(ret[j], rows + (size_t)idx[j] * row_words, row_words, complement, width, gsm);
+    }
+}
+
+// Positions of sets[] by constant, as items[offsets[c]] to items[offsets[c + 1] - 1] for constants up to 'len'
+typedef struct ConstantPostings {
+    uint32_t* offsets;
+    uint32_t* items;
+    uint32_t len;
+} ConstantPostings;
+
+static void constantPostings_init(ConstantPostings* self, segmentHead* sets[], uint32_t sets_len)
+{
+    self->len = 0;
+    for (uint32_t k = 0; k < sets_len; ++k) {
+        segmentReader reader;
+        segmentReader_set(&reader, sets[k]);
+        while (segmentReader_nextItem(&reader)) {
+            self->len = max(self->len, (uint32_t)segmentReader_currentItem(&reader) + 1);
+        }
+    }
+
+    self->offsets = (uint32_t*)calloc(self->len + 1, sizeof(uint32_t));
+    for (uint32_t k = 0; k < sets_len; ++k) {
+        segmentReader reader;
+        segmentReader_set(&reader, sets[k]);
+        while (segmentReader_nextItem(&reader)) {
+            ++self->offsets[segmentReader_currentItem(&reader) + 1];
+        }
+    }
+    for (uint32_t c = 0; c < self->len; ++c) self->offsets[c + 1] += self->offsets[c];
+
+    uint32_t* fill = (uint32_t*)malloc((self->len + 1) * sizeof(uint32_t));
+    memcpy(fill, self->offsets, (self->len + 1) * sizeof(uint32_t));
+    self->items = (uint32_t*)malloc(max(self->offsets[self->len], 1) * sizeof(uint32_t));
+    for (uint32_t k = 0; k < sets_len; ++k) {
+        segmentReader reader;
+        segmentReader_set(&reader, sets[k]);
+        while (segmentReader_nextItem(&reader)) {
+            self->items[fill[segmentReader_currentItem(&reader)]++] = k;
+        }
+    }
+    free(fill);
+}
+
+// Postings of the ucs of the atoms of 'atomization'
+static void constantPostings_initFromAtomization(ConstantPostings* self, Atomization* atomization)
+{
+    segmentHead** ucs = (segmentHead**)malloc(max(atomization->len, 1) * sizeof(segmentHead*));
+    for (uint32_t k = 0; k < atomization->len; ++k) {
+        ucs[k] = atomization->atoms[k].ucs.constants;
+    }
+    constantPostings_init(self, ucs, atomization->len);
+    free(ucs);
+}
+
+static void constantPostings_free(ConstantPostings* self)
+{
+    free(self->offsets);
+    free(self->items);
+}
+
+// Trace of every constant below postings->len that appears in terms[]: AND of the packed traces of its atoms, the full
+// row if it has none. The trace of constant c is the row slot[c], UINT32_MAX if c is in no term. NULL if out of memory.
+static uint64_t* traceMatrix_constantTraces(
+    const uint64_t rows[], uint32_t width, const ConstantPostings* postings, segmentHead* terms[], uint32_t terms_len,
+    uint32_t slot[])
+{
+    uint32_t row_words = traceMatrix_words(width);
+    uint32_t* used = (uint32_t*)malloc(max(postings->len, 1) * sizeof(uint32_t));
+    if (used == NULL) return NULL;
+
+    uint32_t used_len = 0;
+    for (uint32_t c = 0; c < postings->len; ++c) slot[c] = UINT32_MAX;
+    for (uint32_t t = 0; t < terms_len; ++t) {
+        segmentReader reader;
+        segmentReader_set(&reader, terms[t]);
+        while (segmentReader_nextItem(&reader)) {
+            uint32_t c = segmentReader_currentItem(&reader);
+            if (c >= postings->len) break;
+            if (slot[c] != UINT32_MAX) continue;
+            slot[c] = used_len;
+            used[used_len++] = c;
+        }
+    }
+
+    uint64_t* constant_traces = (uint64_t*)malloc(max((size_t)used_len * row_words, 1) * sizeof(uint64_t));
+    if (constant_traces == NULL) {
+        free(used);
+        return NULL;
+    }
+    #pragma omp parallel for schedule(dynamic, 16)
+    for (uint32_t u = 0; u < used_len; ++u) {
+        uint32_t c = used[u];
+        uint64_t* acc = constant_traces + (size_t)u * row_words;
+        traceMatrix_fullRow(acc, row_words, width);
+        for (uint32_t p = postings->offsets[c]; p < postings->offsets[c + 1]; ++p) {
+            const uint64_t* row = rows + (size_t)postings->items[p] * row_words;
+            for (uint32_t w = 0; w < row_words; ++w) acc[w] &= row[w];
+        }
+    }
+    free(used);
+    return constant_traces;
+}
+
+// Write on traces[t] the trace of terms[t]: AND of the traces of its constants, computed once for all the terms.
+// Return false if out of memory.
+static bool traceMatrix_tracesOfTerms(
+    segmentHead** traces[], segmentHead* terms[], uint32_t terms_len, const uint64_t rows[], uint32_t width,
+    const ConstantPostings* postings, generalSegmentManager* gsm)
+{
+    uint32_t row_words = traceMatrix_words(width);
+    uint32_t* slot = (uint32_t*)malloc(max(postings->len, 1) * sizeof(uint32_t));
+    if (slot == NULL) return false;
+    uint64_t* constant_traces = traceMatrix_constantTraces(rows, width, postings, terms, terms_len, slot);
+    if (constant_traces == NULL) {
+        free(slot);
+        return false;
+    }
+
+    bool ok = true;
+    #pragma omp parallel
+    {
+        uint64_t* acc = (uint64_t*)malloc(row_words * sizeof(uint64_t));
+        if (acc == NULL) {
+            #pragma omp atomic write
+            ok = false;
+        }
+        #pragma omp for schedule(dynamic, 16)
+        for (uint32_t t = 0; t < terms_len; ++t) {
+            if (acc == NULL) continue;
+            if (*traces[t] != NULL) abort();
+            traceMatrix_fullRow(acc, row_words, width);
+            segmentReader reader;
+            segmentReader_set(&reader, terms[t]);
+            while (segmentReader_nextItem(&reader)) {
+                uint32_t c = segmentReader_currentItem(&reader);
+                if (c >= postings->len) break;
+                const uint64_t* constant_trace = constant_traces + (size_t)slot[c] * row_words;
+                for (uint32_t w = 0; w < row_words; ++w) acc[w] &= constant_trace[w];
+            }
+            traceMatrix_writeRow(traces[t], acc, row_words, false, width, gsm);
+        }
+        free(acc);
+    }
+    free(constant_traces);
+    free(slot);
+    return ok;
+}
+
+// Set on row[] the bits in 'mask' of the free trace of 'term'
+static void traceMatrix_termRowOver(
+    uint64_t row[], const Tracer* tracer, const LCS* term, const uint64_t mask[], uint32_t row_words, uint32_t width)
+{
+    uint32_t shift = tracer->indicators_len;
+    for (uint32_t w = 0; w < row_words; ++w) {
+        uint64_t word = mask[w];
+        while (word) {
+            uint32_t k = w * 64 + __builtin_ctzll(word);
+            if (k >= width) break;
+            bool in = k < shift ? isSubset(term, &tracer->indicators[k]) : isDisjoint(&tracer->atomIndicators[k - shift], term);
+            if (in) row[w] |= (uint64_t)1 << (k % 64);
+            word &= word - 1;
+        }
+    }
+}
+
+// Write on row[] the bits in 'mask' of the free trace of constant 'c'
+static void traceMatrix_constantRowOver(
+    uint64_t row[], const Tracer* tracer, uint32_t c, const uint64_t mask[], uint32_t row_words, uint32_t width,
+    generalSegmentManager* gsm)
+{
+    LCS constant = {NULL};
+    segment_addItem(&constant.constants, c, gsm);
+
+    memset(row, 0, row_words * sizeof(uint64_t));
+    traceMatrix_termRowOver(row, tracer, &constant, mask, row_words, width);
+    generalSegmentManager_returnSegment(gsm, &constant.constants);
+}
+
+// Mask of the indicators that are not in the image of 'remap', the ones an older trace says nothing about
+static uint64_t* traceMatrix_freshMask(const int32_t remap[], uint32_t remap_len, uint32_t width)
+{
+    uint32_t row_words = traceMatrix_words(width);
+    uint64_t* fresh = (uint64_t*)malloc(row_words * sizeof(uint64_t));
+    traceMatrix_fullRow(fresh, row_words, width);
+    for (uint32_t i = 0; i < remap_len; ++i) {
+        if (remap[i] >= 0 && (uint32_t)remap[i] < width) fresh[remap[i] / 64] &= ~((uint64_t)1 << (remap[i] % 64));
+    }
+    return fresh;
+}
+
+// Set on row[] the image by 'remap' of the items of 'old_trace'
+static void traceMatrix_remapRow(
+    uint64_t row[], segmentHead* old_trace, const int32_t remap[], uint32_t remap_len, uint32_t width)
+{
+    segmentReader reader;
+    segmentReader_set(&reader, old_trace);
+    while (segmentReader_nextItem(&reader)) {
+        uint32_t i = segmentReader_currentItem(&reader);
+        if (i >= remap_len) break;
+        if (remap[i] >= 0 && (uint32_t)remap[i] < width) row[remap[i] / 64] |= (uint64_t)1 << (remap[i] % 64);
+    }
+}
+
+// Free traces can be patched from old_traces[el], a free trace of element el in an older layout of the indicators, with
+// remap as in traceAll. Only the new indicators are evaluated for those elements. old_traces may be NULL, and
+// old_traces[el] NULL if unknown.
+void freeTraceAll(
+    Space* space, Tracer* tracer, segmentHead* old_traces[], const int32_t remap[], uint32_t remap_len,
+    generalSegmentManager* gsm)
 {
     /* With tiling to avoid cache misses */
     uint32_t tileSize = 5000;
@@ -346,6 +802,7 @@ void freeTraceAll(Space* space, Tracer* tracer, generalSegmentManager* gsm)
     for (uint32_t b = 0; b < blocks; ++b) {
         #pragma omp parallel for
         for (uint32_t el = 0; el < space->len; ++el) {
+            if (old_traces != NULL && old_traces[el] != NULL) continue;
             const LCS* cset = &space->cset[el];
             segmentWriter writer;
             int __maybe_unused iH = -1;
@@ -369,6 +826,7 @@ void freeTraceAll(Space* space, Tracer* tracer, generalSegmentManager* gsm)
     for (uint32_t b = 0; b < blocks; ++b) {
         #pragma omp parallel for
         for (uint32_t el = 0; el < space->len; ++el) {
+            if (old_traces != NULL && old_traces[el] != NULL) continue;
             const LCS* cset = &space->cset[el];
             segmentWriter writer;
             int __maybe_unused iH = -1;
@@ -383,115 +841,516 @@ void freeTraceAll(Space* space, Tracer* tracer, generalSegmentManager* gsm)
             }
         }
     }
+
+    if (old_traces == NULL) return;
+
+    uint32_t width = tracer->indicators_len + tracer->atomIndicators_len;
+    uint32_t row_words = traceMatrix_words(width);
+    uint64_t* fresh = traceMatrix_freshMask(remap, remap_len, width);
+    #pragma omp parallel
+    {
+        uint64_t* row = (uint64_t*)malloc(row_words * sizeof(uint64_t));
+        #pragma omp for schedule(dynamic, 16)
+        for (uint32_t el = 0; el < space->len; ++el) {
+            if (old_traces[el] == NULL) continue;
+            if (*space->freeTrace[el] != NULL) abort();
+            memset(row, 0, row_words * sizeof(uint64_t));
+            traceMatrix_remapRow(row, old_traces[el], remap, remap_len, width);
+            traceMatrix_termRowOver(row, tracer, &space->cset[el], fresh, row_words, width);
+            traceMatrix_writeRow(space->freeTrace[el], row, row_words, false, width, gsm);
+        }
+        free(row);
+    }
+    free(fresh);
 }
 
-static segmentHead* getFreeTraceOfIsolatedConstant(
-    const Tracer* tracer, const uint32_t constant_idx, generalSegmentManager* gsm)
+// Atom traces can be patched from old_traces[k], a trace of atom k in an older layout of the indicators, with remap[i]
+// the position of old indicator i in the current layout or -1 if it was removed. Only the indicators that are not in
+// the image of 'remap' are evaluated for those atoms. old_traces may be NULL, and old_traces[k] NULL if unknown.
+// Return false if out of memory.
+bool traceAll(
+    Space* space, Tracer* tracer, Atomization* atomization, segmentHead* old_traces[], const int32_t remap[],
+    uint32_t remap_len, generalSegmentManager* gsm)
 {
-    LCS* constant = calloc(1, sizeof(LCS));
-    segment_addItem(&constant->constants, constant_idx, gsm);
+    uint32_t width = tracer->indicators_len + tracer->atomIndicators_len;
+    uint32_t row_words = traceMatrix_words(width);
 
-    segmentHead* trace = getFreeTraceOfTerm(constant, tracer, gsm);
-    generalSegmentManager_returnSegment(gsm, &constant->constants);
-    free(constant);
-    return trace;
+    ConstantPostings postings;
+    constantPostings_initFromAtomization(&postings, atomization);
+
+    uint64_t* fresh = traceMatrix_freshMask(remap, remap_len, width);
+
+    // Constants of atoms with no old trace need their whole free trace, the rest only the new indicators
+    bool* whole = (bool*)calloc(max(postings.len, 1), sizeof(bool));
+    for (uint32_t k = 0; k < atomization->len; ++k) {
+        if (old_traces != NULL && old_traces[k] != NULL) continue;
+        segmentReader reader;
+        segmentReader_set(&reader, atomization->atoms[k].ucs.constants);
+        while (segmentReader_nextItem(&reader)) {
+            whole[segmentReader_currentItem(&reader)] = true;
+        }
+    }
+
+    // Free traces of the constants in the atomization, computed once
+    uint64_t* constant_rows = (uint64_t*)malloc(max((size_t)postings.len * row_words, 1) * sizeof(uint64_t));
+    #pragma omp parallel for schedule(dynamic, 16)
+    for (uint32_t c = 0; c < postings.len; ++c) {
+        if (postings.offsets[c] == postings.offsets[c + 1]) continue;
+        uint64_t* constant_row = constant_rows + (size_t)c * row_words;
+        if (!whole[c]) {
+            traceMatrix_constantRowOver(constant_row, tracer, c, fresh, row_words, width, gsm);
+            continue;
+        }
+        segmentHead* constant_trace = getFreeTraceOfIsolatedConstant(tracer, c, gsm);
+        traceMatrix_packRow(constant_row, constant_trace, row_words, width);
+        generalSegmentManager_returnSegment(gsm, &constant_trace);
+    }
+    free(whole);
+
+    // The trace of an atom is the union of the free traces of its constants
+    uint64_t* rows = (uint64_t*)malloc(max((size_t)atomization->len * row_words, 1) * sizeof(uint64_t));
+    #pragma omp parallel for
+    for (uint32_t k = 0; k < atomization->len; ++k) {
+        Atom* at = &atomization->atoms[k];
+        if (*at->trace != NULL) abort();
+        uint64_t* row = rows + (size_t)k * row_words;
+        memset(row, 0, row_words * sizeof(uint64_t));
+        bool patched = old_traces != NULL && old_traces[k] != NULL;
+        if (patched) traceMatrix_remapRow(row, old_traces[k], remap, remap_len, width);
+        segmentReader reader;
+        segmentReader_set(&reader, at->ucs.constants);
+        while (segmentReader_nextItem(&reader)) {
+            const uint64_t* constant_row = constant_rows + (size_t)segmentReader_currentItem(&reader) * row_words;
+            if (patched) {
+                for (uint32_t w = 0; w < row_words; ++w) row[w] |= constant_row[w] & fresh[w];
+            } else {
+                for (uint32_t w = 0; w < row_words; ++w) row[w] |= constant_row[w];
+            }
+        }
+        traceMatrix_writeRow(at->trace, row, row_words, false, width, gsm);
+    }
+    free(constant_rows);
+    free(fresh);
+
+    segmentHead** terms = (segmentHead**)malloc(max(space->len, 1) * sizeof(segmentHead*));
+    for (uint32_t k = 0; k < space->len; ++k) {
+        terms[k] = space->cset[k].constants;
+    }
+    bool ok = traceMatrix_tracesOfTerms(space->trace, terms, space->len, rows, width, &postings, gsm);
+    free(terms);
+
+    constantPostings_free(&postings);
+    free(rows);
+    return ok;
 }
 
-void calculateTraceOfAtom(const Tracer* tracer, Atom* at, generalSegmentManager* gsm)
+// Return false if out of memory
+bool storeTracesOfConstants(
+    segmentHead*** traces, uint32_t total_num_indicators, uint32_t constants_len, int constants[],
+    Atomization* atomization, generalSegmentManager* gsm)
 {
-    if (*at->trace != NULL) {
-        const char* COLOR_RED = "\033[1;31m";
-        const char* COLOR_RESET = "\033[0m";
-        printf("%s", COLOR_RED);
-        printf("Caller must ensure atom trace is empty");
-        printf("%s", COLOR_RESET);
-        printf("\n");
-        abort();
+    uint32_t width = total_num_indicators;
+    uint32_t row_words = traceMatrix_words(width);
+    uint64_t* rows = (uint64_t*)malloc(max((size_t)atomization->len * row_words, 1) * sizeof(uint64_t));
+    #pragma omp parallel for
+    for (uint32_t k = 0; k < atomization->len; ++k) {
+        traceMatrix_packRow(rows + (size_t)k * row_words, *atomization->atoms[k].trace, row_words, width);
     }
 
-    segmentWriter writer;
-    segmentWriter_set(&writer, at->trace, gsm);
+    ConstantPostings postings;
+    constantPostings_initFromAtomization(&postings, atomization);
 
-    segmentReader reader;
-    segmentReader_set(&reader, at->ucs.constants);
-    while (segmentReader_nextItem(&reader)) {
-        uint32_t constant_idx = segmentReader_currentItem(&reader);
-        segmentHead* constant_trace = getFreeTraceOfIsolatedConstant(tracer, constant_idx, gsm);
-        segmentWriter_addSegmentNoReturn(&writer, constant_trace);
-        generalSegmentManager_returnSegment(gsm, &constant_trace);
+    segmentHead** terms = (segmentHead**)calloc(max(constants_len, 1), sizeof(segmentHead*));
+    for (uint32_t c_idx = 0; c_idx < constants_len; ++c_idx) {
+        segment_addItem(&terms[c_idx], constants[c_idx], gsm);
+    }
+    bool ok = traceMatrix_tracesOfTerms(traces, terms, constants_len, rows, width, &postings, gsm);
+    for (uint32_t c_idx = 0; c_idx < constants_len; ++c_idx) {
+        generalSegmentManager_returnSegment(gsm, &terms[c_idx]);
     }
+    free(terms);
+
+    constantPostings_free(&postings);
+    free(rows);
+    return ok;
 }
 
-static segmentHead* getTraceOfTerm(
-    const LCS* term, const Tracer* tracer, Atomization* atomization, generalSegmentManager* gsm)
+// Trace closure
+//
+// Enforcement of the trace constraints of the duples of a term space, see sparse_crossing_embedder.traceClosure. The
+// traces of the elements and of the new atoms are kept as trace matrix rows for the whole loop.
+
+enum {
+    TRACE_CLOSURE_OK = 0,
+    TRACE_CLOSURE_NEGATIVE_INCONSISTENT = 1,
+    TRACE_CLOSURE_NEGATIVE_ERROR = 2,
+    TRACE_CLOSURE_POSITIVE_INCONSISTENT = 3,
+};
+
+// New atoms of a trace closure, in order of creation
+typedef struct TraceClosure {
+    segmentHead** ucs;
+    uint64_t* rows;
+    uint32_t len;
+    uint32_t capacity;
+    uint32_t width;
+} TraceClosure;
+
+// Free traces of the constants as rows, computed on first use
+typedef struct ConstantRows {
+    const Tracer* tracer;
+    uint64_t* rows;
+    bool* ready;
+    uint32_t len;
+    uint32_t width;
+} ConstantRows;
+
+static void constantRows_compute(ConstantRows* self, uint32_t c, generalSegmentManager* gsm)
 {
-    segmentHead* trace = NULL;
-    segmentWriter writer;
-    segmentWriter_set(&writer, &trace, gsm);
+    uint32_t row_words = traceMatrix_words(self->width);
+    segmentHead* constant_trace = getFreeTraceOfIsolatedConstant(self->tracer, c, gsm);
+    traceMatrix_packRow(self->rows + (size_t)c * row_words, constant_trace, row_words, self->width);
+    generalSegmentManager_returnSegment(gsm, &constant_trace);
+    self->ready[c] = true;
+}
 
-    uint32_t num_indicators = tracer->indicators_len + tracer->atomIndicators_len;
-    for (uint32_t j = 0; j < num_indicators; ++j) {
-        segmentWriter_addItem(&writer, j);
+// Rows for the constants of sets[], computed in parallel
+static void constantRows_init(
+    ConstantRows* self, const Tracer* tracer, uint32_t width, const ConstantPostings* postings,
+    generalSegmentManager* gsm)
+{
+    self->tracer = tracer;
+    self->width = width;
+    self->len = postings->len;
+    self->rows = (uint64_t*)malloc(max((size_t)self->len * traceMatrix_words(width), 1) * sizeof(uint64_t));
+    self->ready = (bool*)calloc(max(self->len, 1), sizeof(bool));
+    #pragma omp parallel for schedule(dynamic, 16)
+    for (uint32_t c = 0; c < self->len; ++c) {
+        if (postings->offsets[c] == postings->offsets[c + 1]) continue;
+        constantRows_compute(self, c, gsm);
     }
+}
 
-    for (uint32_t k = 0; k < atomization->len; ++k) {
-        if (!isDisjoint(&atomization->atoms[k].ucs, term)) {
-            segmentWriter_intersectSegmentNoReturn(&writer, *atomization->atoms[k].trace);
+// The returned row is only valid until the next call
+static const uint64_t* constantRows_get(ConstantRows* self, uint32_t c, generalSegmentManager* gsm)
+{
+    uint32_t row_words = traceMatrix_words(self->width);
+    if (c >= self->len) {
+        uint32_t len = max(c + 1, 2 * self->len);
+        self->rows = (uint64_t*)realloc(self->rows, (size_t)len * row_words * sizeof(uint64_t));
+        self->ready = (bool*)realloc(self->ready, len * sizeof(bool));
+        memset(self->ready + self->len, 0, (len - self->len) * sizeof(bool));
+        self->len = len;
+    }
+    if (!self->ready[c]) constantRows_compute(self, c, gsm);
+    return self->rows + (size_t)c * row_words;
+}
+
+static void constantRows_free(ConstantRows* self)
+{
+    free(self->rows);
+    free(self->ready);
+}
+
+// Append an atom, the caller writes its trace on the returned row
+static uint64_t* traceClosure_add(TraceClosure* self, segmentHead* ucs)
+{
+    uint32_t row_words = traceMatrix_words(self->width);
+    if (self->len == self->capacity) {
+        self->capacity = max(16, 2 * self->capacity);
+        self->ucs = (segmentHead**)realloc(self->ucs, self->capacity * sizeof(segmentHead*));
+        self->rows = (uint64_t*)realloc(self->rows, (size_t)self->capacity * row_words * sizeof(uint64_t));
+    }
+    self->ucs[self->len] = ucs;
+    return self->rows + (size_t)self->len++ * row_words;
+}
+
+// Drop the atoms from position 'len' on
+static void traceClosure_truncate(TraceClosure* self, uint32_t len, generalSegmentManager* gsm)
+{
+    while (self->len > len) {
+        generalSegmentManager_returnSegment(gsm, &self->ucs[--self->len]);
+    }
+}
+
+// Whether trH - (trL & row) is not empty, or trH - trL if 'row' is NULL
+static bool traceClosure_outIsNotEmpty(
+    const uint64_t trH[], const uint64_t trL[], const uint64_t row[], uint32_t row_words)
+{
+    for (uint32_t w = 0; w < row_words; ++w) {
+        uint64_t low = row ? trL[w] & row[w] : trL[w];
+        if (trH[w] & ~low) return true;
+    }
+    return false;
+}
+
+static uint32_t traceClosure_count(const uint64_t row[], uint32_t row_words)
+{
+    uint32_t count = 0;
+    for (uint32_t w = 0; w < row_words; ++w) count += __builtin_popcountll(row[w]);
+    return count;
+}
+
+// Items of 'segment' in ascending order
+static uint32_t* traceClosure_items(segmentHead* segment, uint32_t* ret_len)
+{
+    *ret_len = segment_countItems(segment);
+    uint32_t* items = (uint32_t*)malloc(max(*ret_len, 1) * sizeof(uint32_t));
+    as_array(segment, items);
+    return items;
+}
+
+// Items of 'segment' as random.shuffle leaves a sorted list of them
+static uint32_t* traceClosure_shuffled(segmentHead* segment, uint32_t* ret_len, PyRandom* rng)
+{
+    uint32_t* items = traceClosure_items(segment, ret_len);
+    PyRandom_shuffle(rng, items, *ret_len);
+    return items;
+}
+
+// Atoms for a negative duple, as in Tracer.enforceNegativeTraceConstraint and ...ByQuotient
+static int traceClosure_negative(
+    TraceClosure* closure, ConstantRows* constant_rows, const uint64_t trL[], const uint64_t trH[], segmentHead* L,
+    segmentHead* H, bool by_quotient, segmentHead* atoms_ucs[], segmentHead* las[], uint32_t las_idx[],
+    uint32_t las_len, bool warn_on_violation, bool* warning_sent, uint64_t acc[], PyRandom* rng,
+    generalSegmentManager* gsm)
+{
+    uint32_t row_words = traceMatrix_words(closure->width);
+    if (traceClosure_outIsNotEmpty(trH, trL, NULL, row_words)) return TRACE_CLOSURE_OK;
+
+    segmentHead* extra = NULL;
+    segment_subtract_to(&extra, L, H, gsm);
+    uint32_t extra_len;
+    uint32_t* extraC = traceClosure_shuffled(extra, &extra_len, rng);
+    generalSegmentManager_returnSegment(gsm, &extra);
+    if (extra_len == 0) {
+        free(extraC);
+        return TRACE_CLOSURE_NEGATIVE_INCONSISTENT;
+    }
+
+    bool enforced = false;
+    while (!enforced && extra_len > 0) {
+        uint32_t c = extraC[--extra_len];
+
+        if (by_quotient) {
+            // Largest quotients by H of the atoms with c that discriminate the duple
+            uint32_t first = closure->len;
+            double maxSize = 0;
+            uint32_t c_idx = array_index(las_idx, las_len, c);
+            uint32_t candidates_len = 0;
+            uint32_t* candidates = traceClosure_items(c_idx < las_len ? las[c_idx] : NULL, &candidates_len);
+            while (candidates_len > 0) {
+                // random.choice over the sorted candidates left
+                uint32_t k = PyRandom_below(rng, candidates_len);
+                segmentHead* at_ucs = atoms_ucs[candidates[k]];
+                memmove(candidates + k, candidates + k + 1, (--candidates_len - k) * sizeof(uint32_t));
+                segmentHead* ucs = NULL;
+                segment_subtract_to(&ucs, at_ucs, H, gsm);
+                uint32_t ucs_len = segment_countItems(ucs);
+                double size = (double)ucs_len / segment_countItems(at_ucs);
+                if (ucs_len <= 1 || size < maxSize) {
+                    generalSegmentManager_returnSegment(gsm, &ucs);
+                    continue;
+                }
+
+                memset(acc, 0, row_words * sizeof(uint64_t));
+                segmentReader reader;
+                segmentReader_set(&reader, ucs);
+                while (segmentReader_nextItem(&reader)) {
+                    const uint64_t* row = constantRows_get(constant_rows, segmentReader_currentItem(&reader), gsm);
+                    for (uint32_t w = 0; w < row_words; ++w) acc[w] |= row[w];
+                }
+                if (!traceClosure_outIsNotEmpty(trH, trL, acc, row_words)) {
+                    generalSegmentManager_returnSegment(gsm, &ucs);
+                    continue;
+                }
+
+                enforced = true;
+                if (size > maxSize) {
+                    maxSize = size;
+                    traceClosure_truncate(closure, first, gsm);
+                }
+                memcpy(traceClosure_add(closure, ucs), acc, row_words * sizeof(uint64_t));
+            }
+            free(candidates);
+            if (closure->len > first) break;
+        }
+
+        const uint64_t* row = constantRows_get(constant_rows, c, gsm);
+        if (traceClosure_outIsNotEmpty(trH, trL, row, row_words)) {
+            enforced = true;
+            segmentHead* ucs = NULL;
+            segment_addItem(&ucs, c, gsm);
+            memcpy(traceClosure_add(closure, ucs), row, row_words * sizeof(uint64_t));
         }
     }
+    free(extraC);
 
-    return trace;
+    if (enforced) return TRACE_CLOSURE_OK;
+    if (!by_quotient) return TRACE_CLOSURE_NEGATIVE_ERROR;
+    if (warn_on_violation && !*warning_sent) {
+        *warning_sent = true;
+        return TRACE_CLOSURE_NEGATIVE_ERROR;
+    }
+    return TRACE_CLOSURE_OK;
 }
 
-void traceAll(Space* space, Tracer* tracer, Atomization* atomization, generalSegmentManager* gsm)
+// Atom for a positive duple, as in Tracer.enforcePositiveTraceConstraint
+static int traceClosure_positive(
+    TraceClosure* closure, ConstantRows* constant_rows, const uint64_t trL[], const uint64_t trH[], segmentHead* H,
+    bool warn_on_violation, bool* warning_sent, bool* ret_positive_violation, uint64_t out[], PyRandom* rng,
+    generalSegmentManager* gsm)
 {
-    #pragma omp parallel for
-    for (uint32_t k = 0; k < atomization->len; ++k) {
-        calculateTraceOfAtom(tracer, &atomization->atoms[k], gsm);
+    uint32_t row_words = traceMatrix_words(closure->width);
+    for (uint32_t w = 0; w < row_words; ++w) out[w] = trH[w] & ~trL[w];
+    uint32_t lout = traceClosure_count(out, row_words);
+    if (lout == 0) return TRACE_CLOSURE_OK;
+
+    uint32_t cH_len;
+    uint32_t* cH = traceClosure_shuffled(H, &cH_len, rng);
+    if (cH_len == 0) {
+        free(cH);
+        return TRACE_CLOSURE_POSITIVE_INCONSISTENT;
+    }
+
+    bool enforced = false;
+    while (cH_len > 0) {
+        uint32_t c = cH[--cH_len];
+        const uint64_t* row = constantRows_get(constant_rows, c, gsm);
+        for (uint32_t w = 0; w < row_words; ++w) out[w] &= row[w];
+        if (traceClosure_count(out, row_words) < lout) {
+            enforced = true;
+            segmentHead* ucs = NULL;
+            segment_addItem(&ucs, c, gsm);
+            memcpy(traceClosure_add(closure, ucs), row, row_words * sizeof(uint64_t));
+            break;
+        }
     }
+    free(cH);
 
-    #pragma omp parallel for
-    for (uint32_t k = 0; k < space->len; ++k) {
-        if (*space->trace[k] != NULL) abort();
-        *space->trace[k] = getTraceOfTerm(&space->cset[k], tracer, atomization, gsm);
+    if (!enforced && warn_on_violation && !*warning_sent) {
+        *warning_sent = true;
+        *ret_positive_violation = true;
     }
+    return TRACE_CLOSURE_OK;
 }
 
-void storeTracesOfConstants(
-    segmentHead*** traces, uint32_t total_num_indicators, uint32_t constants_len, int constants[],
-    Atomization* atomization, generalSegmentManager* gsm)
+// AND the traces of the atoms from position 'first' on into the elements that share a constant with them
+static void traceClosure_updateTraces(
+    const TraceClosure* closure, uint32_t first, uint64_t element_rows[], bool modified[],
+    const ConstantPostings* postings)
 {
-    {
-        segmentHead* all_indicators = NULL;
-        {
-            segmentWriter writer;
-            segmentWriter_set(&writer, &all_indicators, gsm);
-            for (uint32_t j = 0; j < total_num_indicators; ++j) {
-                segmentWriter_addItem(&writer, j);
+    uint32_t row_words = traceMatrix_words(closure->width);
+    for (uint32_t k = first; k < closure->len; ++k) {
+        const uint64_t* row = closure->rows + (size_t)k * row_words;
+        segmentReader reader;
+        segmentReader_set(&reader, closure->ucs[k]);
+        while (segmentReader_nextItem(&reader)) {
+            uint32_t c = segmentReader_currentItem(&reader);
+            if (c >= postings->len) break;
+            for (uint32_t p = postings->offsets[c]; p < postings->offsets[c + 1]; ++p) {
+                uint32_t e = postings->items[p];
+                uint64_t* element_row = element_rows + (size_t)e * row_words;
+                for (uint32_t w = 0; w < row_words; ++w) element_row[w] &= row[w];
+                modified[e] = true;
             }
         }
+    }
+}
 
-        #pragma omp parallel for
-        for (uint32_t c_idx = 0; c_idx < constants_len; ++c_idx) {
-            LCS constant;
-            constant.constants = NULL;
-            segment_addItem(&constant.constants, constants[c_idx], gsm);
-
-            {  // getTraceOfTerm
-                segmentWriter writer;
-                segmentWriter_set(&writer, traces[c_idx], gsm);
-                segmentWriter_cloneFrom(&writer, all_indicators);
-
-                for (uint32_t k = 0; k < atomization->len; ++k) {
-                    if (!isDisjoint(&atomization->atoms[k].ucs, &constant)) {
-                        segmentWriter_intersectSegmentNoReturn(&writer, *atomization->atoms[k].trace);
-                    }
-                }
+// Enforce the trace constraints of the negative duples (nduples_L[d], nduples_H[d]) and then of the positive duples,
+// given as positions in element_cset[], until no duple adds atoms. The traces of the elements are updated in place.
+// With 'by_quotient' negative duples take the quotients of the atoms in las[] and las_idx[], as in
+// segment_lowerAtomicSegment, over atoms_ucs[]. Writes on ret_status whether a constraint could not be enforced, and
+// returns the new atoms for traceClosure_len and extractTraceClosure. Random draws are taken from, and advance,
+// 'random_state', the state of Python's random module, in the same order as the Python closure.
+TraceClosure* traceClosure(
+    int* ret_status, bool* warning_sent, bool* ret_positive_violation, segmentHead* element_cset[],
+    segmentHead** element_trace[], uint32_t elements_len, uint32_t nduples_L[], uint32_t nduples_H[],
+    uint32_t nduples_len, uint32_t pduples_L[], uint32_t pduples_H[], uint32_t pduples_len, Tracer* tracer,
+    bool by_quotient, segmentHead* atoms_ucs[], segmentHead* las[], uint32_t las_idx[], uint32_t las_len,
+    bool warn_on_violation, uint32_t random_state[], generalSegmentManager* gsm)
+{
+    PyRandom rng = {random_state};
+    uint32_t width = tracer->indicators_len + tracer->atomIndicators_len;
+    uint32_t row_words = traceMatrix_words(width);
+
+    TraceClosure* closure = (TraceClosure*)calloc(1, sizeof(TraceClosure));
+    closure->width = width;
+
+    uint64_t* element_rows = (uint64_t*)malloc(max((size_t)elements_len * row_words, 1) * sizeof(uint64_t));
+    #pragma omp parallel for
+    for (uint32_t e = 0; e < elements_len; ++e) {
+        traceMatrix_packRow(element_rows + (size_t)e * row_words, *element_trace[e], row_words, width);
+    }
+    bool* modified = (bool*)calloc(max(elements_len, 1), sizeof(bool));
+
+    ConstantPostings postings;
+    constantPostings_init(&postings, element_cset, elements_len);
+    ConstantRows constant_rows;
+    constantRows_init(&constant_rows, tracer, width, &postings, gsm);
+
+    uint64_t* acc = (uint64_t*)malloc(row_words * sizeof(uint64_t));
+    *ret_status = TRACE_CLOSURE_OK;
+    *ret_positive_violation = false;
+    bool allEnforced = false;
+    while (!allEnforced && *ret_status == TRACE_CLOSURE_OK) {
+        allEnforced = true;
+        for (uint32_t d = 0; d < nduples_len && *ret_status == TRACE_CLOSURE_OK; ++d) {
+            uint32_t first = closure->len;
+            *ret_status = traceClosure_negative(
+                closure, &constant_rows, element_rows + (size_t)nduples_L[d] * row_words,
+                element_rows + (size_t)nduples_H[d] * row_words, element_cset[nduples_L[d]],
+                element_cset[nduples_H[d]], by_quotient, atoms_ucs, las, las_idx, las_len, warn_on_violation,
+                warning_sent, acc, &rng, gsm);
+            if (closure->len > first) {
+                allEnforced = false;
+                traceClosure_updateTraces(closure, first, element_rows, modified, &postings);
+            }
+        }
+        for (uint32_t d = 0; d < pduples_len && *ret_status == TRACE_CLOSURE_OK; ++d) {
+            uint32_t first = closure->len;
+            *ret_status = traceClosure_positive(
+                closure, &constant_rows, element_rows + (size_t)pduples_L[d] * row_words,
+                element_rows + (size_t)pduples_H[d] * row_words, element_cset[pduples_H[d]], warn_on_violation,
+                warning_sent, ret_positive_violation, acc, &rng, gsm);
+            if (closure->len > first) {
+                allEnforced = false;
+                traceClosure_updateTraces(closure, first, element_rows, modified, &postings);
             }
-            generalSegmentManager_returnSegment(gsm, &constant.constants);
         }
-        generalSegmentManager_returnSegment(gsm, &all_indicators);
     }
+    free(acc);
+
+    #pragma omp parallel for
+    for (uint32_t e = 0; e < elements_len; ++e) {
+        if (!modified[e]) continue;
+        generalSegmentManager_returnSegment(gsm, element_trace[e]);
+        traceMatrix_writeRow(element_trace[e], element_rows + (size_t)e * row_words, row_words, false, width, gsm);
+    }
+
+    constantRows_free(&constant_rows);
+    constantPostings_free(&postings);
+    free(modified);
+    free(element_rows);
+    return closure;
+}
+
+uint32_t traceClosure_len(TraceClosure* closure) { return closure->len; }
+
+// Move the new atoms of a trace closure to ucs[] and trace[] and free it
+void extractTraceClosure(
+    TraceClosure* closure, segmentHead** ucs[], segmentHead** trace[], generalSegmentManager* gsm)
+{
+    uint32_t row_words = traceMatrix_words(closure->width);
+    for (uint32_t k = 0; k < closure->len; ++k) {
+        if (*ucs[k] != NULL || *trace[k] != NULL) abort();
+        *ucs[k] = closure->ucs[k];
+        traceMatrix_writeRow(trace[k], closure->rows + (size_t)k * row_words, row_words, false, closure->width, gsm);
+    }
+    free(closure->ucs);
+    free(closure->rows);
+    free(closure);
 }
 
 void considerPositiveDuples(Tracer* tr, Duples* duples, generalSegmentManager* gsm)
@@ -719,6 +1578,23 @@ void updateUnionModelWithSetOfPduples(
     }
 }
 
+// Union of the lower atomic segments of the constants in 'term'.
+// las[] holds the lower atomic segment of every constant in las_idx[], which must be sorted.
+static void segment_lowerAtomicSegment(
+    segmentHead** ret, segmentHead* term, segmentHead* las[], uint32_t las_idx[], uint32_t las_len,
+    generalSegmentManager* gsm)
+{
+    segmentReader reader;
+    segmentReader_set(&reader, term);
+    while (segmentReader_nextItem(&reader)) {
+        uint32_t constant = segmentReader_currentItem(&reader);
+        uint32_t constant_idx = array_index(las_idx, las_len, constant);
+        if (constant_idx < las_len) {
+            segment_add(ret, las[constant_idx], gsm);
+        }
+    }
+}
+
 void calculateLowerAtomicSegments(
     segmentHead** element_las[], segmentHead* element_cset[], uint32_t elements_len, segmentHead* las[],
     uint32_t las_idx[], uint32_t las_len, generalSegmentManager* gsm)
@@ -726,71 +1602,309 @@ void calculateLowerAtomicSegments(
     #pragma omp parallel for
     for (uint32_t e = 0; e < elements_len; ++e) {
         if (*element_las[e]) abort();
+        segment_lowerAtomicSegment(element_las[e], element_cset[e], las, las_idx, las_len, gsm);
+    }
+}
+
+// Writes on ret_disc[d] the size of the discriminant las(L) - las(R) of duple d, and on ret_las[d] the size of
+// las(R). las[] and las_idx[] as in segment_lowerAtomicSegment.
+void duplesDiscriminantSizes(
+    uint32_t ret_disc[], uint32_t ret_las[], segmentHead* duples_L[], segmentHead* duples_R[], uint32_t duples_len,
+    segmentHead* las[], uint32_t las_idx[], uint32_t las_len, generalSegmentManager* gsm)
+{
+    #pragma omp parallel for schedule(dynamic, 16)
+    for (uint32_t d = 0; d < duples_len; ++d) {
+        segmentHead* lasL = NULL;
+        segmentHead* lasR = NULL;
+        segment_lowerAtomicSegment(&lasL, duples_L[d], las, las_idx, las_len, gsm);
+        segment_lowerAtomicSegment(&lasR, duples_R[d], las, las_idx, las_len, gsm);
+        segment_subtract(&lasL, lasR, gsm);
+        ret_disc[d] = segment_countItems(lasL);
+        ret_las[d] = segment_countItems(lasR);
+        generalSegmentManager_returnSegment(gsm, &lasL);
+        generalSegmentManager_returnSegment(gsm, &lasR);
+    }
+}
+
+// Writes on ret[d] the atoms of pending[d] in las(L) - las(R) of duple d, skipping duples with no pending atoms.
+// atoms_ucs[] holds the ucs of every atom position. las[] and las_idx[] as in segment_lowerAtomicSegment.
+void duplesPendingDiscriminants(
+    segmentHead** ret[], segmentHead* duples_L[], segmentHead* duples_R[], segmentHead* pending[], uint32_t duples_len,
+    segmentHead* atoms_ucs[], segmentHead* las[], uint32_t las_idx[], uint32_t las_len, generalSegmentManager* gsm)
+{
+    #pragma omp parallel for schedule(dynamic, 16)
+    for (uint32_t d = 0; d < duples_len; ++d) {
+        if (*ret[d]) abort();
+        if (!pending[d]) continue;
+        segmentHead* candidates = NULL;
+        segment_lowerAtomicSegment(&candidates, duples_L[d], las, las_idx, las_len, gsm);
+        segment_intersect(&candidates, pending[d], gsm);
+
+        /* Candidates are few, test them one by one instead of building las(R) */
+        segmentWriter writer;
+        segmentWriter_set(&writer, ret[d], gsm);
         segmentReader reader;
-        segmentReader_set(&reader, element_cset[e]);
+        segmentReader_set(&reader, candidates);
         while (segmentReader_nextItem(&reader)) {
-            uint32_t constant = segmentReader_currentItem(&reader);
-            uint32_t constant_idx = array_index(las_idx, las_len, constant);
-            if (constant_idx < las_len) {
-                segment_add(element_las[e], las[constant_idx], gsm);
+            uint32_t at_idx = segmentReader_currentItem(&reader);
+            if (segment_isDisjoint(atoms_ucs[at_idx], duples_R[d])) {
+                segmentWriter_addItem(&writer, at_idx);
             }
         }
+        generalSegmentManager_returnSegment(gsm, &candidates);
     }
 }
 
-// CrossAll
+// Inference
 
-typedef struct SegmentSetNode {
-    char* key;
-} SegmentSetNode;
+// Writes on ret[t * classes_len + k] the size of las(class k) - las(term t), or -1 if class k has no atoms.
+// las[] and las_idx[] as in segment_lowerAtomicSegment.
+void discriminantSizes(
+    int32_t ret[], segmentHead* term_cset[], uint32_t terms_len, uint32_t class_idx[], uint32_t classes_len,
+    segmentHead* las[], uint32_t las_idx[], uint32_t las_len, generalSegmentManager* gsm)
+{
+    #pragma omp parallel for schedule(dynamic, 16)
+    for (uint32_t t = 0; t < terms_len; ++t) {
+        segmentHead* term_las = NULL;
+        segment_lowerAtomicSegment(&term_las, term_cset[t], las, las_idx, las_len, gsm);
+
+        segmentHead* disc = NULL;
+        int32_t* row = ret + (size_t)t * classes_len;
+        for (uint32_t k = 0; k < classes_len; ++k) {
+            if (class_idx[k] >= las_len) {
+                row[k] = -1;
+                continue;
+            }
+            segment_subtract_to(&disc, las[class_idx[k]], term_las, gsm);
+            row[k] = segment_countItems(disc);
+        }
 
-char* BitarrayMap_getKey(pointer data) { return ((SegmentSetNode*)data)->key; }
+        generalSegmentManager_returnSegment(gsm, &disc);
+        generalSegmentManager_returnSegment(gsm, &term_las);
+    }
+}
+
+// CrossAll
 
-bool SegmentSet_contains(hashMap* map, segmentHead* segment)
+void segment_hashAll(uint64_t ret[], segmentHead* segments[], uint32_t segments_len)
 {
-    char* key = segment_to_str(segment);
-    SegmentSetNode* ret = (SegmentSetNode*)hashMap_get_masked(map, key);
-    return ret != NULL;
+    #pragma omp parallel for schedule(dynamic, 256)
+    for (uint32_t idx = 0; idx < segments_len; ++idx) {
+        ret[idx] = segment_hash(segments[idx]);
+    }
 }
 
-void SegmentSet_add(hashMap* map, segmentHead* segment)
+// Group equal segments with an open addressing hash table. Writes on ret_keep[] the index of the
+// first segment of every group, in order, and on ret_first[] the index of the first segment of the
+// group each segment belongs to. Returns the number of groups.
+static uint32_t segment_groupRepeated(
+    uint32_t ret_keep[], uint32_t ret_first[], segmentHead* segments[], uint32_t segments_len)
 {
-    char* key = segment_to_str(segment);
-    SegmentSetNode* node = (SegmentSetNode*)malloc(sizeof(SegmentSetNode));
-    node->key = key;
-    hashMap_map_masked(map, key, (pointer)node);
+    const uint32_t EMPTY = UINT32_MAX;
+
+    uint64_t* hashes = malloc(MAX(segments_len, 1) * sizeof(uint64_t));
+    segment_hashAll(hashes, segments, segments_len);
+
+    uint64_t table_len = 16;
+    while (table_len < 2 * (uint64_t)segments_len) table_len *= 2;
+    const uint64_t mask = table_len - 1;
+    uint32_t* table = malloc(table_len * sizeof(uint32_t));
+    memset(table, 0xFF, table_len * sizeof(uint32_t));
+
+    uint32_t keep_len = 0;
+    for (uint32_t idx = 0; idx < segments_len; ++idx) {
+        uint64_t slot = hashes[idx] & mask;
+        ret_first[idx] = idx;
+        while (table[slot] != EMPTY) {
+            uint32_t other = table[slot];
+            if (hashes[other] == hashes[idx] && segment_compareSegments(segments[other], segments[idx]) == 0) {
+                ret_first[idx] = other;
+                break;
+            }
+            slot = (slot + 1) & mask;
+        }
+        if (ret_first[idx] == idx) {
+            table[slot] = idx;
+            ret_keep[keep_len++] = idx;
+        }
+    }
+
+    free(table);
+    free(hashes);
+    return keep_len;
 }
 
-// ----------
+// Writes on ret_keep[] the indices of the segments that are not repeated, keeping the first of every
+// group of equal segments, and returns how many there are. The survivor of each group gets the
+// minimum epoch and the maximum gen of the group.
+uint32_t removeRepeatedSegments(
+    uint32_t ret_keep[], segmentHead* segments[], uint32_t segments_len, int64_t epoch[], int64_t gen[])
+{
+    uint32_t* first = malloc(MAX(segments_len, 1) * sizeof(uint32_t));
+    uint32_t keep_len = segment_groupRepeated(ret_keep, first, segments, segments_len);
+
+    for (uint32_t idx = 0; idx < segments_len; ++idx) {
+        uint32_t survivor = first[idx];
+        if (survivor != idx) {
+            epoch[survivor] = MIN(epoch[survivor], epoch[idx]);
+            gen[survivor] = MAX(gen[survivor], gen[idx]);
+        }
+    }
+
+    free(first);
+    return keep_len;
+}
 
 void get_repeated_atoms(segmentHead** ret_repeated, Atomization_s* atomization, generalSegmentManager* gsm)
 {
-    // build ucs
-    segmentWriter writer;
-    segmentHead** ucs_extended = calloc(atomization->len, sizeof(segmentHead*));
+    segmentHead** ucs = malloc(MAX(atomization->len, 1) * sizeof(segmentHead*));
     for (uint32_t at_idx = 0; at_idx < atomization->len; ++at_idx) {
-        segmentWriter_set(&writer, &ucs_extended[at_idx], gsm);
-        segmentWriter_cloneFrom(&writer, atomization->atoms[at_idx].ucs.constants);
+        ucs[at_idx] = atomization->atoms[at_idx].ucs.constants;
     }
+    uint32_t* keep = malloc(MAX(atomization->len, 1) * sizeof(uint32_t));
+    uint32_t* first = malloc(MAX(atomization->len, 1) * sizeof(uint32_t));
+    segment_groupRepeated(keep, first, ucs, atomization->len);
 
-    // new hasmap for storing atoms' ucs
-    hashMap* map = hashMap_new(NULL, 42, &BitarrayMap_getKey);
-
-    // Add all ucs to the map. Add index to output if ucs is already in map.
+    // Add index to output if ucs is already in a previous atom
     generalSegmentManager_returnSegment(gsm, ret_repeated);
     for (uint32_t at_idx = 0; at_idx < atomization->len; ++at_idx) {
-        if (!SegmentSet_contains(map, ucs_extended[at_idx])) {
-            SegmentSet_add(map, ucs_extended[at_idx]);
-        } else {
+        if (first[at_idx] != at_idx) {
             segment_addItem(ret_repeated, at_idx, gsm);
         }
     }
 
-    for (uint32_t at_idx = 0; at_idx < atomization->len; ++at_idx) {
-        generalSegmentManager_returnSegment(gsm, &ucs_extended[at_idx]);
+    free(first);
+    free(keep);
+    free(ucs);
+}
+
+// Redundancy
+
+// Return true if the items of 'segment' that are in constants[] are all in 'container'
+static bool segment_inSegmentOnConstants(
+    segmentHead* segment, segmentHead* container, uint32_t constants[], uint32_t constants_len)
+{
+    segmentReader reader;
+    segmentReader container_reader;
+    segmentReader_set(&reader, segment);
+    segmentReader_set(&container_reader, container);
+    bool pending = segmentReader_nextItem(&container_reader);
+    while (segmentReader_nextItem(&reader)) {
+        uint32_t item = segmentReader_currentItem(&reader);
+        if (array_index(constants, constants_len, item) == constants_len) continue;
+        while (pending && (uint32_t)segmentReader_currentItem(&container_reader) < item) {
+            pending = segmentReader_nextItem(&container_reader);
+        }
+        if (!pending || (uint32_t)segmentReader_currentItem(&container_reader) != item) return false;
     }
-    free(ucs_extended);
-    hashMap_delete(&map);
+    return true;
+}
+
+// A segment is redundant if it is the union of some of the kept segments. Candidates are the kept
+// segments that have no constant outside 'segment'. They are looked up in the lower atomic segment
+// of the constants of 'segment' (las[]) and in the kept segments with no constants (unbound).
+static bool segment_isRedundant(
+    segmentHead* segment, segmentHead* unbound, segmentHead* las[], uint32_t constants[], uint32_t constants_len,
+    segmentHead* segments[], generalSegmentManager* gsm)
+{
+    segmentHead* candidates = NULL;
+    segment_clone_to(&candidates, unbound, gsm);
+
+    segmentReader reader;
+    segmentReader_set(&reader, segment);
+    while (segmentReader_nextItem(&reader)) {
+        uint32_t c_idx = array_index(constants, constants_len, segmentReader_currentItem(&reader));
+        if (c_idx < constants_len && las[c_idx]) {
+            segment_add(&candidates, las[c_idx], gsm);
+        }
+    }
+
+    bool redundant = false;
+    if (candidates) {
+        segmentHead* rest = NULL;
+        segment_clone_to(&rest, segment, gsm);
+        segmentReader_set(&reader, candidates);
+        while (segmentReader_nextItem(&reader)) {
+            segmentHead* candidate = segments[segmentReader_currentItem(&reader)];
+            if (!segment_inSegmentOnConstants(candidate, segment, constants, constants_len)) continue;
+            segment_subtract(&rest, candidate, gsm);
+            if (!rest) {
+                redundant = true;
+                break;
+            }
+        }
+        generalSegmentManager_returnSegment(gsm, &rest);
+    }
+
+    generalSegmentManager_returnSegment(gsm, &candidates);
+    return redundant;
+}
+
+// Writes on ret_keep[] the indices of the segments that are not redundant and returns how many
+// there are. segments[] must be sorted by size. Segments are only checked against kept segments of
+// smaller size, so all segments of the same size are checked in parallel. The segments of the
+// smallest size and the ones flagged in checked[] are kept without checking.
+uint32_t removeRedundantSegments(
+    uint32_t ret_keep[], segmentHead* segments[], uint32_t segments_len, bool checked[], segmentHead* constants,
+    generalSegmentManager* gsm)
+{
+    uint32_t constants_len = segment_countItems(constants);
+    uint32_t* constants_arr = malloc(MAX(constants_len, 1) * sizeof(uint32_t));
+    as_array(constants, constants_arr);
+
+    // las[c_idx] holds the indices of the kept segments that contain constants_arr[c_idx]
+    segmentHead** las = calloc(MAX(constants_len, 1), sizeof(segmentHead*));
+    segmentHead* unbound = NULL;
+
+    uint32_t* sizes = malloc(MAX(segments_len, 1) * sizeof(uint32_t));
+    bool* survives = malloc(MAX(segments_len, 1) * sizeof(bool));
+
+    #pragma omp parallel for schedule(dynamic, 256)
+    for (uint32_t idx = 0; idx < segments_len; ++idx) {
+        sizes[idx] = segment_countItems(segments[idx]);
+    }
+
+    uint32_t keep_len = 0;
+    uint32_t beg = 0;
+    while (beg < segments_len) {
+        uint32_t end = beg + 1;
+        while (end < segments_len && sizes[end] == sizes[beg]) ++end;
+        IF_THEN_ABORT(end < segments_len && sizes[end] < sizes[beg], "removeRedundantSegments, segments not sorted");
+
+        #pragma omp parallel for schedule(dynamic, 16)
+        for (uint32_t idx = beg; idx < end; ++idx) {
+            survives[idx] = beg == 0 || checked[idx]
+                         || !segment_isRedundant(segments[idx], unbound, las, constants_arr, constants_len, segments, gsm);
+        }
+
+        for (uint32_t idx = beg; idx < end; ++idx) {
+            if (!survives[idx]) continue;
+            ret_keep[keep_len++] = idx;
+            bool bound = false;
+            segmentReader reader;
+            segmentReader_set(&reader, segments[idx]);
+            while (segmentReader_nextItem(&reader)) {
+                uint32_t c_idx = array_index(constants_arr, constants_len, segmentReader_currentItem(&reader));
+                if (c_idx < constants_len) {
+                    segment_addItem(&las[c_idx], idx, gsm);
+                    bound = true;
+                }
+            }
+            if (!bound) segment_addItem(&unbound, idx, gsm);
+        }
+
+        beg = end;
+    }
+
+    for (uint32_t c_idx = 0; c_idx < constants_len; ++c_idx) {
+        generalSegmentManager_returnSegment(gsm, &las[c_idx]);
+    }
+    generalSegmentManager_returnSegment(gsm, &unbound);
+    free(survives);
+    free(sizes);
+    free(las);
+    free(constants_arr);
+    return keep_len;
 }
 
 int sort_by_id(const void* at1, const void* at2) { return (int)((Atom_s*)at1)->ID - (int)((Atom_s*)at2)->ID; }
@@ -810,8 +1924,7 @@ void Atomization_s_remove_atoms(Atomization_s* atomization, segmentHead* atoms_t
     while (segmentReader_nextItem(&reader)) {
         uint32_t at_idx = segmentReader_currentItem(&reader);
         // cleanup
-        generalSegmentManager_returnSegment(gsm, &atomization->atoms[at_idx].ucs.constants);
-        generalSegmentManager_returnSegment(gsm, &atomization->atoms[at_idx].trace);
+        Atom_s_release(&atomization->atoms[at_idx], gsm);
 
         if (prev_at_idx == 0) {
             i = at_idx;
@@ -1128,6 +2241,7 @@ Atom_s atom_union(Atom_s* atomA, Atom_s* atomB, uint32_t epoch, generalSegmentMa
     atom.gen = atomA->gen > atomB->gen ? atomA->gen : atomB->gen;
     atom.G = atomA->G + 1 > atomB->G ? atomA->G + 1 : atomB->G;
     atom.epoch = epoch;
+    atom.origin = NEW_ATOM;
 
     return atom;
 }
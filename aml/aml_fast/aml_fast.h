@@ -51,8 +51,11 @@ typedef struct Atom_s {
     uint32_t G;
     uint32_t gen;
     uint32_t ID;
+    uint32_t origin;  // index in the linked atomization, NEW_ATOM if created in C
 } Atom_s;
 
+#define NEW_ATOM UINT32_MAX
+
 typedef struct Atomization_s {
     Atom_s* atoms;
     uint32_t len;
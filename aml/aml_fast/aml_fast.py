@@ -3,21 +3,28 @@
 
 from .amlCompiledLibrary import ffi
 from .amlCompiledLibrary import lib as caml
-from .amlFastBitarrays import bitarray
+from .amlFastBitarrays import bitarray, BitarrayVector
 import functools
-import time
 import random
+import numpy as np
 
 from .. import amlset
 from ..io import logDebug, logInfo, logWarn, logError, logCrit
 from .. import config
 from .. import core as sc
+from .. import profiling
 
 
 def runCompiled(fast=True):
     def outer(func):
         @functools.wraps(func)
         def inner(*args, **kwargs):
+            if profiling.isEnabled():
+                with profiling.stage(func.__name__):
+                    return dispatch(*args, **kwargs)
+            return dispatch(*args, **kwargs)
+
+        def dispatch(*args, **kwargs):
             if fast and getattr(config.compiledFunc, func.__name__):
                 return __func_dict[func.__name__](*args, **kwargs)
             else:
@@ -28,6 +35,84 @@ def runCompiled(fast=True):
     return outer
 
 
+class TracerStore:
+    """
+    Long-lived C-side view of the indicators of a tracer, kept in
+    'tracer.store' and shared by the compiled functions, so that the
+    indicators are not marshalled again on every call. Indicators are linked
+    by handle and in-place updates are seen from C; the view is rebuilt when
+    the lists of indicators are replaced or their version changes, see
+    core.IndicatorList. As with TraceHelper, the ucs of the pinning atoms
+    must not be modified while the view is in use.
+    """
+
+    def __init__(self, tracer):
+        self.key = TracerStore.keyOf(tracer)
+
+        if not tracer.indicators:
+            self.indicators = []
+            tr_ind_constants_ptr = []
+        elif isinstance(tracer.indicators[0], set):
+            # Copies, the view cannot follow changes to the sets
+            self.indicators = [bitarray(ind) for ind in tracer.indicators]
+            tr_ind_constants_ptr = [b._segment_handle for b in self.indicators]
+            self.key = None
+        elif isinstance(tracer.indicators[0], bitarray):
+            self.indicators = tracer.indicators
+            tr_ind_constants_ptr = [ind._segment_handle for ind in self.indicators]
+        else:
+            raise TypeError("Indicators must be of type 'set' or 'LCSegment'")
+
+        self.atomIndicators = tracer.atomIndicators
+        if not tracer.atomIndicators:
+            self.atomIndicators_ucs = []
+            tr_atind_constants_ptr = []
+        elif isinstance(tracer.atomIndicators[0].ucs, set):
+            self.atomIndicators_ucs = [bitarray(atind.ucs) for atind in tracer.atomIndicators]  # fmt:skip
+            tr_atind_constants_ptr = [b._segment_handle[0] for b in self.atomIndicators_ucs]  # fmt:skip
+            self.key = None
+        elif isinstance(tracer.atomIndicators[0].ucs, bitarray):
+            self.atomIndicators_ucs = [atind.ucs for atind in tracer.atomIndicators]
+            tr_atind_constants_ptr = [ucs._segment_handle[0] for ucs in self.atomIndicators_ucs]  # fmt:skip
+        else:
+            raise TypeError("Indicators must be of type 'set' or 'UCSegment'")
+
+        self.pointer = caml.linkTracer(
+            len(tracer.indicators),
+            tr_ind_constants_ptr,
+            len(tracer.atomIndicators),
+            tr_atind_constants_ptr,
+        )
+
+    def __del__(self):
+        caml.unlinkTracer(self.pointer)
+
+    @staticmethod
+    def keyOf(tracer):
+        # The lists are referenced by the store, so their ids are not reused.
+        # Lists without a version cannot be followed and are linked again.
+        indicators = tracer.indicators
+        atomIndicators = tracer.atomIndicators
+        if not hasattr(indicators, "version") or not hasattr(atomIndicators, "version"):
+            return None
+        return (
+            id(indicators),
+            indicators.version,
+            id(atomIndicators),
+            atomIndicators.version,
+        )
+
+
+def linkedTracer(tracer):
+    """Return the TracerStore of 'tracer', rebuilt if the indicators changed"""
+
+    store = tracer.store
+    if store is None or store.key is None or store.key != TracerStore.keyOf(tracer):
+        store = TracerStore(tracer)
+        tracer.store = store
+    return store
+
+
 # Functions
 
 
@@ -37,89 +122,77 @@ def freeTraceAll(space, tracer):
 
     logInfo("Calculating free traces")
 
-    timing_start = time.time_ns()
+    # Free traces stored in the pool for this layout are reused. The rest are
+    # patched from the layout most of them were stored in, or recomputed.
+    pool = space.pool
+    layout = tracer.layout()
+    elements = []
+    for wt in space.elements:
+        ft = pool.cached("freeTrace", wt.ID, (layout,))
+        if ft is None:
+            elements.append(wt)
+        else:
+            wt.freeTrace = ft
+            wt.freeTrace_ba = bitarray(ft) if amlset == set else ft
+
+    stored = [pool.patchable("freeTrace", wt.ID, tracer) for wt in elements]
+    old = tracer.commonLayout(st[1].period for st in stored if st is not None)
+    if old is None:
+        remap = np.empty([0], dtype=np.int32)
+    else:
+        remap, _ = layout.remapFrom(old)
 
     ### ATTENTION: This block cannot be extracted.
     ### If in a function, Python garbage collects pointers before they're used
-    if not space.elements:
+    if not elements:
         sp_cset_constants = []
         sp_cset_constants_ptr = []
-    elif isinstance(space.elements[0].cset, set):
-        sp_cset_constants = [bitarray(wt.cset) for wt in space.elements]
+    elif isinstance(elements[0].cset, set):
+        sp_cset_constants = [bitarray(wt.cset) for wt in elements]
         sp_cset_constants_ptr = [b._segment_handle[0] for b in sp_cset_constants]
-    elif isinstance(space.elements[0].cset, bitarray):
-        sp_cset_constants_ptr = [wt.cset._segment_handle[0] for wt in space.elements]
+    elif isinstance(elements[0].cset, bitarray):
+        sp_cset_constants_ptr = [wt.cset._segment_handle[0] for wt in elements]
     else:
         raise TypeError("Must be of type 'set' or 'LCSegment'")
 
-    sp_ftrace = [bitarray() for wt in space.elements]
-    sp_ftrace_ptr = [b._segment_handle for b in sp_ftrace]
-    sp_trace = [bitarray() for wt in space.elements]
-    sp_trace_ptr = [b._segment_handle for b in sp_trace]
+    old_traces = [None if st is None or st[1] is not old else st[0] for st in stored]
+    old_traces = [bitarray(t) if isinstance(t, set) else t for t in old_traces]
+    old_traces_ptr = [ffi.NULL if t is None else t._segment_handle[0] for t in old_traces]
+    ###
 
-    ### ATTENTION: This block cannot be extracted.
-    ### If in a function, Python garbage collects pointers before they're used
-    if not tracer.indicators:
-        tr_ind_constants = []
-        tr_ind_constants_ptr = []
-    elif isinstance(tracer.indicators[0], set):
-        tr_ind_constants = [bitarray(ind) for ind in tracer.indicators]
-        tr_ind_constants_ptr = [b._segment_handle for b in tr_ind_constants]
-    elif isinstance(tracer.indicators[0], bitarray):
-        tr_ind_constants_ptr = [ind._segment_handle for ind in tracer.indicators]
-    else:
-        raise TypeError("Must be of type 'set' or 'LCSegment'")
-
-    if not tracer.atomIndicators:
-        tr_atind_constants = []
-        tr_atind_constants_ptr = []
-    elif isinstance(tracer.atomIndicators[0].ucs, set):
-        tr_atind_constants = [bitarray(atind.ucs) for atind in tracer.atomIndicators]
-        tr_atind_constants_ptr = [b._segment_handle[0] for b in tr_atind_constants]
-    elif isinstance(tracer.atomIndicators[0].ucs, bitarray):
-        tr_atind_constants_ptr = [atind.ucs._segment_handle[0] for atind in tracer.atomIndicators]  # fmt:skip
-    else:
-        raise TypeError("Must be of type 'set' or 'UCSegment'")
+    sp_ftrace = bitarray.bulk_new(len(elements))
+    sp_ftrace_ptr = sp_ftrace.handles
+    sp_trace = bitarray.bulk_new(len(elements))
+    sp_trace_ptr = sp_trace.handles
 
     space_ptr = caml.linkSpace(
-        len(space.elements),
+        len(elements),
         sp_cset_constants_ptr,
         sp_ftrace_ptr,
         sp_trace_ptr,
     )
-    tracer_ptr = caml.linkTracer(
-        len(tracer.indicators),
-        tr_ind_constants_ptr,
-        len(tracer.atomIndicators),
-        tr_atind_constants_ptr,
-    )
-
-    timing_prev = time.time_ns()
-    caml.freeTraceAll(
-        space_ptr,
-        tracer_ptr,
-        bitarray.gsm,
-    )
-    timing_post = time.time_ns()
+    tracer_ptr = linkedTracer(tracer).pointer
+
+    with profiling.native():
+        caml.freeTraceAll(
+            space_ptr,
+            tracer_ptr,
+            old_traces_ptr,
+            ffi.cast("int32_t *", remap.ctypes.data),
+            len(remap),
+            bitarray.gsm,
+        )
 
-    for wt, ft in zip(space.elements, sp_ftrace):
+    for wt, ft in zip(elements, sp_ftrace.release()):
         wt.freeTrace_ba = ft
         if amlset == set:
             wt.freeTrace = set(ft)
         elif amlset == bitarray:
             wt.freeTrace = ft
+        pool.store("freeTrace", wt.ID, (layout,), wt.freeTrace)
 
-    caml.unlinkTracer(tracer_ptr)
     caml.unlinkSpace(space_ptr)
 
-    timing_end = time.time_ns()
-    timing_res_total = (timing_end - timing_start) / 1000_000_000
-    timing_res_c = (timing_post - timing_prev) / 1000_000_000
-    timing_res_faff = timing_res_total - timing_res_c
-    logDebug(
-        f"- ({timing_res_total:.3f}s : c {timing_res_c:.3f}s - py {timing_res_faff:.3f}s)"
-    )
-
 
 def traceAll(space, tracer, atomization):
     if bool(tracer.discardedIndicators):
@@ -127,8 +200,6 @@ def traceAll(space, tracer, atomization):
 
     logInfo("Calculating traces")
 
-    timing_start = time.time_ns()
-
     ### ATTENTION: This block cannot be extracted.
     ### If in a function, Python garbage collects pointers before they're used
     if not space.elements:
@@ -142,34 +213,10 @@ def traceAll(space, tracer, atomization):
     else:
         raise TypeError("Must be of type 'set' or 'LCSegment'")
 
-    sp_ftrace = [bitarray() for wt in space.elements]
-    sp_ftrace_ptr = [b._segment_handle for b in sp_ftrace]
-    sp_trace = [bitarray() for wt in space.elements]
-    sp_trace_ptr = [b._segment_handle for b in sp_trace]
-
-    ### ATTENTION: This block cannot be extracted.
-    ### If in a function, Python garbage collects pointers before they're used
-    if not tracer.indicators:
-        tr_ind_constants = []
-        tr_ind_constants_ptr = []
-    elif isinstance(tracer.indicators[0], set):
-        tr_ind_constants = [bitarray(ind) for ind in tracer.indicators]
-        tr_ind_constants_ptr = [b._segment_handle for b in tr_ind_constants]
-    elif isinstance(tracer.indicators[0], bitarray):
-        tr_ind_constants_ptr = [ind._segment_handle for ind in tracer.indicators]
-    else:
-        raise TypeError("Must be of type 'set' or 'LCSegment'")
-
-    if not tracer.atomIndicators:
-        tr_atind_constants = []
-        tr_atind_constants_ptr = []
-    elif isinstance(tracer.atomIndicators[0].ucs, set):
-        tr_atind_constants = [bitarray(atind.ucs) for atind in tracer.atomIndicators]
-        tr_atind_constants_ptr = [b._segment_handle[0] for b in tr_atind_constants]
-    elif isinstance(tracer.atomIndicators[0].ucs, bitarray):
-        tr_atind_constants_ptr = [atind.ucs._segment_handle[0] for atind in tracer.atomIndicators]  # fmt:skip
-    else:
-        raise TypeError("Must be of type 'set' or 'UCSegment'")
+    sp_ftrace = bitarray.bulk_new(len(space.elements))
+    sp_ftrace_ptr = sp_ftrace.handles
+    sp_trace = bitarray.bulk_new(len(space.elements))
+    sp_trace_ptr = sp_trace.handles
 
     ### ATTENTION: This block cannot be extracted.
     ### If in a function, Python garbage collects pointers before they're used
@@ -184,8 +231,27 @@ def traceAll(space, tracer, atomization):
     else:
         raise TypeError("Must be of type 'set' or 'UCSegment'")
 
-    atomization_trace = [bitarray() for at in atomization]
-    atomization_trace_ptr = [b._segment_handle for b in atomization_trace]
+    atomization_trace = bitarray.bulk_new(len(atomization))
+    atomization_trace_ptr = atomization_trace.handles
+
+    # Traces stored in the layout most of them share are patched, the rest
+    # recomputed
+    layout = tracer.layout()
+    old = tracer.commonLayout(at.trace[1] for at in atomization if at.trace is not None)
+    if old is None:
+        remap = np.empty([0], dtype=np.int32)
+    else:
+        remap, _ = layout.remapFrom(old)
+
+    ### ATTENTION: This block cannot be extracted.
+    ### If in a function, Python garbage collects pointers before they're used
+    old_traces = [
+        at.trace[0] if old is not None and at.trace is not None and at.trace[1] == old.period else None
+        for at in atomization
+    ]
+    old_traces = [bitarray(t) if isinstance(t, set) else t for t in old_traces]
+    old_traces_ptr = [ffi.NULL if t is None else t._segment_handle[0] for t in old_traces]
+    ###
 
     space_ptr = caml.linkSpace(
         len(space.elements),
@@ -193,26 +259,27 @@ def traceAll(space, tracer, atomization):
         sp_ftrace_ptr,
         sp_trace_ptr,
     )
-    tracer_ptr = caml.linkTracer(
-        len(tracer.indicators),
-        tr_ind_constants_ptr,
-        len(tracer.atomIndicators),
-        tr_atind_constants_ptr,
-    )
+    tracer_ptr = linkedTracer(tracer).pointer
     atomization_ptr = caml.linkAtomization(
         len(atomization),
         atomization_at_ucs_constants_ptr,
         atomization_trace_ptr,
     )
 
-    timing_prev = time.time_ns()
-    caml.traceAll(
-        space_ptr,
-        tracer_ptr,
-        atomization_ptr,
-        bitarray.gsm,
-    )
-    timing_post = time.time_ns()
+    with profiling.native():
+        ok = caml.traceAll(
+            space_ptr,
+            tracer_ptr,
+            atomization_ptr,
+            old_traces_ptr,
+            ffi.cast("int32_t *", remap.ctypes.data),
+            len(remap),
+            bitarray.gsm,
+        )
+    if not ok:
+        caml.unlinkAtomization(atomization_ptr)
+        caml.unlinkSpace(space_ptr)
+        raise MemoryError("traceAll could not allocate the traces of the constants")
 
     if amlset == set:
         for wt, tr in zip(space.elements, sp_trace):
@@ -220,24 +287,14 @@ def traceAll(space, tracer, atomization):
         for at, tr in zip(atomization, atomization_trace):
             at.trace = [set(tr), tracer.period]
     else:
-        for wt, tr in zip(space.elements, sp_trace):
+        for wt, tr in zip(space.elements, sp_trace.release()):
             wt.trace = tr
-        for at, tr in zip(atomization, atomization_trace):
+        for at, tr in zip(atomization, atomization_trace.release()):
             at.trace = [tr, tracer.period]
 
     caml.unlinkAtomization(atomization_ptr)
-    caml.unlinkTracer(tracer_ptr)
     caml.unlinkSpace(space_ptr)
 
-    timing_end = time.time_ns()
-    timing_res_total = (timing_end - timing_start) / 1000_000_000
-    timing_res_c = (timing_post - timing_prev) / 1000_000_000
-    timing_res_faff = timing_res_total - timing_res_c
-
-    logDebug(
-        f"> ({timing_res_total:.3f}s : c {timing_res_c:.3f}s - py {timing_res_faff:.3f}s)"
-    )
-
 
 def storeTracesOfConstants(tracer, constants, atomization):
     if bool(tracer.discardedIndicators):
@@ -269,63 +326,82 @@ def storeTracesOfConstants(tracer, constants, atomization):
         atomization_trace_ptr,
     )
 
-    traces = [bitarray() for c in constants]
-    traces_ptr = [b._segment_handle for b in traces]
+    traces = bitarray.bulk_new(len(constants))
+    traces_ptr = traces.handles
 
     if isinstance(sc.LCSegment([0]), amlset):
         raw_constants = list(constants)
     else:
         raise TypeError("Must be of type 'set' or 'CSegment'")
 
-    caml.storeTracesOfConstants(
-        traces_ptr,
-        len(tracer.indicators) + len(tracer.atomIndicators),
-        len(raw_constants),
-        raw_constants,
-        atomization_ptr,
-        bitarray.gsm,
-    )
+    with profiling.native():
+        ok = caml.storeTracesOfConstants(
+            traces_ptr,
+            len(tracer.indicators) + len(tracer.atomIndicators),
+            len(raw_constants),
+            raw_constants,
+            atomization_ptr,
+            bitarray.gsm,
+        )
+    if not ok:
+        caml.unlinkAtomization(atomization_ptr)
+        raise MemoryError("storeTracesOfConstants could not allocate the traces of the constants")
 
     if amlset == set:
         for c, t in zip(raw_constants, traces):
             tracer.constToStoredTraces[c] = [set(t), tracer.period]
     else:
-        for c, t in zip(raw_constants, traces):
+        for c, t in zip(raw_constants, traces.release()):
             tracer.constToStoredTraces[c] = [t, tracer.period]
 
     caml.unlinkAtomization(atomization_ptr)
 
 
+def batchTermPointers(batch):
+    """
+    Segments of the terms used by the DupleBatch 'batch' and an array with
+    their addresses, indexed by term ID in the pool of the batch. Fancy
+    indexing the array with the L and R columns gives the pointer arrays of
+    the compiled routines without a Python loop over the duples. The
+    segments must be kept alive while the addresses are in use.
+    """
+
+    ids = batch.termIds()
+    if amlset == set:
+        terms = [bitarray(batch.terms[tid]) for tid in ids]
+    else:
+        terms = [batch.terms[tid] for tid in ids]
+    addresses = np.zeros(len(batch.terms), dtype=np.uintp)
+    addresses[ids] = [int(ffi.cast("uintptr_t", t._segment_handle[0])) for t in terms]
+    return terms, addresses
+
+
+def batchFreeTracePointers(batch):
+    """
+    Addresses of the free traces of the elements of 'batch.space' for the
+    terms used by the DupleBatch 'batch', indexed by term ID. The segments
+    are kept alive by the elements.
+    """
+
+    addresses = np.zeros(len(batch.terms), dtype=np.uintp)
+    for tid in batch.termIds().tolist():
+        freeTrace = batch.space.element(tid).freeTrace_ba
+        addresses[tid] = int(ffi.cast("uintptr_t", freeTrace._segment_handle[0]))
+    return addresses
+
+
 def considerPositiveDuples(tracer, pduples):
     tracer.period += 1
-    #### ATTENTION: This block cannot be extracted.
-    #### If in a function, Python garbage collects pointers before they're used
-    if not tracer.indicators:
-        tr_ind_constants = []
-        tr_ind_constants_ptr = []
-    elif isinstance(tracer.indicators[0], set):
-        tr_ind_constants = [bitarray(ind) for ind in tracer.indicators]
-        tr_ind_constants_ptr = [b._segment_handle for b in tr_ind_constants]
-    elif isinstance(tracer.indicators[0], bitarray):
-        tr_ind_constants_ptr = [ind._segment_handle for ind in tracer.indicators]
-    else:
-        raise TypeError("Indicators must be of type 'set' or 'LCSegment'")
-
-    if not tracer.atomIndicators:
-        tr_atind_constants = []
-        tr_atind_constants_ptr = []
-    elif isinstance(tracer.atomIndicators[0].ucs, set):
-        tr_atind_constants = [bitarray(atind.ucs) for atind in tracer.atomIndicators]
-        tr_atind_constants_ptr = [b._segment_handle[0] for b in tr_atind_constants]
-    elif isinstance(tracer.atomIndicators[0].ucs, bitarray):
-        tr_atind_constants_ptr = [atind.ucs._segment_handle[0] for atind in tracer.atomIndicators]  # fmt:skip
-    else:
-        raise TypeError("Indicators must be of type 'set' or 'UCSegment'")
-
     #### ATTENTION: This block cannot be extracted.
     #### If in a function, Python garbage collects pointers before they're used
     pduples = pduples
-    if not pduples:
+    if isinstance(pduples, sc.DupleBatch):
+        rels_terms, rels_addresses = batchTermPointers(pduples)
+        rels_L_lcs_constants = rels_addresses[pduples.L]
+        rels_L_lcs_constants_ptr = ffi.cast("void **", rels_L_lcs_constants.ctypes.data)
+        rels_H_lcs_constants = rels_addresses[pduples.R]
+        rels_H_lcs_constants_ptr = ffi.cast("void **", rels_H_lcs_constants.ctypes.data)
+    elif not pduples:
         rels_L_lcs_constants = []
         rels_L_lcs_constants_ptr = []
         rels_H_lcs_constants = []
@@ -341,14 +417,13 @@ def considerPositiveDuples(tracer, pduples):
     else:
         raise TypeError("Terms must be of type 'set' or 'LCSegment'")
 
-    duples_hyp = [rel.hypothesis for rel in pduples]
+    if isinstance(pduples, sc.DupleBatch):
+        duples_hyp_column = pduples.hypothesis.astype(np.intc)
+        duples_hyp = ffi.cast("int *", duples_hyp_column.ctypes.data)
+    else:
+        duples_hyp = [rel.hypothesis for rel in pduples]
 
-    tracer_ptr = caml.linkTracer(
-        len(tracer.indicators),
-        tr_ind_constants_ptr,
-        len(tracer.atomIndicators),
-        tr_atind_constants_ptr,
-    )
+    store = linkedTracer(tracer)
     rel_ptr = caml.linkDuple(
         len(pduples),
         rels_L_lcs_constants_ptr,
@@ -357,28 +432,29 @@ def considerPositiveDuples(tracer, pduples):
     )
     ###
 
-    caml.considerPositiveDuples(
-        tracer_ptr,
-        rel_ptr,
-        bitarray.gsm,
-    )
+    with profiling.native():
+        caml.considerPositiveDuples(
+            store.pointer,
+            rel_ptr,
+            bitarray.gsm,
+        )
 
     ## Update tracer indicators
     if tracer.indicators:  # if emtpy, skip this block
         if amlset == set:
             if isinstance(tracer.indicators[0], set):
-                for idx, ind_new in enumerate(tr_ind_constants):  # fmt:skip
+                for idx, ind_new in enumerate(store.indicators):  # fmt:skip
                     tracer.indicators[idx] = ind_new
             else:
                 raise TypeError("Indicators must be of type 'set' or 'LCSegment'")
         if amlset == bitarray:
             if isinstance(tracer.indicators[0], bitarray):
-                pass
+                for ind in tracer.indicators:
+                    ind._hash = None
             else:
                 raise TypeError("Indicators must be of type 'set' or 'LCSegment'")
 
     caml.unlinkDuple(rel_ptr)
-    caml.unlinkTracer(tracer_ptr)
 
 
 def simplifyFromConstants(tracer, constants, atoms, generation):
@@ -433,18 +509,19 @@ def simplifyFromConstants(tracer, constants, atoms, generation):
         b_at_traces = [tracer.getTraceOfAtom(at) for at in atoms]
         b_at_traces_ptr = [b._segment_handle[0] for b in b_at_traces]
 
-    caml.simplifyFromConstants_inner_loop(
-        selectedIds_ptr,
-        len(constantList),
-        b_las_ptr,
-        b_tD_ptr,
-        b_constToStoredTraces_ptr,
-        len(atoms),
-        b_at_traces_ptr,
-        tracer.numIndicators(),
-        random.randint(0, 4_294_967_295),
-        bitarray.gsm,
-    )
+    with profiling.native():
+        caml.simplifyFromConstants_inner_loop(
+            selectedIds_ptr,
+            len(constantList),
+            b_las_ptr,
+            b_tD_ptr,
+            b_constToStoredTraces_ptr,
+            len(atoms),
+            b_at_traces_ptr,
+            tracer.numIndicators(),
+            random.randint(0, 4_294_967_295),
+            bitarray.gsm,
+        )
 
     selected = []
     for x in selectedIds:
@@ -486,8 +563,8 @@ def updateUnionModelWithSetOfPduples(embedder, pDuples):
         raise TypeError("Must be of type 'set' or 'UCSegment'")
 
     # trace is not used, we just need an empty bitarray
-    unionModel_trace = [bitarray() for at in embedder.unionModel]
-    unionModel_trace_ptr = [b._segment_handle for b in unionModel_trace]
+    unionModel_trace = bitarray.bulk_new(len(embedder.unionModel))
+    unionModel_trace_ptr = unionModel_trace.handles
 
     unionModel_ptr = caml.linkAtomization(
         len(embedder.unionModel),
@@ -495,10 +572,14 @@ def updateUnionModelWithSetOfPduples(embedder, pDuples):
         unionModel_trace_ptr,
     )
 
-    # pduples = pDuples
-    pDuplesSorted = pDuples.copy()
-    pDuplesSorted.sort(key=lambda r: r.lastUnionUpdate)
-    if not pDuplesSorted:
+    pDuplesSorted = sc.sortedByUnionUpdate(pDuples)
+    if isinstance(pDuplesSorted, sc.DupleBatch):
+        rels_terms, rels_addresses = batchTermPointers(pDuplesSorted)
+        rels_L_lcs_constants = rels_addresses[pDuplesSorted.L]
+        rels_L_lcs_constants_ptr = ffi.cast("void **", rels_L_lcs_constants.ctypes.data)
+        rels_H_lcs_constants = rels_addresses[pDuplesSorted.R]
+        rels_H_lcs_constants_ptr = ffi.cast("void **", rels_H_lcs_constants.ctypes.data)
+    elif not pDuplesSorted:
         rels_L_lcs_constants = []
         rels_L_lcs_constants_ptr = []
         rels_H_lcs_constants = []
@@ -514,7 +595,14 @@ def updateUnionModelWithSetOfPduples(embedder, pDuples):
     else:
         raise TypeError("Terms must be of type 'set' or 'LCSegment'")
 
-    duples_hyp = [rel.hypothesis for rel in pDuplesSorted]
+    if isinstance(pDuplesSorted, sc.DupleBatch):
+        duples_hyp_column = pDuplesSorted.hypothesis.astype(np.intc)
+        duples_hyp = ffi.cast("int *", duples_hyp_column.ctypes.data)
+        lastUnionUpdate_column = pDuplesSorted.lastUnionUpdate
+        lastUnionUpdate = ffi.cast("int64_t *", lastUnionUpdate_column.ctypes.data)
+    else:
+        duples_hyp = [rel.hypothesis for rel in pDuplesSorted]
+        lastUnionUpdate = [r.lastUnionUpdate for r in pDuplesSorted]
 
     rel_ptr = caml.linkDuple(
         len(pDuplesSorted),
@@ -524,18 +612,18 @@ def updateUnionModelWithSetOfPduples(embedder, pDuples):
     )
 
     unionUpdateEntrance = [at.unionUpdateEntrance for at in embedder.unionModel]
-    lastUnionUpdate = [r.lastUnionUpdate for r in pDuplesSorted]
-
-    caml.updateUnionModelWithSetOfPduples(
-        atoms_to_keep_ptr,
-        atoms_deleted_ptr,
-        exclude_from_pinningterm_ptr,
-        unionModel_ptr,
-        rel_ptr,
-        unionUpdateEntrance,
-        lastUnionUpdate,
-        bitarray.gsm,
-    )
+
+    with profiling.native():
+        caml.updateUnionModelWithSetOfPduples(
+            atoms_to_keep_ptr,
+            atoms_deleted_ptr,
+            exclude_from_pinningterm_ptr,
+            unionModel_ptr,
+            rel_ptr,
+            unionUpdateEntrance,
+            lastUnionUpdate,
+            bitarray.gsm,
+        )
 
     caml.unlinkDuple(rel_ptr)
     caml.unlinkAtomization(unionModel_ptr)
@@ -552,9 +640,7 @@ def updateUnionModelWithSetOfPduples(embedder, pDuples):
     for idx in exclude_from_pinningterm:
         excluseFromPinning.append(embedder.unionModel[idx])
 
-    for r in pDuples:
-        if not r.hypothesis:
-            r.lastUnionUpdate = embedder.vars.unionUpdates
+    sc.setLastUnionUpdate(pDuples, embedder.vars.unionUpdates)
 
     if len(take) + len(deleted) + len(excluseFromPinning) != len(embedder.unionModel):  # fmt:skip
         raise ValueError("updateUnionModelWithSetOfPduples count failed")
@@ -565,8 +651,8 @@ def updateUnionModelWithSetOfPduples(embedder, pDuples):
 
 
 def calculateLowerAtomicSegments(space, atoms, las):
-    element_las = [bitarray() for el in space.elements]
-    element_las_ptr = [b._segment_handle for b in element_las]
+    element_las = bitarray.bulk_new(len(space.elements))
+    element_las_ptr = element_las.handles
     if amlset == set:
         element_cset = [bitarray(el.cset) for el in space.elements]
         element_cset_ptr = [b._segment_handle[0] for b in element_cset]
@@ -581,22 +667,133 @@ def calculateLowerAtomicSegments(space, atoms, las):
         las_value.append(bitarray(las[k]))
         las_value_ptr.append(las_value[-1]._segment_handle[0])
 
-    caml.calculateLowerAtomicSegments(
-        element_las_ptr,
-        element_cset_ptr,
-        len(space.elements),
-        las_value_ptr,
-        las_idx,
-        len(las),
-        bitarray.gsm,
-    )
+    with profiling.native():
+        caml.calculateLowerAtomicSegments(
+            element_las_ptr,
+            element_cset_ptr,
+            len(space.elements),
+            las_value_ptr,
+            las_idx,
+            len(las),
+            bitarray.gsm,
+        )
 
     if amlset == set:
         for idx, el in enumerate(space.elements):
             el.las = set(element_las[idx])
     else:
-        for idx, el in enumerate(space.elements):
-            el.las = element_las[idx]
+        for el, elLas in zip(space.elements, element_las.release()):
+            el.las = elLas
+
+
+def duplesDiscriminantSizes(las, duples):
+    duples_len = len(duples)
+
+    ### ATTENTION: This block cannot be extracted.
+    ### If in a function, Python garbage collects pointers before they're used
+    if isinstance(duples, sc.DupleBatch):
+        duples_terms, duples_addresses = batchTermPointers(duples)
+        duples_L = duples_addresses[duples.L]
+        duples_R = duples_addresses[duples.R]
+        duples_L_ptr = ffi.cast("void **", duples_L.ctypes.data)
+        duples_R_ptr = ffi.cast("void **", duples_R.ctypes.data)
+    elif amlset == set:
+        duples_L = [bitarray(r.L) for r in duples]
+        duples_R = [bitarray(r.R) for r in duples]
+        duples_L_ptr = [b._segment_handle[0] for b in duples_L]
+        duples_R_ptr = [b._segment_handle[0] for b in duples_R]
+    else:
+        duples_L_ptr = [r.L._segment_handle[0] for r in duples]
+        duples_R_ptr = [r.R._segment_handle[0] for r in duples]
+
+    las_idx = sorted(las.keys())
+    if amlset == set:
+        las_value = [bitarray(las[k]) for k in las_idx]
+        las_value_ptr = [b._segment_handle[0] for b in las_value]
+    else:
+        las_value_ptr = [las[k]._segment_handle[0] for k in las_idx]
+    ###
+
+    discSizes = np.empty([duples_len], dtype=np.uint32)
+    lasSizes = np.empty([duples_len], dtype=np.uint32)
+
+    with profiling.native():
+        caml.duplesDiscriminantSizes(
+            ffi.cast("uint32_t *", discSizes.ctypes.data),
+            ffi.cast("uint32_t *", lasSizes.ctypes.data),
+            duples_L_ptr,
+            duples_R_ptr,
+            duples_len,
+            las_value_ptr,
+            las_idx,
+            len(las_idx),
+            bitarray.gsm,
+        )
+
+    return discSizes.tolist(), lasSizes.tolist()
+
+
+def duplesPendingDiscriminants(las, atoms, duples, pending):
+    duples_len = len(duples)
+
+    ### ATTENTION: This block cannot be extracted.
+    ### If in a function, Python garbage collects pointers before they're used
+    if isinstance(duples, sc.DupleBatch):
+        duples_terms, duples_addresses = batchTermPointers(duples)
+        duples_L = duples_addresses[duples.L]
+        duples_R = duples_addresses[duples.R]
+        duples_L_ptr = ffi.cast("void **", duples_L.ctypes.data)
+        duples_R_ptr = ffi.cast("void **", duples_R.ctypes.data)
+    elif amlset == set:
+        duples_L = [bitarray(r.L) for r in duples]
+        duples_R = [bitarray(r.R) for r in duples]
+        duples_L_ptr = [b._segment_handle[0] for b in duples_L]
+        duples_R_ptr = [b._segment_handle[0] for b in duples_R]
+    else:
+        duples_L_ptr = [r.L._segment_handle[0] for r in duples]
+        duples_R_ptr = [r.R._segment_handle[0] for r in duples]
+
+    if amlset == set:
+        pending_value = [bitarray(p) for p in pending]
+        pending_ptr = [b._segment_handle[0] for b in pending_value]
+    else:
+        pending_ptr = [p._segment_handle[0] for p in pending]
+
+    # Free positions of an AtomIndex hold None
+    if amlset == set:
+        atoms_ucs = [bitarray() if at is None else bitarray(at.ucs) for at in atoms]
+        atoms_ucs_ptr = [b._segment_handle[0] for b in atoms_ucs]
+    else:
+        atoms_ucs_ptr = [ffi.NULL if at is None else at.ucs._segment_handle[0] for at in atoms]  # fmt:skip
+
+    las_idx = sorted(las.keys())
+    if amlset == set:
+        las_value = [bitarray(las[k]) for k in las_idx]
+        las_value_ptr = [b._segment_handle[0] for b in las_value]
+    else:
+        las_value_ptr = [las[k]._segment_handle[0] for k in las_idx]
+    ###
+
+    ret = bitarray.bulk_new(duples_len)
+    ret_ptr = ret.handles
+
+    with profiling.native():
+        caml.duplesPendingDiscriminants(
+            ret_ptr,
+            duples_L_ptr,
+            duples_R_ptr,
+            pending_ptr,
+            duples_len,
+            atoms_ucs_ptr,
+            las_value_ptr,
+            las_idx,
+            len(las_idx),
+            bitarray.gsm,
+        )
+
+    if amlset == set:
+        return [set(b) for b in ret]
+    return ret.release()
 
 
 def crossAll(embedder, exampleSet):
@@ -628,9 +825,12 @@ def crossAll(embedder, exampleSet):
     else:
         raise TypeError("Must be of type 'set' or 'UCSegment'")
 
+    # The ucs and traces are borrowed by the C side, which does not modify them
     tracer_get_trace = embedder.tracer.getTraceOfAtom
-    atomization_trace = [bitarray(tracer_get_trace(at)) for at in atomization]
-    atomization_trace_ptr = [b._segment_handle[0] for b in atomization_trace]
+    atomization_trace = [tracer_get_trace(at) for at in atomization]
+    if amlset == set:
+        atomization_trace = [bitarray(trace) for trace in atomization_trace]
+    atomization_trace_ptr = [trace._segment_handle[0] for trace in atomization_trace]  # fmt:skip
 
     atomization_epoch = [at.epoch for at in atomization]
     atomization_G = [at.G for at in atomization]
@@ -658,7 +858,13 @@ def crossAll(embedder, exampleSet):
     constants_ptr = caml.linkCS_constants(cs_constants_ptr)
 
     pduples = exampleSet
-    if not pduples:
+    if isinstance(pduples, sc.DupleBatch):
+        rels_terms, rels_addresses = batchTermPointers(pduples)
+        rels_L_lcs_constants = rels_addresses[pduples.L]
+        rels_L_lcs_constants_ptr = ffi.cast("void **", rels_L_lcs_constants.ctypes.data)
+        rels_H_lcs_constants = rels_addresses[pduples.R]
+        rels_H_lcs_constants_ptr = ffi.cast("void **", rels_H_lcs_constants.ctypes.data)
+    elif not pduples:
         rels_L_lcs_constants = []
         rels_L_lcs_constants_ptr = []
         rels_H_lcs_constants = []
@@ -673,7 +879,11 @@ def crossAll(embedder, exampleSet):
         rels_H_lcs_constants_ptr = [rel.R._segment_handle[0] for rel in pduples]
     else:
         raise TypeError("Terms must be of type 'set' or 'LCSegment'")
-    duples_hyp = [rel.hypothesis for rel in pduples]
+    if isinstance(pduples, sc.DupleBatch):
+        duples_hyp_column = pduples.hypothesis.astype(np.intc)
+        duples_hyp = ffi.cast("int *", duples_hyp_column.ctypes.data)
+    else:
+        duples_hyp = [rel.hypothesis for rel in pduples]
     rel_ptr = caml.linkDuple(
         len(pduples),
         rels_L_lcs_constants_ptr,
@@ -683,80 +893,100 @@ def crossAll(embedder, exampleSet):
 
     # stored_trace_of_constant_ptr,
     constantsList = sorted(list(embedder.internals.constantsInTrainingSet))
-    stored_trace_of_constant = [
-        bitarray(embedder.tracer.getStoredTraceOfConstant(c))
-        for c in constantsList
-    ]
-    stored_trace_of_constant_ptr = [b._segment_handle[0] for b in stored_trace_of_constant]  # fmt:skip
+    stored_trace_of_constant = BitarrayVector.copyOf(
+        [embedder.tracer.getStoredTraceOfConstant(c) for c in constantsList]
+    )
+    stored_trace_of_constant_ptr = stored_trace_of_constant.segments
 
     # total_indicators_len,
     total_indicators_len = embedder.tracer.numIndicators()
 
     # ignore_crossing,
-    ignore_crossing = [pRel.region == 0 for pRel in exampleSet]
-
-    atomization_len = caml.crossAll(
-        ret_crossed_ptr,
-        ret_not_crossed_ptr,
-        ret_lastj,
-        ret_epoch,
-        atomization_ptr,
-        constants_ptr,
-        rel_ptr,
-        stored_trace_of_constant_ptr,
-        total_indicators_len,
-        ignore_crossing,
-        {
-            "calculate_redundancy": False,
-            "remove_repetitions": embedder.params.removeRepetitions,
-            "verbose": bool(config.Verbosity.Info >= config.verbosityLevel),
-            "use_tracehelper": config.use_tracehelper,
-            "simplify_threshold": embedder.params.simplify_threshold,
-            "ignore_single_const_ucs": embedder.params.ignore_single_const_ucs,
-        },
-        random.randint(0, 4_294_967_295),
-        bitarray.gsm,
-    )
+    if isinstance(exampleSet, sc.DupleBatch):
+        ignore_crossing_column = exampleSet.region == 0
+        ignore_crossing = ffi.cast("_Bool *", ignore_crossing_column.ctypes.data)
+    else:
+        ignore_crossing = [pRel.region == 0 for pRel in exampleSet]
+
+    with profiling.native():
+        atomization_len = caml.crossAll(
+            ret_crossed_ptr,
+            ret_not_crossed_ptr,
+            ret_lastj,
+            ret_epoch,
+            atomization_ptr,
+            constants_ptr,
+            rel_ptr,
+            stored_trace_of_constant_ptr,
+            total_indicators_len,
+            ignore_crossing,
+            {
+                "calculate_redundancy": False,
+                "remove_repetitions": embedder.params.removeRepetitions,
+                "verbose": bool(config.Verbosity.Info >= config.verbosityLevel),
+                "use_tracehelper": config.use_tracehelper,
+                "simplify_threshold": embedder.params.simplify_threshold,
+                "ignore_single_const_ucs": embedder.params.ignore_single_const_ucs,
+            },
+            random.randint(0, 4_294_967_295),
+            bitarray.gsm,
+        )
 
     # return
-    at_ucs_constants = [bitarray() for _ in range(atomization_len)]
-    at_ucs_constants_ptr = [b._segment_handle for b in at_ucs_constants]
-    at_trace = [bitarray() for _ in range(atomization_len)]
-    at_trace_ptr = [b._segment_handle for b in at_trace]
-
-    at_epoch = ffi.new("uint32_t[]", atomization_len)
-    at_G = ffi.new("uint32_t[]", atomization_len)
-    at_gen = ffi.new("uint32_t[]", atomization_len)
-
-    caml.extractAtomization_s(
-        atomization_ptr,
-        at_ucs_constants_ptr,
-        at_trace_ptr,
-        at_epoch,
-        at_G,
-        at_gen,
-    )
+    # Atoms that survive the crossing are returned as the same Python objects,
+    # only the atoms created in C are moved out and wrapped
+    at_origin = ffi.new("uint32_t[]", atomization_len)
+    new_len = caml.originsAtomization_s(atomization_ptr, at_origin)
+
+    at_ucs_constants = bitarray.bulk_new(new_len)
+    at_ucs_constants_ptr = at_ucs_constants.handles
+    at_trace = bitarray.bulk_new(new_len)
+    at_trace_ptr = at_trace.handles
+
+    at_epoch = ffi.new("uint32_t[]", new_len)
+    at_G = ffi.new("uint32_t[]", new_len)
+    at_gen = ffi.new("uint32_t[]", new_len)
+
+    with profiling.native():
+        caml.extractAtomization_s(
+            atomization_ptr,
+            at_ucs_constants_ptr,
+            at_trace_ptr,
+            at_epoch,
+            at_G,
+            at_gen,
+        )
+
+    at_ucs_constants = at_ucs_constants.release()
+    at_trace = at_trace.release()
 
     Atom = embedder.Atom
-    cmanager = embedder.model.cmanager
     tracer_period = embedder.tracer.period
-    atomization = [Atom(0, 0, set()) for _ in range(atomization_len)]
+    previous = atomization
+    atomization = []
+    new_idx = 0
     for idx in range(atomization_len):
-        if isinstance(atomization[0].ucs, set):
-            atomization[idx].ucs = set(at_ucs_constants[idx])
-        elif isinstance(atomization[0].ucs, bitarray):
-            atomization[idx].ucs = at_ucs_constants[idx]
+        origin = at_origin[idx]
+        if origin < len(previous):
+            at = previous[origin]
+            trace = atomization_trace[origin]
         else:
-            raise TypeError("Atoms' ucs must be of type 'set' or 'LCSegment'")
+            at = Atom(at_epoch[new_idx], at_gen[new_idx], set())
+            if isinstance(at.ucs, set):
+                at.ucs = set(at_ucs_constants[new_idx])
+            elif isinstance(at.ucs, bitarray):
+                at.ucs = at_ucs_constants[new_idx]
+            else:
+                raise TypeError("Atoms' ucs must be of type 'set' or 'LCSegment'")
+            at.G = at_G[new_idx]
+            trace = at_trace[new_idx]
+            new_idx += 1
 
         if amlset == set:
-            atomization[idx].trace = [set(at_trace[idx]), tracer_period]
+            at.trace = [set(trace), tracer_period]
         else:
-            atomization[idx].trace = [at_trace[idx], tracer_period]
-
-        atomization[idx].epoch = at_epoch[idx]
-        atomization[idx].gen = at_gen[idx]
-        atomization[idx].G = at_G[idx]
+            at.trace = [trace, tracer_period]
+        atomization.append(at)
 
     embedder.model.atomization = atomization
 
@@ -767,12 +997,162 @@ def crossAll(embedder, exampleSet):
     caml.unlinkCS_constants(constants_ptr)
     caml.unlinkDuple(rel_ptr)
 
-    crossed = [exampleSet[idx] for idx in ret_crossed]
-    notCrossed = [exampleSet[idx] for idx in ret_not_crossed]
+    crossed = sc.selectDuples(exampleSet, list(ret_crossed))
+    notCrossed = sc.selectDuples(exampleSet, list(ret_not_crossed))
 
     return crossed, notCrossed, ret_lastj[0]
 
 
+# Layout of random.getstate() read by PyRandom in aml_fast.c: the version of
+# the random module, then 624 Mersenne Twister words and the position in them
+PY_RANDOM_VERSION = 3
+PY_RANDOM_STATE_LEN = 625
+
+
+def traceClosure(embedder, space, examples, cexamples, atoms):
+    tracer = embedder.tracer
+    if bool(tracer.discardedIndicators):
+        raise ValueError("traceClosure error discardedIndicators")
+
+    # The closure draws from the state of the random module and hands it back,
+    # so it takes the same choices as the Python version. Any other layout of
+    # the state is left to the Python version.
+    version, random_state, gauss_next = random.getstate()
+    if version != PY_RANDOM_VERSION or len(random_state) != PY_RANDOM_STATE_LEN:
+        logWarn("Unknown random state layout, running the Python traceClosure")
+        pythonTraceClosure = type(embedder).traceClosure.__wrapped__
+        return pythonTraceClosure(embedder, space, examples, cexamples, atoms)
+
+    # Positions in space.elements of the terms of the duples
+    if isinstance(cexamples, sc.DupleBatch):
+        position = np.zeros(len(space.pool), dtype=np.uint32)
+        position[[wt.ID for wt in space.elements]] = np.arange(len(space.elements))
+        nduples_L_column = position[cexamples.L]
+        nduples_H_column = position[cexamples.R]
+        pduples_L_column = position[examples.L]
+        pduples_H_column = position[examples.R]
+        nduples_L = ffi.cast("uint32_t *", nduples_L_column.ctypes.data)
+        nduples_H = ffi.cast("uint32_t *", nduples_H_column.ctypes.data)
+        pduples_L = ffi.cast("uint32_t *", pduples_L_column.ctypes.data)
+        pduples_H = ffi.cast("uint32_t *", pduples_H_column.ctypes.data)
+    else:
+        position = {id(wt): k for k, wt in enumerate(space.elements)}
+        nduples_L = [position[id(r.wL)] for r in cexamples]
+        nduples_H = [position[id(r.wH)] for r in cexamples]
+        pduples_L = [position[id(r.wL)] for r in examples]
+        pduples_H = [position[id(r.wH)] for r in examples]
+
+    byQuotient = embedder.params.byQuotient
+    if byQuotient:
+        logInfo(f"Calculating lower atomic segments")
+        quotientAtoms = embedder.model.atomization
+        las = sc.calculateLowerAtomicSegment(
+            quotientAtoms, embedder.internals.constantsInMasterAndTraining, True
+        )
+    else:
+        quotientAtoms = []
+        las = {}
+
+    ### ATTENTION: This block cannot be extracted.
+    ### If in a function, Python garbage collects pointers before they're used
+    if amlset == set:
+        element_cset = [bitarray(wt.cset) for wt in space.elements]
+        element_cset_ptr = [b._segment_handle[0] for b in element_cset]
+        element_trace = [bitarray(wt.trace) for wt in space.elements]
+        element_trace_ptr = [b._segment_handle for b in element_trace]
+        atoms_ucs = [bitarray(at.ucs) for at in quotientAtoms]
+        atoms_ucs_ptr = [b._segment_handle[0] for b in atoms_ucs]
+    else:
+        element_cset_ptr = [wt.cset._segment_handle[0] for wt in space.elements]
+        element_trace_ptr = [wt.trace._segment_handle for wt in space.elements]
+        atoms_ucs_ptr = [at.ucs._segment_handle[0] for at in quotientAtoms]
+
+    las_idx = sorted(las.keys())
+    if amlset == set:
+        las_value = [bitarray(las[k]) for k in las_idx]
+        las_value_ptr = [b._segment_handle[0] for b in las_value]
+    else:
+        las_value_ptr = [las[k]._segment_handle[0] for k in las_idx]
+    ###
+
+    ret_status = ffi.new("int *")
+    warning_sent = ffi.new("_Bool *", tracer.warningSent)
+    ret_positive_violation = ffi.new("_Bool *")
+
+    random_state = ffi.new("uint32_t[]", random_state)
+
+    with profiling.native():
+        closure_ptr = caml.traceClosure(
+            ret_status,
+            warning_sent,
+            ret_positive_violation,
+            element_cset_ptr,
+            element_trace_ptr,
+            len(space.elements),
+            nduples_L,
+            nduples_H,
+            len(cexamples),
+            pduples_L,
+            pduples_H,
+            len(examples),
+            linkedTracer(tracer).pointer,
+            byQuotient,
+            atoms_ucs_ptr,
+            las_value_ptr,
+            las_idx,
+            len(las_idx),
+            tracer.warnOnTraceViolation,
+            random_state,
+            bitarray.gsm,
+        )
+    random.setstate((version, tuple(random_state), gauss_next))
+
+    new_len = caml.traceClosure_len(closure_ptr)
+    at_ucs_constants = bitarray.bulk_new(new_len)
+    at_ucs_constants_ptr = at_ucs_constants.handles
+    at_trace = bitarray.bulk_new(new_len)
+    at_trace_ptr = at_trace.handles
+    caml.extractTraceClosure(closure_ptr, at_ucs_constants_ptr, at_trace_ptr, bitarray.gsm)
+
+    # The C side modified the traces of the elements in place
+    if amlset == set:
+        for wt, trace in zip(space.elements, element_trace):
+            wt.trace = set(trace)
+    else:
+        for wt in space.elements:
+            wt.trace._hash = None
+
+    tracer.warningSent = warning_sent[0]
+    if ret_positive_violation[0]:
+        logError("enforcePositiveTraceConstraint trace error")
+    if ret_status[0] == 1:
+        raise ValueError("enforceNegativeTraceConstraint inconsistent")
+    if ret_status[0] == 2:
+        if byQuotient:
+            raise ValueError("enforceNegativeTraceConstraintByQuotient trace error")
+        raise ValueError("enforceNegativeTraceConstraint trace error")
+    if ret_status[0] == 3:
+        raise ValueError("enforcePositiveTraceConstraint inconsistent")
+
+    initial = []
+    for ucs, trace in zip(at_ucs_constants.release(), at_trace.release()):
+        at = sc.Atom(embedder.model.epoch, embedder.model.generation, set())
+        if isinstance(at.ucs, set):
+            at.ucs = set(ucs)
+        elif isinstance(at.ucs, bitarray):
+            at.ucs = ucs
+        else:
+            raise TypeError("Atoms' ucs must be of type 'set' or 'LCSegment'")
+        if tracer.storeTraces:
+            at.trace = [set(trace) if amlset == set else trace, tracer.period]
+        initial.append(at)
+
+    initial = sc.removeRepeatedAtoms(initial)
+
+    logInfo(f"Traces enforced with {len(initial)} atoms")
+    return initial
+
+
 def selectAllUsefulIndicators(self, nduplesIn, reversedNameDictionary):
     if bool(self.discardedIndicators):
         raise ValueError("selectAllUsefulIndicators error discardedIndicators")
@@ -791,24 +1171,33 @@ def selectAllUsefulIndicators(self, nduplesIn, reversedNameDictionary):
     else:
         tr_discardedIndicators_ptr = self.discardedIndicators._segment_handle[0]
 
-    rel_L_freeTrace_ptr = [nr.wL.freeTrace_ba._segment_handle[0] for nr in nduplesIn]
-    rel_H_freeTrace_ptr = [nr.wH.freeTrace_ba._segment_handle[0] for nr in nduplesIn]
-
-    duples_hyp = [nr.hypothesis for nr in nduplesIn]
-
-    caml.selectAllUsefulIndicators(
-        ret_take_ptr,
-        ret_duples_keep_ptr,
-        len(nduplesIn),
-        tr_discardedIndicators_ptr,
-        rel_L_freeTrace_ptr,
-        rel_H_freeTrace_ptr,
-        duples_hyp,
-        bool(config.Verbosity.Info >= config.verbosityLevel),  # verbose
-        bitarray.gsm,
-    )
+    if isinstance(nduplesIn, sc.DupleBatch):
+        freeTrace_addresses = batchFreeTracePointers(nduplesIn)
+        rel_L_freeTrace = freeTrace_addresses[nduplesIn.L]
+        rel_L_freeTrace_ptr = ffi.cast("void **", rel_L_freeTrace.ctypes.data)
+        rel_H_freeTrace = freeTrace_addresses[nduplesIn.R]
+        rel_H_freeTrace_ptr = ffi.cast("void **", rel_H_freeTrace.ctypes.data)
+        duples_hyp_column = nduplesIn.hypothesis
+        duples_hyp = ffi.cast("_Bool *", duples_hyp_column.ctypes.data)
+    else:
+        rel_L_freeTrace_ptr = [nr.wL.freeTrace_ba._segment_handle[0] for nr in nduplesIn]
+        rel_H_freeTrace_ptr = [nr.wH.freeTrace_ba._segment_handle[0] for nr in nduplesIn]
+        duples_hyp = [nr.hypothesis for nr in nduplesIn]
+
+    with profiling.native():
+        caml.selectAllUsefulIndicators(
+            ret_take_ptr,
+            ret_duples_keep_ptr,
+            len(nduplesIn),
+            tr_discardedIndicators_ptr,
+            rel_L_freeTrace_ptr,
+            rel_H_freeTrace_ptr,
+            duples_hyp,
+            bool(config.Verbosity.Info >= config.verbosityLevel),  # verbose
+            bitarray.gsm,
+        )
 
-    nrels = [nduplesIn[nr_idx] for nr_idx in ret_duples_keep]
+    nrels = sc.selectDuples(nduplesIn, list(ret_duples_keep))
 
     self.discardedIndicators = amlset(
         [i for i in range(self.numIndicators()) if i not in ret_take]
@@ -826,25 +1215,128 @@ def reduceIndicators(self, nduplesIn, reversedNameDictionary, singles):
     else:
         tr_discardedIndicators_ptr = self.discardedIndicators._segment_handle
 
-    rel_L_freeTrace_ptr = [nr.wL.freeTrace_ba._segment_handle[0] for nr in nduplesIn]
-    rel_H_freeTrace_ptr = [nr.wH.freeTrace_ba._segment_handle[0] for nr in nduplesIn]
+    if isinstance(nduplesIn, sc.DupleBatch):
+        freeTrace_addresses = batchFreeTracePointers(nduplesIn)
+        rel_L_freeTrace = freeTrace_addresses[nduplesIn.L]
+        rel_L_freeTrace_ptr = ffi.cast("void **", rel_L_freeTrace.ctypes.data)
+        rel_H_freeTrace = freeTrace_addresses[nduplesIn.R]
+        rel_H_freeTrace_ptr = ffi.cast("void **", rel_H_freeTrace.ctypes.data)
+    else:
+        rel_L_freeTrace_ptr = [nr.wL.freeTrace_ba._segment_handle[0] for nr in nduplesIn]
+        rel_H_freeTrace_ptr = [nr.wH.freeTrace_ba._segment_handle[0] for nr in nduplesIn]
 
     singles_ptr = singles._segment_handle
 
-    caml.reduceIndicators(
-        len(nduplesIn),
-        self.numIndicators(),
-        tr_discardedIndicators_ptr,
-        rel_L_freeTrace_ptr,
-        rel_H_freeTrace_ptr,
-        singles_ptr,
-        bool(config.Verbosity.Info >= config.verbosityLevel),  # verbose
-        random.randint(0, 4_294_967_295),
-        bitarray.gsm,
-    )
+    with profiling.native():
+        caml.reduceIndicators(
+            len(nduplesIn),
+            self.numIndicators(),
+            tr_discardedIndicators_ptr,
+            rel_L_freeTrace_ptr,
+            rel_H_freeTrace_ptr,
+            singles_ptr,
+            bool(config.Verbosity.Info >= config.verbosityLevel),  # verbose
+            random.randint(0, 4_294_967_295),
+            bitarray.gsm,
+        )
 
     if amlset == set:
         self.discardedIndicators = amlset(tr_discardedIndicators)
+    else:
+        self.discardedIndicators._hash = None
+    singles._hash = None
+
+
+def removeRepeatedAtoms(atomization):
+    atomization_len = len(atomization)
+
+    ### ATTENTION: This block cannot be extracted.
+    ### If in a function, Python garbage collects pointers before they're used
+    if not atomization:
+        atomization_at_ucs_constants = []
+        atomization_at_ucs_constants_ptr = []
+    elif isinstance(atomization[0].ucs, set):
+        atomization_at_ucs_constants = [bitarray(at.ucs) for at in atomization]
+        atomization_at_ucs_constants_ptr = [b._segment_handle[0] for b in atomization_at_ucs_constants]  # fmt:skip
+    elif isinstance(atomization[0].ucs, bitarray):
+        atomization_at_ucs_constants_ptr = [at.ucs._segment_handle[0] for at in atomization]  # fmt:skip
+    else:
+        raise TypeError("Must be of type 'set' or 'UCSegment'")
+
+    atomization_epoch = np.array([at.epoch for at in atomization], dtype=np.int64)
+    atomization_gen = np.array([at.gen for at in atomization], dtype=np.int64)
+    keep = np.empty([atomization_len], dtype=np.uint32)
+
+    with profiling.native():
+        keep_len = caml.removeRepeatedSegments(
+            ffi.cast("uint32_t *", keep.ctypes.data),
+            atomization_at_ucs_constants_ptr,
+            atomization_len,
+            ffi.cast("int64_t *", atomization_epoch.ctypes.data),
+            ffi.cast("int64_t *", atomization_gen.ctypes.data),
+        )
+
+    ret = []
+    if keep_len == atomization_len:
+        ret.extend(atomization)
+    else:
+        epochs = atomization_epoch.tolist()
+        gens = atomization_gen.tolist()
+        for at_idx in keep[:keep_len].tolist():
+            at = atomization[at_idx]
+            at.epoch = epochs[at_idx]
+            at.gen = gens[at_idx]
+            ret.append(at)
+
+    logInfo(f"From {len(atomization)} to {len(ret)}")
+    return ret
+
+
+def removeRedundantAtoms(atomization, constants, markAsChecked):
+    if len(atomization) == 0:
+        return []
+
+    atomization.sort(key=lambda at: len(at.ucs))
+    atomization_len = len(atomization)
+
+    ### ATTENTION: This block cannot be extracted.
+    ### If in a function, Python garbage collects pointers before they're used
+    if isinstance(atomization[0].ucs, set):
+        atomization_at_ucs_constants = [bitarray(at.ucs) for at in atomization]
+        atomization_at_ucs_constants_ptr = [b._segment_handle[0] for b in atomization_at_ucs_constants]  # fmt:skip
+    elif isinstance(atomization[0].ucs, bitarray):
+        atomization_at_ucs_constants_ptr = [at.ucs._segment_handle[0] for at in atomization]  # fmt:skip
+    else:
+        raise TypeError("Must be of type 'set' or 'UCSegment'")
+
+    if isinstance(constants, set):
+        cs_constants = bitarray(constants)
+    elif isinstance(constants, bitarray):
+        cs_constants = constants
+    else:
+        raise TypeError("Must be of type 'set' or 'CSegment'")
+    ###
+
+    atomization_checked = [at.redundancyChecked for at in atomization]
+    keep = np.empty([atomization_len], dtype=np.uint32)
+
+    with profiling.native():
+        keep_len = caml.removeRedundantSegments(
+            ffi.cast("uint32_t *", keep.ctypes.data),
+            atomization_at_ucs_constants_ptr,
+            atomization_len,
+            atomization_checked,
+            cs_constants._segment_handle[0],
+            bitarray.gsm,
+        )
+
+    ret = [atomization[at_idx] for at_idx in keep[:keep_len].tolist()]
+    if markAsChecked:
+        for at in ret:
+            at.redundancyChecked = True
+
+    logInfo(f"From {len(atomization)} to {len(ret)}")
+    return ret
 
 
 class TraceHelper:
@@ -877,37 +1369,8 @@ class TraceHelper:
             bitarray.gsm,
         )
 
-        # Trace pointer
-        if not tracer.indicators:
-            tr_ind_constants = []
-            tr_ind_constants_ptr = []
-        elif isinstance(tracer.indicators[0], set):
-            tr_ind_constants = [bitarray(ind) for ind in tracer.indicators]
-            tr_ind_constants_ptr = [b._segment_handle for b in tr_ind_constants]
-        elif isinstance(tracer.indicators[0], bitarray):
-            tr_ind_constants_ptr = [ind._segment_handle for ind in tracer.indicators]
-        else:
-            raise TypeError("Must be of type 'set' or 'LCSegment'")
-
-        if not tracer.atomIndicators:
-            tr_atind_constants = []
-            tr_atind_constants_ptr = []
-        elif isinstance(tracer.atomIndicators[0].ucs, set):
-            tr_atind_constants = [
-                bitarray(atind.ucs) for atind in tracer.atomIndicators
-            ]
-            tr_atind_constants_ptr = [b._segment_handle[0] for b in tr_atind_constants]
-        elif isinstance(tracer.atomIndicators[0].ucs, bitarray):
-            tr_atind_constants_ptr = [atind.ucs._segment_handle[0] for atind in tracer.atomIndicators]  # fmt:skip
-        else:
-            raise TypeError("Must be of type 'set' or 'UCSegment'")
-
-        self.tracer_ptr = caml.linkTracer(
-            len(tracer.indicators),
-            tr_ind_constants_ptr,
-            len(tracer.atomIndicators),
-            tr_atind_constants_ptr,
-        )
+        # C-side view of the indicators, shared with the compiled functions
+        self.tracerStore = linkedTracer(tracer)
 
     def __del__(self):
         caml.TraceHelper_delete_from_python(
@@ -915,7 +1378,6 @@ class TraceHelper:
             bitarray.gsm,
         )
         caml.unlinkCS_constants(self.constants_ptr)
-        caml.unlinkTracer(self.tracer_ptr)
 
     def atomFromId(self, ID):
         left = 0
@@ -945,14 +1407,22 @@ class TraceHelper:
 
         atomization_id = [at.ID for at in atomization]
 
-        caml.TraceHelperPy_update(
-            self.pointer,
-            len(atomization),
-            atomization_trace_ptr,
-            atomization_id,
-            complete,
-            bitarray.gsm,
-        )
+        with profiling.native():
+            caml.TraceHelperPy_update(
+                self.pointer,
+                len(atomization),
+                atomization_trace_ptr,
+                atomization_id,
+                complete,
+                bitarray.gsm,
+            )
+
+        # The C side modified these sets in place, drop their cached hashes
+        for at in atomization:
+            at.trace[0]._hash = None
+        for b in self.tD:
+            b._hash = None
+        self.atomIDs._hash = None
 
         return amlset(atomization_id)
 
@@ -965,7 +1435,12 @@ __func_dict = {
     "simplifyFromConstants": simplifyFromConstants,
     "updateUnionModelWithSetOfPduples": updateUnionModelWithSetOfPduples,
     "calculateLowerAtomicSegments": calculateLowerAtomicSegments,
+    "duplesDiscriminantSizes": duplesDiscriminantSizes,
+    "duplesPendingDiscriminants": duplesPendingDiscriminants,
     "crossAll": crossAll,
+    "traceClosure": traceClosure,
     "selectAllUsefulIndicators": selectAllUsefulIndicators,
     "reduceIndicators": reduceIndicators,
+    "removeRedundantAtoms": removeRedundantAtoms,
+    "removeRepeatedAtoms": removeRepeatedAtoms,
 }
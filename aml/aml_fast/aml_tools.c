@@ -29,3 +29,8 @@ boolean verifyAllRetGenSegMgr(generalSegmentManager* theGeneralSegmentManager)
     }
     return true;
 }
+
+/* OpenMP */
+void setNumThreads(int num_threads) { omp_set_num_threads(num_threads); }
+
+int getMaxThreads() { return omp_get_max_threads(); }
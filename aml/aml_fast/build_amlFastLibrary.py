@@ -13,6 +13,10 @@ with open("amlFast_bitarrays.h") as f:
     cdef_text += "\n"
     cdef_text += f.read()
 
+with open("amlFast_densebitarrays.h") as f:
+    cdef_text += "\n"
+    cdef_text += f.read()
+
 ffibuilder.cdef(cdef_text)
 
 ffibuilder.set_source(
@@ -20,9 +24,11 @@ ffibuilder.set_source(
     """
     #include "build_amlFastLibrary_externalFunctions.h"
     #include "amlFast_bitarrays.h"
+    #include "amlFast_densebitarrays.h"
     """,
     sources=[
         "amlFast_bitarrays.c",
+        "amlFast_densebitarrays.c",
         "aml_fast.c",
         "aml_tools.c",
         "cbar_buffer.c",
@@ -12,9 +12,11 @@ struct CrossAll_Params {
 };
 
 /* Main Functions */
-void freeTraceAll(void* space, void* tracer, void* theGeneralSegmentManager);
-void traceAll(void* space, void* tracer, void* atomization, void* gsm);
-void storeTracesOfConstants(
+void freeTraceAll(
+    void* space, void* tracer, void* old_traces[], int32_t remap[], uint32_t remap_len, void* theGeneralSegmentManager);
+_Bool traceAll(
+    void* space, void* tracer, void* atomization, void* old_traces[], int32_t remap[], uint32_t remap_len, void* gsm);
+_Bool storeTracesOfConstants(
     void*** traces, uint32_t total_num_indicators, uint32_t constants_len, int constants[], void* atomization,
     void* gsm);
 void considerPositiveDuples(void* tr, void* duples, void* gsm);
@@ -28,6 +30,20 @@ void updateUnionModelWithSetOfPduples(
 void calculateLowerAtomicSegments(
     void** element_las[], void* element_cset[], uint32_t elements_len, void* las[], uint32_t las_idx[],
     uint32_t las_len, void* gsm);
+void duplesDiscriminantSizes(
+    uint32_t ret_disc[], uint32_t ret_las[], void* duples_L[], void* duples_R[], uint32_t duples_len, void* las[],
+    uint32_t las_idx[], uint32_t las_len, void* gsm);
+void duplesPendingDiscriminants(
+    void** ret[], void* duples_L[], void* duples_R[], void* pending[], uint32_t duples_len, void* atoms_ucs[],
+    void* las[], uint32_t las_idx[], uint32_t las_len, void* gsm);
+void discriminantSizes(
+    int32_t ret[], void* term_cset[], uint32_t terms_len, uint32_t class_idx[], uint32_t classes_len, void* las[],
+    uint32_t las_idx[], uint32_t las_len, void* gsm);
+void segment_hashAll(uint64_t ret[], void* segments[], uint32_t segments_len);
+uint32_t removeRepeatedSegments(
+    uint32_t ret_keep[], void* segments[], uint32_t segments_len, int64_t epoch[], int64_t gen[]);
+uint32_t removeRedundantSegments(
+    uint32_t ret_keep[], void* segments[], uint32_t segments_len, _Bool checked[], void* constants, void* gsm);
 uint32_t crossAll(
     void** ret_crossed, void** ret_not_crossed, int* ret_lastj, uint32_t* ret_epoch, void* atomization, void* constants,
     void* positive_duples, void** stored_trace_of_constant, uint32_t total_indicators_len,
@@ -38,6 +54,22 @@ void selectAllUsefulIndicators(
 void reduceIndicators(
     uint32_t duples_len, uint32_t num_indicators, void** discardedIndicators, void* rel_L_freeTrace[],
     void* rel_H_freeTrace[], void** singles, _Bool verbose, unsigned int seed, void* gsm);
+void* traceClosure(
+    int* ret_status, _Bool* warning_sent, _Bool* ret_positive_violation, void* element_cset[], void** element_trace[],
+    uint32_t elements_len, uint32_t nduples_L[], uint32_t nduples_H[], uint32_t nduples_len, uint32_t pduples_L[],
+    uint32_t pduples_H[], uint32_t pduples_len, void* tracer, _Bool by_quotient, void* atoms_ucs[], void* las[],
+    uint32_t las_idx[], uint32_t las_len, _Bool warn_on_violation, uint32_t random_state[], void* gsm);
+uint32_t traceClosure_len(void* closure);
+void extractTraceClosure(void* closure, void** ucs[], void** trace[], void* gsm);
+
+/* Trace matrices */
+void traceMatrix_pack(uint64_t rows[], void* segments[], uint32_t rows_len, uint32_t width);
+void traceMatrix_transpose(uint64_t cols[], const uint64_t rows[], uint32_t rows_len, uint32_t width);
+void traceMatrix_reduceRows(
+    void** ret[], const uint64_t rows[], uint32_t width, void* groups[], uint32_t groups_len, _Bool union_, void* gsm);
+void traceMatrix_unpackRows(
+    void** ret[], const uint64_t rows[], uint32_t width, uint32_t idx[], uint32_t idx_len, _Bool complement,
+    void* gsm);
 
 /* TraceHelper */
 void* TraceHelper_init_from_python(void* constants, int indicators_num, void** atomIDs, void*** tD, void* gsm);
@@ -50,6 +82,9 @@ int segment_getAllSegmentsBufferLength(void** segments, int segments_len);
 void segment_getAllSegmentsBuffer(char* buffer, void** segments, int segments_len);
 int segment_getBufferNumberOfCbars(char* buffer);
 void segment_buildFromBuffer(char* buffer, void** segments[], void* gsm);
+uint64_t segment_getAllSegmentsBlobLength(void** segments, int segments_len, int alignment);
+void segment_getAllSegmentsBlob(char* blob, uint64_t offsets[], void** segments, int segments_len, int alignment);
+void segment_viewsFromBlob(void** segments[], char* blob, uint64_t offsets[], int segments_len);
 
 /* Linkers */
 void* linkSpace(uint32_t sp_len, void* sp_cset_constants[], void** sp_ftrace[], void** sp_trace[]);
@@ -62,6 +97,7 @@ void* linkAtomization_s(
     uint32_t atomization_len, void* atomization_at_ucs_constants[], void* atomization_at_trace[],
     uint32_t atomization_epoch[], uint32_t atomization_G[], uint32_t atomization_gen[], void* gsm);
 void unlinkAtomization_s(void* atomization, void* gsm);
+uint32_t originsAtomization_s(void* atomization, uint32_t ret_origin[]);
 void extractAtomization_s(
     void* atomization, void** at_ucs_constants[], void** at_trace[], uint32_t at_epoch[], uint32_t at_G[],
     uint32_t at_gen[]);
@@ -74,3 +110,7 @@ void unlinkDuple(void* rels);
 void* createGenSegMgr();
 void deleteGenSegMgr(void* theGeneralSegmentManager);
 int verifyAllRetGenSegMgr(void* theGeneralSegmentManager);
+
+/* OpenMP */
+void setNumThreads(int num_threads);
+int getMaxThreads();
@@ -800,16 +800,332 @@ void cbarReader_setAndExecuteOnEachItem(cbarReader * self, cbarHead * onCbar, vo
  * -----------------------------------------------------------------------------
  * ----------------------------------------------------------------------------*/
 
+/* Free cbars of every size class kept by a thread. A cache serves one manager at a time. When it meets a different
+   one, its cbars are given back to the free lists of their manager if that manager is still alive. */
+typedef struct cbarThreadCache {
+    generalCbarManager * owner;
+    long long epoch;
+    cbarHead * freeList[CBAR_SLAB_CLASSES];
+    int freeCount[CBAR_SLAB_CLASSES];
+} cbarThreadCache;
+
+static _Thread_local cbarThreadCache cbarThreadCache_local;
+static long long generalCbarManager_epochs = 0;
+
+/* Managers alive, by epoch. Only accessed inside the critical section cbarManagers */
+typedef struct cbarLiveManager {
+    generalCbarManager * manager;
+    long long epoch;
+} cbarLiveManager;
+
+static cbarLiveManager * generalCbarManager_live = null;
+static int generalCbarManager_live_len = 0;
+static int generalCbarManager_live_capacity = 0;
+
+#define cbarSlab_next(_cbar) (*(cbarHead **) (_cbar))
+
+/* Size classes go in steps of 16 bytes up to 128 bytes, then four classes per power of two */
+static int cbarSlab_class(osUnsignedLong length) {
+    if (length <= 128) {
+        return (length <= 16) ? 0 : (int) ((length + 15) / 16) - 1;
+    }
+    {
+        int log = 63 - __builtin_clzll(length - 1);
+        int sub = (int) ((length - 1 - (1ULL << log)) >> (log - 2));
+        return 8 + (log - 7) * 4 + sub;
+    }
+}
+
+static osUnsignedLong cbarSlab_classLength(int c) {
+    if (c < 8) {
+        return (osUnsignedLong) (c + 1) * 16;
+    }
+    {
+        int log = 7 + (c - 8) / 4;
+        return (1ULL << log) + (osUnsignedLong) ((c - 8) % 4 + 1) * (1ULL << (log - 2));
+    }
+}
+
+static void generalCbarManager_register(generalCbarManager * self) {
+    #pragma omp critical (cbarManagers)
+    {
+        if (generalCbarManager_live_len == generalCbarManager_live_capacity) {
+            generalCbarManager_live_capacity = max(8, 2 * generalCbarManager_live_capacity);
+            generalCbarManager_live = (cbarLiveManager *) realloc(generalCbarManager_live,
+                sizeof(cbarLiveManager) * generalCbarManager_live_capacity);
+            if (generalCbarManager_live == null) {
+                d("realloc returned null.");
+                terminate(0);
+            }
+        }
+        generalCbarManager_live[generalCbarManager_live_len].manager = self;
+        generalCbarManager_live[generalCbarManager_live_len].epoch = self->epoch;
+        ++generalCbarManager_live_len;
+    }
+}
+
+static void generalCbarManager_unregister(generalCbarManager * self) {
+    #pragma omp critical (cbarManagers)
+    {
+        int k;
+        for (k = 0; k < generalCbarManager_live_len; ++k) {
+            if (generalCbarManager_live[k].manager == self && generalCbarManager_live[k].epoch == self->epoch) {
+                generalCbarManager_live[k] = generalCbarManager_live[--generalCbarManager_live_len];
+                break;
+            }
+        }
+    }
+}
+
+/* Give the cbars of the cache back to the free lists of its manager, unless the manager was deleted and its slabs
+   with it, and empty the cache */
+static void cbarThreadCache_release(cbarThreadCache * cache) {
+    if (cache->owner != null) {
+        #pragma omp critical (cbarManagers)
+        {
+            int k;
+            for (k = 0; k < generalCbarManager_live_len; ++k) {
+                if (generalCbarManager_live[k].manager == cache->owner && generalCbarManager_live[k].epoch == cache->epoch) {
+                    generalCbarManager * owner = cache->owner;
+                    int c;
+                    omp_set_lock(&owner->lock);
+                    for (c = 0; c < CBAR_SLAB_CLASSES; ++c) {
+                        while (cache->freeList[c] != null) {
+                            cbarHead * cbar = cache->freeList[c];
+                            cache->freeList[c] = cbarSlab_next(cbar);
+                            cbarSlab_next(cbar) = owner->classes[c].freeList;
+                            owner->classes[c].freeList = cbar;
+                        }
+                    }
+                    omp_unset_lock(&owner->lock);
+                    break;
+                }
+            }
+        }
+    }
+    memset(cache, 0, sizeof(cbarThreadCache));
+}
+
+static cbarThreadCache * cbarThreadCache_get(generalCbarManager * self) {
+    cbarThreadCache * cache = &cbarThreadCache_local;
+    if (cache->owner != self || cache->epoch != self->epoch) {
+        cbarThreadCache_release(cache);
+        cache->owner = self;
+        cache->epoch = self->epoch;
+    }
+    return cache;
+}
+
+/* Carve a new cbar of class c. The manager lock must be held */
+static cbarHead * generalCbarManager_carve(generalCbarManager * self, int c) {
+    osUnsignedLong length = cbarSlab_classLength(c);
+    cbarSlabClass * slabClass = &self->classes[c];
+    cbarHead * result;
+
+    if (slabClass->slabNext == null || slabClass->slabNext + length > slabClass->slabEnd) {
+        osUnsignedLong slabLength = max((osUnsignedLong) CBAR_SLAB_LENGTH, 8 * length);
+        char * slab = null;
+        (void)posix_memalign((void **) &slab, 32, (size_t) slabLength);
+        if (slab == null) {
+            d("out of memory for a slab of %llu bytes", slabLength);
+            terminate(0);
+        }
+        if (self->slabs_len == self->slabs_capacity) {
+            self->slabs_capacity = max(16, 2 * self->slabs_capacity);
+            self->slabs = (cbarSlab *) realloc(self->slabs, sizeof(cbarSlab) * self->slabs_capacity);
+            if (self->slabs == null) {
+                d("realloc returned null.");
+                terminate(0);
+            }
+        }
+        self->slabs[self->slabs_len].start = slab;
+        self->slabs[self->slabs_len].length = slabLength;
+        self->slabs[self->slabs_len].c = c;
+        ++self->slabs_len;
+        #pragma omp atomic update
+        self->residentBytes += slabLength;
+        slabClass->slabNext = slab;
+        slabClass->slabEnd = slab + slabLength;
+    }
+
+    result = (cbarHead *) slabClass->slabNext;
+    slabClass->slabNext += length;
+    return result;
+}
+
+/* Move up to half a cache of free cbars of class c from the manager to the thread cache */
+static void cbarThreadCache_refill(generalCbarManager * self, cbarThreadCache * cache, int c) {
+    omp_set_lock(&self->lock);
+    {
+        cbarSlabClass * slabClass = &self->classes[c];
+        while (slabClass->freeList != null && cache->freeCount[c] < CBAR_THREAD_CACHE_LENGTH / 2) {
+            cbarHead * cbar = slabClass->freeList;
+            slabClass->freeList = cbarSlab_next(cbar);
+            cbarSlab_next(cbar) = cache->freeList[c];
+            cache->freeList[c] = cbar;
+            ++cache->freeCount[c];
+        }
+    }
+    omp_unset_lock(&self->lock);
+}
+
+static int cbarSlab_compare(const void * a, const void * b) {
+    const char * x = ((const cbarSlab *) a)->start;
+    const char * y = ((const cbarSlab *) b)->start;
+    return (x > y) - (x < y);
+}
+
+/* Index of the slab holding 'cbar' in slabs sorted by address */
+static int cbarSlab_find(const cbarSlab * slabs, int slabs_len, const char * cbar) {
+    int lo = 0;
+    int hi = slabs_len - 1;
+    while (lo < hi) {
+        int mid = (lo + hi + 1) / 2;
+        if (slabs[mid].start <= cbar) {
+            lo = mid;
+        } else {
+            hi = mid - 1;
+        }
+    }
+    return lo;
+}
+
+static long long generalCbarManager_freeSlabBytes(generalCbarManager * self) {
+    return self->residentBytes - self->memoryUsed;
+}
+
+/* Give back to the system the slabs whose cbars are all in the free lists of the manager. Cbars in thread caches
+   count as used, so slabs are never freed under a thread. The manager lock must be held */
+static void generalCbarManager_trimLocked(generalCbarManager * self) {
+    int * freeCount;
+    int c;
+    int k;
+    int kept = 0;
+
+    if (self->slabs_len == 0) {
+        return;
+    }
+    qsort(self->slabs, (size_t) self->slabs_len, sizeof(cbarSlab), cbarSlab_compare);
+    freeCount = (int *) calloc((size_t) self->slabs_len, sizeof(int));
+
+    for (c = 0; c < CBAR_SLAB_CLASSES; ++c) {
+        cbarHead * cbar;
+        for (cbar = self->classes[c].freeList; cbar != null; cbar = cbarSlab_next(cbar)) {
+            ++freeCount[cbarSlab_find(self->slabs, self->slabs_len, (const char *) cbar)];
+        }
+    }
+
+    /* A slab is released when all the cbars carved from it are free. freeCount becomes -1 for those */
+    for (k = 0; k < self->slabs_len; ++k) {
+        cbarSlab * slab = &self->slabs[k];
+        cbarSlabClass * slabClass = &self->classes[slab->c];
+        osUnsignedLong length = cbarSlab_classLength(slab->c);
+        boolean current = slabClass->slabNext != null && slabClass->slabNext >= slab->start
+                          && slabClass->slabNext <= slab->start + slab->length;
+        osUnsignedLong carved = current ? (osUnsignedLong) (slabClass->slabNext - slab->start) / length
+                                        : slab->length / length;
+        if (freeCount[k] == (int) carved) {
+            freeCount[k] = -1;
+            if (current) {
+                slabClass->slabNext = null;
+                slabClass->slabEnd = null;
+            }
+        }
+    }
+
+    for (c = 0; c < CBAR_SLAB_CLASSES; ++c) {
+        cbarHead ** link = &self->classes[c].freeList;
+        while (*link != null) {
+            if (freeCount[cbarSlab_find(self->slabs, self->slabs_len, (const char *) *link)] == -1) {
+                *link = cbarSlab_next(*link);
+            } else {
+                link = &cbarSlab_next(*link);
+            }
+        }
+    }
+
+    for (k = 0; k < self->slabs_len; ++k) {
+        if (freeCount[k] == -1) {
+            #pragma omp atomic update
+            self->residentBytes -= self->slabs[k].length;
+            free(self->slabs[k].start);
+        } else {
+            self->slabs[kept++] = self->slabs[k];
+        }
+    }
+    self->slabs_len = kept;
+    free(freeCount);
+
+    self->trimAt = max((long long) CBAR_SLAB_TRIM_BYTES, 2 * generalCbarManager_freeSlabBytes(self));
+}
+
+void generalCbarManager_trim(generalCbarManager * self) {
+    cbarThreadCache * cache = cbarThreadCache_get(self);
+    int c;
+    omp_set_lock(&self->lock);
+    for (c = 0; c < CBAR_SLAB_CLASSES; ++c) {
+        while (cache->freeList[c] != null) {
+            cbarHead * cbar = cache->freeList[c];
+            cache->freeList[c] = cbarSlab_next(cbar);
+            cbarSlab_next(cbar) = self->classes[c].freeList;
+            self->classes[c].freeList = cbar;
+        }
+        cache->freeCount[c] = 0;
+    }
+    generalCbarManager_trimLocked(self);
+    omp_unset_lock(&self->lock);
+}
+
+/* Give half of the free cbars of class c in the thread cache back to the manager. Slabs are trimmed once the free
+   bytes in them have doubled since the last trim */
+static void cbarThreadCache_flush(generalCbarManager * self, cbarThreadCache * cache, int c) {
+    omp_set_lock(&self->lock);
+    {
+        cbarSlabClass * slabClass = &self->classes[c];
+        while (cache->freeCount[c] > CBAR_THREAD_CACHE_LENGTH / 2) {
+            cbarHead * cbar = cache->freeList[c];
+            cache->freeList[c] = cbarSlab_next(cbar);
+            cbarSlab_next(cbar) = slabClass->freeList;
+            slabClass->freeList = cbar;
+            --cache->freeCount[c];
+        }
+        if (generalCbarManager_freeSlabBytes(self) > self->trimAt) {
+            generalCbarManager_trimLocked(self);
+        }
+    }
+    omp_unset_lock(&self->lock);
+}
+
 boolean generalCbarManager_initialize(generalCbarManager * self, int initialSize) {
     (void)initialSize;
     self->countOut = 0;
     self->initialSize = 0;
     self->memoryUsed = 0;
+    self->countAllocated = 0;
+    self->countReused = 0;
+    self->residentBytes = 0;
+    self->trimAt = CBAR_SLAB_TRIM_BYTES;
+    #pragma omp atomic capture
+    self->epoch = ++generalCbarManager_epochs;
+    memset(self->classes, 0, sizeof(self->classes));
+    self->slabs = null;
+    self->slabs_len = 0;
+    self->slabs_capacity = 0;
+    omp_init_lock(&self->lock);
+    generalCbarManager_register(self);
     return true;
 }
 
 void generalCbarManager_finalize(generalCbarManager * self) {
-    (void)self;
+    int k;
+    generalCbarManager_unregister(self);
+    for (k = 0; k < self->slabs_len; ++k) {
+        free(self->slabs[k].start);
+    }
+    free(self->slabs);
+    self->slabs = null;
+    self->slabs_len = 0;
+    omp_destroy_lock(&self->lock);
 }
 
 generalCbarManager * generalCbarManager_new(int initialSize) {
@@ -836,14 +1152,48 @@ long long generalCbarManager_memoryUsed(generalCbarManager * self) {
     return self->memoryUsed;
 }
 
+long long generalCbarManager_countAllocated(generalCbarManager * self) {
+    return self->countAllocated;
+}
+
+long long generalCbarManager_countReused(generalCbarManager * self) {
+    return self->countReused;
+}
+
+long long generalCbarManager_residentBytes(generalCbarManager * self) {
+    return self->residentBytes;
+}
+
 cbarHead * generalCbarManager_getCbar(generalCbarManager * self, osUnsignedLong cbarLength) {
 
     cbarHead * result = null;
-    (void)posix_memalign((void **) &result, 32, (size_t) cbarLength);
 
-    if (result == null) {
-        d("out of memory for %llu bytes", cbarLength);
-        terminate(0);
+    if (cbarLength <= CBAR_SLAB_MAX_LENGTH) {
+        int c = cbarSlab_class(cbarLength);
+        cbarThreadCache * cache = cbarThreadCache_get(self);
+        if (cache->freeCount[c] == 0) {
+            cbarThreadCache_refill(self, cache, c);
+        }
+        if (cache->freeCount[c] > 0) {
+            result = cache->freeList[c];
+            cache->freeList[c] = cbarSlab_next(result);
+            --cache->freeCount[c];
+            #pragma omp atomic update
+            ++self->countReused;
+        } else {
+            omp_set_lock(&self->lock);
+            result = generalCbarManager_carve(self, c);
+            omp_unset_lock(&self->lock);
+        }
+    } else {
+        (void)posix_memalign((void **) &result, 32, (size_t) cbarLength);
+
+        if (result == null) {
+            d("out of memory for %llu bytes", cbarLength);
+            terminate(0);
+        }
+        #pragma omp atomic update
+        self->residentBytes += cbarLength;
     }
 
     cbar_setSize(result, 0);
@@ -856,14 +1206,30 @@ cbarHead * generalCbarManager_getCbar(generalCbarManager * self, osUnsignedLong
     self->memoryUsed += cbarLength;
     #pragma omp atomic update
     ++self->countOut;
+    #pragma omp atomic update
+    ++self->countAllocated;
     return result;
 }
 
+/* The class of a cbar is found from its max size, which always holds the length it was asked with */
 void generalCbarManager_returnCbar(generalCbarManager * self, cbarHead ** pHead) {
     if (*pHead != null)  {
+        osUnsignedLong length = cbar_getMaxSize(*pHead);
         #pragma omp atomic update
-        self->memoryUsed -= cbar_getMaxSize(*pHead);
-        free(*pHead);
+        self->memoryUsed -= length;
+        if (length <= CBAR_SLAB_MAX_LENGTH) {
+            int c = cbarSlab_class(length);
+            cbarThreadCache * cache = cbarThreadCache_get(self);
+            cbarSlab_next(*pHead) = cache->freeList[c];
+            cache->freeList[c] = *pHead;
+            if (++cache->freeCount[c] > CBAR_THREAD_CACHE_LENGTH) {
+                cbarThreadCache_flush(self, cache, c);
+            }
+        } else {
+            #pragma omp atomic update
+            self->residentBytes -= length;
+            free(*pHead);
+        }
         *pHead = null;
         #pragma omp atomic update
         --self->countOut;
@@ -2012,6 +2378,156 @@ int cbar_compareCbars(cbarHead * cbarA, cbarHead * cbarB) {
     }
 }
 
+/* Hash of the set represented by a cbar. It is computed over the decoded
+ * (byte offset, byte value) stream, so cbars that compare equal hash equally
+ * whatever their encoding. */
+osUnsignedLong cbar_hash(cbarHead * cbar) {
+    osUnsignedLong h = 0xcbf29ce484222325ULL;
+    if (cbar == null) { return h; }
+    {
+        cbarReader reader;
+        cbarReader_set(&reader, cbar);
+        while (cbarReader_nextByte(&reader)) {
+            h ^= ((osUnsignedLong)reader.charOffset << 8) | *(reader.x);
+            h *= 0x100000001b3ULL;
+        }
+    }
+    h ^= h >> 33;
+    h *= 0xff51afd7ed558ccdULL;
+    h ^= h >> 33;
+    return h;
+}
+
+int cbar_countDifference(cbarHead * cbarA, cbarHead * cbarB) {
+    int count = 0;
+    if (cbarA == null) { return 0; }
+    if (cbarA == cbarB) { return 0; }
+
+    {
+        cbarReader readerA;
+        cbarReader readerB;
+        boolean AisFinished;
+        boolean BisFinished;
+        boolean readA;
+        boolean readB;
+
+        cbarReader_set(&readerA, cbarA);
+        cbarReader_set(&readerB, cbarB);
+
+        AisFinished = !cbarReader_nextByte(&readerA);
+        BisFinished = !cbarReader_nextByte(&readerB);
+
+        while (!AisFinished) {
+            readA = BisFinished || (readerA.charOffset <= readerB.charOffset);
+            readB = !BisFinished && (readerB.charOffset <= readerA.charOffset);
+
+            if (readA && !readB) {
+                count += __builtin_popcount(*(readerA.x));
+                AisFinished = !cbarReader_nextByte(&readerA);
+            } else if (readB && !readA) {
+                BisFinished = !cbarReader_nextByte(&readerB);
+            } else {
+                count += __builtin_popcount(*(readerA.x) & ~*(readerB.x) & 0xFF);
+                AisFinished = !cbarReader_nextByte(&readerA);
+                BisFinished = !cbarReader_nextByte(&readerB);
+            }
+        }
+    }
+    return count;
+}
+
+int cbar_countIntersection(cbarHead * cbarA, cbarHead * cbarB) {
+    int count = 0;
+    if ((cbarA == null) || (cbarB == null)) { return 0; }
+    if (cbarA == cbarB) { return cbar_countItems(cbarA); }
+
+    {
+        cbarReader readerA;
+        cbarReader readerB;
+        boolean AisFinished;
+        boolean BisFinished;
+        boolean readA;
+        boolean readB;
+
+        cbarReader_set(&readerA, cbarA);
+        cbarReader_set(&readerB, cbarB);
+
+        AisFinished = !cbarReader_nextByte(&readerA);
+        BisFinished = !cbarReader_nextByte(&readerB);
+
+        while (!(AisFinished || BisFinished)) {
+            readA = (readerA.charOffset <= readerB.charOffset);
+            readB = (readerB.charOffset <= readerA.charOffset);
+
+            if (readA && !readB) {
+                AisFinished = !cbarReader_nextByte(&readerA);
+            } else if (readB && !readA) {
+                BisFinished = !cbarReader_nextByte(&readerB);
+            } else {
+                count += __builtin_popcount(*(readerA.x) & *(readerB.x));
+                AisFinished = !cbarReader_nextByte(&readerA);
+                BisFinished = !cbarReader_nextByte(&readerB);
+            }
+        }
+    }
+    return count;
+}
+
+int cbar_unpackFrom(int ret[], cbarHead * cbar, int fromItem, int maxItems) {
+    int count = 0;
+    if ((cbar == null) || (maxItems <= 0)) { return 0; }
+    {
+        cbarReader reader;
+        osLong fromByte = fromItem / 8;
+        unsigned int byte;
+
+        // Bytes before 'fromItem' are skipped without decoding their bits
+        cbarReader_set(&reader, cbar);
+        while (cbarReader_nextByte(&reader)) {
+            if (reader.charOffset < fromByte) { continue; }
+            byte = *(reader.x);
+            if (reader.charOffset == fromByte) {
+                byte &= (0xFFu << (fromItem % 8)) & 0xFFu;
+            }
+            while (byte != 0) {
+                if (count == maxItems) { return count; }
+                ret[count++] = 8 * reader.charOffset + __builtin_ctz(byte);
+                byte &= byte - 1;
+            }
+        }
+    }
+    return count;
+}
+
+int cbar_nthItem(cbarHead * cbar, int n) {
+    int count = 0;
+    if ((cbar == null) || (n < 0)) { return -1; }
+    {
+        cbarReader reader;
+        unsigned char byte;
+        int inByte;
+
+        // Whole bytes are skipped with a popcount, only the byte holding
+        // the item is scanned bit by bit
+        cbarReader_set(&reader, cbar);
+        while (cbarReader_nextByte(&reader)) {
+            byte = *(reader.x);
+            inByte = __builtin_popcount(byte);
+            if (count + inByte > n) {
+                for (int k = 0; k < 8; ++k) {
+                    if ((byte >> k) & 1) {
+                        if (count++ == n) {
+                            return 8 * reader.charOffset + k;
+                        }
+                    }
+                }
+            }
+            count += inByte;
+        }
+    }
+    return -1;
+}
+
 int cbar_countItems(cbarHead * cbar) {
     int count = 0;
     if (cbar == null) { return 0; }
@@ -29,6 +29,10 @@
 #define segment_countItems  cbar_countItems
 #define segment_countItems_upto2  cbar_countItems_upto2
 #define segment_chooseItemIn cbar_chooseItemIn
+#define segment_countDifference cbar_countDifference
+#define segment_countIntersection cbar_countIntersection
+#define segment_nthItem cbar_nthItem
+#define segment_unpackFrom cbar_unpackFrom
 #define segmentWriter_set   cbarWriter_set
 #define segmentWriter_addTransformFromTable   cbarWriter_addTransformFromTable
 #define generalSegmentManager_getSegment  generalCbarManager_getCbar
@@ -37,9 +41,15 @@
 #define generalSegmentManager_delete  generalCbarManager_delete
 #define generalSegmentManager_allReturned  generalCbarManager_allReturned
 #define generalSegmentManager_countSegmentsOut generalCbarManager_countCbarsOut
+#define generalSegmentManager_memoryUsed generalCbarManager_memoryUsed
+#define generalSegmentManager_countAllocated generalCbarManager_countAllocated
+#define generalSegmentManager_countReused generalCbarManager_countReused
+#define generalSegmentManager_residentBytes generalCbarManager_residentBytes
+#define generalSegmentManager_trim generalCbarManager_trim
 #define maxSegmentIndex  2147483648
 #define segment_inSegment   cbar_inCbar
 #define segment_compareSegments  cbar_compareCbars
+#define segment_hash  cbar_hash
 #define segment_containsItem   cbar_containsItem
 #define segment_isDisjoint   cbar_isDisjoint
 #define segment_size   cbar_getSize
@@ -167,10 +177,44 @@ typedef struct cbarReader {
                                   should be moved 1 byte forward */
 } cbarReader;
 
+/* Cbars up to CBAR_SLAB_MAX_LENGTH bytes are carved from slabs in size classes, four classes per
+   power of two, and recycled through free lists. Every thread keeps up to CBAR_THREAD_CACHE_LENGTH
+   free cbars per class, so most requests inside parallel regions never take the manager lock.
+   Longer cbars are allocated and freed one by one. Set CBAR_SLAB_MAX_LENGTH to 0 to disable slabs.
+   Slabs whose cbars are all free are given back to the system once the free bytes in slabs exceed
+   CBAR_SLAB_TRIM_BYTES and have doubled since the last trim, see generalCbarManager_trim. */
+#define CBAR_SLAB_MAX_LENGTH 65536
+#define CBAR_SLAB_CLASSES 44
+#define CBAR_SLAB_LENGTH 262144
+#define CBAR_THREAD_CACHE_LENGTH 64
+#define CBAR_SLAB_TRIM_BYTES (16 * CBAR_SLAB_LENGTH)
+
+typedef struct cbarSlabClass {
+    cbarHead* freeList; /* free cbars linked through their first bytes */
+    char* slabNext;     /* next cbar to carve from the current slab */
+    char* slabEnd;
+} cbarSlabClass;
+
+typedef struct cbarSlab {
+    char* start;
+    osUnsignedLong length;
+    int c; /* size class of the cbars carved from it */
+} cbarSlab;
+
 typedef struct generalCbarManager {
     int initialSize;
     int countOut;
-    long long memoryUsed;
+    long long memoryUsed;     /* bytes requested by the cbars out */
+    long long countAllocated; /* cbars handed out */
+    long long countReused;    /* cbars handed out from a free list */
+    long long residentBytes;  /* bytes held from the system: slabs and long cbars out */
+    long long trimAt;         /* free bytes in slabs above which the slabs are trimmed */
+    long long epoch;          /* tells thread caches of deleted managers apart */
+    cbarSlabClass classes[CBAR_SLAB_CLASSES];
+    cbarSlab* slabs;
+    int slabs_len;
+    int slabs_capacity;
+    omp_lock_t lock;
 } generalCbarManager;
 
 typedef struct cbarWriter {
@@ -223,7 +267,12 @@ typedef struct frequencyMatrixEntry {
 int cbar_chooseItemIn(cbarHead* cbar);
 int cbar_countItems(cbarHead* cbar);
 int cbar_countItems_upto2(cbarHead* cbar);
+int cbar_countDifference(cbarHead* cbarA, cbarHead* cbarB);
+int cbar_countIntersection(cbarHead* cbarA, cbarHead* cbarB);
+int cbar_nthItem(cbarHead* cbar, int n);
+int cbar_unpackFrom(int ret[], cbarHead* cbar, int fromItem, int maxItems);
 int cbar_compareCbars(cbarHead* cbarA, cbarHead* cbarB);
+osUnsignedLong cbar_hash(cbarHead* cbar);
 boolean cbar_inCbar(cbarHead* includedCbar, cbarHead* containerCbar);
 boolean cbar_containsItem(cbarHead* cbar, int itemIndex);
 boolean cbarWriter_removeItem(cbarWriter* self, int itemIndex);
@@ -237,6 +286,11 @@ void cbarWriter_cloneFrom(cbarWriter* self, cbarHead* source);
 void cbarWriter_set(cbarWriter* self, cbarHead** onPtCbar, generalCbarManager* memoryManager);
 boolean generalCbarManager_allReturned(generalCbarManager* self);
 int generalCbarManager_countCbarsOut(generalCbarManager* self);
+long long generalCbarManager_memoryUsed(generalCbarManager* self);
+long long generalCbarManager_countAllocated(generalCbarManager* self);
+long long generalCbarManager_countReused(generalCbarManager* self);
+long long generalCbarManager_residentBytes(generalCbarManager* self);
+void generalCbarManager_trim(generalCbarManager* self);
 void generalCbarManager_delete(generalCbarManager** self);
 generalCbarManager* generalCbarManager_new(int initialSize);
 unsigned int cbarReader_currentItem(cbarReader* self);
@@ -246,6 +300,7 @@ void generalCbarManager_returnCbar(generalCbarManager* self, cbarHead** pHead);
 cbarHead* generalCbarManager_getCbar(generalCbarManager* self, osUnsignedLong cbarLength);
 void cbar_print(cbarHead* cbar);
 cbarHeaderCbarLength cbar_getSize(cbarHead* cbar);
+void cbar_setMaxSize(cbarHead* cbar, cbarHeaderCbarMaxLength maxSize);
 
 // hashMap
 void hashMap_delete(hashMap** self);
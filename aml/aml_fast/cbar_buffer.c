@@ -3,6 +3,7 @@
 
 #include "cbar.h"
 
+#include <inttypes.h>
 #include <string.h>
 
 // NOTE: It only works with compressed bitarrays
@@ -63,6 +64,55 @@ void segment_buildFromBuffer(
         /* Rebuild cbar */
         *segments[bar] = generalSegmentManager_getSegment(gsm, size);
         memcpy(*segments[bar], ptr, size);
+        cbar_setMaxSize(*segments[bar], size);
         ptr += size;
     }
 }
+
+// Blobs store cbars back to back, each one starting at a multiple of 'alignment' bytes, so that
+// they can be used in place (e.g. from a memory mapped file). Segment k spans from offsets[k] to
+// offsets[k + 1]; an empty segment has equal offsets.
+
+static uint64_t align_up(uint64_t value, int alignment)
+{
+    return (value + alignment - 1) / alignment * alignment;
+}
+
+uint64_t segment_getAllSegmentsBlobLength(segmentHead** segments, int segments_len, int alignment)
+{
+    uint64_t total_length = 0;
+    for (int bar = 0; bar < segments_len; ++bar) {
+        total_length = align_up(total_length + segment_size(segments[bar]), alignment);
+    }
+    return total_length;
+}
+
+void segment_getAllSegmentsBlob(
+    char* blob, uint64_t offsets[], segmentHead** segments, int segments_len, int alignment)
+{
+    uint64_t offset = 0;
+    for (int bar = 0; bar < segments_len; ++bar) {
+        osUnsignedLong size = segment_size(segments[bar]);
+        offsets[bar] = offset;
+        if (size) {
+            memcpy(blob + offset, segments[bar], size);
+            /* The copy owns exactly 'size' bytes */
+            cbar_setMaxSize((segmentHead*)(blob + offset), size);
+        }
+        uint64_t next = align_up(offset + size, alignment);
+        memset(blob + offset + size, 0, next - offset - size);
+        offset = next;
+    }
+    offsets[segments_len] = offset;
+}
+
+void segment_viewsFromBlob(segmentHead** segments[], char* blob, uint64_t offsets[], int segments_len)
+{
+    for (int bar = 0; bar < segments_len; ++bar) {
+        if (offsets[bar] == offsets[bar + 1]) {
+            *segments[bar] = NULL;
+        } else {
+            *segments[bar] = (segmentHead*)(blob + offsets[bar]);
+        }
+    }
+}
@@ -1,9 +1,15 @@
 // Algebraic AI - 2025
 // Go to github.com/Algebraic-AI for full license details.
 
+#include <inttypes.h>
+
 #include "cbar.h"
 
 int segment_getAllSegmentsBufferLength(segmentHead** segments, int segments_len);
 void segment_getAllSegmentsBuffer(char* buffer, segmentHead** segments, int segments_len);
 int segment_getBufferNumberOfCbars(char* buffer);
 void segment_buildFromBuffer(char* buffer, segmentHead** segments[], generalSegmentManager* gsm);
+uint64_t segment_getAllSegmentsBlobLength(segmentHead** segments, int segments_len, int alignment);
+void segment_getAllSegmentsBlob(
+    char* blob, uint64_t offsets[], segmentHead** segments, int segments_len, int alignment);
+void segment_viewsFromBlob(segmentHead** segments[], char* blob, uint64_t offsets[], int segments_len);
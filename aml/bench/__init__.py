@@ -0,0 +1,5 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+from .workloads import WORKLOADS, SIZES
+from .runner import runWorkload, runSuite, compareWithBaseline
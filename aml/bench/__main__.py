@@ -0,0 +1,64 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import argparse
+import json
+import sys
+
+from .runner import runSuite, compareWithBaseline
+from .workloads import WORKLOADS, SIZES
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m aml.bench",
+        description="Run the AML benchmark workloads and compare them with a baseline.",
+    )
+    parser.add_argument("workloads", nargs="*", metavar="workload",
+                        help=f"workloads to run (default: all). Available: {', '.join(WORKLOADS)}")  # fmt:skip
+    parser.add_argument("--size", choices=SIZES, default="small")
+    parser.add_argument("--seed", type=int, default=123456789)
+    parser.add_argument("--output", "-o", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", "-b", help="JSON results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown over the baseline as a fraction (default: 0.2)")  # fmt:skip
+    parser.add_argument("--no-isolate", action="store_true",
+                        help="run all workloads in this process")  # fmt:skip
+    args = parser.parse_args(argv)
+    for name in args.workloads:
+        if name not in WORKLOADS:
+            parser.error(f"unknown workload '{name}'")
+
+    results = runSuite(
+        args.workloads or None, args.size, args.seed, isolate=not args.no_isolate
+    )
+
+    for name, res in results["workloads"].items():
+        stages = ", ".join(
+            f"{stage} {value['time']:.3f}s"
+            for stage, value in res["stages"].items()
+            if value["calls"]
+        )
+        print(f"{name}: {res['wall']:.3f}s atoms {res['atoms']} unionModel {res['unionModel']}")  # fmt:skip
+        if stages:
+            print(f"  {stages}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        lines, regressions = compareWithBaseline(results, baseline, args.tolerance)
+        print()
+        print("\n".join(lines))
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.tolerance:.0%}")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import multiprocessing
+import platform
+import random
+import resource
+import sys
+import time
+
+import aml
+from .. import profiling
+from .workloads import WORKLOADS
+
+# Compiled stages whose wall time is reported
+STAGES = (
+    "crossAll",
+    "freeTraceAll",
+    "traceAll",
+    "traceClosure",
+    "selectAllUsefulIndicators",
+    "reduceIndicators",
+    "simplifyFromConstants",
+)
+
+FORMAT_VERSION = 1
+
+
+def _peakRSS():
+    """Peak resident set size of this process in bytes"""
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def runWorkload(name, size, seed):
+    """
+    Run the workload 'name' at the given size preset and return its record:
+    wall time, time per stage, peak RSS and the workload counters.
+    """
+
+    verbosityLevel = aml.config.verbosityLevel
+    aml.config.verbosityLevel = aml.config.Verbosity.Warn
+    random.seed(seed)
+    profiling.reset()
+    profiling.enable()
+    try:
+        start = time.perf_counter()
+        counters = WORKLOADS[name](size)
+        wall = time.perf_counter() - start
+    finally:
+        profiling.disable()
+        aml.config.verbosityLevel = verbosityLevel
+
+    stats = profiling.stats()
+    stages = {}
+    for stage in STAGES:
+        st = stats.get(stage, {"total": 0.0, "native": 0.0, "count": 0})
+        stages[stage] = {"time": st["total"], "native": st["native"], "calls": st["count"]}  # fmt:skip
+
+    return {
+        "wall": wall,
+        "stages": stages,
+        "peakRSS": _peakRSS(),
+        **counters,
+    }
+
+
+def _runWorkloadIsolated(args):
+    return runWorkload(*args)
+
+
+def runSuite(names=None, size="small", seed=123456789, isolate=True):
+    """
+    Run the workloads in 'names' (all if None) and return the results as a
+    dict ready to be stored as JSON. With 'isolate' every workload runs in
+    its own process, so peak RSS is measured per workload.
+    """
+
+    if names is None:
+        names = list(WORKLOADS)
+    for name in names:
+        if name not in WORKLOADS:
+            raise KeyError(f"Unknown workload '{name}'")
+
+    workloads = {}
+    for name in names:
+        if isolate:
+            with multiprocessing.get_context().Pool(1, maxtasksperchild=1) as pool:
+                workloads[name] = pool.apply(_runWorkloadIsolated, ((name, size, seed),))  # fmt:skip
+        else:
+            workloads[name] = runWorkload(name, size, seed)
+
+    return {
+        "version": FORMAT_VERSION,
+        "size": size,
+        "seed": seed,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "workloads": workloads,
+    }
+
+
+def compareWithBaseline(results, baseline, tolerance=0.2, minTime=0.05):
+    """
+    Compare 'results' with a 'baseline' produced by runSuite.
+    Return a list of report lines and the list of regressions: timings that
+    grew more than 'tolerance' (as a fraction) over the baseline. Timings
+    below 'minTime' seconds in the baseline are reported but never counted
+    as regressions. Counters that differ from the baseline are reported, as
+    the workloads are deterministic for a given size and seed.
+    """
+
+    lines = []
+    regressions = []
+
+    if (results["size"], results["seed"]) != (baseline["size"], baseline["seed"]):
+        lines.append(
+            f"warning: baseline was run with size {baseline['size']} and seed {baseline['seed']}"
+        )
+
+    for name, res in results["workloads"].items():
+        if name not in baseline["workloads"]:
+            lines.append(f"{name}: not in baseline")
+            continue
+        base = baseline["workloads"][name]
+
+        timings = [("wall", base["wall"], res["wall"])]
+        for stage, value in res["stages"].items():
+            if stage in base["stages"] and (value["calls"] or base["stages"][stage]["calls"]):  # fmt:skip
+                timings.append((stage, base["stages"][stage]["time"], value["time"]))
+
+        for label, before, after in timings:
+            ratio = after / before if before > 0 else float("inf") if after > 0 else 1.0
+            flag = ""
+            if before >= minTime and ratio > 1 + tolerance:
+                flag = " REGRESSION"
+                regressions.append(f"{name}.{label}")
+            lines.append(f"{name}.{label}: {before:.3f}s -> {after:.3f}s ({ratio:.2f}x){flag}")
+
+        rss = res["peakRSS"] / max(base["peakRSS"], 1)
+        lines.append(f"{name}.peakRSS: {base['peakRSS'] >> 20}MB -> {res['peakRSS'] >> 20}MB ({rss:.2f}x)")
+
+        for counter in ("atoms", "unionModel"):
+            if base.get(counter) != res.get(counter):
+                lines.append(f"{name}.{counter}: {base.get(counter)} -> {res.get(counter)} (changed)")
+
+    return lines, regressions
@@ -0,0 +1,268 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+"""
+Reproducible workloads for the benchmark suite.
+
+Every workload is a reduced, size-parameterized version of one of the
+bundled examples. They only depend on the random seed and the size preset,
+so two runs with the same arguments perform the same computation. The
+Sudoku and Hamiltonian cycles workloads load the embedding theories shipped
+in the Examples directory; the others generate their data.
+"""
+
+import os
+import random
+
+import aml
+
+SIZES = ("small", "medium", "large")
+
+EXAMPLES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "Examples",
+)
+
+
+def _freestModel(model, constantsNames):
+    """Add the constants to the model and one atom for every constant"""
+
+    for name in constantsNames:
+        c = model.cmanager.setNewConstantIndexWithName(name)
+        model.atomization.append(aml.Atom(model.epoch, model.generation, [c]))
+
+
+def _duplesFromEmbedding(embedding):
+    pduples = []
+    for L, R, region, _ in embedding["positiveDuples"]:
+        pduples.append(aml.Duple(aml.LCSegment(L), aml.LCSegment(R), True, 0, region))  # fmt:skip
+
+    nduples = []
+    for L, R, region, hyp in embedding["negativeDuples"]:
+        rlt = aml.Duple(aml.LCSegment(L), aml.LCSegment(R), False, 0, region)
+        rlt.hypothesis = hyp
+        nduples.append(rlt)
+
+    return pduples, nduples
+
+
+def _loadEmbedding(fileName, *args):
+    path = os.path.join(EXAMPLES_DIR, fileName)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(
+            f"{path} not found. This workload needs the Examples directory of the repository."
+        )
+    return aml.amldl.load_embedding(path, *args)
+
+
+# ------------------------------------------------------------------------------
+# Pattern recognition (example01): absence of a vertical bar in a noisy grid
+
+
+def _verticalBarExample(side, noise):
+    ret = []
+    retW = []
+    column = random.randint(0, side - 1)
+    for i in range(side * side):
+        if i % side == column or random.randint(0, 1 + noise) == 0:
+            ret.append(i)
+        else:
+            retW.append(side * side + i)
+    ret.extend(retW)
+    return ret
+
+
+def _nonVerticalBarExample(side, noise):
+    while True:
+        ret = []
+        retW = []
+        for i in range(side * side):
+            if random.randint(0, 1 + noise) == 0:
+                ret.append(i)
+            else:
+                retW.append(side * side + i)
+        present = set(ret)
+        hasLine = any(
+            all(y * side + x in present for y in range(side)) for x in range(side)
+        )
+        if not hasLine:
+            ret.extend(retW)
+            return ret
+
+
+def patternRecognition(size):
+    side, batches, batchSize = {
+        "small": (4, 6, 200),
+        "medium": (5, 10, 400),
+        "large": (6, 20, 1000),
+    }[size]
+    noise = 0
+
+    model = aml.Model()
+    for i in range(2 * side * side):
+        model.cmanager.setNewConstantIndex()
+    vTerm = aml.LCSegment([model.cmanager.setNewConstantIndexWithName("v")])
+
+    embedder = aml.sparse_crossing_embedder(model)
+    embedder.params.useReduceIndicators = False
+    embedder.params.byQuotient = False
+
+    for _ in range(batches):
+        pbatch = []
+        nbatch = []
+        for _ in range(batchSize):
+            term = aml.LCSegment(_nonVerticalBarExample(side, noise))
+            pbatch.append(aml.Duple(vTerm, term, True, model.generation, 1))
+            term = aml.LCSegment(_verticalBarExample(side, noise))
+            nbatch.append(aml.Duple(vTerm, term, False, model.generation, 1))
+        embedder.enforce(pbatch, nbatch)
+
+    return {"atoms": len(model.atomization), "unionModel": len(embedder.unionModel)}
+
+
+# ------------------------------------------------------------------------------
+# Sudoku (example02): sparse crossing of the Sudoku embedding from the
+# freest model
+
+
+def sudoku(size):
+    gridDimension, attempts = {
+        "small": (4, 3),
+        "medium": (5, 5),
+        "large": (6, 10),
+    }[size]
+
+    embedding = _loadEmbedding("embedding_Sudoku.py", gridDimension)
+    model = aml.Model()
+    _freestModel(model, embedding["constantsNames"])
+    pduples, nduples = _duplesFromEmbedding(embedding)
+
+    embedder = aml.sparse_crossing_embedder(model)
+    embedder.params.storePositives = False
+    embedder.params.byQuotient = False
+    embedder.params.useReduceIndicators = True
+    embedder.params.negativeIndicatorThreshold = -1
+
+    initial = aml.atomizationCopy(model.atomization)
+    for _ in range(attempts):
+        embedder.setAtomization(aml.atomizationCopy(initial))
+        embedder.enforce(pduples, nduples)
+
+    return {"atoms": len(model.atomization), "unionModel": len(embedder.unionModel)}
+
+
+# ------------------------------------------------------------------------------
+# Hamiltonian cycles (example03): sparse crossing of the Hamiltonian cycles
+# embedding of a random graph that contains a cycle through all vertexes
+
+
+def _randomCycleGraph(nVertexes, p):
+    ady = [[0] * nVertexes for _ in range(nVertexes)]
+    for v in range(nVertexes):
+        ady[v][(v + 1) % nVertexes] = 1
+        ady[(v + 1) % nVertexes][v] = 1
+        for vv in range(v + 2, nVertexes):
+            if random.random() < p:
+                ady[v][vv] = 1
+                ady[vv][v] = 1
+    return ady
+
+
+def hamiltonianCycles(size):
+    nVertexes, attempts = {
+        "small": (10, 5),
+        "medium": (14, 10),
+        "large": (20, 20),
+    }[size]
+
+    embedding = _loadEmbedding("embedding_HamiltonianCycles.py", _randomCycleGraph(nVertexes, 0.15))  # fmt:skip
+    model = aml.Model()
+    _freestModel(model, embedding["constantsNames"])
+    pduples, nduples = _duplesFromEmbedding(embedding)
+
+    embedder = aml.sparse_crossing_embedder(model)
+    embedder.params.storePositives = False
+    embedder.params.byQuotient = False
+    embedder.params.useReduceIndicators = True
+    embedder.params.simplify_threshold = 1.1
+    embedder.params.ignore_single_const_ucs = False
+    embedder.params.negativeIndicatorThreshold = 0.5
+
+    initial = aml.atomizationCopy(model.atomization)
+    for _ in range(attempts):
+        embedder.setAtomization(aml.atomizationCopy(initial))
+        embedder.enforce(pduples, nduples)
+
+    return {"atoms": len(model.atomization), "unionModel": len(embedder.unionModel)}
+
+
+# ------------------------------------------------------------------------------
+# MNIST-like classification (example04) on synthetic digits: every class has
+# a random stroke prototype and samples are noisy, shifted copies of it
+
+
+def _digitPrototype(side):
+    pixels = set()
+    x = random.randrange(side)
+    y = random.randrange(side)
+    for _ in range(3 * side):
+        pixels.add((x, y))
+        x = min(max(x + random.randint(-1, 1), 0), side - 1)
+        y = min(max(y + random.randint(-1, 1), 0), side - 1)
+    return pixels
+
+
+def _digitSample(prototype, side, flips):
+    dx = random.randint(-1, 1)
+    dy = random.randint(-1, 1)
+    on = set()
+    for x, y in prototype:
+        if 0 <= x + dx < side and 0 <= y + dy < side:
+            on.add((y + dy) * side + x + dx)
+    for _ in range(flips):
+        on ^= {random.randrange(side * side)}
+    return [i if i in on else i + side * side for i in range(side * side)]
+
+
+def mnistSynthetic(size):
+    side, batches, batchSize = {
+        "small": (8, 4, 50),
+        "medium": (12, 8, 100),
+        "large": (28, 10, 200),
+    }[size]
+    numClasses = 10
+    flips = side // 2
+
+    model = aml.Model()
+    for i in range(2 * side * side):
+        model.cmanager.setNewConstantIndex()
+    dTerm = []
+    for d in range(numClasses):
+        dTerm.append(aml.LCSegment([model.cmanager.setNewConstantIndexWithName(f"D[{d}]")]))  # fmt:skip
+    prototypes = [_digitPrototype(side) for _ in range(numClasses)]
+
+    embedder = aml.sparse_crossing_embedder(model)
+    embedder.params.useReduceIndicators = True
+    embedder.params.byQuotient = False
+
+    for _ in range(batches):
+        pbatch = []
+        nbatch = []
+        for _ in range(batchSize):
+            label = random.randrange(numClasses)
+            term = aml.LCSegment(_digitSample(prototypes[label], side, flips))
+            pbatch.append(aml.Duple(dTerm[label], term, True, 0, 1 + label))
+            for d in range(numClasses):
+                if d != label:
+                    nbatch.append(aml.Duple(dTerm[d], term, False, 0, 1 + d))
+        embedder.enforce(pbatch, nbatch)
+
+    return {"atoms": len(model.atomization), "unionModel": len(embedder.unionModel)}
+
+
+WORKLOADS = {
+    "patternRecognition": patternRecognition,
+    "sudoku": sudoku,
+    "hamiltonianCycles": hamiltonianCycles,
+    "mnistSynthetic": mnistSynthetic,
+}
@@ -24,10 +24,15 @@ class compiledFunc:
     calculateLowerAtomicSegments = True
     considerPositiveDuples = True
     crossAll = True
+    duplesDiscriminantSizes = True
+    duplesPendingDiscriminants = True
     freeTraceAll = True
     reduceIndicators = True
+    removeRedundantAtoms = True
+    removeRepeatedAtoms = True
     selectAllUsefulIndicators = True
     simplifyFromConstants = True
     storeTracesOfConstants = True
     traceAll = True
+    traceClosure = True
     updateUnionModelWithSetOfPduples = True
@@ -1,11 +1,16 @@
 # Copyright (C) 2025 Algebraic AI - All Rights Reserved
 # Go to github.com/algebraic-ai for full license details.
 
+import collections
 import random
 import traceback
 
+import numpy as np
+
 from .aml_fast.aml_fast import runCompiled
-from . import amlset
+from .aml_fast.amlFastTraceMatrix import TraceMatrix
+from .aml_fast.amlFastDenseBitarrays import DenseBitarrayVector
+from . import amlset, amlsetForUniverse
 from . import config
 from .io import logDebug, logInfo, logWarn, logError
 
@@ -36,6 +41,43 @@ class CSegment(amlset):
     pass
 
 
+# Set operations that only need the size or a random element of the result.
+# Bitarrays compute them in C without building the result, sets fall back to
+# building it.
+
+
+def differenceLen(a, b):
+    """Return len(a - b)"""
+
+    if isinstance(a, (set, frozenset)):
+        return len(a - b)
+    return a.difference_len(b)
+
+
+def intersectionLen(a, b):
+    """Return len(a & b)"""
+
+    if isinstance(a, (set, frozenset)):
+        return len(a & b)
+    return a.intersection_len(b)
+
+
+def intersectsAnyOf(a, others):
+    """Return True if 'a' is not disjoint with some set in 'others'"""
+
+    if isinstance(a, (set, frozenset)):
+        return any(not a.isdisjoint(o) for o in others)
+    return a.intersects_any_of(others)
+
+
+def chooseRandom(a):
+    """Same as random.choice(tuple(a))"""
+
+    if isinstance(a, (set, frozenset)):
+        return random.choice(tuple(a))
+    return a.choose_random()
+
+
 class Atom:
     """
     Individual atom from an atomization model.
@@ -137,6 +179,407 @@ class Duple:
         return Duple(self.L, self.R, self.positive, self.generation, self.region, self.hypothesis)  # fmt:skip
 
 
+class TermPool:
+    """
+    Interns terms by content: equal terms get the same object and a stable
+    ID. Values computed from a term (free trace, trace, lower atomic segment)
+    are cached per ID together with the stamp they were computed for, the
+    TraceLayout of the tracer period or the version of an AtomIndex. Traces
+    stamped with a layout the tracer still holds, including those stored
+    under earlier tracers chained through 'previous', are patched to the
+    current layout, the rest are recalculated. Terms are treated as
+    immutable, so an interned term must not be modified in place.
+
+    Vars:
+    terms (list)   : interned terms, indexed by ID
+    """
+
+    def __init__(self):
+        self.terms = []
+        self._ids = {}
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.terms)
+
+    def termId(self, term):
+        """ID of 'term', interning it if no equal term is in the pool"""
+
+        key = frozenset(term) if isinstance(term, set) else term
+        tid = self._ids.get(key)
+        if tid is None:
+            tid = len(self.terms)
+            self._ids[key] = tid
+            self.terms.append(term)
+        return tid
+
+    def intern(self, term):
+        """The pooled term equal to 'term'"""
+
+        return self.terms[self.termId(term)]
+
+    def cached(self, kind, tid, stamp):
+        """Value of 'kind' stored for term 'tid' at 'stamp', None if stale"""
+
+        entry = self._cache.get((kind, tid))
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        return None
+
+    def store(self, kind, tid, stamp, value):
+        self._cache[(kind, tid)] = (stamp, value)
+        return value
+
+    def clearCache(self):
+        self._cache = {}
+
+    def patchable(self, kind, tid, tracer, *keys):
+        """
+        Trace of 'kind' stored for term 'tid' and the TraceLayout it was
+        stored in, if it was stored for the same 'keys' and 'tracer' can
+        patch it to its current layout. None otherwise.
+        """
+
+        entry = self._cache.get((kind, tid))
+        if entry is None or entry[0][1:] != keys or bool(tracer.discardedIndicators):
+            return None
+        old = entry[0][0]
+        if tracer.layouts.get(old.period) is not old:
+            return None
+        return entry[1], old
+
+    def freeTraceOfTerm(self, tracer, term):
+        """
+        Same as tracer.getFreeTraceOfTerm, cached for the layout of the
+        tracer period. The returned set is shared, copy it to modify it.
+        """
+
+        tid = self.termId(term)
+        layout = tracer.layout()
+        ret = self.cached("freeTrace", tid, (layout,))
+        if ret is None:
+            stored = self.patchable("freeTrace", tid, tracer)
+            if stored is None:
+                ret = tracer.getFreeTraceOfTerm(term)
+            else:
+                ret = layout.patch(*stored, lambda k: tracer.isInFreeTraceOfTerm(term, k))  # fmt:skip
+            self.store("freeTrace", tid, (layout,), ret)
+        return ret
+
+    def traceOfTerm(self, tracer, index, atomization, term):
+        """
+        Same as tracer.getTraceOfTerm over 'atomization', cached for the
+        layout of the tracer period and the version of 'index', an AtomIndex
+        following 'atomization'. The returned set is shared, copy it to
+        modify it.
+        """
+
+        index.update(atomization)
+        tid = self.termId(term)
+        layout = tracer.layout()
+        stamp = (layout, index.ID, index.version)
+        ret = self.cached("trace", tid, stamp)
+        if ret is None:
+            stored = self.patchable("trace", tid, tracer, index.ID, index.version)
+            if stored is None:
+                ret = tracer.getTraceOfTerm(term, atomization)
+            else:
+                atoms = index.atomsIn(atomization, term)
+                ret = layout.patch(*stored, lambda k: all(tracer.isInTraceOfAtom(at, k) for at in atoms))  # fmt:skip
+            self.store("trace", tid, stamp, ret)
+        return ret
+
+    def lowerAtomicSegmentOfTerm(self, index, atomization, term):
+        """
+        Slots of 'index' in the lower atomic segment of 'term', cached for
+        the version of 'index' after updating it to 'atomization'. The
+        returned set is shared, copy it to modify it.
+        """
+
+        index.update(atomization)
+        tid = self.termId(term)
+        stamp = (index.ID, index.version)
+        ret = self.cached("las", tid, stamp)
+        if ret is None:
+            ret = self.store("las", tid, stamp, index.lowerAtomicSegment(term))
+        return ret
+
+
+class DupleBatch:
+    """
+    Columnar storage for a large set of duples. The flags, generation, region
+    and last union model update of the duples are NumPy columns, and their
+    terms are IDs into a pool where equal terms are stored once. A batch can
+    be passed to the embedders and to the compiled duple routines instead of
+    a list of Duple. Indexing a batch with an integer returns a Duple, and
+    with a slice, mask or array of rows another batch on the same pool.
+
+    Vars:
+    L,R (np.ndarray)               : IDs of the left and right terms in 'terms'
+    positive (np.ndarray)          : True for positive duples
+    generation (np.ndarray)        : generation at which every duple was created
+    region (np.ndarray)            : region of every duple
+    hypothesis (np.ndarray)        : True for hypothesis duples
+    lastUnionUpdate (np.ndarray)   : last union model update every duple has seen
+    pool (TermPool)                : pool of the terms, shared with batches selected from this one
+    space (termSpace)              : if set, the Duples of the batch get the elements
+                                     of their terms in 'space' as wL and wH
+    """
+
+    _COLUMNS = (
+        ("L", np.uint32),
+        ("R", np.uint32),
+        ("positive", bool),
+        ("generation", np.int64),
+        ("region", np.int64),
+        ("hypothesis", bool),
+        ("lastUnionUpdate", np.int64),
+    )
+    _COLUMN_NAMES = frozenset(name for name, _ in _COLUMNS)
+
+    def __init__(self, pool=None):
+        self.pool = TermPool() if pool is None else pool
+        self.space = None
+        self._len = 0
+        self._data = {name: np.empty(16, dtype=dtype) for name, dtype in self._COLUMNS}
+
+    def __getattr__(self, name):
+        # Columns are views of the used part of the buffers
+        if name in DupleBatch._COLUMN_NAMES:
+            return self._data[name][: self._len]
+        raise AttributeError(name)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for k in range(self._len):
+            yield self.duple(k)
+
+    def __getitem__(self, rows):
+        if isinstance(rows, (int, np.integer)):
+            if rows < 0:
+                rows += self._len
+            if not 0 <= rows < self._len:
+                raise IndexError("DupleBatch index out of range")
+            return self.duple(rows)
+        return self.select(rows)
+
+    def __repr__(self):
+        return f"DupleBatch({self._len} duples, {len(self.pool)} terms in pool)"
+
+    @property
+    def terms(self):
+        return self.pool.terms
+
+    def termIds(self):
+        """Sorted IDs of the terms used by the duples of this batch"""
+
+        return np.unique(np.concatenate([self.L, self.R]))
+
+    def uniqueTermIds(self, *columns):
+        """
+        IDs of the terms in 'columns' ("L", "R") in order of first appearance,
+        reading the columns row by row
+        """
+
+        ids = np.stack([getattr(self, name) for name in columns], axis=1).ravel()
+        _, first = np.unique(ids, return_index=True)
+        return ids[np.sort(first)]
+
+    def __reserve(self, size):
+        capacity = len(self._data["L"])
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name, column in self._data.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[: self._len] = column[: self._len]
+            self._data[name] = grown
+
+    def add(self, L, R, positive, generation, region, hypothesis=False):
+        """Append the duple 'L < R' with the arguments of Duple"""
+
+        self.__reserve(self._len + 1)
+        k = self._len
+        self._data["L"][k] = self.pool.termId(L)
+        self._data["R"][k] = self.pool.termId(R)
+        self._data["positive"][k] = positive
+        self._data["generation"][k] = generation
+        self._data["region"][k] = region
+        self._data["hypothesis"][k] = hypothesis
+        self._data["lastUnionUpdate"][k] = -1
+        self._len += 1
+
+    def append(self, r):
+        """Append a copy of the Duple 'r', keeping its lastUnionUpdate"""
+
+        self.add(r.L, r.R, r.positive, r.generation, r.region, r.hypothesis)
+        self._data["lastUnionUpdate"][self._len - 1] = r.lastUnionUpdate
+
+    def extend(self, duples):
+        """Append a list of Duple or the rows of another batch"""
+
+        if not isinstance(duples, DupleBatch):
+            for r in duples:
+                self.append(r)
+            return
+
+        if duples.pool is self.pool:
+            L, R = duples.L, duples.R
+        else:
+            ids = np.zeros(len(duples.pool), dtype=np.uint32)
+            for tid in duples.termIds():
+                ids[tid] = self.pool.termId(duples.terms[tid])
+            L, R = ids[duples.L], ids[duples.R]
+        self.__reserve(self._len + len(duples))
+        end = self._len + len(duples)
+        for name, _ in self._COLUMNS:
+            self._data[name][self._len : end] = getattr(duples, name)
+        self._data["L"][self._len : end] = L
+        self._data["R"][self._len : end] = R
+        self._len = end
+
+    @classmethod
+    def fromDuples(cls, duples, pool=None):
+        """Batch with a copy of the list of Duple 'duples'"""
+
+        batch = cls(pool)
+        batch.__reserve(len(duples))
+        batch.extend(duples)
+        return batch
+
+    def duple(self, k):
+        """Duple with the values of row 'k'"""
+
+        r = Duple(
+            self.terms[self._data["L"][k]],
+            self.terms[self._data["R"][k]],
+            bool(self._data["positive"][k]),
+            int(self._data["generation"][k]),
+            int(self._data["region"][k]),
+            bool(self._data["hypothesis"][k]),
+        )
+        r.lastUnionUpdate = int(self._data["lastUnionUpdate"][k])
+        if self.space is not None:
+            r.wL = self.space.element(int(self._data["L"][k]))
+            r.wH = self.space.element(int(self._data["R"][k]))
+        return r
+
+    def toDuples(self):
+        """List of Duple with the rows of this batch"""
+
+        return [self.duple(k) for k in range(self._len)]
+
+    def select(self, rows):
+        """Batch with the rows 'rows' (slice, boolean mask or indices), same pool"""
+
+        batch = DupleBatch(self.pool)
+        batch.space = self.space
+        for name, _ in self._COLUMNS:
+            batch._data[name] = np.array(getattr(self, name)[rows])
+        batch._len = len(batch._data["L"])
+        if batch._len == 0:
+            batch._data = {name: np.empty(16, dtype=dtype) for name, dtype in self._COLUMNS}
+        return batch
+
+    def copy(self):
+        return self.select(slice(None))
+
+    def shuffle(self):
+        """
+        Shuffle the rows in place. The random module is drawn as by
+        random.shuffle on a list of the same length.
+        """
+
+        order = list(range(self._len))
+        random.shuffle(order)
+        for name, _ in self._COLUMNS:
+            self._data[name][: self._len] = getattr(self, name)[order]
+
+    def storeUnionUpdates(self, duples):
+        """
+        Copy lastUnionUpdate to 'duples', a list of Duple or a DupleBatch with
+        the same rows
+        """
+
+        if isinstance(duples, DupleBatch):
+            duples.lastUnionUpdate[:] = self.lastUnionUpdate
+        else:
+            for r, lastUnionUpdate in zip(duples, self.lastUnionUpdate.tolist()):
+                r.lastUnionUpdate = lastUnionUpdate
+
+
+def asDupleBatch(duples, pool):
+    """'duples' if it is a DupleBatch on 'pool', else a copy on 'pool'"""
+
+    if isinstance(duples, DupleBatch) and duples.pool is pool:
+        return duples
+    return DupleBatch.fromDuples(duples, pool)
+
+
+def duplesColumn(duples, name):
+    """Column 'name' of a list of Duple or a DupleBatch, as a NumPy array"""
+
+    if isinstance(duples, DupleBatch):
+        return getattr(duples, name)
+    dtype = dict(DupleBatch._COLUMNS)[name]
+    return np.array([getattr(r, name) for r in duples], dtype=dtype)
+
+
+def selectDuples(duples, rows):
+    """Duples in the positions 'rows' of a list of Duple or a DupleBatch"""
+
+    if isinstance(duples, DupleBatch):
+        return duples.select(np.array(rows, dtype=np.intp))
+    return [duples[k] for k in rows]
+
+
+def shuffleDuples(duples):
+    """Shuffle a list of Duple or a DupleBatch in place"""
+
+    if isinstance(duples, DupleBatch):
+        duples.shuffle()
+    else:
+        random.shuffle(duples)
+
+
+def setLastUnionUpdate(duples, unionUpdates):
+    """Mark the non hypothesis duples of 'duples' as checked at 'unionUpdates'"""
+
+    if isinstance(duples, DupleBatch):
+        duples.lastUnionUpdate[~duples.hypothesis] = unionUpdates
+        return
+    for r in duples:
+        if not r.hypothesis:
+            r.lastUnionUpdate = unionUpdates
+
+
+def sortedByUnionUpdate(duples):
+    """Copy of 'duples' stably sorted by lastUnionUpdate"""
+
+    if isinstance(duples, DupleBatch):
+        return duples.select(np.argsort(duples.lastUnionUpdate, kind="stable"))
+    ret = duples.copy()
+    ret.sort(key=lambda r: r.lastUnionUpdate)
+    return ret
+
+
+def constantsOfDuples(duples):
+    """CSegment with the constants in the terms of 'duples'"""
+
+    ret = CSegment()
+    if isinstance(duples, DupleBatch):
+        for tid in duples.termIds().tolist():
+            ret |= duples.terms[tid]
+    else:
+        for r in duples:
+            ret |= r.L
+            ret |= r.R
+    return ret
+
+
 class ConstantManager:
     """
     Hold information about the model's constants.
@@ -212,9 +655,7 @@ class ConstantManager:
         for at in unionModel:
             standing |= CSegment(at.ucs)
 
-        for r in storedPositives:
-            standing |= r.L
-            standing |= r.R
+        standing |= constantsOfDuples(storedPositives)
 
         toDelete = self.embeddingConstants - standing
 
@@ -359,7 +800,45 @@ def cross_simpler(
     return ret
 
 
-def cross(discriminant, nonDiscriminant, lasRightTerm, atomization, constants, epoch, binary):  # fmt:skip
+def crossProduct(discriminant, lasRightTerm, epoch, chunkSize):
+    """
+    Generator over the product discriminant x lasRightTerm.
+    Yields lists of at most 'chunkSize' atoms, so the product is never held
+    in memory as a whole.
+    """
+
+    chunk = []
+    for atL in discriminant:
+        for atH in lasRightTerm:
+            chunk.append(atL.atomUnion(atH, epoch))
+            if len(chunk) >= chunkSize:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def _addNonRepeatedAtoms(ret, index, atoms):
+    """
+    Append to 'ret' the atoms in 'atoms' that are not in 'index', a dict from
+    atom to itself. Repeated atoms are merged as in removeRepeatedAtoms.
+    Returns the number of repeated atoms.
+    """
+
+    repeated = 0
+    for at in atoms:
+        at2 = index.get(at)
+        if at2 is None:
+            index[at] = at
+            ret.append(at)
+        else:
+            at2.epoch = min(at2.epoch, at.epoch)
+            at2.gen = max(at2.gen, at.gen)
+            repeated += 1
+    return repeated
+
+
+def cross(discriminant, nonDiscriminant, lasRightTerm, atomization, constants, epoch, binary, maxAtoms=1000000):  # fmt:skip
     """
     Performs full crossing of a Duple (leftTerm, rightTerm) over atomization.
     It removes repeted and redundant atoms during training.
@@ -367,41 +846,44 @@ def cross(discriminant, nonDiscriminant, lasRightTerm, atomization, constants, e
         (discriminant, nonDiscriminant, lasRightTerm)
             = separateDiscriminant(leftTerm, rightTerm, atomization)
 
+    The product is consumed in chunks. Repeated atoms are discarded as they
+    are produced, and redundant atoms are removed every time the result
+    reaches 'maxAtoms'.
+
     Vars:
     binary (bool) : optimization when leftTerm only has one constant and is
                     common for all duples
+    maxAtoms (int): number of atoms that triggers the removal of redundant
+                    atoms while crossing
     """
 
     if not bool(discriminant):
         return atomization
 
-    ret = nonDiscriminant.copy()
-
     if binary:
         auxH = [at for at in lasRightTerm if at.isSizeOne()]
     else:
         auxH = lasRightTerm
 
-    removed_repeated = 0
+    ret = []
+    index = {}
+    removed_repeated = _addNonRepeatedAtoms(ret, index, nonDiscriminant)
     removed_redundant = 0
+    threshold = maxAtoms
     logInfo("Calculating full crossing")
-    for idx, atL in enumerate(discriminant):
-        for atH in auxH:
-            nAt = atL.atomUnion(atH, epoch)
-            ret.append(nAt)
+    for chunk in crossProduct(discriminant, auxH, epoch, min(maxAtoms, 100000)):
+        removed_repeated += _addNonRepeatedAtoms(ret, index, chunk)
 
-        if len(ret) >= 1000000:
-            ret_size = len(ret)
-            ret = removeRepeatedAtoms(ret)
-            removed_repeated += ret_size - len(ret)
+        if len(ret) >= threshold:
             ret_size = len(ret)
             ret = removeRedundantAtoms(ret, constants, False)
             removed_redundant += ret_size - len(ret)
-            logInfo(f"{idx} / {len(discriminant)} ", end="", flush=True)
+            index = {at: at for at in ret}
+            # Do not prune again until the result doubles if redundancy
+            # could not bring it below the threshold
+            threshold = max(maxAtoms, 2 * len(ret))
+            logInfo(f"{len(ret)} atoms ", end="", flush=True)
 
-    ret_size = len(ret)
-    ret = removeRepeatedAtoms(ret)
-    removed_repeated += ret_size - len(ret)
     ret_size = len(ret)
     ret = removeRedundantAtoms(ret, constants, True)  # mark as checked
     removed_redundant += ret_size - len(ret)
@@ -423,6 +905,7 @@ def crossWithTraces(tr, disc, noDisc, lasH, atomSet, model):
     return ret
 
 
+@runCompiled()
 def removeRepeatedAtoms(atomization):
     """
     Remove repeated atoms with the same upper constant segment.
@@ -498,6 +981,7 @@ def _removeRedundantAtoms_inner(thisAset, prevAset, las, constants, atFromId, at
     return ret
 
 
+@runCompiled()
 def removeRedundantAtoms(atomization, constants, markAsChecked):
     """
     Return a new atomization containing the non redundant atoms in 'atomization'.
@@ -574,6 +1058,55 @@ def calculateLowerAtomicSegment(atoms, constantSet, asPositionTrueAsObjectFalse)
     return las
 
 
+def lowerAtomicSegmentOfTerm(las, term):
+    """
+    Return the union of the lower atomic segments in 'las' of the constants
+    in 'term'. 'las' maps constants to sets of atoms or atom positions.
+    """
+
+    ret = amlset()
+    for c in term:
+        if c in las:
+            ret |= las[c]
+    return ret
+
+
+@runCompiled()
+def duplesDiscriminantSizes(las, duples):
+    """
+    Return two lists with, for every duple, the number of atoms in its
+    discriminant las(L) - las(R) and the number of atoms in las(R).
+    'las' maps constants to sets of atom positions.
+    """
+
+    discSizes = []
+    lasSizes = []
+    for r in duples:
+        lasR = lowerAtomicSegmentOfTerm(las, r.R)
+        discSizes.append(differenceLen(lowerAtomicSegmentOfTerm(las, r.L), lasR))
+        lasSizes.append(len(lasR))
+    return discSizes, lasSizes
+
+
+@runCompiled()
+def duplesPendingDiscriminants(las, atoms, duples, pending):
+    """
+    Return, for every duple, the atom positions of 'pending[d]' that are in
+    its discriminant las(L) - las(R). Duples with an empty 'pending[d]' get
+    an empty set. 'las' maps constants to sets of positions in 'atoms'.
+    """
+
+    ret = []
+    for r, pend in zip(duples, pending):
+        disc = amlset()
+        if pend:
+            for idx in lowerAtomicSegmentOfTerm(las, r.L) & pend:
+                if atoms[idx].ucs.isdisjoint(r.R):
+                    disc.add(idx)
+        ret.append(disc)
+    return ret
+
+
 def printGSpectrum(atomSet, resFile=None):
     atList = []
     for at in atomSet:
@@ -683,86 +1216,79 @@ def calculateTraces(tr, atoms, wterms, j):
 
 
 class _WrappedTerm:
-    def __init__(self, cset):
+    def __init__(self, cset, ID=-1):
         self.cset = cset
+        self.ID = ID  # term ID in the TermPool of the space
         self.trace = None
         self.freeTrace = None
         self.cpointer = 0  # c extensions helper field
 
 
-class _SetFinder:
-    def __init__(self, ref):
-        self.A = None
-        self.B = None
-        self.c = None
-        self.refwt = ref
-
-    def find(self, term):
-        if self.c is not None:
-            if self.c in term:
-                return self.A.find(term)
-            else:
-                return self.B.find(term)
-        elif self.refwt is None:
-            self.refwt = _WrappedTerm(term)
-            return self.refwt, False
-        else:
-            dif = self.refwt.cset - term
-            if dif:
-                ldif = list(dif)
-                self.c = ldif[0]
-                self.A = _SetFinder(self.refwt)
-                self.B = _SetFinder(_WrappedTerm(term))
-                self.refwt = None
-                return self.B.refwt, False
-
-            dif = term - self.refwt.cset
-            if dif:
-                ldif = list(dif)
-                self.c = ldif[0]
-                self.A = _SetFinder(_WrappedTerm(term))
-                self.B = _SetFinder(self.refwt)
-                self.refwt = None
-                return self.A.refwt, False
-            else:
-                return self.refwt, True
-
-    def count(self):
-        if self.refwt:
-            return 1
-        if self.A:
-            return self.A.count() + self.B.count()
-        return 0
-
-
 class termSpace:
-    def __init__(self):
+    def __init__(self, pool=None):
+        """
+        Terms are deduplicated through 'pool', a TermPool. Passing the same
+        pool to the spaces of several batches keeps the term IDs stable and
+        shares the cached free traces between them.
+        """
+
         self.elements = []
-        self.sf = _SetFinder(None)
+        self.pool = TermPool() if pool is None else pool
+        self._byId = {}
+        # constant -> positions of the elements containing it, built on demand
+        self.index = {}
+        self._indexed = 0
 
     def add(self, term):
-        wt, found = self.sf.find(term)
-        if not found:
+        return self.addId(self.pool.termId(term))
+
+    def addId(self, tid):
+        """Add the term with ID 'tid' in the pool of the space"""
+
+        wt = self._byId.get(tid)
+        if wt is None:
+            wt = _WrappedTerm(self.pool.terms[tid], tid)
+            self._byId[tid] = wt
             self.elements.append(wt)
         return wt
 
+    def element(self, tid):
+        """Element of the term with ID 'tid', it must have been added"""
+
+        return self._byId[tid]
+
     @runCompiled()
     def traceAll(self, tr, atoms):
         logInfo("Calculating traces")
-        for wt in self.elements:
-            wt.trace = tr.getTraceOfTerm(wt.cset, atoms)
+        traces = tr.getTracesOfTerms([wt.cset for wt in self.elements], atoms)
+        for wt, trace in zip(self.elements, traces):
+            wt.trace = trace
 
     @runCompiled()
     def freeTraceAll(self, tr):
         logInfo("Calculating free traces")
         for wt in self.elements:
-            wt.freeTrace = tr.getFreeTraceOfTerm(wt.cset, None)
+            wt.freeTrace = self.pool.freeTraceOfTerm(tr, wt.cset)
+
+    def elementsIntersecting(self, term):
+        """Positions of the elements with a constant in 'term'"""
+
+        for x in range(self._indexed, len(self.elements)):
+            for c in self.elements[x].cset:
+                if c not in self.index:
+                    self.index[c] = amlset()
+                self.index[c].add(x)
+        self._indexed = len(self.elements)
+
+        return lowerAtomicSegmentOfTerm(self.index, term)
 
     def updateTraces(self, tr, newAtoms):
-        for wt in self.elements:
-            for at in newAtoms:
-                if not at.ucs.isdisjoint(wt.cset):
-                    wt.trace &= tr.getTraceOfAtom(at)
+        for at in newAtoms:
+            positions = self.elementsIntersecting(at.ucs)
+            if positions:
+                trace = tr.getTraceOfAtom(at)
+                for x in positions:
+                    self.elements[x].trace &= trace
 
     def returnFreeTraces(self, tr):
         for wt in self.elements:
@@ -831,8 +1357,144 @@ class TraceHelper:
         return ids
 
 
+class TraceLayout:
+    """
+    Indicators of a tracer at one period, identified by their content, so
+    that a trace stored in that period can be carried to a later layout
+    instead of being recomputed. A negative indicator and a pinning atom are
+    kept apart even if they hold the same constants.
+    """
+
+    def __init__(self, tracer):
+        self.period = tracer.period
+        self.keys = [(0, self.keyOf(s, True)) for s in tracer.indicators]
+        self.keys.extend((1, self.keyOf(at.ucs, False)) for at in tracer.atomIndicators)
+        self.positions = {key: k for k, key in enumerate(self.keys)}
+        self.remaps = {}
+
+    @staticmethod
+    def keyOf(segment, mutable):
+        if isinstance(segment, (set, frozenset)):
+            return frozenset(segment)
+        # Negative indicators are modified in place by considerPositiveDuples
+        return segment.copy() if mutable else segment
+
+    def __len__(self):
+        return len(self.keys)
+
+    def remapFrom(self, old):
+        """
+        Return an int32 array with the position in this layout of every
+        indicator of the layout 'old', -1 if it was removed, and the sorted
+        positions of the indicators that are not in 'old'.
+        """
+
+        if old.period not in self.remaps:
+            remap = np.array([self.positions.get(key, -1) for key in old.keys], dtype=np.int32)  # fmt:skip
+            fresh = np.ones(len(self), dtype=bool)
+            fresh[remap[remap >= 0]] = False
+            self.remaps[old.period] = (remap, np.flatnonzero(fresh))
+        return self.remaps[old.period]
+
+    def patch(self, trace, old, isIn):
+        """
+        Carry 'trace', stored in the layout 'old', to this layout. Only the
+        new indicators are evaluated, with 'isIn(k)' for indicator k.
+        """
+
+        remap, fresh = self.remapFrom(old)
+        if isinstance(trace, (set, frozenset)):
+            items = np.fromiter(trace, dtype=np.int64, count=len(trace))
+        else:
+            items = trace.to_numpy()
+        items = remap[items]
+        ret = amlset(items[items >= 0].tolist())
+        for k in fresh.tolist():
+            if isIn(k):
+                ret.add(k)
+        return ret
+
+
+class IndicatorList(list):
+    """
+    List of indicators with a version that increases every time an element
+    is added, removed or replaced, so that views of the indicators such as
+    aml_fast.TracerStore can tell when they are outdated. Updates made in
+    place to an indicator are not counted.
+
+    Vars:
+    version (int)   : number of changes since creation
+    """
+
+    def __init__(self, items=()):
+        super().__init__(items)
+        self.version = 0
+
+    def __reduce__(self):
+        return (IndicatorList, (list(self),))
+
+    def copy(self):
+        return IndicatorList(self)
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice) or self[key] is not value:
+            self.version += 1
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.version += 1
+        super().__delitem__(key)
+
+    def __iadd__(self, items):
+        self.version += 1
+        return super().__iadd__(items)
+
+    def __imul__(self, n):
+        self.version += 1
+        return super().__imul__(n)
+
+    def append(self, item):
+        self.version += 1
+        super().append(item)
+
+    def extend(self, items):
+        self.version += 1
+        super().extend(items)
+
+    def insert(self, i, item):
+        self.version += 1
+        super().insert(i, item)
+
+    def pop(self, i=-1):
+        self.version += 1
+        return super().pop(i)
+
+    def remove(self, item):
+        self.version += 1
+        super().remove(item)
+
+    def clear(self):
+        self.version += 1
+        super().clear()
+
+    def sort(self, **kwargs):
+        self.version += 1
+        super().sort(**kwargs)
+
+    def reverse(self):
+        self.version += 1
+        super().reverse()
+
+
 class Tracer:
-    def __init__(self, period, cmanager):
+    IDS = 0
+
+    # Layouts kept to patch the traces stored in earlier periods
+    maxLayouts = 4
+
+    def __init__(self, period, cmanager, previous=None):
+        Tracer.IDS += 1
+        self.ID = Tracer.IDS
         self.indicators = []
         self.atomIndicators = []
         self.discardedIndicators = amlset([])
@@ -843,14 +1505,55 @@ class Tracer:
         self.warningSent = False
         self.cmanager = cmanager
         self.traceHelper = None
-
+        # C-side view of the indicators, see aml_fast.TracerStore
+        self.store = None
+        # Packed traces of the last atoms asked for, see getTraceMatrix
+        self.traceMatrix = None
+        self.traceMatrixAtoms = None
+
+        # Layouts of the periods traces were stored in, by period. They are
+        # taken over from the 'previous' tracer with its free traces of
+        # constants, so that traces stored by it can be patched, see layout.
+        self.layouts = {}
         self.constToFreeTraces = {}
+        if previous is not None:
+            self.layouts = dict(previous.layouts)
+            self.constToFreeTraces = dict(previous.constToFreeTraces)
         self.constToStoredTraces = {}
         self.recalculateConstantTraces = False
 
+        # Dense copy of the indicators of this period, see getDenseIndicators
+        self.denseIndicators = None
+        self.denseIndicatorsPeriod = None
+
     def numIndicators(self):
         return len(self.indicators) + len(self.atomIndicators)
 
+    def layout(self):
+        """
+        TraceLayout of the current period. It is recorded, so traces stored
+        now can later be patched instead of recomputed.
+        """
+
+        layout = self.layouts.get(self.period)
+        if layout is None:
+            layout = TraceLayout(self)
+            self.layouts[self.period] = layout
+            while len(self.layouts) > self.maxLayouts:
+                del self.layouts[min(self.layouts)]
+        return layout
+
+    def commonLayout(self, periods):
+        """
+        TraceLayout of an earlier period that most of 'periods', the periods
+        of some stored traces, refer to. None if the tracer holds none of them.
+        """
+
+        counts = collections.Counter(p for p in periods if p < self.period and p in self.layouts)
+        if not counts:
+            return None
+        return self.layouts[counts.most_common(1)[0][0]]
+
     def addNegativeH(self, nr):
         self.indicators.append(nr.copy())
         self.period += 1
@@ -861,6 +1564,8 @@ class Tracer:
 
     @runCompiled()
     def considerPositiveDuples(self, pduples):
+        if isinstance(pduples, DupleBatch):
+            pduples = pduples.toDuples()
         for i in range(len(self.indicators)):
             modified = True
             while modified:
@@ -878,8 +1583,7 @@ class Tracer:
         logInfo(f"Number of indicators {self.numIndicators()}")
 
         if LCSegment == set:
-            self.indicators = {frozenset(s) for s in self.indicators}
-            self.indicators = [amlset(s) for s in self.indicators]
+            self.indicators = [amlset(s) for s in {frozenset(s) for s in self.indicators}]
         else:
             self.indicators = list(frozenset(self.indicators))
 
@@ -887,6 +1591,26 @@ class Tracer:
 
         logInfo(f"Number of unique indicators {self.numIndicators()}")
 
+    @property
+    def indicators(self):
+        return self._indicators
+
+    @indicators.setter
+    def indicators(self, indicators):
+        if not isinstance(indicators, IndicatorList):
+            indicators = IndicatorList(indicators)
+        self._indicators = indicators
+
+    @property
+    def atomIndicators(self):
+        return self._atomIndicators
+
+    @atomIndicators.setter
+    def atomIndicators(self, atomIndicators):
+        if not isinstance(atomIndicators, IndicatorList):
+            atomIndicators = IndicatorList(atomIndicators)
+        self._atomIndicators = atomIndicators
+
     def getTraceOfAtom(self, at):
         if not at.trace is None:
             if self.period < at.trace[1]:
@@ -895,19 +1619,53 @@ class Tracer:
             if self.period == at.trace[1]:
                 return at.trace[0]
 
-        aux = amlset([])
-        for c in at.ucs:
-            aux |= self.getFreeTraceOfConstant(c)
+        old = None if at.trace is None else self.layouts.get(at.trace[1])
+        if old is None or bool(self.discardedIndicators):
+            aux = amlset([])
+            for c in at.ucs:
+                aux |= self.getFreeTraceOfConstant(c)
+        else:
+            aux = self.layout().patch(at.trace[0], old, lambda k: self.isInTraceOfAtom(at, k))
 
         if self.storeTraces:
+            self.layout()
             at.trace = [amlset(aux), self.period]
         return aux
 
+    def isInTraceOfAtom(self, at, k):
+        shift = len(self.indicators)
+        if k < shift:
+            return not at.ucs.isdisjoint(self.indicators[k])
+        return not at.ucs.issubset(self.atomIndicators[k - shift].ucs)
+
+    def indicatorSet(self):
+        """Set implementation for the constant universe of the indicators"""
+
+        return amlsetForUniverse(self.cmanager.lastDefConstantOrChain + 1)
+
+    def getDenseIndicators(self):
+        """
+        DenseBitarrayVector with the indicators when their constant universe
+        is small, None otherwise. Every change of the indicators starts a new
+        period, so the copy is kept until then.
+        """
+
+        if self.indicatorSet() is amlset:
+            return None
+        if self.denseIndicatorsPeriod != self.period:
+            self.denseIndicators = DenseBitarrayVector.copyOf(self.indicators)
+            self.denseIndicatorsPeriod = self.period
+        return self.denseIndicators
+
     def getTraceOfAtomFromIndicators(self, at):
-        aux = []
-        for i in range(len(self.indicators)):
-            if not at.ucs.isdisjoint(self.indicators[i]):
-                aux.append(i)
+        indicators = self.getDenseIndicators()
+        if indicators is not None:
+            aux = indicators.intersecting(at.ucs)
+        else:
+            aux = []
+            for i in range(len(self.indicators)):
+                if not at.ucs.isdisjoint(self.indicators[i]):
+                    aux.append(i)
 
         shift = len(self.indicators)
         for i in range(len(self.atomIndicators)):
@@ -920,10 +1678,14 @@ class Tracer:
         if bool(self.discardedIndicators):
             raise ValueError("getFreeTraceOfTerm error discardedIndicators")
 
-        aux = []
-        for i in range(len(self.indicators)):
-            if term.issubset(self.indicators[i]):
-                aux.append(i)
+        indicators = self.getDenseIndicators()
+        if indicators is not None:
+            aux = indicators.supersetsOf(term)
+        else:
+            aux = []
+            for i in range(len(self.indicators)):
+                if term.issubset(self.indicators[i]):
+                    aux.append(i)
 
         shift = len(self.indicators)
         if constLowAtomicSegment is None:
@@ -956,6 +1718,38 @@ class Tracer:
 
         return amlset(aux)
 
+    def getTraceMatrix(self, atoms):
+        """
+        TraceMatrix with the traces of 'atoms'. It is kept until the period
+        changes or the traces of other atoms are asked for.
+        """
+
+        if (
+            self.traceMatrix is None
+            or not self.traceMatrix.isValid(self)
+            or self.traceMatrixAtoms is not atoms
+            or len(self.traceMatrix) != len(atoms)
+        ):
+            self.traceMatrix = TraceMatrix.fromAtoms(self, atoms)
+            self.traceMatrixAtoms = atoms
+        return self.traceMatrix
+
+    def getTracesOfTerms(self, terms, atoms):
+        """Batch version of getTraceOfTerm"""
+
+        if bool(self.discardedIndicators):
+            raise ValueError("getTracesOfTerms error discardedIndicators")
+
+        constants = amlset()
+        for term in terms:
+            constants |= term
+        las = calculateLowerAtomicSegment(atoms, constants, True)
+        groups = [lowerAtomicSegmentOfTerm(las, term) for term in terms]
+        traces = self.getTraceMatrix(atoms).andRows(groups)
+        if amlset == set:
+            traces = [set(t) for t in traces]
+        return traces
+
     def getTraceOfTerm(self, term, atoms):
         if bool(self.discardedIndicators):
             raise ValueError("getTraceOfTerm error discardedIndicators")
@@ -997,7 +1791,7 @@ class Tracer:
 
         take = amlset([])
         nrels = []
-        for nr in nduplesIn:
+        for k, nr in enumerate(nduplesIn):
             if nr.wL is None:
                 tL = self.getFreeTraceOfTerm(nr.L)
             else:
@@ -1020,16 +1814,16 @@ class Tracer:
                     tb = traceback.format_exc()
                     logError(tb)
                     raise ValueError("Inconsistent")
-                    nrels.append(nr)
+                    nrels.append(k)
             else:
                 take |= useful
-                nrels.append(nr)
+                nrels.append(k)
 
         self.discardedIndicators = amlset([i for i in range(self.numIndicators())]) - take  # fmt:skip
 
         logInfo(f"Number of indicators after selecting useful {len(take)}")
 
-        return nrels
+        return selectDuples(nduplesIn, nrels)
 
     @runCompiled()
     def reduceIndicators(self, nduplesIn, reversedNameDictionary, singles):
@@ -1044,7 +1838,7 @@ class Tracer:
         take = amlset([])
         duplesOut = amlset([])
         nduples = nduplesIn.copy()
-        random.shuffle(nduples)
+        shuffleDuples(nduples)
 
         for i, nr in enumerate(nduples):
             if nr.wL is None:
@@ -1080,7 +1874,7 @@ class Tracer:
         take |= singles
 
         aux = amlset([i for i in range(len(nduples))]) - duplesOut
-        nduples = [nduples[i] for i in aux]
+        nduples = selectDuples(nduples, list(aux))
 
         logInfo(f"Number of unique indicators after reduction {len(take)}")
 
@@ -1139,7 +1933,7 @@ class Tracer:
 
             out = maxTrace - trL
             while bool(out):
-                eta = random.choice(tuple(out))
+                eta = chooseRandom(out)
                 if self.traceHelper is not None:
                     if tD[eta] == -1:
                         self.traceHelper.tD[eta] &= self.traceHelper.atomIDs
@@ -1159,9 +1953,9 @@ class Tracer:
                 elif self.warnOnTraceViolation and not self.warningSent:
                     raise ValueError("calculateAtomSetProduct trace error")
                     self.warningSent = True
-                    out = out - amlset([eta])
+                    out.discard(eta)
                 else:
-                    out = out - amlset([eta])
+                    out.discard(eta)
 
             if not picked:
                 atH = random.choice(tuple(setH))
@@ -1180,16 +1974,34 @@ class Tracer:
         else:
             if c in self.constToFreeTraces:
                 aux = self.constToFreeTraces[c]
+                old = self.layouts.get(aux[1])
                 if self.period == aux[1]:
                     ctrace = aux[0]
+                elif old is not None and not bool(self.discardedIndicators):
+                    ctrace = self.layout().patch(aux[0], old, lambda k: self.isInFreeTraceOfConstant(c, k))  # fmt:skip
+                    self.constToFreeTraces[c] = [ctrace, self.period]
                 else:
                     ctrace = self.getFreeTraceOfTerm(LCSegment([c]))
+                    self.layout()
                     self.constToFreeTraces[c] = [ctrace, self.period]
             else:
                 ctrace = self.getFreeTraceOfTerm(LCSegment([c]))
+                self.layout()
                 self.constToFreeTraces[c] = [ctrace, self.period]
         return ctrace
 
+    def isInFreeTraceOfTerm(self, term, k):
+        shift = len(self.indicators)
+        if k < shift:
+            return term.issubset(self.indicators[k])
+        return self.atomIndicators[k - shift].ucs.isdisjoint(term)
+
+    def isInFreeTraceOfConstant(self, c, k):
+        shift = len(self.indicators)
+        if k < shift:
+            return c in self.indicators[k]
+        return c not in self.atomIndicators[k - shift].ucs
+
     def getStoredTraceOfConstant(self, c):
         if c in self.constToStoredTraces:
             aux = self.constToStoredTraces[c]
@@ -1204,17 +2016,13 @@ class Tracer:
     @runCompiled()
     def simplifyFromConstants(self, constants, atoms, generation):
         maxTrace = amlset([i for i in range(self.numIndicators())])
-        tD = [None] * len(maxTrace)
-        for i in maxTrace:
-            tD[i] = amlset([])
+        tD = self.getTraceMatrix(atoms).tD()
+        if amlset == set:
+            tD = [set(t) for t in tD]
         las = {}
         for c in constants:
             las[c] = amlset([])
         for x, at in enumerate(atoms):
-            trace = self.getTraceOfAtom(at)
-            out = maxTrace - trace
-            for i in out:
-                tD[i].add(x)
             for c in at.ucs & constants:
                 las[c].add(x)
 
@@ -1234,7 +2042,7 @@ class Tracer:
 
             while bool(out):
                 xcount += 1
-                eta = random.choice(tuple(out))
+                eta = chooseRandom(out)
                 candidates = tD[eta] & lasc
 
                 if len(candidates) == 0:
@@ -1242,17 +2050,17 @@ class Tracer:
                         input("trace warning. Continue?")
                         self.warningSent = True
 
-                    out = out - amlset([eta])
+                    out.discard(eta)
                     break
 
                 aux = candidates & selectedIds
                 if not bool(aux):
-                    x = random.choice(tuple(candidates))
+                    x = chooseRandom(candidates)
                     at = atoms[x]
                     selectedIds.add(x)
                     selected.append(at)
                 else:
-                    x = random.choice(tuple(aux))
+                    x = chooseRandom(aux)
                     at = atoms[x]
 
                 out &= self.getTraceOfAtom(at)
@@ -1267,17 +2075,13 @@ class Tracer:
 
     def simplifyFromTerms(self, constants, atoms, generation):
         maxTrace = amlset([i for i in range(self.numIndicators())])
-        tD = [None] * len(maxTrace)
-        for i in maxTrace:
-            tD[i] = amlset([])
+        tD = self.getTraceMatrix(atoms).tD()
+        if amlset == set:
+            tD = [set(t) for t in tD]
         las = {}
         for c in constants:
             las[c] = amlset([])
         for x, at in enumerate(atoms):
-            trace = self.getTraceOfAtom(at)
-            out = maxTrace - trace
-            for i in out:
-                tD[i].add(x)
             for c in at.ucs & constants:
                 las[c].add(x)
 
@@ -1297,30 +2101,30 @@ class Tracer:
             out = maxTrace - ttrace
 
             if not bool(out):
-                if not bool(las_term & selectedIds):
+                if las_term.isdisjoint(selectedIds):
                     if bool(las_term):
-                        x = random.choice(tuple(las_term))
+                        x = chooseRandom(las_term)
                         at = atoms[x]
                         selectedIds.add(x)
 
             while bool(out):
-                eta = random.choice(tuple(out))
+                eta = chooseRandom(out)
                 candidates = tD[eta] & las_term
                 if len(candidates) == 0:
                     if self.warnOnTraceViolation and not self.warningSent:
                         input("trace warning. Continue?")
                         self.warningSent = True
 
-                    out = out - amlset([eta])
+                    out.discard(eta)
                     break
 
                 aux = candidates & selectedIds
                 if not bool(aux):
-                    x = random.choice(tuple(candidates))
+                    x = chooseRandom(candidates)
                     at = atoms[x]
                     selectedIds.add(x)
                 else:
-                    at = atoms[random.choice(tuple(aux))]
+                    at = atoms[chooseRandom(aux)]
 
                 out &= self.getTraceOfAtom(at)
 
@@ -1403,8 +2207,7 @@ class Tracer:
             H = r.wH.cset
 
         ret = []
-        out = trH - trL
-        lout = len(out)
+        lout = differenceLen(trH, trL)
         if lout == 0:
             extraC = list(L - H)
             if len(extraC) == 0:
@@ -1418,9 +2221,9 @@ class Tracer:
 
                 c = extraC[-1]
                 del extraC[-1]
-                out = trH - (trL & self.getFreeTraceOfConstant(c))
-                if len(out) > 0:
-                    lout = len(out)
+                nOut = differenceLen(trH, trL & self.getFreeTraceOfConstant(c))
+                if nOut > 0:
+                    lout = nOut
                     at = Atom(epoch, generation, [c])
                     ret.append(at)
 
@@ -1428,7 +2231,13 @@ class Tracer:
 
         return ret
 
-    def enforceNegativeTraceConstraintByQuotient(self, r, atoms, cmanager, epoch, generation, las):  # fmt:skip
+    def enforceNegativeTraceConstraintByQuotient(self, r, atoms, cmanager, epoch, generation, las, quotientAtoms=None):  # fmt:skip
+        """
+        'las' maps constants to the atoms with them, or to their positions in
+        'quotientAtoms' if given. Candidates are drawn as the compiled
+        traceClosure draws them when given positions.
+        """
+
         if r.positive == True:
             raise TypeError("Not a negative Duple")
 
@@ -1447,8 +2256,7 @@ class Tracer:
             H = r.wH.cset
 
         ret = []
-        out = trH - trL
-        lout = len(out)
+        lout = differenceLen(trH, trL)
         if lout == 0:
             extraC = list(L - H)
             if len(extraC) == 0:
@@ -1475,17 +2283,19 @@ class Tracer:
                     candidates = None
 
                 while candidates:
-                    at = random.choice(tuple(candidates))
-                    candidates -= set([at])
+                    at = chooseRandom(candidates)
+                    candidates.discard(at)
+                    if quotientAtoms is not None:
+                        at = quotientAtoms[at]
 
                     ucs = at.ucs - H
                     if len(ucs) > 1:
                         if len(ucs) / len(at.ucs) >= maxSize:
                             nAt = Atom(epoch, generation, ucs)
 
-                            out = trH - (trL & self.getTraceOfAtom(nAt))
-                            if len(out) > 0:
-                                lout = len(out)
+                            nOut = differenceLen(trH, trL & self.getTraceOfAtom(nAt))
+                            if nOut > 0:
+                                lout = nOut
                                 if len(ucs) / len(at.ucs) > maxSize:
                                     maxSize = len(ucs) / len(at.ucs)
                                     subAts = []
@@ -1496,9 +2306,9 @@ class Tracer:
                 ret.extend(subAts)
                 # -------------------------------------------------------------
                 if len(subAts) == 0:
-                    out = trH - (trL & self.getFreeTraceOfConstant(c))
-                    if len(out) > 0:
-                        lout = len(out)
+                    nOut = differenceLen(trH, trL & self.getFreeTraceOfConstant(c))
+                    if nOut > 0:
+                        lout = nOut
 
                         at = Atom(epoch, generation, [c])
                         ret.append(at)
@@ -1508,22 +2318,412 @@ class Tracer:
     @runCompiled()
     def storeTracesOfConstants(self, constants, atoms):
         logInfo("Traces of constants")
-        for c in constants:
-            self.constToStoredTraces[c] = [
-                self.getTraceOfTerm(LCSegment([c]), atoms),
-                self.period,
-            ]
+        constants = list(constants)
+        traces = self.getTracesOfTerms([LCSegment([c]) for c in constants], atoms)
+        for c, trace in zip(constants, traces):
+            self.constToStoredTraces[c] = [trace, self.period]
 
 
 # -----------------------------------------------------------------------------
 
 
+class Atomization(list):
+    """
+    List of atoms that records every atom entering or leaving it, so that an
+    AtomIndex following it replays the changes instead of comparing the whole
+    list. Model.atomization is always one. Followers that fall behind the
+    recorded changes, or follow a plain list, resynchronise in full.
+
+    Vars:
+    generation (int)    : number of changes recorded since creation
+    """
+
+    def __init__(self, atoms=()):
+        super().__init__(atoms)
+        self._log = []
+        self._logStart = 0
+
+    @property
+    def generation(self):
+        return self._logStart + len(self._log)
+
+    def changesSince(self, generation):
+        """
+        Return the changes after 'generation' as (atom, +1) for an atom that
+        entered and (atom, -1) for one that left, None if they were dropped.
+        """
+
+        if generation < self._logStart or generation > self.generation:
+            return None
+        return self._log[generation - self._logStart :]
+
+    def _record(self, entered, left):
+        self._log.extend((at, -1) for at in left)
+        self._log.extend((at, 1) for at in entered)
+        # Old changes are dropped once the log outgrows the list
+        limit = max(1024, 2 * len(self))
+        if len(self._log) > limit:
+            drop = len(self._log) - limit // 2
+            del self._log[:drop]
+            self._logStart += drop
+
+    def __reduce__(self):
+        return (Atomization, (list(self),))
+
+    def copy(self):
+        return Atomization(self)
+
+    def append(self, at):
+        super().append(at)
+        self._record((at,), ())
+
+    def extend(self, atoms):
+        atoms = list(atoms)
+        super().extend(atoms)
+        self._record(atoms, ())
+
+    def __iadd__(self, atoms):
+        self.extend(atoms)
+        return self
+
+    def __imul__(self, n):
+        entered = list(self) * (n - 1) if n > 0 else []
+        left = [] if n > 0 else list(self)
+        super().__imul__(n)
+        self._record(entered, left)
+        return self
+
+    def insert(self, i, at):
+        super().insert(i, at)
+        self._record((at,), ())
+
+    def pop(self, i=-1):
+        at = super().pop(i)
+        self._record((), (at,))
+        return at
+
+    def remove(self, at):
+        super().remove(at)
+        self._record((), (at,))
+
+    def clear(self):
+        left = list(self)
+        super().clear()
+        self._record((), left)
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            left = self[key]
+            value = list(value)
+        else:
+            left = [self[key]]
+        super().__setitem__(key, value)
+        self._record(value if isinstance(key, slice) else (value,), left)
+
+    def __delitem__(self, key):
+        left = self[key] if isinstance(key, slice) else [self[key]]
+        super().__delitem__(key)
+        self._record((), left)
+
+
+class AtomIndex:
+    """
+    Inverted index of an atomization. Maps every constant to the slots of the
+    atoms whose upper constant segment contains it, i.e. the lower atomic
+    segment of the constant as a posting list.
+
+    The index follows an atomization through 'update', which only indexes
+    the atoms that entered and drops the ones that left since the previous
+    call. Changes to an Atomization are replayed from its log, any other list
+    is compared in full. Atoms are identified by object and treated as
+    immutable, so the ucs of an indexed atom must not be modified in place.
+
+    Vars:
+    las (dict)      : constant -> amlset with the slots of the atoms containing it
+    ID (int)        : unique identifier
+    version (int)   : increases every time an atom enters or leaves the index
+    """
+
+    IDS = 0
+
+    def __init__(self, atomization=None):
+        AtomIndex.IDS += 1
+        self.ID = AtomIndex.IDS
+        self.version = 0
+        self.las = {}
+        self._atoms = []
+        self._slots = {}
+        self._freeSlots = []
+        # Occurrences of every indexed atom in the atomization, by id
+        self._counts = {}
+        self._atomization = None
+        self._generation = -1
+        self._changed = amlset()
+        if atomization is not None:
+            self.update(atomization)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def update(self, atomization):
+        """
+        Bring the index in line with 'atomization'. Only atoms that are new or
+        that are gone since the last update touch the posting lists.
+        """
+
+        changes = None
+        if atomization is self._atomization:
+            changes = atomization.changesSince(self._generation)
+
+        if changes is None:
+            counts = {}
+            for at in atomization:
+                counts[id(at)] = counts.get(id(at), 0) + 1
+            for key in [key for key in self._slots if key not in counts]:
+                self._removeAtom(key)
+            for at in atomization:
+                if id(at) not in self._slots:
+                    self._addAtom(at)
+            self._counts = counts
+        else:
+            for at, sign in changes:
+                key = id(at)
+                count = self._counts.get(key, 0) + sign
+                if count > 0:
+                    self._counts[key] = count
+                    if key not in self._slots:
+                        self._addAtom(at)
+                else:
+                    self._counts.pop(key, None)
+                    if key in self._slots:
+                        self._removeAtom(key)
+
+        if isinstance(atomization, Atomization):
+            self._atomization = atomization
+            self._generation = atomization.generation
+        else:
+            self._atomization = None
+            self._generation = -1
+
+    def _addAtom(self, at):
+        if self._freeSlots:
+            slot = self._freeSlots.pop()
+            self._atoms[slot] = at
+        else:
+            slot = len(self._atoms)
+            self._atoms.append(at)
+        self._slots[id(at)] = slot
+        self._changed |= at.ucs
+        self.version += 1
+        for c in at.ucs:
+            if c not in self.las:
+                self.las[c] = amlset()
+            self.las[c].add(slot)
+
+    def _removeAtom(self, key):
+        slot = self._slots.pop(key)
+        at = self._atoms[slot]
+        self._atoms[slot] = None
+        self._freeSlots.append(slot)
+        self._changed |= at.ucs
+        self.version += 1
+        for c in at.ucs:
+            self.las[c].remove(slot)
+            if not self.las[c]:
+                del self.las[c]
+
+    def lowerAtomicSegment(self, term):
+        """
+        Return the slots of the atoms that form part of the lower atomic
+        segment of 'term'.
+        """
+
+        return lowerAtomicSegmentOfTerm(self.las, term)
+
+    def atomsIn(self, atomization, term):
+        """Same as core.atomsIn, using the posting lists."""
+
+        self.update(atomization)
+        return [self._atoms[slot] for slot in self.lowerAtomicSegment(term)]
+
+    def lowerOrEqual(self, left, right, atomization):
+        """Same as core.lowerOrEqual, using the posting lists."""
+
+        self.update(atomization)
+        return self.lowerAtomicSegment(left) <= self.lowerAtomicSegment(right)
+
+    def discriminantSize(self, leftTerm, rightTerm, atomization):
+        """
+        Return the number of atoms in the discriminant of (leftTerm, rightTerm)
+        and the number of atoms in the lower atomic segment of 'rightTerm'.
+        """
+
+        self.update(atomization)
+        lasR = self.lowerAtomicSegment(rightTerm)
+        disc = self.lowerAtomicSegment(leftTerm) - lasR
+        return len(disc), len(lasR)
+
+    def duplesDiscriminantSizes(self, duples, atomization):
+        """
+        Batch version of 'discriminantSize'. Returns two lists with the sizes
+        for every duple in 'duples'.
+        """
+
+        self.update(atomization)
+        return duplesDiscriminantSizes(self.las, duples)
+
+    def changedConstants(self, atomization):
+        """
+        Return the constants whose lower atomic segment changed since the
+        previous call, after updating the index to 'atomization'.
+        """
+
+        self.update(atomization)
+        ret = self._changed
+        self._changed = amlset()
+        return ret
+
+    def separateDiscriminant(self, leftTerm, rightTerm, atomization):
+        """
+        Same as core.separateDiscriminant. The discriminant is computed from
+        the posting lists, and the atomization is only walked when the
+        discriminant is not empty. Atoms keep their order in 'atomization'.
+        """
+
+        self.update(atomization)
+        lasR = self.lowerAtomicSegment(rightTerm)
+        disc = self.lowerAtomicSegment(leftTerm) - lasR
+        if not disc:
+            return [], list(atomization), []
+
+        disc = set(disc)
+        lasR = set(lasR)
+        discriminant = []
+        nonDiscriminant = []
+        lasRightTerm = []
+        for at in atomization:
+            slot = self._slots[id(at)]
+            if slot in disc:
+                discriminant.append(at)
+            else:
+                nonDiscriminant.append(at)
+                if slot in lasR:
+                    lasRightTerm.append(at)
+
+        return discriminant, nonDiscriminant, lasRightTerm
+
+
+class UnionModelIndex(AtomIndex):
+    """
+    AtomIndex of a union model that also groups the atoms by the union update
+    in which they entered it. Kept across batches by the sparse embedder, it
+    lets 'updateUnionModel' check every positive duple only against the atoms
+    that entered after the duple was last checked and that intersect its
+    left term, instead of walking the whole union model.
+
+    Vars:
+    entered (dict)  : unionUpdateEntrance -> amlset with the slots of the atoms
+    """
+
+    def __init__(self, atomization=None):
+        self.entered = {}
+        self._entrance = -1
+        super().__init__(atomization)
+
+    def _addAtom(self, at):
+        if at.unionUpdateEntrance == -1:
+            at.unionUpdateEntrance = self._entrance
+        super()._addAtom(at)
+        if at.unionUpdateEntrance not in self.entered:
+            self.entered[at.unionUpdateEntrance] = amlset()
+        self.entered[at.unionUpdateEntrance].add(self._slots[id(at)])
+
+    def _removeAtom(self, key):
+        at = self._atoms[self._slots[key]]
+        entered = self.entered[at.unionUpdateEntrance]
+        entered.remove(self._slots[key])
+        if not entered:
+            del self.entered[at.unionUpdateEntrance]
+        super()._removeAtom(key)
+
+    def updateUnionModel(self, unionModel, pDuples, unionUpdates):
+        """
+        Same as sparse_crossing_embedder.updateUnionModelWithSetOfPduples for
+        update number 'unionUpdates'. Atoms of 'unionModel' that are new to
+        the index enter with that number.
+
+        Returns the atoms to keep, the set of atoms excluded from pinning and
+        the list of discarded atoms.
+        """
+
+        self._entrance = unionUpdates
+        self.update(unionModel)
+
+        pDuplesSorted = sortedByUnionUpdate(pDuples)
+        lastUnionUpdates = duplesColumn(pDuplesSorted, "lastUnionUpdate").tolist()
+
+        # Slots of the atoms each duple has to be checked against, i.e. that
+        # entered after the duple was last checked. Duples sharing the same
+        # last update share the set.
+        entrances = sorted(self.entered)
+        pending = amlset()
+        for entrance in entrances:
+            pending |= self.entered[entrance]
+        e = 0
+        lastUpdate = None
+        pendingOf = []
+        for lastUnionUpdate in lastUnionUpdates:
+            if lastUnionUpdate != lastUpdate:
+                lastUpdate = lastUnionUpdate
+                while e < len(entrances) and entrances[e] <= lastUpdate:
+                    pending = pending - self.entered[entrances[e]]
+                    e += 1
+            if not pending:
+                break
+            pendingOf.append(pending)
+        checked = pDuplesSorted[: len(pendingOf)]
+        hypothesis = duplesColumn(checked, "hypothesis").tolist()
+
+        # The first duple, in update order, that discriminates an atom decides
+        deleted = amlset()
+        excluded = amlset()
+        decided = amlset()
+        for hyp, disc in zip(hypothesis, duplesPendingDiscriminants(self.las, self._atoms, checked, pendingOf)):  # fmt:skip
+            if not disc:
+                continue
+            disc -= decided
+            if not disc:
+                continue
+            if hyp:
+                excluded |= disc
+            else:
+                deleted |= disc
+            decided |= disc
+
+        setLastUnionUpdate(pDuples, unionUpdates)
+
+        excluseFromPinning = set(self._atoms[slot] for slot in excluded)
+        if not deleted:
+            return list(unionModel), excluseFromPinning, []
+
+        deleted = set(deleted)
+        take = []
+        discarded = []
+        for at in unionModel:
+            if self._slots[id(at)] in deleted:
+                discarded.append(at)
+            else:
+                take.append(at)
+        return take, excluseFromPinning, discarded
+
+
 class Model:
     __slots__ = (
         "epoch",
         "generation",
         "cmanager",
-        "atomization",
+        "_atomization",
+        "index",
     )
 
     def __init__(self):
@@ -1531,6 +2731,19 @@ class Model:
         self.generation = 0
         self.cmanager = ConstantManager()
         self.atomization = []
+        self.index = AtomIndex()
+
+    # Lists assigned to the atomization are kept as an Atomization, so that
+    # 'index' follows their changes
+    @property
+    def atomization(self):
+        return self._atomization
+
+    @atomization.setter
+    def atomization(self, atoms):
+        if not isinstance(atoms, Atomization):
+            atoms = Atomization(atoms)
+        self._atomization = atoms
 
 
 def enforce(
@@ -1542,6 +2755,7 @@ def enforce(
     removeRepetitions=False,
     calculateRedundancy=False,
     binary=False,
+    maxCrossingAtoms=1000000,
 ):
     model.epoch += 1
     if tracer == None:
@@ -1553,6 +2767,7 @@ def enforce(
             model.cmanager.embeddingConstants,
             model.epoch,
             binary,
+            maxCrossingAtoms,
         )
     else:
         model.atomization = crossWithTraces(
@@ -8,9 +8,11 @@ from .io import logDebug, logInfo, logWarn, logError
 from .aml_fast import aml_fast as af
 from .aml_fast.aml_fast import runCompiled
 from .aml_fast.amlFastBitarrays import bitarray
+from . import profiling
 
 import random
-import time
+
+import numpy as np
 
 
 class params_full:
@@ -20,11 +22,13 @@ class params_full:
         removeRepetitions=False,
         sortDuples=False,
         binary=False,
+        maxCrossingAtoms=1000000,
     ):
         self.calculateRedundancy = calculateRedundancy
         self.removeRepetitions = removeRepetitions
         self.sortDuples = sortDuples
         self.binary = binary
+        self.maxCrossingAtoms = maxCrossingAtoms
 
 
 class full_crossing_embedder:
@@ -32,31 +36,51 @@ class full_crossing_embedder:
         self.model = model
         self.params = params_full()
 
-    def sortDuplesBySolvability(self, atoms, duples):
+    @profiling.stage("full_crossing_embedder.sortDuplesBySolvability")
+    def sortDuplesBySolvability(self, atoms, duples, solvability=None):
         """
-        Sort list of duples to improve efficiency in the full crossing
+        Sort list of duples to improve efficiency in the full crossing.
+        'solvability' caches the discriminant and las(R) sizes of the duples
+        between calls. Only duples not in the cache, or whose terms touch a
+        constant with changed lower atomic segment, are measured again.
         """
         logInfo("Sorting duples")
+        if solvability is None:
+            solvability = {}
+        changed = self.model.index.changedConstants(atoms)
+        measure = [
+            r
+            for r in duples
+            if id(r) not in solvability
+            or sc.intersectsAnyOf(changed, (r.L, r.R))
+        ]
+        dsizes, hsizes = self.model.index.duplesDiscriminantSizes(measure, atoms)
+        for r, dsize, hsize in zip(measure, dsizes, hsizes):
+            solvability[id(r)] = (dsize, hsize)
+
         aux = []
         for r in duples:
-            disc, outOfDisc, _ = sc.separateDiscriminant(r.L, r.R, atoms)
-            hsize = len(sc.atomsIn(atoms, r.R))
-            aux.append([len(disc), len(r.R), hsize, r])
+            dsize, hsize = solvability[id(r)]
+            aux.append([dsize, len(r.R), hsize, r])
         aux.sort(key=lambda rd: rd[0] * (rd[2] - 1))
         aux.sort(key=lambda rd: rd[1])
         return [rd[3] for rd in aux]
 
+    @profiling.stage("full_crossing_embedder.enforce")
     def enforce(self, duples):
         rels = duples.copy()
+        solvability = {}
         if self.params.sortDuples and len(rels) > 0:
-            rels = self.sortDuplesBySolvability(self.model.atomization, rels)
+            rels = self.sortDuplesBySolvability(self.model.atomization, rels, solvability)  # fmt:skip
         while len(rels) > 0:
             r = rels.pop(0)
             (
                 disc,
                 nodisc,
                 lasH,
-            ) = sc.separateDiscriminant(r.L, r.R, self.model.atomization)
+            ) = self.model.index.separateDiscriminant(
+                r.L, r.R, self.model.atomization
+            )
             if bool(disc):
                 sc.enforce(
                     self.model,
@@ -66,9 +90,10 @@ class full_crossing_embedder:
                     removeRepetitions=self.params.removeRepetitions,
                     calculateRedundancy=self.params.calculateRedundancy,
                     binary=self.params.binary,
+                    maxCrossingAtoms=self.params.maxCrossingAtoms,
                 )
                 if self.params.sortDuples:
-                    rels = self.sortDuplesBySolvability(self.model.atomization, rels)
+                    rels = self.sortDuplesBySolvability(self.model.atomization, rels, solvability)  # fmt:skip
 
 class params_sparse:
     def __init__(
@@ -85,6 +110,7 @@ class params_sparse:
         staticConstants=False,
         simplify_threshold=1.5,
         ignore_single_const_ucs=True,
+        indexedUnionUpdate=True,
     ):
         self.removeRepetitions = removeRepetitions
         self.reductionByTraces = reductionByTraces
@@ -101,6 +127,8 @@ class params_sparse:
         self.simplify_threshold = simplify_threshold
         # When computing the growth of an atomization, only account for atoms with more than one atom in their ucs
         self.ignore_single_const_ucs = ignore_single_const_ucs
+        # Update the union model through an inverted index kept across batches
+        self.indexedUnionUpdate = indexedUnionUpdate
 
 
 class sparse_crossing_embedder_vars:
@@ -131,6 +159,9 @@ class sparse_crossing_embedder_internals:
         self.constantsInTrainingSet = sc.CSegment()
         self.doCleanUp = False
         self.updateUnionModelWithStorePositives = False
+        self.unionIndex = sc.UnionModelIndex()
+        # Terms of the duples seen in training, shared by the spaces of every batch
+        self.termPool = sc.TermPool()
 
 
 class sparse_crossing_embedder:
@@ -163,19 +194,12 @@ class sparse_crossing_embedder:
         self.exampleSet = []
         self.counterexampleSet = []
 
+    @profiling.stage("sparse_crossing_embedder.updateConstantsAndMaster")
     def updateConstantsAndMaster(self, additionalDuples):
         constantsInTrainingSet = sc.CSegment()
-        for r in self.exampleSet:
-            constantsInTrainingSet |= r.L
-            constantsInTrainingSet |= r.R
-
-        for r in additionalDuples:
-            constantsInTrainingSet |= r.L
-            constantsInTrainingSet |= r.R
-
-        for r in self.counterexampleSet:
-            constantsInTrainingSet |= r.L
-            constantsInTrainingSet |= r.R
+        constantsInTrainingSet |= sc.constantsOfDuples(self.exampleSet)
+        constantsInTrainingSet |= sc.constantsOfDuples(additionalDuples)
+        constantsInTrainingSet |= sc.constantsOfDuples(self.counterexampleSet)
 
         constantsInMasterAndTraining = constantsInTrainingSet.copy()
         for at in self.model.atomization:
@@ -209,8 +233,9 @@ class sparse_crossing_embedder:
         discarded = []
         excluseFromPinning = set()
 
-        pDuplesSorted = pDuples.copy()
-        pDuplesSorted.sort(key=lambda r: r.lastUnionUpdate)
+        pDuplesSorted = sc.sortedByUnionUpdate(pDuples)
+        if isinstance(pDuplesSorted, sc.DupleBatch):
+            pDuplesSorted = pDuplesSorted.toDuples()
         for at in self.unionModel:
             if at.unionUpdateEntrance == -1:
                 at.unionUpdateEntrance = self.vars.unionUpdates
@@ -232,14 +257,30 @@ class sparse_crossing_embedder:
             if take:
                 aux.append(at)
 
-        for r in pDuples:
-            if not r.hypothesis:
-                r.lastUnionUpdate = self.vars.unionUpdates
+        sc.setLastUnionUpdate(pDuples, self.vars.unionUpdates)
+
+        logInfo("final unionModel size:", len(aux))
+
+        return aux, excluseFromPinning, discarded
 
+    @profiling.stage("sparse_crossing_embedder.updateUnionModelByIndex")
+    def updateUnionModelByIndex(self, pDuples):
+        """
+        Same as updateUnionModelWithSetOfPduples, using the union model index
+        in 'internals'. Only the atoms that intersect the left term of a duple
+        and entered the union model after the duple was last checked are
+        visited.
+        """
+        logInfo("Updating unionModel", len(self.unionModel))
+        self.vars.unionUpdates += 1
+        aux, excluseFromPinning, discarded = self.internals.unionIndex.updateUnionModel(
+            self.unionModel, pDuples, self.vars.unionUpdates
+        )
         logInfo("final unionModel size:", len(aux))
 
         return aux, excluseFromPinning, discarded
 
+    @profiling.stage("sparse_crossing_embedder.reductionByTraces")
     def __reductionByTraces(self):
         if self.params.reductionByTraces:
             if self.params.useSimplifyFromTerms:
@@ -282,12 +323,12 @@ class sparse_crossing_embedder:
 
         j = 0
         for i, pRel in enumerate(exampleSet):
-            disc, nodisc, lasH = sc.separateDiscriminant(
+            disc, nodisc, lasH = self.model.index.separateDiscriminant(
                 pRel.L, pRel.R, self.model.atomization
             )
             if not bool(disc):
                 if pRel.region != 0:
-                    notCrossed.append(pRel)
+                    notCrossed.append(i)
                     j += 1
             else:
                 sc.enforce(
@@ -300,7 +341,7 @@ class sparse_crossing_embedder:
                 )
                 if pRel.region != 0:
                     lastj = j
-                    crossed.append(pRel)
+                    crossed.append(i)
                     j += 1
 
                 if self.params.ignore_single_const_ucs:
@@ -332,15 +373,14 @@ class sparse_crossing_embedder:
         self.__reductionByTraces()
         self.tracer.traceHelper = None
 
+        crossed = sc.selectDuples(exampleSet, crossed)
+        notCrossed = sc.selectDuples(exampleSet, notCrossed)
         return crossed, notCrossed, lastj
 
+    @profiling.stage("sparse_crossing_embedder.internalEnforceAllPositives")
     def internalEnforceAllPositives(self):
         self.Atom = sc.Atom
-        timing_start = time.time_ns()
         crossed, notCrossed, lastj = self.crossAll(self.exampleSet)
-        timing_end = time.time_ns()
-        timing_res_total = (timing_end - timing_start) / 1000_000_000
-        logInfo(f"CrossAll time: {timing_res_total:.3f}s")
         # check leaks
         if isinstance(amlset, set):
             assert bitarray.howManyAreOut() == 0
@@ -360,28 +400,54 @@ class sparse_crossing_embedder:
         else:
             self.exampleSet = []
 
+    @profiling.stage("sparse_crossing_embedder.externalExtendUnionModel")
     def externalExtendUnionModel(self, atSet):
         self.unionModel.extend(atSet)
         self.unionModel = sc.removeRepeatedAtoms(self.unionModel)  # fmt:skip
         self.internals.updateUnionModelWithStorePositives = True
 
+    @profiling.stage("sparse_crossing_embedder.enforce")
     def enforce(self, pDuples, nDuples):
-        self.vars.pcount += len([r for r in pDuples if r.region != 0])
-        self.vars.ncount += len([r for r in nDuples if r.region != 0])
+        # Once a DupleBatch is given the example sets are kept as batches on
+        # the term pool of the space and passed as such to the compiled routines
+        inputDuples = pDuples
+        batched = any(
+            isinstance(duples, sc.DupleBatch)
+            for duples in (pDuples, nDuples, self.exampleSet)
+        )
+        if batched:
+            pool = self.internals.termPool
+            pDuples = sc.asDupleBatch(pDuples, pool)
+            nDuples = sc.asDupleBatch(nDuples, pool)
+            self.exampleSet = sc.asDupleBatch(self.exampleSet, pool)
+            self.counterexampleSet = sc.asDupleBatch(self.counterexampleSet, pool)
+
+        self.vars.pcount += int(np.count_nonzero(sc.duplesColumn(pDuples, "region")))
+        self.vars.ncount += int(np.count_nonzero(sc.duplesColumn(nDuples, "region")))
 
         # Update the union model
-        updateDuples = pDuples.copy()
         if self.internals.updateUnionModelWithStorePositives:
-            updateDuples.extend(self.exampleSet)
+            stored = list(range(len(self.exampleSet)))
             self.internals.updateUnionModelWithStorePositives = False
         else:
-            updateDuples.extend([r for r in self.exampleSet if r.hypothesis])
-        self.unionModel, excluseFromPinning, _ = self.updateUnionModelWithSetOfPduples(
-            updateDuples
-        )
+            stored = np.flatnonzero(sc.duplesColumn(self.exampleSet, "hypothesis")).tolist()  # fmt:skip
+        storedDuples = sc.selectDuples(self.exampleSet, stored)
+        updateDuples = pDuples.copy()
+        updateDuples.extend(storedDuples)
+        if self.params.indexedUnionUpdate:
+            self.unionModel, excluseFromPinning, _ = self.updateUnionModelByIndex(
+                updateDuples
+            )
+        else:
+            self.unionModel, excluseFromPinning, _ = self.updateUnionModelWithSetOfPduples(
+                updateDuples
+            )
+        if batched:
+            updateDuples[: len(pDuples)].storeUnionUpdates(pDuples)
+            self.exampleSet.lastUnionUpdate[stored] = updateDuples.lastUnionUpdate[len(pDuples) :]  # fmt:skip
 
         aux = pDuples.copy()
-        random.shuffle(aux)  # imprescindible for repeated batches
+        sc.shuffleDuples(aux)  # imprescindible for repeated batches
         aux.extend(self.exampleSet)
         self.exampleSet = aux
 
@@ -389,15 +455,11 @@ class sparse_crossing_embedder:
         self.updateConstantsAndMaster([])
 
         if config.Verbosity.Info >= config.verbosityLevel:
-            count = [0] * 100
-            for rel in self.exampleSet:
-                count[rel.region] += 1
+            count = np.bincount(sc.duplesColumn(self.exampleSet, "region"))
             for region in range(len(count)):
                 if count[region] > 0:
                     logInfo(f" + region  {region} > {count[region]}")
-            count = [0] * 100
-            for rel in self.counterexampleSet:
-                count[rel.region] += 1
+            count = np.bincount(sc.duplesColumn(self.counterexampleSet, "region"))
             for region in range(len(count)):
                 if count[region] > 0:
                     logInfo(f" - region  {region} > {count[region]}")
@@ -412,10 +474,14 @@ class sparse_crossing_embedder:
             warningSent = self.tracer.warningSent
             period = self.tracer.period
 
-        self.tracer = sc.Tracer(period + 1, self.model.cmanager)
+        self.tracer = sc.Tracer(period + 1, self.model.cmanager, previous=self.tracer)
         self.tracer.warningSent = warningSent
 
-        dupleRHS = frozenset([r.R for r in self.counterexampleSet])
+        if batched:
+            terms = self.counterexampleSet.terms
+            dupleRHS = frozenset([terms[tid] for tid in self.counterexampleSet.uniqueTermIds("R").tolist()])  # fmt:skip
+        else:
+            dupleRHS = frozenset([r.R for r in self.counterexampleSet])
         for R in dupleRHS:
             self.tracer.addNegativeH(R)
 
@@ -434,14 +500,20 @@ class sparse_crossing_embedder:
 
         # -----------------------------------------------------------------
 
-        space = sc.termSpace()
+        space = sc.termSpace(self.internals.termPool)
         logInfo("Preparing space class")
-        for r in self.counterexampleSet:
-            r.wL = space.add(r.L)
-            r.wH = space.add(r.R)
-        for r in self.exampleSet:
-            r.wL = space.add(r.L)
-            r.wH = space.add(r.R)
+        if batched:
+            for duples in (self.counterexampleSet, self.exampleSet):
+                for tid in duples.uniqueTermIds("L", "R").tolist():
+                    space.addId(tid)
+                duples.space = space
+        else:
+            for r in self.counterexampleSet:
+                r.wL = space.add(r.L)
+                r.wH = space.add(r.R)
+            for r in self.exampleSet:
+                r.wL = space.add(r.L)
+                r.wH = space.add(r.R)
         space.freeTraceAll(self.tracer)
 
         # -----------------------------------------------------------------
@@ -476,9 +548,9 @@ class sparse_crossing_embedder:
             aux.extend(initial)
         else:
             cexamples = nDuples.copy()
-            random.shuffle(cexamples)
+            sc.shuffleDuples(cexamples)
             examples = self.exampleSet.copy()
-            random.shuffle(examples)
+            sc.shuffleDuples(examples)
             atoms = self.model.atomization.copy()
 
             # -----------------------------------------------------------------
@@ -486,12 +558,16 @@ class sparse_crossing_embedder:
             # -----------------------------------------------------------------
             initial = self.traceClosure(space, examples, cexamples, atoms)
 
-        for r in self.counterexampleSet:
-            r.wL = None
-            r.wH = None
-        for r in self.exampleSet:
-            r.wL = None
-            r.wH = None
+        if batched:
+            self.counterexampleSet.space = None
+            self.exampleSet.space = None
+        else:
+            for r in self.counterexampleSet:
+                r.wL = None
+                r.wH = None
+            for r in self.exampleSet:
+                r.wL = None
+                r.wH = None
 
         if self.params.segregateByGeneration:
             self.model.generation += 1
@@ -531,16 +607,25 @@ class sparse_crossing_embedder:
                 self.model.atomization, self.unionModel, duples
             )
 
+        if batched and pDuples is not inputDuples:
+            pDuples.storeUnionUpdates(inputDuples)
+
+    @runCompiled()
     def traceClosure(self, space, examples, cexamples, atoms):
         if self.params.byQuotient:
             logInfo(f"Calculating lower atomic segments")
+            quotientAtoms = self.model.atomization
             las = sc.calculateLowerAtomicSegment(
-                self.model.atomization,
+                quotientAtoms,
                 self.internals.constantsInMasterAndTraining,
-                False,
+                True,
             )
         # ------------------------------------------------------------
         initial = []
+        if isinstance(examples, sc.DupleBatch):
+            examples = examples.toDuples()
+        if isinstance(cexamples, sc.DupleBatch):
+            cexamples = cexamples.toDuples()
 
         allEnforced = False
         while not allEnforced:
@@ -554,6 +639,7 @@ class sparse_crossing_embedder:
                         self.model.epoch,
                         self.model.generation,
                         las,
+                        quotientAtoms,
                     )
                 else:
                     aux = self.tracer.enforceNegativeTraceConstraint(
@@ -594,6 +680,7 @@ class sparse_crossing_embedder:
         logInfo(f"Traces enforced with {len(initial)} atoms")
         return initial
 
+    @profiling.stage("sparse_crossing_embedder.testAccuracy")
     def testAccuracy(self, rels):
         """
         Compute FPR and FNR.
@@ -609,7 +696,7 @@ class sparse_crossing_embedder:
         numPositives = 0
         numNegatives = 0
         for r in rels:
-            disc = r.wL.las - r.wH.las
+            disc = not r.wL.las.issubset(r.wH.las)
 
             if r.positive:
                 numPositives += 1
@@ -631,6 +718,7 @@ class sparse_crossing_embedder:
 
         return FPR, FNR
 
+    @profiling.stage("sparse_crossing_embedder.test")
     def test(self, duples, region=-1):
         """
         Report FPR and FNR as a string
@@ -0,0 +1,111 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import numpy as np
+
+from . import core as sc
+from .aml_fast import aml_fast as af
+from .aml_fast.amlFastBitarrays import bitarray
+
+
+class UnionModelPredictor:
+    """
+    Immutable predictor compiled from a union model (a list of Atom).
+
+    The lower atomic segment of every constant is computed once and kept in
+    C-ready form. Scoring a batch of terms against a list of class constants
+    is done in a single compiled call, so the cost per query is the set
+    algebra and not the Python loop over terms and classes.
+
+    Vars:
+    size (int)          : number of atoms in the compiled union model
+    constants (list)    : sorted constants with a non-empty lower atomic segment
+    """
+
+    def __init__(self, unionModel, constants=None):
+        """
+        'constants' restricts the lower atomic segments to the given constants.
+        If None, every constant found in the atoms is used.
+        """
+
+        if constants is None:
+            constants = sc.CSegment()
+            for at in unionModel:
+                constants |= at.ucs
+
+        las = sc.calculateLowerAtomicSegment(unionModel, constants, True)
+
+        self.size = len(unionModel)
+        self.constants = sorted(las.keys())
+        self._las = [bitarray(las[c]) for c in self.constants]
+        self._las_idx = af.ffi.new("uint32_t[]", self.constants)
+        self._las_ptr = af.ffi.new(
+            "void *[]", [b._segment_handle[0] for b in self._las]
+        )
+        self._constant_idx = {c: idx for idx, c in enumerate(self.constants)}
+
+    def lowerAtomicSegment(self, c):
+        """
+        Return a copy of the lower atomic segment of constant 'c' as positions
+        in the union model.
+        """
+
+        idx = self._constant_idx.get(c)
+        if idx is None:
+            return bitarray()
+        return self._las[idx].copy()
+
+    def discriminantSizes(self, terms, classConstants):
+        """
+        Return an int32 matrix of shape (len(terms), len(classConstants)) with
+        |las(class) - las(term)| for every term and class constant.
+        Classes whose constant has no atoms are marked with -1.
+        """
+
+        ret = np.empty([len(terms), len(classConstants)], dtype=np.int32)
+        if ret.size == 0:
+            return ret
+
+        ### ATTENTION: This block cannot be extracted.
+        ### If in a function, Python garbage collects pointers before they're used
+        if isinstance(terms[0], set):
+            term_cset = [bitarray(t) for t in terms]
+            term_cset_ptr = [b._segment_handle[0] for b in term_cset]
+        elif isinstance(terms[0], bitarray):
+            term_cset_ptr = [t._segment_handle[0] for t in terms]
+        else:
+            raise TypeError("Must be of type 'set' or 'LCSegment'")
+
+        nonexistent = len(self.constants)
+        class_idx = [self._constant_idx.get(c, nonexistent) for c in classConstants]
+
+        af.caml.discriminantSizes(
+            af.ffi.cast("int32_t *", ret.ctypes.data),
+            term_cset_ptr,
+            len(terms),
+            class_idx,
+            len(class_idx),
+            self._las_ptr,
+            self._las_idx,
+            len(self.constants),
+            bitarray.gsm,
+        )
+
+        return ret
+
+    def predict(self, terms, classConstants):
+        """
+        Return, for each term, the index in 'classConstants' of the class with
+        the smallest discriminant. Ties are resolved in favour of the first
+        class. Terms for which no class has atoms get -1.
+        """
+
+        sizes = self.discriminantSizes(terms, classConstants)
+        if sizes.size == 0:
+            return np.full(len(terms), -1, dtype=np.int64)
+
+        missing = sizes < 0
+        scores = np.where(missing, np.iinfo(np.int32).max, sizes)
+        ret = np.argmin(scores, axis=1)
+        ret[missing.all(axis=1)] = -1
+        return ret
@@ -3,6 +3,8 @@
 
 import pickle
 import os
+import mmap
+import struct
 import subprocess
 import numpy as np
 from pathlib import Path
@@ -187,18 +189,23 @@ def loadAtomizationFromFileUsingBitarrays(filePathAndName):
             buffer = pickle.load(inputfile)
 
         # Read data into bitarrays
-        segments = [bitarray() for _ in range(atomization_len)]
-        handles = [b._segment_handle for b in segments]
+        segments = bitarray.bulk_new(atomization_len)
         buffer_ptr = af.ffi.cast("char *", buffer.ctypes.data)
         af.caml.segment_buildFromBuffer(
             buffer_ptr,
-            handles,
+            segments.handles,
             bitarray.gsm,
         )
 
         # Assign bitarrays to atoms ucs
+        if amlset == bitarray:
+            segments = segments.release(sc.UCSegment)
         for k in range(atomization_len):
-            at = sc.Atom(0, 0, set(segments[k]))
+            if amlset == bitarray:
+                at = sc.Atom(0, 0, set())
+                at.ucs = segments[k]
+            else:
+                at = sc.Atom(0, 0, set(segments[k]))
             at.gen = gens[k]
             at.G = Gs[k]
             atomization.append(at)
@@ -208,3 +215,203 @@ def loadAtomizationFromFileUsingBitarrays(filePathAndName):
         print(f"{COLOR_RED}File saved with version: {git_hash}{COLOR_RESET}")
 
     return cmanager, atomization
+
+
+def packAtomization(atomization):
+    """
+    Pack the ucs, epoch, gen and G of the atoms in 'atomization' into a
+    compact segment buffer and an int64 array, e.g. to send them to another
+    process. It only works if amlset is an alias for bitarray.
+    """
+
+    segments = [at.ucs if isinstance(at.ucs, bitarray) else bitarray(at.ucs) for at in atomization]  # fmt:skip
+    handles = [s._segment_handle[0] for s in segments]
+    length_buffer = af.caml.segment_getAllSegmentsBufferLength(handles, len(handles))
+    buffer = np.empty([length_buffer], dtype=np.byte)
+    buffer_ptr = af.ffi.cast("char *", buffer.ctypes.data)
+    af.caml.segment_getAllSegmentsBuffer(buffer_ptr, handles, len(handles))
+
+    columns = np.array(
+        [[at.epoch, at.gen, at.G] for at in atomization], dtype=np.int64
+    ).reshape(-1, 3)
+    return buffer, columns
+
+
+def unpackAtomization(packed):
+    """Return the atoms packed by packAtomization"""
+
+    buffer, columns = packed
+    segments = [bitarray() for _ in range(len(columns))]
+    handles = [b._segment_handle for b in segments]
+    buffer_ptr = af.ffi.cast("char *", buffer.ctypes.data)
+    af.caml.segment_buildFromBuffer(buffer_ptr, handles, bitarray.gsm)
+
+    atomization = []
+    for ucs, (epoch, gen, G) in zip(segments, columns.tolist()):
+        at = sc.Atom(epoch, gen, [])
+        at.ucs = ucs
+        at.G = G
+        atomization.append(at)
+    return atomization
+
+
+# -----------------------------------------------------------------------------
+# Memory mapped models
+#
+# Layout of a .amlm file (little endian):
+#   header        magic, version, number of atoms and the byte offset of each
+#                 of the following sections (and the cmanager length)
+#   offset table  uint64[n + 1], segment k spans blob[table[k]:table[k + 1]]
+#   cbar blob     raw cbars, each one aligned to MAPPED_MODEL_ALIGNMENT bytes
+#   columns       int64[3][n] with the epoch, gen and G of every atom
+#   cmanager      pickled constant manager
+
+MAPPED_MODEL_MAGIC = b"AMLMODEL"
+MAPPED_MODEL_VERSION = 1
+MAPPED_MODEL_ALIGNMENT = 32
+_MAPPED_MODEL_HEADER = struct.Struct("<8sIIQQQQQQ")
+
+
+def _alignUp(offset):
+    return -(-offset // MAPPED_MODEL_ALIGNMENT) * MAPPED_MODEL_ALIGNMENT
+
+
+def saveAtomizationOnMappedFile(atomization, cmanager, filePathAndName):
+    """
+    Save 'atomization' and 'cmanager' to 'filePathAndName'.amlm in the
+    versioned binary format read by loadAtomizationFromMappedFile.
+    """
+
+    # Set up paths and extensions
+    filename = Path(filePathAndName + ".amlm")
+    filename_temp = Path(filePathAndName + ".atemp")
+    print("Saving in file as", filename)
+
+    ### ATTENTION: This block cannot be extracted.
+    ### If in a function, Python garbage collects pointers before they're used
+    atomization_len = len(atomization)
+    if atomization and isinstance(atomization[0].ucs, set):
+        segments = [bitarray(at.ucs) for at in atomization]
+    else:
+        segments = [at.ucs for at in atomization]
+    handles = [s._segment_handle[0] for s in segments]
+
+    # Cbar blob and offset table
+    blob_len = af.caml.segment_getAllSegmentsBlobLength(
+        handles, atomization_len, MAPPED_MODEL_ALIGNMENT
+    )
+    blob = np.empty([blob_len], dtype=np.byte)
+    offsets = np.empty([atomization_len + 1], dtype=np.uint64)
+    af.caml.segment_getAllSegmentsBlob(
+        af.ffi.cast("char *", blob.ctypes.data),
+        af.ffi.cast("uint64_t *", offsets.ctypes.data),
+        handles,
+        atomization_len,
+        MAPPED_MODEL_ALIGNMENT,
+    )
+
+    columns = np.array(
+        [
+            [at.epoch for at in atomization],
+            [at.gen for at in atomization],
+            [at.G for at in atomization],
+        ],
+        dtype=np.int64,
+    )
+
+    embeddingConstants = cmanager.embeddingConstants
+    cmanager.embeddingConstants = set(embeddingConstants)
+    cmanager_bytes = pickle.dumps(cmanager, pickle.HIGHEST_PROTOCOL)
+    cmanager.embeddingConstants = embeddingConstants
+
+    table_offset = _alignUp(_MAPPED_MODEL_HEADER.size)
+    blob_offset = _alignUp(table_offset + offsets.nbytes)
+    columns_offset = blob_offset + blob_len
+    cmanager_offset = columns_offset + columns.nbytes
+    header = _MAPPED_MODEL_HEADER.pack(
+        MAPPED_MODEL_MAGIC,
+        MAPPED_MODEL_VERSION,
+        0,
+        atomization_len,
+        table_offset,
+        blob_offset,
+        columns_offset,
+        cmanager_offset,
+        len(cmanager_bytes),
+    )
+
+    with open(filename_temp, "wb") as output:
+        output.write(header)
+        output.write(bytes(table_offset - len(header)))
+        output.write(offsets.tobytes())
+        output.write(bytes(blob_offset - table_offset - offsets.nbytes))
+        output.write(blob.tobytes())
+        output.write(columns.tobytes())
+        output.write(cmanager_bytes)
+
+    filename_temp.rename(filename)
+
+
+def loadAtomizationFromMappedFile(filePathAndName):
+    """
+    Load 'cmanager' and 'atomization' from 'filePathAndName'.amlm.
+    The file is memory mapped and, when using bitarrays, the ucs of the atoms
+    point straight into the read-only mapping. A ucs is copied to memory the
+    first time it is modified.
+    """
+
+    filename = Path(filePathAndName + ".amlm")
+    print("Loading file", filename)
+    with open(filename, "rb") as inputfile:
+        mapping = mmap.mmap(inputfile.fileno(), 0, access=mmap.ACCESS_READ)
+
+    (
+        magic,
+        version,
+        _,
+        atomization_len,
+        table_offset,
+        blob_offset,
+        columns_offset,
+        cmanager_offset,
+        cmanager_len,
+    ) = _MAPPED_MODEL_HEADER.unpack_from(mapping, 0)
+    if magic != MAPPED_MODEL_MAGIC:
+        raise ValueError(f"{filename} is not a memory mapped model file")
+    if version != MAPPED_MODEL_VERSION:
+        raise ValueError(
+            f"{filename} has format version {version}, "
+            f"expected {MAPPED_MODEL_VERSION}"
+        )
+
+    cmanager = pickle.loads(mapping[cmanager_offset : cmanager_offset + cmanager_len])
+    cmanager.embeddingConstants = amlset(cmanager.embeddingConstants)
+
+    columns = np.frombuffer(
+        mapping, dtype=np.int64, count=3 * atomization_len, offset=columns_offset
+    ).reshape(3, atomization_len)
+    epochs = columns[0].tolist()
+    gens = columns[1].tolist()
+    Gs = columns[2].tolist()
+
+    # Point segments into the mapping
+    buffer = af.ffi.from_buffer(mapping)
+    handles = [af.ffi.new("void **") for _ in range(atomization_len)]
+    af.caml.segment_viewsFromBlob(
+        handles,
+        buffer + blob_offset,
+        af.ffi.cast("uint64_t *", buffer + table_offset),
+        atomization_len,
+    )
+
+    atomization = []
+    for k in range(atomization_len):
+        at = sc.Atom(epochs[k], gens[k], [])
+        at.G = Gs[k]
+        if amlset == set:
+            at.ucs = sc.UCSegment(bitarray.fromMapping(handles[k], buffer))
+        else:
+            at.ucs = sc.UCSegment.fromMapping(handles[k], buffer)
+        atomization.append(at)
+
+    return cmanager, atomization
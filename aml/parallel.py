@@ -0,0 +1,310 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import multiprocessing
+import os
+import random
+
+import numpy as np
+
+from . import core as sc
+from . import amlset
+from . import profiling
+from .embedders import sparse_crossing_embedder
+from .io import logInfo, packAtomization, unpackAtomization
+from .aml_fast import aml_fast as af
+from .aml_fast.amlFastBitarrays import bitarray
+
+# -----------------------------------------------------------------------------
+# Worker side. Every worker process holds one embedder between batches.
+
+_embedder = None
+# Atoms of the atomization of the embedder after the last batch, by ucs
+_atomization = {}
+
+
+def _workerStart(seed, numThreads):
+    global _embedder, _atomization
+    random.seed(seed)
+    af.caml.setNumThreads(numThreads)
+    _embedder = sparse_crossing_embedder(sc.Model())
+    _atomization = {}
+
+
+def _delta(before, after):
+    # Atoms of 'after' not in 'before' and of 'before' not in 'after', packed
+    added = [at for ucs, at in after.items() if ucs not in before]
+    removed = [at for ucs, at in before.items() if ucs not in after]
+    return packAtomization(added), packAtomization(removed)
+
+
+def _workerFollow(unionModelDelta):
+    # Bring the union model up to the merged one of the master
+    packedAdded, packedRemoved = unionModelDelta
+    removed = {at.ucs for at in unpackAtomization(packedRemoved)}
+    if removed:
+        _embedder.unionModel = [at for at in _embedder.unionModel if at.ucs not in removed]  # fmt:skip
+    added = unpackAtomization(packedAdded)
+    if added:
+        _embedder.externalExtendUnionModel(added)
+
+
+def _workerEnforce(constants, params, unionModelDelta, pDuples, nDuples):
+    last, names, newConstants = constants
+    cmanager = _embedder.model.cmanager
+    cmanager.lastDefConstantOrChain = max(cmanager.lastDefConstantOrChain, last)
+    for c, name in names.items():
+        cmanager.definedWithName[name] = c
+        cmanager.reversedNameDict[c] = name
+    if newConstants:
+        cmanager.embeddingConstants |= amlset(newConstants)
+
+    _embedder.params = params
+    _workerFollow(unionModelDelta)
+
+    global _atomization
+    before = {at.ucs: at for at in _embedder.unionModel}
+    _embedder.enforce(pDuples, nDuples)
+    after = {at.ucs: at for at in _embedder.unionModel}
+
+    # Only the changes are sent back
+    atomization = {at.ucs: at for at in _embedder.model.atomization}
+    atomizationDelta = _delta(_atomization, atomization)
+    _atomization = atomization
+    model = _embedder.model
+    return _delta(before, after), atomizationDelta, (model.epoch, model.generation)
+
+
+# -----------------------------------------------------------------------------
+# Master side
+
+
+class ParallelSparseEmbedder(sparse_crossing_embedder):
+    """
+    Data-parallel sparse crossing. Every batch of duples is split into
+    'workers' shards, each one enforced by a sparse_crossing_embedder living
+    in its own process. Before a batch every worker receives the changes of
+    the merged 'unionModel' since it last saw it, so all of them pin their
+    tracers with the same union model. Afterwards they send back only the
+    atoms they added to and removed from their union model and atomization,
+    in the compact segment buffer format. The new atoms are merged into
+    'unionModel' and checked against the positive duples of all the shards,
+    atoms that discriminate any of them are discarded and, with
+    'removeRedundant', so are the atoms that are the union of other atoms.
+    'model.atomization' holds the atoms of the atomizations of all the
+    workers, each one once, besides the atoms it had to begin with.
+
+    'params' are sent to the workers with every batch. Constants must be
+    created in 'model.cmanager'; new ones are sent to the workers as well.
+    Call close() (or use the embedder as a context manager) to stop the
+    workers. Only works if amlset is an alias for bitarray.
+    """
+
+    def __init__(self, model, workers=None, removeRedundant=True):
+        super().__init__(model)
+        if amlset != bitarray:
+            raise TypeError("ParallelSparseEmbedder requires amlset to be bitarray")
+
+        self.workers = workers or os.cpu_count() or 1
+        self.removeRedundant = removeRedundant
+        self._lastSentConstant = -1
+        # Changes of the union model not yet sent to every worker, as the
+        # atoms to add and to remove by ucs. They follow 'unionModel' as it
+        # was left by the last merge, '_mergedUnionModel', by ucs.
+        self._pendingDeltas = [({}, {}) for _ in range(self.workers)]
+        self._mergedUnionModel = {}
+        self._mergedUnionModelList = None
+        # Number of workers whose atomization holds every atom of
+        # 'model.atomization', by ucs. Atoms it held before are counted once.
+        self._atomizationCounts = {at.ucs: 1 for at in model.atomization}
+
+        # Workers are spawned: a forked OpenMP runtime is not safe to use
+        context = multiprocessing.get_context("spawn")
+        numThreads = max(1, (os.cpu_count() or 1) // self.workers)
+        self._pools = [
+            context.Pool(1, _workerStart, (random.randrange(2**32), numThreads))
+            for _ in range(self.workers)
+        ]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Stop the worker processes"""
+
+        for pool in getattr(self, "_pools", []):
+            pool.terminate()
+            pool.join()
+        self._pools = []
+
+    def _constantsDelta(self):
+        # Constants and names created since the last batch
+        cmanager = self.model.cmanager
+        last = self._lastSentConstant
+        names = {c: name for c, name in cmanager.reversedNameDict.items() if c > last}
+        newConstants = [c for c in cmanager.embeddingConstants if c > last]
+        self._lastSentConstant = cmanager.lastDefConstantOrChain
+        return cmanager.lastDefConstantOrChain, names, newConstants
+
+    def _noteUnionModelChanges(self, added, removed):
+        # Record in the pending deltas of every worker that the atoms in
+        # 'added' entered the union model and those in 'removed' left it
+        for pendingAdded, pendingRemoved in self._pendingDeltas:
+            for ucs, at in added.items():
+                if pendingRemoved.pop(ucs, None) is None:
+                    pendingAdded[ucs] = at
+            for ucs, at in removed.items():
+                if pendingAdded.pop(ucs, None) is None:
+                    pendingRemoved[ucs] = at
+
+    def _followUnionModel(self):
+        # Changes made to 'unionModel' outside of enforce are found by
+        # comparing it in full with the one left by the last merge
+        if self.unionModel is self._mergedUnionModelList:
+            return
+        current = {at.ucs: at for at in self.unionModel}
+        merged = self._mergedUnionModel
+        self._noteUnionModelChanges(
+            {ucs: at for ucs, at in current.items() if ucs not in merged},
+            {ucs: at for ucs, at in merged.items() if ucs not in current},
+        )
+        self._mergedUnionModel = current
+        self._mergedUnionModelList = self.unionModel
+
+    def _unionModelDeltas(self):
+        # Atoms added to and removed from the union model since every worker
+        # last saw it, which are then no longer pending
+        self._followUnionModel()
+        deltas = []
+        for k, (added, removed) in enumerate(self._pendingDeltas):
+            deltas.append((packAtomization(list(added.values())), packAtomization(list(removed.values()))))  # fmt:skip
+            self._pendingDeltas[k] = ({}, {})
+        return deltas
+
+    def _shard(self, duples):
+        shards = [duples[k :: self.workers] for k in range(self.workers)]
+        if isinstance(duples, sc.DupleBatch):
+            # Sent with a pool holding only the terms of the shard
+            shards = [sc.DupleBatch.fromDuples(shard) for shard in shards]
+        return shards
+
+    @profiling.stage("ParallelSparseEmbedder.enforce")
+    def enforce(self, pDuples, nDuples):
+        if not self._pools:
+            raise ValueError("The workers of this embedder have been stopped")
+
+        # With a DupleBatch the stored positives are kept as a batch
+        inputDuples = pDuples
+        batched = isinstance(pDuples, sc.DupleBatch) or isinstance(self.exampleSet, sc.DupleBatch)  # fmt:skip
+        if batched:
+            pDuples = sc.asDupleBatch(pDuples, self.internals.termPool)
+            self.exampleSet = sc.asDupleBatch(self.exampleSet, self.internals.termPool)
+
+        self.vars.pcount += int(np.count_nonzero(sc.duplesColumn(pDuples, "region")))
+        self.vars.ncount += int(np.count_nonzero(sc.duplesColumn(nDuples, "region")))
+
+        constants = self._constantsDelta()
+        pending = [
+            pool.apply_async(_workerEnforce, (constants, self.params, delta, pShard, nShard))  # fmt:skip
+            for pool, delta, pShard, nShard in zip(
+                self._pools,
+                self._unionModelDeltas(),
+                self._shard(pDuples),
+                self._shard(nDuples),
+            )
+        ]
+        with profiling.stage("ParallelSparseEmbedder.gather"):
+            results = [p.get() for p in pending]
+
+        with profiling.stage("ParallelSparseEmbedder.merge"):
+            self.__mergeUnionModels(results, pDuples)
+        if batched and pDuples is not inputDuples:
+            pDuples.storeUnionUpdates(inputDuples)
+
+        logInfo(
+            f"Atomization: {len(self.model.atomization)}, "
+            f"unionModel: {len(self.unionModel)}"
+        )
+
+    def __mergeAtomizations(self, results):
+        # The atomization of the model holds every atom of a worker
+        # atomization once
+        counts = self._atomizationCounts
+        entered = []
+        left = set()
+        for _, (packedAdded, packedRemoved), (epoch, generation) in results:
+            for at in unpackAtomization(packedAdded):
+                count = counts.get(at.ucs, 0)
+                counts[at.ucs] = count + 1
+                if count == 0:
+                    if at.ucs in left:
+                        left.discard(at.ucs)
+                    else:
+                        entered.append(at)
+            for at in unpackAtomization(packedRemoved):
+                count = counts.pop(at.ucs) - 1
+                if count > 0:
+                    counts[at.ucs] = count
+                else:
+                    left.add(at.ucs)
+            self.model.epoch = max(self.model.epoch, epoch)
+            self.model.generation = max(self.model.generation, generation)
+
+        if left:
+            self.model.atomization = [at for at in self.model.atomization if at.ucs not in left]  # fmt:skip
+        self.model.atomization.extend(at for at in entered if at.ucs not in left)
+
+    def __mergeUnionModels(self, results, pDuples):
+        self.__mergeAtomizations(results)
+
+        # The workers now hold the union model they were sent with their own
+        # changes. Those are pending until the next batch, together with the
+        # changes of the merge.
+        merged = self._mergedUnionModel
+        known = set()
+        new = []
+        for k, ((packedNew, packedDropped), _, _) in enumerate(results):
+            dropped = {at.ucs: at for at in unpackAtomization(packedDropped)}
+            learnt = {at.ucs: at for at in unpackAtomization(packedNew)}
+            self._pendingDeltas[k] = (dropped, learnt)
+            for ucs, at in learnt.items():
+                if ucs not in merged and ucs not in known:
+                    known.add(ucs)
+                    new.append(at)
+
+        self.lastUnionModel = self.unionModel
+        self.unionModel = self.unionModel + new
+
+        # An atom learnt by one worker may discriminate positive duples of
+        # the other shards. Atoms already in the union model have seen the
+        # stored positives, so only the new ones are checked against them.
+        updateDuples = pDuples.copy()
+        updateDuples.extend(self.exampleSet)
+        if self.params.indexedUnionUpdate:
+            self.unionModel, _, _ = self.updateUnionModelByIndex(updateDuples)
+        else:
+            self.unionModel, _, _ = self.updateUnionModelWithSetOfPduples(updateDuples)
+        if isinstance(updateDuples, sc.DupleBatch):
+            updateDuples[: len(pDuples)].storeUnionUpdates(pDuples)
+            updateDuples[len(pDuples) :].storeUnionUpdates(self.exampleSet)
+        if self.params.storePositives:
+            self.exampleSet.extend(pDuples)
+
+        if self.removeRedundant:
+            self.unionModel = sc.removeRedundantAtoms(
+                self.unionModel, self.model.cmanager.embeddingConstants, True
+            )
+
+        current = {at.ucs: at for at in self.unionModel}
+        added = {ucs: at for ucs, at in current.items() if ucs not in self._mergedUnionModel}  # fmt:skip
+        removed = {ucs: at for ucs, at in self._mergedUnionModel.items() if ucs not in current}  # fmt:skip
+        self._noteUnionModelChanges(added, removed)
+        self._mergedUnionModel = current
+        self._mergedUnionModelList = self.unionModel
@@ -0,0 +1,281 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+"""
+Stage-level profiling.
+
+Every compiled function and every embedder stage is wrapped in a 'stage'.
+While profiling is enabled each stage accumulates its number of calls, total,
+minimum and maximum wall time, a histogram of durations and the time spent
+inside the compiled library ('native'), so that the marshalling overhead of
+the Python wrappers is the difference between both. Stages also record how
+many cbars were allocated while they were open.
+
+    from aml import profiling
+
+    profiling.enable(trace=True)
+    embedder.enforce(pDuples, nDuples)
+    print(profiling.report())
+    profiling.dumpChromeTrace("enforce.json")
+
+When profiling is disabled stages only cost a flag check.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+
+
+class _state:
+    enabled = False
+    trace = False
+    origin = 0
+    stats = {}
+    stack = []
+    events = []
+
+
+def _now():
+    return time.perf_counter_ns()
+
+
+def enable(trace=False):
+    """
+    Start collecting stage statistics. With 'trace' every stage call is also
+    recorded as an event for dumpChromeTrace.
+    """
+
+    _state.enabled = True
+    _state.trace = trace
+    if not _state.origin:
+        _state.origin = _now()
+
+
+def disable():
+    """Stop collecting. Collected statistics are kept until reset"""
+
+    _state.enabled = False
+    _state.trace = False
+
+
+def isEnabled():
+    return _state.enabled
+
+
+def reset():
+    """Discard the collected statistics and trace events"""
+
+    _state.stats = {}
+    _state.events = []
+    _state.origin = _now()
+
+
+def counters():
+    """Counters of the compiled library"""
+
+    from .aml_fast.amlFastBitarrays import bitarray
+    from .aml_fast.amlCompiledLibrary import lib as caml
+
+    ret = {
+        "cbarsOut": 0,
+        "cbarsAllocated": 0,
+        "cbarsReused": 0,
+        "cbarBytesInUse": 0,
+        "cbarBytesResident": 0,
+    }
+    if bitarray.gsm is not None:
+        ret["cbarsOut"] = caml.bitarray_howManyAreOut(bitarray.gsm)
+        ret["cbarsAllocated"] = bitarray.countAllocated()
+        ret["cbarsReused"] = bitarray.countReused()
+        ret["cbarBytesInUse"] = bitarray.memoryUsed()
+        ret["cbarBytesResident"] = bitarray.residentBytes()
+    ret["densebitarraysOut"] = caml.densebitarray_howManyAreOut()
+    return ret
+
+
+class _StageStats:
+    __slots__ = ("count", "total", "native", "min", "max", "allocated", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.native = 0
+        self.min = None
+        self.max = 0
+        self.allocated = 0
+        # Bucket k holds the calls that took less than 2**k microseconds
+        self.histogram = {}
+
+    def add(self, elapsed, native, allocated):
+        self.count += 1
+        self.total += elapsed
+        self.native += native
+        self.min = elapsed if self.min is None else min(self.min, elapsed)
+        self.max = max(self.max, elapsed)
+        self.allocated += allocated
+        bucket = (elapsed // 1000).bit_length()
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def asDict(self):
+        return {
+            "count": self.count,
+            "total": self.total / 1e9,
+            "native": self.native / 1e9,
+            "marshalling": (self.total - self.native) / 1e9,
+            "min": (self.min or 0) / 1e9,
+            "max": self.max / 1e9,
+            "cbarsAllocated": self.allocated,
+            "histogram": {
+                f"<{1 << k}us": self.histogram[k] for k in sorted(self.histogram)
+            },
+        }
+
+
+def _cbarsAllocated():
+    from .aml_fast.amlFastBitarrays import bitarray
+
+    if bitarray.gsm is None:
+        return 0
+    return bitarray.countAllocated()
+
+
+class stage:
+    """
+    Context manager and decorator that times a stage under 'name'.
+    Extra keyword arguments are attached to the trace event, which is useful
+    to tell batches apart. The wall time of the last use is available as
+    'elapsed' (seconds) even when profiling is disabled.
+    """
+
+    __slots__ = ("name", "args", "elapsed", "_start", "_native", "_allocated")
+
+    def __init__(self, name, **args):
+        self.name = name
+        self.args = args
+        self.elapsed = 0.0
+
+    def __call__(self, func):
+        name = self.name
+        args = self.args
+
+        @functools.wraps(func)
+        def inner(*fargs, **fkwargs):
+            if not _state.enabled:
+                return func(*fargs, **fkwargs)
+            with stage(name, **args):
+                return func(*fargs, **fkwargs)
+
+        return inner
+
+    def __enter__(self):
+        self._native = 0
+        if _state.enabled:
+            self._allocated = _cbarsAllocated()
+            _state.stack.append(self)
+        self._start = _now()
+        return self
+
+    def __exit__(self, *exc):
+        end = _now()
+        elapsed = end - self._start
+        self.elapsed = elapsed / 1e9
+        if _state.stack and _state.stack[-1] is self:
+            _state.stack.pop()
+            allocated = _cbarsAllocated() - self._allocated
+            stats = _state.stats.get(self.name)
+            if stats is None:
+                stats = _state.stats[self.name] = _StageStats()
+            stats.add(elapsed, self._native, allocated)
+            # Native time of nested stages also counts for the enclosing one
+            if _state.stack:
+                _state.stack[-1]._native += self._native
+            if _state.trace:
+                self._record(end, elapsed, allocated)
+        return False
+
+    def _record(self, end, elapsed, allocated):
+        ts = (self._start - _state.origin) / 1000
+        pid = os.getpid()
+        _state.events.append(
+            {
+                "name": self.name,
+                "cat": "aml",
+                "ph": "X",
+                "ts": ts,
+                "dur": elapsed / 1000,
+                "pid": pid,
+                "tid": threading.get_ident(),
+                "args": {
+                    "native_us": self._native / 1000,
+                    "cbarsAllocated": allocated,
+                    **self.args,
+                },
+            }
+        )
+        _state.events.append(
+            {
+                "name": "cbarBytesInUse",
+                "ph": "C",
+                "ts": (end - _state.origin) / 1000,
+                "pid": pid,
+                "args": {"bytes": counters()["cbarBytesInUse"]},
+            }
+        )
+
+
+class native:
+    """
+    Context manager around a call into the compiled library. Its wall time is
+    added to the native time of the innermost open stage.
+    """
+
+    __slots__ = ("_start",)
+
+    def __enter__(self):
+        self._start = _now()
+        return self
+
+    def __exit__(self, *exc):
+        if _state.stack:
+            _state.stack[-1]._native += _now() - self._start
+        return False
+
+
+def stats():
+    """Collected statistics per stage, times in seconds"""
+
+    return {name: st.asDict() for name, st in _state.stats.items()}
+
+
+def report():
+    """Collected statistics as a table sorted by total time"""
+
+    lines = [
+        f"{'stage':<52} {'calls':>7} {'total':>9} {'native':>9} {'marshal':>9} {'max':>9} {'cbars':>10}"
+    ]
+    for name, st in sorted(stats().items(), key=lambda kv: -kv[1]["total"]):
+        lines.append(
+            f"{name:<52} {st['count']:>7} {st['total']:>8.3f}s {st['native']:>8.3f}s "
+            f"{st['marshalling']:>8.3f}s {st['max']:>8.3f}s {st['cbarsAllocated']:>10}"
+        )
+    return "\n".join(lines)
+
+
+def dumpJSON(path):
+    """Write the collected statistics and the current counters to 'path'"""
+
+    with open(path, "w") as f:
+        json.dump({"stages": stats(), "counters": counters()}, f, indent=1)
+
+
+def dumpChromeTrace(path):
+    """
+    Write the recorded events in Chrome trace format, to be opened with
+    chrome://tracing or Perfetto. Events are only recorded when profiling is
+    enabled with trace=True.
+    """
+
+    with open(path, "w") as f:
+        json.dump({"traceEvents": _state.events, "displayTimeUnit": "ms"}, f)
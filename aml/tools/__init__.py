@@ -3,3 +3,4 @@
 
 from .selectAtomsFrom import *
 from .evaluateUsingUnionModel import *
+from . import metrics
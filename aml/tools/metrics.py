@@ -0,0 +1,217 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import numpy as np
+
+from .. import core as sc
+
+
+class Evaluation:
+    """
+    Result of evaluating a union model on a set of duples. A duple is assigned
+    positive if its discriminant las(L) - las(R) has less than 'cutoff' atoms.
+
+    Vars:
+    positives (int)              : number of positive duples
+    negatives (int)              : number of negative duples
+    balance (float)              : weight of the negative class in 'accuracy'
+    auc (float)                  : area under the ROC curve
+    fpr (np.ndarray)             : false positive rate at cutoffs 0, 1, ..., max size + 1
+    tpr (np.ndarray)             : true positive rate at the same cutoffs
+    cutoff (int)                 : cutoff of the evaluation, -1 if no cutoff is better than none
+    accuracy (float)             : accuracy at 'cutoff', negatives weighted by 'balance'
+    error (float)                : 1 - accuracy
+    tp, tn, fp, fn (int)         : confusion counts at 'cutoff'
+    f1 (float)                   : F1 score of the positive class at 'cutoff'
+    f1Negative (float)           : F1 score of the negative class at 'cutoff'
+    bestF1 (float)               : best F1 score of the positive class over all cutoffs
+    bestF1Cutoff (int)           : cutoff of 'bestF1', -1 if none
+    bestF1Negative (float)       : best F1 score of the negative class over all cutoffs
+    bestF1NegativeCutoff (int)   : cutoff of 'bestF1Negative', -1 if none
+    """
+
+    def __init__(self):
+        self.positives = 0
+        self.negatives = 0
+        self.balance = 1.0
+        self.auc = 0.0
+        self.fpr = np.zeros(1)
+        self.tpr = np.zeros(1)
+        self.cutoff = -1
+        self.accuracy = 0.0
+        self.error = 1.0
+        self.tp = 0
+        self.tn = 0
+        self.fp = 0
+        self.fn = 0
+        self.f1 = 0.0
+        self.f1Negative = 0.0
+        self.bestF1 = 0.0
+        self.bestF1Cutoff = -1
+        self.bestF1Negative = 0.0
+        self.bestF1NegativeCutoff = -1
+
+    def __repr__(self):
+        return (
+            f"Evaluation(auc={self.auc:.4f}, error={self.error:.4f}, "
+            f"cutoff={self.cutoff}, f1={self.f1:.4f}, f1Negative={self.f1Negative:.4f})"
+        )
+
+
+def discriminantSizes(duples, atomization):
+    """
+    Return an int64 array with the number of atoms of 'atomization' in the
+    discriminant of every duple, computed in a single batched call. 'duples'
+    is a list of Duple or a DupleBatch.
+    """
+
+    constants = sc.CSegment()
+    if isinstance(duples, sc.DupleBatch):
+        terms = [duples.terms[tid] for tid in duples.termIds()]
+    else:
+        terms = [t for r in duples for t in (r.L, r.R)]
+    for t in terms:
+        constants |= t
+    las = sc.calculateLowerAtomicSegment(atomization, constants, True)
+    sizes, _ = sc.duplesDiscriminantSizes(las, duples)
+    return np.asarray(sizes, dtype=np.int64)
+
+
+def _f1(tp, fp, fn, guard):
+    # With 'guard' the denominator is at least one, otherwise 0 / 0 is 0
+    den = tp + 0.5 * (fp + fn)
+    if guard:
+        return tp / np.maximum(den, 1)
+    return np.divide(tp, den, out=np.zeros_like(den), where=den > 0)
+
+
+def _firstBest(values):
+    # Index and value of the first maximum of every row, index -1 if not positive
+    idx = np.argmax(values, axis=1)
+    best = values[np.arange(values.shape[0]), idx]
+    return np.where(best > 0, idx, -1), np.where(best > 0, best, 0)
+
+
+def _evaluateRows(positives, negatives, scopes, balance, cutoff):
+    """
+    Evaluate every row of the histograms 'positives' and 'negatives', which
+    count the duples of each class by discriminant size. Returns a list of
+    Evaluation, with ROC arrays cut to the largest size of each row.
+    """
+
+    rows = np.arange(positives.shape[0])
+    P = positives.sum(axis=1)
+    N = negatives.sum(axis=1)
+
+    # Duples with a discriminant smaller than the cutoff m, for m = 0 .. bins
+    zero = np.zeros([positives.shape[0], 1], dtype=np.int64)
+    below = np.concatenate([zero, np.cumsum(positives, axis=1)], axis=1)
+    belowN = np.concatenate([zero, np.cumsum(negatives, axis=1)], axis=1)
+    tpr = below / np.maximum(P, 1)[:, None]
+    fpr = belowN / np.maximum(N, 1)[:, None]
+    auc = np.sum((fpr[:, 1:] - fpr[:, :-1]) * (tpr[:, 1:] + tpr[:, :-1]) / 2, axis=1)
+
+    if balance == -1:
+        balance = N / np.maximum(P, 1)
+    else:
+        balance = np.full(positives.shape[0], float(balance))
+    accuracy = (balance[:, None] * (1 - fpr) + tpr) / (1 + balance[:, None])
+
+    # Cutoff 0 assigns no duple to the positive class and is not a candidate
+    if cutoff is None:
+        best, _ = _firstBest(accuracy[:, 1:])
+        cutoffs = np.where(best >= 0, best + 1, -1)
+    else:
+        cutoffs = np.full(positives.shape[0], cutoff)
+    at = np.clip(cutoffs, 0, below.shape[1] - 1)
+
+    tp = below[rows, at]
+    fp = belowN[rows, at]
+    fn = P - tp
+    tn = N - fp
+    f1 = _f1(tp, fp, fn, True)
+    f1n = _f1(tn, fp, fn, True)
+
+    allF1 = _f1(below[:, 1:], belowN[:, 1:], P[:, None] - below[:, 1:], False)
+    allF1n = _f1(N[:, None] - belowN[:, 1:], belowN[:, 1:], P[:, None] - below[:, 1:], False)
+    bestF1Idx, bestF1 = _firstBest(allF1)
+    bestF1nIdx, bestF1n = _firstBest(allF1n)
+
+    ret = []
+    for k in rows:
+        ev = Evaluation()
+        ev.positives = int(P[k])
+        ev.negatives = int(N[k])
+        ev.balance = float(balance[k])
+        ev.auc = float(auc[k])
+        ev.fpr = fpr[k, : scopes[k] + 2]
+        ev.tpr = tpr[k, : scopes[k] + 2]
+        ev.cutoff = int(cutoffs[k])
+        if ev.cutoff != -1:
+            ev.accuracy = float(accuracy[k, at[k]])
+            ev.error = 1 - ev.accuracy
+            ev.tp, ev.tn, ev.fp, ev.fn = int(tp[k]), int(tn[k]), int(fp[k]), int(fn[k])
+            ev.f1 = float(f1[k])
+            ev.f1Negative = float(f1n[k])
+        ev.bestF1 = float(bestF1[k])
+        ev.bestF1Cutoff = int(bestF1Idx[k] + 1) if bestF1Idx[k] >= 0 else -1
+        ev.bestF1Negative = float(bestF1n[k])
+        ev.bestF1NegativeCutoff = int(bestF1nIdx[k] + 1) if bestF1nIdx[k] >= 0 else -1
+        ret.append(ev)
+    return ret
+
+
+def _histograms(discSizes, positive, rows, numRows):
+    sizes = np.asarray(discSizes, dtype=np.int64)
+    positive = np.asarray(positive, dtype=bool)
+    if sizes.shape != positive.shape:
+        raise ValueError("discSizes and positive must have the same length")
+    if sizes.size and sizes.min() < 0:
+        raise ValueError("Discriminant sizes must not be negative")
+
+    bins = int(sizes.max()) + 1 if sizes.size else 1
+    counts = np.bincount(
+        (rows * bins + sizes) * 2 + positive, minlength=numRows * bins * 2
+    ).reshape(numRows, bins, 2)
+
+    scopes = np.zeros(numRows, dtype=np.int64)
+    np.maximum.at(scopes, rows, sizes)
+    return counts[:, :, 1], counts[:, :, 0], scopes
+
+
+def evaluate(discSizes, positive, balance=-1):
+    """
+    Evaluate a union model at its optimal cutoff, the one with the highest
+    accuracy when negatives weigh 'balance' (-1 for negatives / positives).
+
+    Vars:
+    discSizes (array)  : discriminant size of every duple, see discriminantSizes
+    positive (array)   : whether every duple is positive
+    """
+
+    rows = np.zeros(len(discSizes), dtype=np.int64)
+    return _evaluateRows(*_histograms(discSizes, positive, rows, 1), balance, None)[0]
+
+
+def evaluateByRegion(discSizes, positive, regions, balance=-1):
+    """
+    Same as evaluate for every region in 'regions' (the region of every
+    duple), in one pass. Returns a dictionary from region to Evaluation.
+    """
+
+    keys, rows = np.unique(np.asarray(regions), return_inverse=True)
+    rows = rows.reshape(-1).astype(np.int64)
+    evaluations = _evaluateRows(
+        *_histograms(discSizes, positive, rows, len(keys)), balance, None
+    )
+    return {key.item(): ev for key, ev in zip(keys, evaluations)}
+
+
+def evaluateAtCutoff(discSizes, positive, misses, balance=-1):
+    """
+    Evaluate a union model at cutoff 'misses': a duple is assigned positive if
+    its discriminant has less than 'misses' atoms.
+    """
+
+    rows = np.zeros(len(discSizes), dtype=np.int64)
+    return _evaluateRows(*_histograms(discSizes, positive, rows, 1), balance, misses)[0]
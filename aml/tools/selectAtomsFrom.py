@@ -2,6 +2,7 @@
 # Go to github.com/Algebraic-AI for full license details.
 
 from .. import CSegment
+from .. import intersectionLen
 from .. import lowerOrEqual
 from ..io import logInfo
 import random
@@ -9,7 +10,7 @@ import random
 
 def prioritizeByOutOfContextSet(atoms, OutK):
     random.shuffle(atoms)
-    atoms.sort(key=lambda at: len(at.ucs & OutK))
+    atoms.sort(key=lambda at: intersectionLen(at.ucs, OutK))
     return atoms
 
 
@@ -49,9 +50,8 @@ def selectAtomsFromNegativeDuplesAndExplicit(
 
         if discriminative:
             selection.append(at)
-            newOutK = OutK - at.ucs
-            if len(newOutK) != len(OutK) and negativeDuplesCopy:
-                OutK = newOutK
+            if not OutK.isdisjoint(at.ucs) and negativeDuplesCopy:
+                OutK = OutK - at.ucs
                 asetCopy = prioritizeByOutOfContextSet(asetCopy, OutK)
 
         if not negativeDuplesCopy:
@@ -0,0 +1,82 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import random
+
+from aml import config
+from aml import core as sc
+
+
+def indexedConstants(index):
+    return {c: set(index._atoms[slot].ucs for slot in slots) for c, slots in index.las.items()}  # fmt:skip
+
+
+def freshIndex(atomization):
+    return indexedConstants(sc.AtomIndex(list(atomization)))
+
+
+def test_in_place_replacement_is_seen():
+    model = sc.Model()
+    model.atomization = [sc.Atom(0, 0, [c]) for c in range(5)]
+    model.index.update(model.atomization)
+
+    model.atomization[2] = sc.Atom(0, 0, [7])
+    model.index.update(model.atomization)
+    assert 2 not in model.index.las
+    assert indexedConstants(model.index) == freshIndex(model.atomization)
+
+
+def test_random_changes_match_a_fresh_index():
+    rng = random.Random(3)
+    model = sc.Model()
+    model.atomization = [sc.Atom(0, 0, [rng.randrange(30)]) for _ in range(20)]
+    for _ in range(300):
+        op = rng.randrange(6)
+        at = sc.Atom(0, 0, [rng.randrange(30), rng.randrange(30)])
+        if op == 0:
+            model.atomization.append(at)
+        elif op == 1 and model.atomization:
+            model.atomization[rng.randrange(len(model.atomization))] = at
+        elif op == 2 and model.atomization:
+            del model.atomization[rng.randrange(len(model.atomization))]
+        elif op == 3:
+            model.atomization.extend([at, model.atomization[0]] if model.atomization else [at])  # fmt:skip
+        elif op == 4 and model.atomization:
+            model.atomization.pop()
+        elif op == 5:
+            model.atomization[1:3] = [at]
+        if rng.randrange(3) == 0:
+            model.index.update(model.atomization)
+            assert indexedConstants(model.index) == freshIndex(model.atomization)
+
+
+def test_plain_lists_are_compared_in_full():
+    atoms = [sc.Atom(0, 0, [c]) for c in range(4)]
+    index = sc.AtomIndex(atoms)
+    atoms[0] = sc.Atom(0, 0, [9])
+    index.update(atoms)
+    assert indexedConstants(index) == freshIndex(atoms)
+
+
+def test_duples_discriminant_sizes_match_separate_discriminant(monkeypatch):
+    rng = random.Random(4)
+    atoms = [sc.Atom(0, 0, rng.sample(range(40), rng.randint(1, 3))) for _ in range(80)]  # fmt:skip
+    duples = []
+    for _ in range(60):
+        L = sc.LCSegment(rng.sample(range(40), rng.randint(1, 6)))
+        R = sc.LCSegment(rng.sample(range(40), rng.randint(1, 6)))
+        duples.append(sc.Duple(L, R, rng.random() < 0.5, 0, 1))
+
+    expected = ([], [])
+    for r in duples:
+        disc, _, lasR = sc.separateDiscriminant(r.L, r.R, atoms, False)
+        expected[0].append(len(disc))
+        expected[1].append(len(sc.atomsIn(atoms, r.R)))
+        assert len(lasR) == expected[1][-1]
+
+    index = sc.AtomIndex(atoms)
+    for compiled in (False, True):
+        monkeypatch.setattr(config.compiledFunc, "duplesDiscriminantSizes", compiled)
+        assert tuple(index.duplesDiscriminantSizes(duples, atoms)) == expected
+        batch = sc.DupleBatch.fromDuples(duples)
+        assert tuple(index.duplesDiscriminantSizes(batch, atoms)) == expected
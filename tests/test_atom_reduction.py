@@ -0,0 +1,73 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import random
+
+from aml import config
+from aml import core as sc
+
+
+def atomization(rng, n, universe):
+    pool = [rng.sample(range(universe), rng.randint(1, 6)) for _ in range(n // 2 + 1)]
+    ret = []
+    for k in range(n):
+        at = sc.Atom(rng.randrange(10), rng.randrange(10), rng.choice(pool))
+        ret.append(at)
+    return ret
+
+
+def copies(atoms):
+    ret = []
+    for at in atoms:
+        at2 = sc.Atom(at.epoch, at.gen, list(at.ucs))
+        at2.redundancyChecked = at.redundancyChecked
+        ret.append(at2)
+    return ret
+
+
+def described(atoms):
+    return [(sorted(at.ucs), at.epoch, at.gen) for at in atoms]
+
+
+def test_compiled_remove_repeated_atoms_matches_python(monkeypatch):
+    rng = random.Random(1)
+    for n in (0, 1, 50, 400):
+        atoms = atomization(rng, n, 30)
+
+        monkeypatch.setattr(config.compiledFunc, "removeRepeatedAtoms", False)
+        expected = sc.removeRepeatedAtoms(copies(atoms))
+        monkeypatch.setattr(config.compiledFunc, "removeRepeatedAtoms", True)
+        result = sc.removeRepeatedAtoms(copies(atoms))
+
+        assert described(result) == described(expected)
+        assert len({tuple(sorted(at.ucs)) for at in result}) == len(result)
+
+
+def redundantAtomization(rng, n, universe):
+    ret = [sc.Atom(0, 0, rng.sample(range(universe), rng.randint(1, 4))) for _ in range(n)]  # fmt:skip
+    for _ in range(n // 2):
+        ucs = set()
+        for at in rng.sample(ret[:n], rng.randint(2, 3)):
+            ucs |= set(at.ucs)
+        ret.append(sc.Atom(0, 1, list(ucs)))
+    for at in ret:
+        at.redundancyChecked = rng.random() < 0.2
+    rng.shuffle(ret)
+    return ret
+
+
+def test_compiled_remove_redundant_atoms_matches_python(monkeypatch):
+    rng = random.Random(2)
+    for n in (1, 20, 150):
+        atoms = redundantAtomization(rng, n, 40)
+        constants = sc.CSegment(list(range(40)))
+        for markAsChecked in (False, True):
+            monkeypatch.setattr(config.compiledFunc, "removeRedundantAtoms", False)
+            expected = sc.removeRedundantAtoms(copies(atoms), constants, markAsChecked)
+            monkeypatch.setattr(config.compiledFunc, "removeRedundantAtoms", True)
+            result = sc.removeRedundantAtoms(copies(atoms), constants, markAsChecked)
+
+            assert sorted(described(result)) == sorted(described(expected))
+            assert [at.redundancyChecked for at in result] == [at.redundancyChecked for at in expected]  # fmt:skip
+            if n > 1:
+                assert len(result) < len(atoms)
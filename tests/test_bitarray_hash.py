@@ -0,0 +1,96 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import random
+
+import pytest
+
+from aml.aml_fast.amlFastBitarrays import bitarray
+
+
+def applyRandomOperations(rng, ba, s, steps):
+    """Apply the same random operations to the bitarray 'ba' and the set 's'"""
+
+    for _ in range(steps):
+        other = {rng.randrange(200) for _ in range(rng.randrange(20))}
+        op = rng.randrange(8)
+        if op == 0:
+            v = rng.randrange(200)
+            ba.add(v)
+            s.add(v)
+        elif op == 1:
+            v = rng.randrange(200)
+            ba.discard(v)
+            s.discard(v)
+        elif op == 2 and s:
+            v = rng.choice(sorted(s))
+            ba.remove(v)
+            s.remove(v)
+        elif op == 3:
+            ba |= bitarray(other)
+            s |= other
+        elif op == 4:
+            other |= set(rng.sample(range(200), 100))
+            ba &= bitarray(other)
+            s &= other
+        elif op == 5:
+            ba -= bitarray(other)
+            s -= other
+        elif op == 6:
+            ba.add(list(other))
+            s |= other
+        hash(ba)
+    return ba, s
+
+
+def test_hash_follows_in_place_changes():
+    ba = bitarray([1, 2, 3])
+    before = hash(ba)
+    ba.add(4)
+    assert hash(ba) == hash(bitarray([1, 2, 3, 4]))
+    ba.remove(4)
+    assert hash(ba) == before
+    ba |= bitarray([7])
+    ba &= bitarray([1, 7])
+    assert hash(ba) == hash(bitarray([1, 7]))
+    ba -= bitarray([7])
+    assert hash(ba) == hash(bitarray([1]))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_equal_sets_hash_equally(seed):
+    rng = random.Random(seed)
+    ba, s = applyRandomOperations(rng, bitarray(), set(), 100)
+
+    # Same set reached by other means
+    assert ba == bitarray(sorted(s))
+    assert hash(ba) == hash(bitarray(sorted(s)))
+    assert hash(ba) == hash(bitarray(list(s)) & bitarray(sorted(s)))
+    assert hash(ba) == hash((bitarray(sorted(s)) | bitarray([1000])) - bitarray([1000]))
+    assert hash(ba) == hash(ba.copy())
+
+
+def test_hash_in_dictionaries():
+    rng = random.Random(0)
+    table = {}
+    for _ in range(200):
+        s = {rng.randrange(50) for _ in range(rng.randrange(5))}
+        table[bitarray(sorted(s))] = frozenset(s)
+    for key, s in table.items():
+        assert table[bitarray(list(s))] == s
+    assert len(table) == len(set(table.values()))
+
+
+def test_vector_views_do_not_keep_stale_hashes():
+    vector = bitarray.bulk_new(2)
+    a, b = vector[0], vector[0]
+    hash(a)
+    hash(b)
+    a.add(5)
+    assert a == b
+    assert hash(b) == hash(bitarray([5]))
+
+    owned = vector.release()
+    assert hash(owned[0]) == hash(bitarray([5]))
+    owned[0].add(6)
+    assert hash(owned[0]) == hash(bitarray([5, 6]))
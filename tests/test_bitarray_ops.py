@@ -0,0 +1,130 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import random
+
+import numpy as np
+import pytest
+
+from aml import core as sc
+from aml.aml_fast.amlFastBitarrays import bitarray, BitarrayVector
+
+
+def samples(rng):
+    """Sets of several densities, so every kind of cbar block is exercised"""
+
+    ret = [set(), {0}, set(range(3000)), set(range(5, 4000, 2))]
+    for _ in range(30):
+        universe = rng.choice([20, 300, 5000])
+        ret.append(set(rng.sample(range(universe), rng.randint(1, universe // 2))))
+    return ret
+
+
+def test_counts_match_set_operations():
+    rng = random.Random(1)
+    sets = samples(rng)
+    for a in sets:
+        ba = bitarray(list(a))
+        for b in rng.sample(sets, 8):
+            bb = bitarray(list(b))
+            assert ba.difference_len(bb) == len(a - b)
+            assert ba.intersection_len(bb) == len(a & b)
+
+
+def test_intersects_any_of():
+    rng = random.Random(2)
+    sets = samples(rng)
+    for a in sets:
+        others = rng.sample(sets, 4)
+        expected = any(a & b for b in others)
+        assert bitarray(list(a)).intersects_any_of([bitarray(list(b)) for b in others]) == expected  # fmt:skip
+    assert not bitarray([1]).intersects_any_of([])
+
+
+def test_nth_matches_sorted_items():
+    rng = random.Random(3)
+    for a in samples(rng):
+        ba = bitarray(list(a))
+        items = sorted(a)
+        for n in rng.sample(range(len(items)), min(len(items), 20)):
+            assert ba.nth(n) == items[n]
+        with pytest.raises(IndexError):
+            ba.nth(len(items))
+
+
+def test_choose_random_draws_like_random_choice():
+    rng = random.Random(4)
+    for a in samples(rng)[1:]:
+        random.seed(len(a))
+        expected = [random.choice(tuple(sorted(a))) for _ in range(5)]
+        random.seed(len(a))
+        ba = bitarray(list(a))
+        assert [ba.choose_random() for _ in range(5)] == expected
+    with pytest.raises(IndexError):
+        bitarray().choose_random()
+
+
+def test_numpy_round_trip():
+    rng = random.Random(5)
+    for a in samples(rng):
+        ba = bitarray(list(a))
+        items = ba.to_numpy()
+        assert items.dtype == np.int32
+        assert items.tolist() == sorted(a)
+        assert bitarray.from_numpy(items) == ba
+        shuffled = np.array(rng.sample(sorted(a), len(a)) * 2, dtype=np.int64)
+        assert bitarray.from_numpy(shuffled) == ba
+
+
+@pytest.mark.parametrize("size", [1, 7, 64, None])
+def test_chunks_cover_the_items_in_order(size):
+    rng = random.Random(6)
+    for a in samples(rng):
+        chunks = list(bitarray(list(a)).chunks(size))
+        limit = bitarray.chunkSize if size is None else size
+        assert all(0 < len(chunk) <= limit for chunk in chunks)
+        assert all(len(chunk) == limit for chunk in chunks[:-1])
+        joined = np.concatenate(chunks).tolist() if chunks else []
+        assert joined == sorted(a)
+
+
+def test_iteration_past_the_chunk_size(monkeypatch):
+    monkeypatch.setattr(bitarray, "chunkSize", 16)
+    rng = random.Random(7)
+    for a in samples(rng):
+        assert list(bitarray(list(a))) == sorted(a)
+
+
+def test_vector_frees_the_segments_it_was_not_asked_for():
+    values = [bitarray([1, 2]), bitarray([5]), bitarray(list(range(100)))]
+    before = bitarray.howManyAreOut()
+    vector = BitarrayVector.copyOf(values)
+    assert bitarray.howManyAreOut() == before + len(values)
+    assert [list(v) for v in vector] == [list(v) for v in values]
+
+    view = vector[1]
+    del view
+    assert bitarray.howManyAreOut() == before + len(values)
+    del vector
+    assert bitarray.howManyAreOut() == before
+
+
+def test_released_bitarrays_own_their_segment():
+    values = [bitarray([1, 2]), bitarray([5]), bitarray(list(range(100)))]
+    before = bitarray.howManyAreOut()
+    vector = BitarrayVector.copyOf(values)
+    released = vector.release(sc.UCSegment)
+    with pytest.raises(ValueError):
+        vector.release()
+    del vector
+    assert bitarray.howManyAreOut() == before + len(values)
+    assert all(isinstance(b, sc.UCSegment) for b in released)
+    assert released == values
+
+    # Released bitarrays are modified and freed one by one
+    released[0].add(7)
+    assert list(released[0]) == [1, 2, 7]
+    del released[1]
+    assert bitarray.howManyAreOut() == before + len(values) - 1
+    del released
+    assert bitarray.howManyAreOut() == before
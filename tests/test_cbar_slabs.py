@@ -0,0 +1,51 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import random
+
+from aml.aml_fast.amlFastBitarrays import bitarray
+
+
+def allocate(rng, n):
+    return [bitarray(sorted(rng.sample(range(100000), rng.randint(1, 300)))) for _ in range(n)]  # fmt:skip
+
+
+def test_freed_cbars_are_reused():
+    rng = random.Random(1)
+    bitarrays = allocate(rng, 3000)
+    allocated = bitarray.countAllocated()
+    resident = bitarray.residentBytes()
+    assert resident > 0
+    del bitarrays
+
+    reused = bitarray.countReused()
+    bitarrays = allocate(rng, 3000)
+    assert bitarray.countAllocated() > allocated
+    assert bitarray.countReused() - reused > 1000
+    # Same sizes, so the slabs already carved are enough
+    assert bitarray.residentBytes() <= resident
+    assert [len(b) for b in bitarrays].count(0) == 0
+
+
+def test_trim_returns_free_slabs():
+    before = bitarray.residentBytes()
+    bitarray.trim()
+    start = bitarray.residentBytes()
+    assert start <= before
+
+    rng = random.Random(2)
+    bitarrays = allocate(rng, 5000)
+    kept = bitarrays[::500]
+    assert bitarray.residentBytes() > start
+    del bitarrays
+    bitarray.howManyAreOut()
+    bitarray.trim()
+    resident = bitarray.residentBytes()
+    # At most one 256KB slab per cbar still in use
+    assert resident <= start + 256 * 1024 * len(kept)
+    assert [len(b) for b in kept].count(0) == 0
+
+    del kept
+    bitarray.howManyAreOut()
+    bitarray.trim()
+    assert bitarray.residentBytes() <= start
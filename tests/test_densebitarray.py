@@ -0,0 +1,71 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import random
+
+import pytest
+
+from aml import core as sc
+from aml.aml_fast.amlFastBitarrays import bitarray
+from aml.aml_fast.amlFastDenseBitarrays import densebitarray, DenseBitarrayVector
+
+
+@pytest.mark.parametrize("other", [bitarray([3, 70]), [3, 70], {3, 70}, densebitarray([3, 70])])  # fmt:skip
+def test_operators_accept_other_representations(other):
+    a = densebitarray([1, 2, 70])
+    assert set(a | other) == {1, 2, 3, 70}
+    assert set(a & other) == {70}
+    assert set(a - other) == {1, 2}
+    assert not a.issubset(other)
+    assert not a.isdisjoint(other)
+    assert a.intersection_len(other) == 1
+    assert a.difference_len(other) == 2
+
+    a |= other
+    assert set(a) == {1, 2, 3, 70}
+    a -= other
+    assert set(a) == {1, 2}
+
+
+def test_operators_reject_unknown_types():
+    a = densebitarray([1, 2])
+    with pytest.raises(TypeError):
+        a | 3
+    with pytest.raises(TypeError):
+        a.issubset("12")
+    assert a != 3
+    assert a == bitarray([1, 2])
+
+
+def test_vector_scans_match_set_operations():
+    rng = random.Random(4)
+    values = [set(rng.sample(range(300), 40)) for _ in range(50)] + [set()]
+    vector = DenseBitarrayVector.copyOf([bitarray(v) for v in values])
+    assert len(vector) == len(values)
+
+    for _ in range(20):
+        term = set(rng.sample(range(300), 2))
+        assert vector.supersetsOf(bitarray(term)) == [i for i, v in enumerate(values) if term <= v]  # fmt:skip
+        assert vector.intersecting(term) == [i for i, v in enumerate(values) if term & v]  # fmt:skip
+    assert vector.supersetsOf([]) == list(range(len(values)))
+
+
+def test_dense_indicator_scans_match_compressed_ones():
+    rng = random.Random(5)
+    tracer = sc.Tracer(0, sc.ConstantManager())
+    for _ in range(60):
+        tracer.addNegativeH(bitarray(rng.sample(range(40), 6)))
+    atoms = [sc.Atom(0, 0, rng.sample(range(40), 3)) for _ in range(30)]
+
+    tracer.cmanager.lastDefConstantOrChain = 39
+    assert tracer.getDenseIndicators() is not None
+
+    for _ in range(20):
+        term = bitarray(rng.sample(range(40), 5))
+        assert tracer.getFreeTraceOfTerm(term) == bitarray(
+            [i for i, ind in enumerate(tracer.indicators) if term.issubset(ind)]
+        )
+    for at in atoms:
+        assert tracer.getTraceOfAtomFromIndicators(at) == bitarray(
+            [i for i, ind in enumerate(tracer.indicators) if not at.ucs.isdisjoint(ind)]
+        )
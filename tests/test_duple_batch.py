@@ -0,0 +1,60 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import random
+
+import pytest
+
+import aml
+from aml import core as sc
+from aml.bench.workloads import _verticalBarExample, _nonVerticalBarExample
+
+
+def embed(asBatches, storePositives):
+    random.seed(7)
+    side = 3
+    model = aml.Model()
+    for i in range(2 * side * side):
+        model.cmanager.setNewConstantIndex()
+    vTerm = aml.LCSegment([model.cmanager.setNewConstantIndexWithName("v")])
+
+    embedder = aml.sparse_crossing_embedder(model)
+    embedder.params.useReduceIndicators = True
+    embedder.params.byQuotient = False
+    embedder.params.storePositives = storePositives
+
+    for _ in range(3):
+        pbatch = []
+        nbatch = []
+        for _ in range(40):
+            term = aml.LCSegment(_nonVerticalBarExample(side, 0))
+            pbatch.append(aml.Duple(vTerm, term, True, model.generation, 1))
+            term = aml.LCSegment(_verticalBarExample(side, 0))
+            nbatch.append(aml.Duple(vTerm, term, False, model.generation, 1))
+        if asBatches:
+            pbatch = sc.DupleBatch.fromDuples(pbatch)
+            nbatch = sc.DupleBatch.fromDuples(nbatch)
+        embedder.enforce(pbatch, nbatch)
+
+    atoms = sorted(sorted(at.ucs) for at in model.atomization)
+    unionModel = sorted(sorted(at.ucs) for at in embedder.unionModel)
+    return atoms, unionModel, embedder
+
+
+@pytest.mark.parametrize("storePositives", [False, True])
+def test_enforce_with_batches_matches_lists(storePositives):
+    atoms, unionModel, _ = embed(False, storePositives)
+    batchAtoms, batchUnionModel, embedder = embed(True, storePositives)
+    assert batchAtoms == atoms
+    assert batchUnionModel == unionModel
+    if storePositives:
+        assert isinstance(embedder.exampleSet, sc.DupleBatch)
+        assert embedder.exampleSet.space is None
+
+
+def test_compiled_enforce_does_not_build_duples(monkeypatch):
+    def duple(self, k):
+        raise AssertionError("Duple built from a batch")
+
+    monkeypatch.setattr(sc.DupleBatch, "duple", duple)
+    embed(True, True)
@@ -0,0 +1,61 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import random
+
+import aml
+from aml import core as sc
+from aml.aml_fast.amlFastBitarrays import bitarray
+
+
+def unionModel(rng):
+    return [sc.Atom(0, 0, rng.sample(range(40), rng.randint(1, 4))) for _ in range(60)]
+
+
+def lowerAtomicSegment(las, term):
+    ret = set()
+    for c in term:
+        ret |= set(las.get(c, []))
+    return ret
+
+
+def test_discriminant_sizes_match_python():
+    rng = random.Random(1)
+    atoms = unionModel(rng)
+    predictor = aml.UnionModelPredictor(atoms)
+    las = sc.calculateLowerAtomicSegment(atoms, sc.CSegment(list(range(40))), True)
+
+    terms = [bitarray(rng.sample(range(40), 6)) for _ in range(25)]
+    classes = [0, 5, 17, 39, 100]
+    sizes = predictor.discriminantSizes(terms, classes)
+    assert sizes.shape == (len(terms), len(classes))
+    for t, term in enumerate(terms):
+        lasTerm = lowerAtomicSegment(las, term)
+        for k, c in enumerate(classes):
+            if c not in las:
+                assert sizes[t][k] == -1
+            else:
+                assert sizes[t][k] == len(set(las[c]) - lasTerm)
+
+
+def test_predict_picks_the_smallest_discriminant():
+    rng = random.Random(2)
+    atoms = unionModel(rng)
+    predictor = aml.UnionModelPredictor(atoms)
+    terms = [bitarray(rng.sample(range(40), 6)) for _ in range(25)]
+    classes = [3, 100, 8, 21]
+
+    sizes = predictor.discriminantSizes(terms, classes).tolist()
+    for row, selected in zip(sizes, predictor.predict(terms, classes).tolist()):
+        scores = [s for s in row if s >= 0]
+        assert row[selected] == min(scores)
+        assert row.index(min(scores)) == selected
+
+
+def test_predict_without_atoms_for_any_class():
+    rng = random.Random(3)
+    predictor = aml.UnionModelPredictor(unionModel(rng))
+    terms = [bitarray([1, 2]), bitarray([3, 4])]
+    assert predictor.predict(terms, [100, 101]).tolist() == [-1, -1]
+    assert predictor.predict([], [1]).tolist() == []
+    assert predictor.discriminantSizes(terms, []).shape == (2, 0)
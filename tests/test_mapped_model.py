@@ -0,0 +1,106 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import random
+import struct
+
+import pytest
+
+import aml
+from aml import core as sc
+from aml import io as amlio
+from aml.aml_fast.amlFastBitarrays import bitarray
+
+
+def atomization(rng, n):
+    ret = []
+    for k in range(n):
+        at = sc.Atom(rng.randrange(5), k, rng.sample(range(300), rng.randint(1, 40)))
+        at.G = rng.randrange(1000)
+        ret.append(at)
+    return ret
+
+
+def saved(tmp_path, atoms):
+    model = aml.Model()
+    for i in range(300):
+        model.cmanager.setNewConstantIndex()
+    path = str(tmp_path / "model")
+    amlio.saveAtomizationOnMappedFile(atoms, model.cmanager, path)
+    return path
+
+
+def test_round_trip(tmp_path):
+    rng = random.Random(1)
+    atoms = atomization(rng, 50)
+    path = saved(tmp_path, atoms)
+
+    cmanager, loaded = amlio.loadAtomizationFromMappedFile(path)
+    assert len(cmanager.embeddingConstants) == 300
+    assert len(loaded) == len(atoms)
+    for at, lat in zip(atoms, loaded):
+        assert sorted(lat.ucs) == sorted(at.ucs)
+        assert (lat.epoch, lat.gen, lat.G) == (at.epoch, at.gen, at.G)
+
+
+def test_round_trip_of_traces(tmp_path):
+    rng = random.Random(2)
+    atoms = atomization(rng, 40)
+    path = saved(tmp_path, atoms)
+    _, loaded = amlio.loadAtomizationFromMappedFile(path)
+
+    tracer = sc.Tracer(0, sc.ConstantManager())
+    tracer.storeTraces = False
+    for _ in range(30):
+        tracer.addNegativeH(bitarray(rng.sample(range(300), 60)))
+    for at, lat in zip(atoms, loaded):
+        assert sorted(tracer.getTraceOfAtomFromIndicators(lat)) == sorted(tracer.getTraceOfAtomFromIndicators(at))  # fmt:skip
+    for _ in range(15):
+        term = bitarray(rng.sample(range(300), 20))
+        assert sorted(tracer.getTraceOfTerm(term, loaded)) == sorted(tracer.getTraceOfTerm(term, atoms))  # fmt:skip
+
+
+def test_mutation_detaches_from_the_mapping(tmp_path):
+    rng = random.Random(3)
+    atoms = atomization(rng, 10)
+    path = saved(tmp_path, atoms)
+    with open(path + ".amlm", "rb") as f:
+        before = f.read()
+
+    _, loaded = amlio.loadAtomizationFromMappedFile(path)
+    ucs = loaded[4].ucs
+    other = loaded[5].ucs
+    assert ucs._mapping is not None
+    item = next(c for c in range(300, 400) if c not in ucs)
+    ucs.add(item)
+    assert ucs._mapping is None
+    assert item in ucs
+    assert sorted(ucs) == sorted(set(atoms[4].ucs) | {item})
+    assert other._mapping is not None
+    assert sorted(other) == sorted(atoms[5].ucs)
+
+    # A fresh load does not see the change
+    with open(path + ".amlm", "rb") as f:
+        assert f.read() == before
+    _, reloaded = amlio.loadAtomizationFromMappedFile(path)
+    assert item not in reloaded[4].ucs
+
+
+def patch(path, offset, value):
+    with open(path + ".amlm", "r+b") as f:
+        f.seek(offset)
+        f.write(value)
+
+
+def test_rejects_bad_magic(tmp_path):
+    path = saved(tmp_path, atomization(random.Random(4), 3))
+    patch(path, 0, b"NOTAMODL")
+    with pytest.raises(ValueError, match="not a memory mapped model"):
+        amlio.loadAtomizationFromMappedFile(path)
+
+
+def test_rejects_other_versions(tmp_path):
+    path = saved(tmp_path, atomization(random.Random(5), 3))
+    patch(path, 8, struct.pack("<I", amlio.MAPPED_MODEL_VERSION + 1))
+    with pytest.raises(ValueError, match="format version"):
+        amlio.loadAtomizationFromMappedFile(path)
@@ -0,0 +1,96 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import random
+
+import aml
+from aml import parallel
+from aml.bench.workloads import _digitPrototype, _digitSample
+
+
+def workerUnionModel():
+    return sorted(tuple(at.ucs) for at in parallel._embedder.unionModel)
+
+
+def workerAtomization():
+    return sorted(tuple(at.ucs) for at in parallel._embedder.model.atomization)
+
+
+def batch(rng, dTerm, prototypes, side):
+    pbatch = []
+    nbatch = []
+    for _ in range(30):
+        label = rng.randrange(len(dTerm))
+        term = aml.LCSegment(_digitSample(prototypes[label], side, side // 2))
+        pbatch.append(aml.Duple(dTerm[label], term, True, 0, 1 + label))
+        for d in range(len(dTerm)):
+            if d != label:
+                nbatch.append(aml.Duple(dTerm[d], term, False, 0, 1 + d))
+    return pbatch, nbatch
+
+
+def parallelEmbedder(model, workers):
+    side = 6
+    for i in range(2 * side * side):
+        model.cmanager.setNewConstantIndex()
+    dTerm = [aml.LCSegment([model.cmanager.setNewConstantIndexWithName(f"D[{d}]")]) for d in range(4)]  # fmt:skip
+    prototypes = [_digitPrototype(side) for _ in dTerm]
+    return aml.ParallelSparseEmbedder(model, workers=workers), dTerm, prototypes, side
+
+
+def test_workers_follow_the_merged_union_model():
+    random.seed(3)
+    rng = random.Random(3)
+    model = aml.Model()
+    embedder, dTerm, prototypes, side = parallelEmbedder(model, 2)
+
+    with embedder:
+        embedder.params.byQuotient = False
+        for _ in range(2):
+            embedder.enforce(*batch(rng, dTerm, prototypes, side))
+            merged = sorted(tuple(at.ucs) for at in embedder.unionModel)
+            for (added, removed), pool in zip(embedder._pendingDeltas, embedder._pools):
+                held = set(pool.apply(workerUnionModel))
+                assert set(held) != set(merged)
+                held -= {tuple(ucs) for ucs in removed}
+                held |= {tuple(ucs) for ucs in added}
+                assert sorted(held) == merged
+
+        # The deltas of the next batch bring every worker to the merged model
+        deltas = embedder._unionModelDeltas()
+        assert embedder._pendingDeltas == [({}, {}), ({}, {})]
+        for delta, pool in zip(deltas, embedder._pools):
+            pool.apply(parallel._workerFollow, (delta,))
+            assert pool.apply(workerUnionModel) == merged
+
+        # Changes made to the union model between batches are sent as well
+        removed = embedder.unionModel[0]
+        embedder.unionModel = embedder.unionModel[1:]
+        for delta, pool in zip(embedder._unionModelDeltas(), embedder._pools):
+            assert len(delta[0][1]) == 0 and len(delta[1][1]) == 1
+            pool.apply(parallel._workerFollow, (delta,))
+            assert tuple(removed.ucs) not in pool.apply(workerUnionModel)
+
+
+def test_master_atomization_holds_the_worker_atomizations():
+    random.seed(4)
+    rng = random.Random(4)
+    model = aml.Model()
+    initial = aml.Atom(0, 0, [0, 1, 2])
+    model.atomization = [initial]
+    embedder, dTerm, prototypes, side = parallelEmbedder(model, 2)
+
+    with embedder:
+        previous = [(0, 1, 2)]
+        for _ in range(3):
+            embedder.enforce(*batch(rng, dTerm, prototypes, side))
+            atoms = [tuple(at.ucs) for at in model.atomization]
+            assert atoms != previous
+            assert len(set(atoms)) == len(atoms)
+
+            held = {(0, 1, 2)}
+            for pool in embedder._pools:
+                held |= set(pool.apply(workerAtomization))
+            assert set(atoms) == held
+            previous = atoms
+        assert model.generation > 0
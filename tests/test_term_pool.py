@@ -0,0 +1,98 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import random
+
+from aml import core as sc
+from aml.aml_fast.amlFastBitarrays import bitarray
+
+
+def test_equal_terms_share_an_id():
+    pool = sc.TermPool()
+    term = bitarray([1, 2, 3])
+    tid = pool.termId(term)
+    assert pool.termId(bitarray([3, 2, 1])) == tid
+    assert pool.termId(bitarray([4])) != tid
+    assert pool.intern(bitarray([1, 2, 3])) is term
+    assert len(pool) == 2
+
+
+def test_lower_atomic_segments_follow_the_index_version():
+    rng = random.Random(1)
+    atoms = [sc.Atom(0, 0, rng.sample(range(30), 3)) for _ in range(15)]
+    index = sc.AtomIndex(atoms)
+    pool = sc.TermPool()
+    term = bitarray(rng.sample(range(30), 6))
+    las = pool.lowerAtomicSegmentOfTerm(index, atoms, term)
+    assert pool.lowerAtomicSegmentOfTerm(index, atoms, term) is las
+
+    atoms.append(sc.Atom(0, 0, [next(iter(term))]))
+    updated = pool.lowerAtomicSegmentOfTerm(index, atoms, term)
+    assert updated is not las
+    assert set(updated) == set(index.lowerAtomicSegment(term))
+    assert len(updated) == len(las) + 1
+
+
+def firstTracer(rng):
+    first = sc.Tracer(0, sc.ConstantManager())
+    for _ in range(40):
+        first.addNegativeH(bitarray(rng.sample(range(30), 8)))
+    return first
+
+
+def nextTracer(rng, first):
+    """Tracer that follows 'first', dropping and adding indicators"""
+
+    second = sc.Tracer(first.period, first.cmanager, previous=first)
+    for ind in first.indicators[5:]:
+        second.addNegativeH(ind)
+    for _ in range(10):
+        second.addNegativeH(bitarray(rng.sample(range(30), 8)))
+    return second
+
+
+def traceFromIndicators(tracer, term, atoms):
+    trace = set(range(tracer.numIndicators()))
+    for at in atoms:
+        if not at.ucs.isdisjoint(term):
+            trace &= set(tracer.getTraceOfAtomFromIndicators(at))
+    return trace
+
+
+def test_free_traces_are_patched_across_tracers():
+    rng = random.Random(2)
+    first = firstTracer(rng)
+    pool = sc.TermPool()
+    terms = [bitarray(rng.sample(range(30), 2)) for _ in range(20)]
+    for term in terms:
+        pool.freeTraceOfTerm(first, term)
+
+    second = nextTracer(rng, first)
+
+    def recompute(term, constLowAtomicSegment=None):
+        raise AssertionError("free trace recomputed")
+
+    second.getFreeTraceOfTerm = recompute
+    for term in terms:
+        expected = {k for k in range(second.numIndicators()) if second.isInFreeTraceOfTerm(term, k)}  # fmt:skip
+        assert set(pool.freeTraceOfTerm(second, term)) == expected
+
+
+def test_traces_are_patched_across_tracers():
+    rng = random.Random(6)
+    first = firstTracer(rng)
+    atoms = [sc.Atom(0, 0, rng.sample(range(30), 3)) for _ in range(15)]
+    index = sc.AtomIndex(atoms)
+    pool = sc.TermPool()
+    terms = [bitarray(rng.sample(range(30), 3)) for _ in range(20)]
+    for term in terms:
+        assert set(pool.traceOfTerm(first, index, atoms, term)) == traceFromIndicators(first, term, atoms)  # fmt:skip
+
+    second = nextTracer(rng, first)
+
+    def recompute(term, atoms):
+        raise AssertionError("trace recomputed")
+
+    second.getTraceOfTerm = recompute
+    for term in terms:
+        assert set(pool.traceOfTerm(second, index, atoms, term)) == traceFromIndicators(second, term, atoms)  # fmt:skip
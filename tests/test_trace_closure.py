@@ -0,0 +1,71 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import random
+
+import pytest
+
+import aml
+from aml import config
+from aml.bench.workloads import _digitPrototype, _digitSample
+
+
+def embed(byQuotient):
+    random.seed(11)
+    rng = random.Random(11)
+    side = 6
+    model = aml.Model()
+    for i in range(2 * side * side):
+        model.cmanager.setNewConstantIndex()
+    dTerm = [aml.LCSegment([model.cmanager.setNewConstantIndexWithName(f"D[{d}]")]) for d in range(3)]  # fmt:skip
+    prototypes = [_digitPrototype(side) for _ in dTerm]
+
+    embedder = aml.sparse_crossing_embedder(model)
+    embedder.params.byQuotient = byQuotient
+    for _ in range(3):
+        pbatch = []
+        nbatch = []
+        for _ in range(25):
+            label = rng.randrange(len(dTerm))
+            term = aml.LCSegment(_digitSample(prototypes[label], side, side // 2))
+            pbatch.append(aml.Duple(dTerm[label], term, True, 0, 1 + label))
+            for d in range(len(dTerm)):
+                if d != label:
+                    nbatch.append(aml.Duple(dTerm[d], term, False, 0, 1 + d))
+        embedder.enforce(pbatch, nbatch)
+
+    atoms = sorted(sorted(at.ucs) for at in model.atomization)
+    unionModel = sorted(sorted(at.ucs) for at in embedder.unionModel)
+    return atoms, unionModel, random.getstate()
+
+
+@pytest.mark.parametrize("byQuotient", [False, True])
+def test_compiled_closure_matches_python_for_a_seed(monkeypatch, byQuotient):
+    calls = []
+    closure = aml.sparse_crossing_embedder.traceClosure
+
+    def countingClosure(self, *args):
+        calls.append(config.compiledFunc.traceClosure)
+        return closure(self, *args)
+
+    monkeypatch.setattr(aml.sparse_crossing_embedder, "traceClosure", countingClosure)
+
+    monkeypatch.setattr(config.compiledFunc, "traceClosure", False)
+    expected = embed(byQuotient)
+    monkeypatch.setattr(config.compiledFunc, "traceClosure", True)
+    assert embed(byQuotient) == expected
+    assert calls.count(True) == calls.count(False) > 0
+
+
+def test_unknown_random_state_runs_the_python_closure(monkeypatch):
+    expected = embed(True)
+
+    getstate = random.getstate
+
+    def otherLayout():
+        version, state, gauss_next = getstate()
+        return version + 1, state, gauss_next
+
+    monkeypatch.setattr(random, "getstate", otherLayout)
+    atoms, unionModel, _ = embed(True)
+    assert (atoms, unionModel) == expected[:2]
@@ -0,0 +1,61 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import random
+
+from aml import core as sc
+from aml.aml_fast.amlFastBitarrays import bitarray
+
+
+def recomputed(tracer, at):
+    return sorted(tracer.getTraceOfAtomFromIndicators(at))
+
+
+def test_patched_traces_match_recomputed_traces(monkeypatch):
+    calls = {"patch": 0}
+    patch = sc.TraceLayout.patch
+
+    def countingPatch(self, trace, old, isIn):
+        calls["patch"] += 1
+        return patch(self, trace, old, isIn)
+
+    monkeypatch.setattr(sc.TraceLayout, "patch", countingPatch)
+
+    rng = random.Random(1)
+    tracer = sc.Tracer(0, sc.ConstantManager())
+    for _ in range(30):
+        tracer.addNegativeH(bitarray(rng.sample(range(40), 12)))
+    atoms = [sc.Atom(0, 0, rng.sample(range(40), rng.randint(1, 3))) for _ in range(60)]  # fmt:skip
+    for at in atoms[:4]:
+        tracer.addPinningAtom(at)
+
+    for step in range(40):
+        op = rng.randrange(5)
+        if op == 0:
+            tracer.addNegativeH(bitarray(rng.sample(range(40), 12)))
+        elif op == 1:
+            tracer.addPinningAtom(rng.choice(atoms))
+        elif op == 2:
+            L = bitarray(rng.sample(range(40), 2))
+            R = bitarray(rng.sample(range(40), 1))
+            tracer.considerPositiveDuples([sc.Duple(L, R, True, 0, 1)])
+        elif op == 3:
+            discarded = rng.sample(range(tracer.numIndicators()), tracer.numIndicators() // 4)  # fmt:skip
+            tracer.discardedIndicators = bitarray(discarded)
+            tracer.removeDiscardedIndicators()
+        else:
+            # Traces asked for while indicators are discarded, as in
+            # reduceIndicators, are computed in full and never patched
+            for c in range(40):
+                tracer.getFreeTraceOfConstant(c)
+            tracer.discardedIndicators = bitarray(rng.sample(range(tracer.numIndicators()), 3))  # fmt:skip
+            patched = calls["patch"]
+            for at in rng.sample(atoms, 20):
+                assert sorted(tracer.getTraceOfAtom(at)) == recomputed(tracer, at)
+            assert calls["patch"] == patched
+            tracer.discardedIndicators = bitarray()
+
+        for at in rng.sample(atoms, 30):
+            assert sorted(tracer.getTraceOfAtom(at)) == recomputed(tracer, at)
+
+    assert calls["patch"] > 100
@@ -0,0 +1,84 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import random
+
+import pytest
+
+from aml import config
+from aml import core as sc
+from aml.aml_fast.amlFastBitarrays import bitarray
+
+
+def tracerWithAtoms(rng):
+    tracer = sc.Tracer(0, sc.ConstantManager())
+    for _ in range(90):
+        tracer.addNegativeH(bitarray(rng.sample(range(60), 20)))
+    atoms = [sc.Atom(0, 0, rng.sample(range(60), rng.randint(1, 3))) for _ in range(150)]  # fmt:skip
+    for at in atoms[:5]:
+        tracer.addPinningAtom(at)
+    return tracer, atoms
+
+
+def traceOfGroup(tracer, atoms, group, union):
+    ret = set() if union else set(range(tracer.numIndicators()))
+    for x in group:
+        if union:
+            ret |= set(tracer.getTraceOfAtom(atoms[x]))
+        else:
+            ret &= set(tracer.getTraceOfAtom(atoms[x]))
+    return ret
+
+
+def test_rows_and_reductions_match_the_atom_traces():
+    rng = random.Random(1)
+    tracer, atoms = tracerWithAtoms(rng)
+    matrix = tracer.getTraceMatrix(atoms)
+    assert tracer.getTraceMatrix(atoms) is matrix
+    width = tracer.numIndicators()
+
+    for x in range(len(atoms)):
+        assert sorted(matrix.row(x)) == sorted(tracer.getTraceOfAtom(atoms[x]))
+    for k, missing in enumerate(matrix.tD()):
+        assert set(missing) == {x for x in range(len(atoms)) if k not in tracer.getTraceOfAtom(atoms[x])}  # fmt:skip
+        assert set(matrix.column(k)) == set(range(len(atoms))) - set(missing)
+    assert len(matrix.tD()) == width
+
+    groups = [[]] + [rng.sample(range(len(atoms)), rng.randint(1, 10)) for _ in range(30)]  # fmt:skip
+    for group, trace in zip(groups, matrix.andRows(groups)):
+        assert set(trace) == traceOfGroup(tracer, atoms, group, False)
+    for group, trace in zip(groups, matrix.orRows(groups)):
+        assert set(trace) == traceOfGroup(tracer, atoms, group, True)
+
+
+def test_traces_of_terms_match_trace_of_term():
+    rng = random.Random(2)
+    tracer, atoms = tracerWithAtoms(rng)
+    for _ in range(3):
+        terms = [bitarray(rng.sample(range(70), rng.randint(1, 4))) for _ in range(40)]
+        traces = tracer.getTracesOfTerms(terms, atoms)
+        assert len(traces) == len(terms)
+        for term, trace in zip(terms, traces):
+            assert sorted(trace) == sorted(tracer.getTraceOfTerm(term, atoms))
+
+        # A new period gives a new matrix
+        matrix = tracer.getTraceMatrix(atoms)
+        tracer.addNegativeH(bitarray(rng.sample(range(60), 20)))
+        assert tracer.getTraceMatrix(atoms) is not matrix
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_stored_traces_of_some_constants(monkeypatch, compiled):
+    monkeypatch.setattr(config.compiledFunc, "storeTracesOfConstants", compiled)
+    rng = random.Random(3)
+    tracer, atoms = tracerWithAtoms(rng)
+    for at in atoms:
+        tracer.getTraceOfAtom(at)
+
+    # A few constants, some of them in no atom
+    constants = sorted(rng.sample(range(70), 12))
+    tracer.storeTracesOfConstants(constants, atoms)
+    assert sorted(tracer.constToStoredTraces) == constants
+    for c in constants:
+        expected = tracer.getTraceOfTerm(bitarray([c]), atoms)
+        assert sorted(tracer.getStoredTraceOfConstant(c)) == sorted(expected)
@@ -0,0 +1,66 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import pickle
+import random
+
+from aml import core as sc
+from aml.aml_fast import aml_fast
+from aml.aml_fast.amlFastBitarrays import bitarray
+
+
+def tracer(rng):
+    ret = sc.Tracer(0, sc.ConstantManager())
+    for _ in range(10):
+        ret.addNegativeH(bitarray(rng.sample(range(40), 12)))
+    for _ in range(3):
+        ret.addPinningAtom(sc.Atom(0, 0, rng.sample(range(40), 3)))
+    return ret
+
+
+def test_store_is_kept_while_the_indicators_are_unchanged():
+    rng = random.Random(1)
+    tr = tracer(rng)
+    store = aml_fast.linkedTracer(tr)
+    assert aml_fast.linkedTracer(tr) is store
+
+    # Updates made in place to an indicator are seen through its handle
+    tr.indicators[3] |= bitarray([41])
+    assert aml_fast.linkedTracer(tr) is store
+
+
+def test_store_is_rebuilt_when_an_indicator_is_replaced():
+    rng = random.Random(2)
+    tr = tracer(rng)
+    store = aml_fast.linkedTracer(tr)
+
+    replacement = bitarray(rng.sample(range(40), 12))
+    tr.indicators[3] = replacement
+    rebuilt = aml_fast.linkedTracer(tr)
+    assert rebuilt is not store
+    assert rebuilt.indicators[3] is replacement
+
+    tr.atomIndicators[0] = sc.Atom(0, 0, [1, 2])
+    assert aml_fast.linkedTracer(tr) is not rebuilt
+
+    store = aml_fast.linkedTracer(tr)
+    tr.indicators = list(tr.indicators)
+    assert isinstance(tr.indicators, sc.IndicatorList)
+    assert aml_fast.linkedTracer(tr) is not store
+
+
+def test_indicator_list_counts_changes():
+    indicators = sc.IndicatorList([bitarray([1]), bitarray([2])])
+    same = indicators[0]
+    indicators[0] = same
+    assert indicators.version == 0
+
+    indicators.append(bitarray([3]))
+    indicators[1] = bitarray([4])
+    del indicators[0]
+    indicators.sort(key=len)
+    assert indicators.version == 4
+
+    loaded = pickle.loads(pickle.dumps(indicators))
+    assert isinstance(loaded, sc.IndicatorList)
+    assert [list(ind) for ind in loaded] == [list(ind) for ind in indicators]
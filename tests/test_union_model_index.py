@@ -0,0 +1,81 @@
+# Algebraic AI - 2025
+# Go to github.com/Algebraic-AI for full license details.
+
+import random
+
+import pytest
+
+from aml import config
+from aml import core as sc
+
+
+def referenceUpdate(unionModel, pDuples, unionUpdates):
+    """The scan of sparse_crossing_embedder.updateUnionModelWithSetOfPduples"""
+
+    take = []
+    discarded = []
+    excluded = set()
+    pDuplesSorted = sorted(pDuples, key=lambda r: r.lastUnionUpdate)
+    for at in unionModel:
+        if at.unionUpdateEntrance == -1:
+            at.unionUpdateEntrance = unionUpdates
+        keep = True
+        for r in pDuplesSorted:
+            if at.unionUpdateEntrance <= r.lastUnionUpdate:
+                break
+            if not at.ucs.isdisjoint(r.L):
+                if at.ucs.isdisjoint(r.R):
+                    if not r.hypothesis:
+                        keep = False
+                        discarded.append(at)
+                    else:
+                        excluded.add(at)
+                    break
+        if keep:
+            take.append(at)
+    for r in pDuples:
+        if not r.hypothesis:
+            r.lastUnionUpdate = unionUpdates
+    return take, excluded, discarded
+
+
+def simulate(mode, seed):
+    rng = random.Random(seed)
+    index = sc.UnionModelIndex()
+    unionModel = []
+    pDuples = []
+    history = []
+    for unionUpdates in range(1, 10):
+        unionModel.extend(sc.Atom(0, 0, rng.sample(range(50), rng.randint(1, 3))) for _ in range(25))  # fmt:skip
+        for _ in range(rng.randint(0, 8)):
+            L = sc.LCSegment(rng.sample(range(50), rng.randint(1, 5)))
+            R = sc.LCSegment(rng.sample(range(50), rng.randint(5, 25)))
+            pDuples.append(sc.Duple(L, R, True, 0, 1, rng.random() < 0.3))
+
+        if mode == "reference":
+            result = referenceUpdate(unionModel, pDuples, unionUpdates)
+        elif mode == "rebuilt":
+            result = sc.UnionModelIndex().updateUnionModel(unionModel, pDuples, unionUpdates)  # fmt:skip
+        else:
+            result = index.updateUnionModel(unionModel, pDuples, unionUpdates)
+        unionModel, excluded, discarded = result
+
+        history.append(
+            (
+                [sorted(at.ucs) for at in unionModel],
+                sorted(sorted(at.ucs) for at in excluded),
+                [sorted(at.ucs) for at in discarded],
+                [r.lastUnionUpdate for r in pDuples],
+            )
+        )
+    return history
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_kept_index_matches_a_full_rebuild(monkeypatch, compiled):
+    monkeypatch.setattr(config.compiledFunc, "duplesPendingDiscriminants", compiled)
+    for seed in range(4):
+        expected = simulate("reference", seed)
+        assert simulate("rebuilt", seed) == expected
+        assert simulate("kept", seed) == expected
+        assert any(discarded for _, _, discarded, _ in expected)